@@ -136,11 +136,14 @@ class Coupon(models.Model):
         if not self.is_valid:
             return False
         
+        # Pedidos e usos de cupom antigos ficam no arquivo (orders.archive)
+        from orders.models import ArchivedCouponUsage, ArchivedOrder
+        
         # Verificar se é apenas para primeiro pedido
         if self.first_order_only:
             has_previous_orders = customer.orders.filter(
                 status__in=['confirmed', 'processing', 'shipped', 'delivered']
-            ).exists()
+            ).exists() or ArchivedOrder.objects.filter(customer=customer, status='delivered').exists()
             if has_previous_orders:
                 return False
         
@@ -148,6 +151,9 @@ class Coupon(models.Model):
         customer_usage = CouponUsage.objects.filter(
             coupon=self,
             customer=customer
+        ).count() + ArchivedCouponUsage.objects.filter(
+            coupon_id=self.pk,
+            customer=customer
         ).count()
         
         return customer_usage < self.usage_limit_per_customer
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.16 on 2026-10-17 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveries', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='delivery',
+            options={'ordering': ['-created_at', '-id'], 'verbose_name': 'Entrega', 'verbose_name_plural': 'Entregas'},
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['-created_at', '-id'], name='deliveries__created_4de9cc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['driver', '-created_at', '-id'], name='deliveries__driver__cc9339_idx'),
+        ),
+    ]
@@ -4,6 +4,20 @@ from decimal import Decimal
 import uuid
 
 
+class DeliveryQuerySet(models.QuerySet):
+    """
+    QuerySet de entregas com as anotações e pré-carregamentos lidos pelos serializers
+    """
+    
+    def for_listing(self):
+        """Pedido (com o resumo dos itens), cliente e motorista (DeliveryListSerializer)"""
+        return self.select_related('order__customer', 'driver')
+    
+    def for_driver(self):
+        """Pedido, cliente e itens pré-carregados (DeliveryDriverSerializer)"""
+        return self.select_related('order__customer').prefetch_related('order__items')
+
+
 class Delivery(models.Model):
     """
     Modelo para entregas dos pedidos.
@@ -109,10 +123,16 @@ class Delivery(models.Model):
     picked_up_at = models.DateTimeField(null=True, blank=True, verbose_name='Coletado em')
     delivered_at = models.DateTimeField(null=True, blank=True, verbose_name='Entregue em')
     
+    objects = DeliveryQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Entrega'
         verbose_name_plural = 'Entregas'
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['driver', '-created_at', '-id']),
+        ]
     
     def __str__(self):
         return f"Entrega {self.tracking_code} - Pedido {self.order.order_number}"
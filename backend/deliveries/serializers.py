@@ -8,6 +8,8 @@ class DeliveryStatusHistorySerializer(serializers.ModelSerializer):
     """
     Serializer para histórico de status de entregas
     """
+    changed_at = serializers.DateTimeField(source='created_at', read_only=True)
+    
     class Meta:
         model = DeliveryStatusHistory
         fields = [
@@ -24,7 +26,9 @@ class DeliveryListSerializer(serializers.ModelSerializer):
     customer_phone = serializers.CharField(source='order.customer.phone', read_only=True)
     order_number = serializers.CharField(source='order.order_number', read_only=True)
     driver_name = serializers.CharField(source='driver.full_name', read_only=True)
-    total_items = serializers.SerializerMethodField()
+    estimated_delivery = serializers.DateTimeField(source='estimated_delivery_date', read_only=True)
+    actual_delivery = serializers.DateTimeField(source='actual_delivery_date', read_only=True)
+    total_items = serializers.IntegerField(source='order.items_count', read_only=True)
     
     class Meta:
         model = Delivery
@@ -33,9 +37,6 @@ class DeliveryListSerializer(serializers.ModelSerializer):
             'driver_name', 'status', 'delivery_address', 'estimated_delivery',
             'actual_delivery', 'total_items', 'created_at'
         ]
-    
-    def get_total_items(self, obj):
-        return obj.order.items.count()
 
 
 class DeliveryDetailSerializer(serializers.ModelSerializer):
@@ -121,6 +122,7 @@ class DeliveryDriverSerializer(serializers.ModelSerializer):
     """
     customer_name = serializers.CharField(source='order.customer.full_name', read_only=True)
     customer_phone = serializers.CharField(source='order.customer.phone', read_only=True)
+    estimated_delivery = serializers.DateTimeField(source='estimated_delivery_date', read_only=True)
     order_items = serializers.SerializerMethodField()
     
     class Meta:
@@ -135,9 +137,10 @@ class DeliveryDriverSerializer(serializers.ModelSerializer):
     def get_order_items(self, obj):
         # Retornar apenas informações básicas dos itens
         items = []
+        # Nome gravado no item do pedido; dispensa carregar o produto
         for item in obj.order.items.all():
             items.append({
-                'product_name': item.product.name,
+                'product_name': item.product_name,
                 'quantity': item.quantity,
                 'unit_price': item.unit_price
             })
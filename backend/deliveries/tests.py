@@ -1,3 +1,119 @@
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.db import connection
+from rest_framework.test import APITestCase
+from rest_framework import status
+from decimal import Decimal
+from .models import Delivery, DeliveryStatusHistory
+from orders.models import Order, OrderItem
+from products.models import Department, Product
 
-# Create your tests here.
+User = get_user_model()
+
+
+class DeliveryQueryCountTest(APITestCase):
+    """Testes de quantidade fixa de consultas nos endpoints de entregas"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email='admin@example.com',
+            password='testpass123',
+            full_name='Admin User',
+            cpf_cnpj='11111111111',
+            user_type='admin'
+        )
+        self.driver = User.objects.create_user(
+            email='driver@example.com',
+            password='testpass123',
+            full_name='Driver User',
+            cpf_cnpj='22222222222',
+            user_type='driver'
+        )
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass123',
+            full_name='Customer User',
+            cpf_cnpj='33333333333'
+        )
+        department = Department.objects.create(name='Eletrônicos', slug='eletronicos')
+        self.products = [
+            Product.objects.create(
+                name=f'Produto {index}',
+                description='Descrição',
+                slug=f'produto-{index}',
+                department=department,
+                price=Decimal('10.00')
+            )
+            for index in range(5)
+        ]
+    
+    def create_delivery(self):
+        order = Order.objects.create(
+            customer=self.customer,
+            payment_method='pix',
+            subtotal=Decimal('50.00'),
+            total_amount=Decimal('50.00'),
+            shipping_address='Rua A, 1',
+            shipping_city='São Paulo',
+            shipping_state='SP',
+            shipping_postal_code='01000-000'
+        )
+        for product in self.products:
+            OrderItem.objects.create(order=order, product=product, quantity=2, unit_price=product.price)
+        return Delivery.objects.create(
+            order=order,
+            driver=self.driver,
+            delivery_address='Rua A, 1',
+            delivery_city='São Paulo',
+            delivery_state='SP',
+            delivery_postal_code='01000-000',
+            customer_name='Customer User',
+            customer_phone='+5511999999999'
+        )
+    
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+    
+    def test_delivery_list_query_count_is_constant(self):
+        """Teste da listagem de entregas independente da quantidade de entregas"""
+        self.client.force_authenticate(user=self.admin)
+        self.create_delivery()
+        baseline = self.count_queries('/api/deliveries/')
+        
+        for _ in range(4):
+            self.create_delivery()
+        self.assertEqual(self.count_queries('/api/deliveries/'), baseline)
+    
+    def test_driver_deliveries_query_count_is_constant(self):
+        """Teste das entregas do motorista independente da quantidade de itens"""
+        self.client.force_authenticate(user=self.driver)
+        self.create_delivery()
+        baseline = self.count_queries('/api/deliveries/driver/')
+        
+        for _ in range(4):
+            self.create_delivery()
+        self.assertEqual(self.count_queries('/api/deliveries/driver/'), baseline)
+        
+        response = self.client.get('/api/deliveries/driver/')
+        self.assertEqual(response.data[0]['order_items'][0]['product_name'], 'Produto 0')
+
+    def test_track_delivery_not_modified(self):
+        """Teste de 304 no rastreamento público até a próxima mudança de status"""
+        delivery = self.create_delivery()
+        url = f'/api/deliveries/track/{delivery.tracking_code}/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        
+        DeliveryStatusHistory.objects.create(delivery=delivery, status='in_transit', changed_by=self.driver)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['status_history']), 1)
@@ -2,11 +2,17 @@ from rest_framework import status, generics, permissions, filters
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from django.db.models import Q, Count
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q, Count, Max
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.views.decorators.http import condition
 from datetime import datetime, timedelta
 
+from ecommerce_saas.pagination import OptionalKeysetPagination
+from orders.models import ArchivedOrder
+from orders.outbox import emit, event
 from .models import Delivery, DeliveryStatusHistory
 from .serializers import (
     DeliveryListSerializer,
@@ -32,10 +38,11 @@ class DeliveryListView(generics.ListAPIView):
     search_fields = ['tracking_code', 'order__customer__full_name', 'delivery_address']
     ordering_fields = ['created_at', 'estimated_delivery', 'status']
     ordering = ['-created_at']
+    pagination_class = OptionalKeysetPagination
     
     def get_queryset(self):
         user = self.request.user
-        queryset = Delivery.objects.select_related('order__customer', 'driver')
+        queryset = Delivery.objects.for_listing()
         
         # Filtrar baseado no tipo de usuário
         if user.user_type == 'admin':
@@ -79,22 +86,28 @@ def update_delivery_status(request, delivery_id):
         location = serializer.validated_data.get('location', '')
         notes = serializer.validated_data.get('notes', '')
         
-        # Atualizar status da entrega
-        delivery.status = new_status
-        
-        # Se foi entregue, registrar data/hora
-        if new_status == 'delivered':
-            delivery.actual_delivery = timezone.now()
-        
-        delivery.save()
-        
-        # Criar registro de histórico
-        DeliveryStatusHistory.objects.create(
-            delivery=delivery,
-            status=new_status,
-            notes=notes,
-            changed_by=user
-        )
+        old_status = delivery.status
+        with transaction.atomic():
+            # Atualizar status da entrega
+            delivery.status = new_status
+            
+            # Se foi entregue, registrar data/hora
+            if new_status == 'delivered':
+                delivery.actual_delivery = timezone.now()
+            
+            delivery.save()
+            
+            # Criar registro de histórico
+            DeliveryStatusHistory.objects.create(
+                delivery=delivery,
+                status=new_status,
+                notes=notes,
+                changed_by=user
+            )
+            emit(event(
+                'delivery.status_changed', 'delivery', delivery.pk, delivery_id=delivery.pk,
+                order_id=delivery.order_id, old_status=old_status, new_status=new_status
+            ))
         
         return Response({
             'message': 'Status atualizado com sucesso',
@@ -105,8 +118,35 @@ def update_delivery_status(request, delivery_id):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def tracking_last_modified(request, tracking_code):
+    """
+    Versão do rastreamento: última alteração da entrega ou do seu histórico
+    """
+    cache = request.__dict__.setdefault('_tracking_versions', {})
+    if tracking_code not in cache:
+        try:
+            versions = Delivery.objects.filter(tracking_code=tracking_code).aggregate(
+                delivery=Max('updated_at'),
+                history=Max('status_history__created_at')
+            )
+        except ValidationError:
+            # Código de rastreamento em formato inválido
+            versions = {}
+        stamps = [stamp for stamp in versions.values() if stamp is not None]
+        cache[tracking_code] = max(stamps) if stamps else None
+    return cache[tracking_code]
+
+
+def tracking_etag(request, tracking_code):
+    version = tracking_last_modified(request, tracking_code)
+    if version is None:
+        return None
+    return f'W/"{tracking_code}-{version.timestamp():.6f}"'
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@condition(etag_func=tracking_etag, last_modified_func=tracking_last_modified)
 def track_delivery(request, tracking_code):
     """
     Rastrear entrega pelo código (público)
@@ -115,7 +155,7 @@ def track_delivery(request, tracking_code):
         delivery = Delivery.objects.get(tracking_code=tracking_code)
         status_history = DeliveryStatusHistory.objects.filter(
             delivery=delivery
-        ).order_by('changed_at')
+        ).order_by('created_at')
         
         data = {
             'tracking_code': delivery.tracking_code,
@@ -128,9 +168,33 @@ def track_delivery(request, tracking_code):
         return Response(data, status=status.HTTP_200_OK)
         
     except Delivery.DoesNotExist:
+        pass
+    
+    # Entregas de pedidos arquivados (orders.archive)
+    document = ArchivedOrder.objects.filter(tracking_code=tracking_code).values_list('document', flat=True).first()
+    if document is None:
         return Response({
             'error': 'Código de rastreamento não encontrado'
         }, status=status.HTTP_404_NOT_FOUND)
+    
+    delivery = document['delivery']
+    return Response({
+        'tracking_code': delivery['tracking_code'],
+        'status': delivery['status'],
+        'estimated_delivery_date': delivery['estimated_delivery_date'],
+        'delivery_address': delivery['delivery_address'],
+        'status_history': [
+            {
+                'id': entry['id'],
+                'delivery': delivery['id'],
+                'status': entry['status'],
+                'notes': entry['notes'],
+                'changed_at': entry['created_at'],
+                'changed_by': entry['changed_by_id'],
+            }
+            for entry in delivery['status_history']
+        ]
+    }, status=status.HTTP_200_OK)
 
 
 @api_view(['GET'])
@@ -144,7 +208,7 @@ def driver_deliveries(request):
     
     deliveries = Delivery.objects.filter(
         driver=request.user
-    ).select_related('order__customer').order_by('-created_at')
+    ).for_driver().order_by('-created_at')
     
     # Filtrar por status se especificado
     status_filter = request.query_params.get('status')
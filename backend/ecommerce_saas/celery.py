@@ -40,14 +40,66 @@ app.conf.update(
             'task': 'orders.tasks.cleanup_expired_carts',
             'schedule': 3600.0,  # A cada hora
         },
+        'flush-carts': {
+            'task': 'orders.tasks.flush_carts',
+            'schedule': 30.0,  # A cada 30 segundos (carrinhos no Redis)
+        },
+        'release-expired-reservations': {
+            'task': 'orders.tasks.release_expired_reservations',
+            'schedule': 60.0,  # A cada minuto (reservas de pedidos não pagos)
+        },
+        'relay-outbox-events': {
+            'task': 'orders.tasks.relay_outbox_events',
+            'schedule': 5.0,  # A cada 5 segundos (eventos de domínio)
+        },
+        'purge-outbox-events': {
+            'task': 'orders.tasks.purge_outbox_events',
+            'schedule': 86400.0,  # Diariamente
+        },
+        'update-sales-rollups': {
+            'task': 'orders.tasks.update_sales_rollups',
+            'schedule': 300.0,  # A cada 5 minutos (relatórios de vendas)
+        },
+        'purge-idempotency-keys': {
+            'task': 'orders.tasks.purge_idempotency_keys',
+            'schedule': 3600.0,  # A cada hora
+        },
+        'archive-orders': {
+            'task': 'orders.tasks.archive_orders',
+            'schedule': 604800.0,  # Semanalmente
+        },
+        'snapshot-stock-balances': {
+            'task': 'products.tasks.snapshot_stock_balances',
+            'schedule': 86400.0,  # Diariamente
+        },
+        'compact-stock-ledger': {
+            'task': 'products.tasks.compact_stock_ledger',
+            'schedule': 604800.0,  # Semanalmente
+        },
+        'apply-price-schedules': {
+            'task': 'products.tasks.apply_price_schedules',
+            'schedule': 60.0,  # A cada minuto (viradas de promoções agendadas)
+        },
+        'warm-catalog-cache': {
+            'task': 'products.tasks.warm_catalog_cache',
+            'schedule': 300.0,  # A cada 5 minutos
+        },
         'update-product-rankings': {
             'task': 'products.tasks.update_product_rankings',
             'schedule': 86400.0,  # Diariamente
         },
+        'update-related-products': {
+            'task': 'products.tasks.update_related_products',
+            'schedule': 3600.0,  # A cada hora
+        },
         'send-abandoned-cart-emails': {
             'task': 'orders.tasks.send_abandoned_cart_emails',
             'schedule': 7200.0,  # A cada 2 horas
         },
+        'purge-export-jobs': {
+            'task': 'exports.tasks.purge_export_jobs',
+            'schedule': 86400.0,  # Diariamente
+        },
         'cleanup-old-logs': {
             'task': 'audit.tasks.cleanup_old_logs',
             'schedule': 86400.0,  # Diariamente
@@ -0,0 +1,157 @@
+import base64
+from collections import OrderedDict
+
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginação por cursor (keyset) sobre (created_at, id), do mais recente
+    para o mais antigo.
+    
+    Cada página é lida com `WHERE (created_at, id) < cursor ORDER BY
+    created_at DESC, id DESC LIMIT n + 1`, apoiada em índices compostos, sem
+    COUNT(*) nem OFFSET. Em vez do total, a resposta informa `has_more`.
+    
+    O cursor só vale para essa ordenação: `?ordering=` com outro critério
+    (preço, popularidade, avaliação...) é rejeitado com 400.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = PageNumberPagination.page_size or 20
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Cursor inválido.'
+    invalid_ordering_message = 'A paginação por cursor só aceita a ordenação -created_at.'
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        self.check_ordering(request)
+    
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            created_at, pk = position
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+    
+        results = list(queryset[:page_size + 1])
+        self.has_more = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+    
+    def check_ordering(self, request):
+        ordering = request.query_params.get(api_settings.ORDERING_PARAM)
+        if not ordering:
+            return
+        terms = tuple(term.strip() for term in ordering.split(',') if term.strip())
+        if terms not in (self.ordering[:1], self.ordering):
+            raise ValidationError({api_settings.ORDERING_PARAM: [self.invalid_ordering_message]})
+    
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+    
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_at, pk = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            created_at = parse_datetime(created_at)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+    
+    def encode_cursor(self, instance):
+        position = f'{instance.created_at.isoformat()}|{instance.pk}'
+        return base64.urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+    
+    def get_next_link(self):
+        if not self.has_more:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+    
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('has_more', self.has_more),
+            ('results', data)
+        ]))
+    
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'has_more': {'type': 'boolean'},
+                'results': schema,
+            },
+        }
+
+
+class OptionalKeysetPagination(PageNumberPagination):
+    """
+    Paginação por página (padrão) com modo cursor opcional.
+    
+    `?pagination=cursor` (ou a presença de `?cursor=`) ativa o KeysetPagination;
+    sem o parâmetro, o comportamento de `?page=N` com `count` é mantido.
+    """
+    mode_query_param = 'pagination'
+    
+    def use_keyset(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_keyset(request):
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+    
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator do admin que, para listagens sem filtro no PostgreSQL, usa a
+    estimativa de linhas do planejador (pg_class.reltuples) em vez de COUNT(*).
+    """
+    
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                    [self.object_list.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] > 0:
+                return row[0]
+        return super().count
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+from decimal import Decimal
 from decouple import config
 import os
 
@@ -57,6 +58,7 @@ INSTALLED_APPS = [
     'notifications',
     'audit',
     'payments',
+    'exports',
 ]
 
 MIDDLEWARE = [
@@ -211,6 +213,7 @@ CORS_ALLOWED_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'idempotency-key',
     'origin',
     'user-agent',
     'x-csrftoken',
@@ -298,13 +301,21 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
-# Cache Settings (simplificado para desenvolvimento)
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+# Cache Settings (memória local em desenvolvimento; Redis compartilhado com CACHE_URL)
+if config('CACHE_URL', default=None):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config('CACHE_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unique-snowflake',
+        }
     }
-}
 
 # Session backend padrão
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
@@ -390,6 +401,60 @@ PAYMENT_TIMEOUT_MINUTES = config('PAYMENT_TIMEOUT_MINUTES', default=30, cast=int
 # Order settings
 ORDER_EXPIRY_MINUTES = config('ORDER_EXPIRY_MINUTES', default=60, cast=int)
 
+# Cart storage ('database' ou 'redis'; no Redis os carrinhos são gravados no banco em segundo plano)
+CART_STORE_BACKEND = config('CART_STORE_BACKEND', default='database')
+CART_REDIS_URL = config('CART_REDIS_URL', default=config('CACHE_URL', default='redis://localhost:6379/1'))  # 'fakeredis://' em testes
+CART_TTL_DAYS = config('CART_TTL_DAYS', default=30, cast=int)
+CART_SUMMARY_TIMEOUT = config('CART_SUMMARY_TIMEOUT', default=60, cast=int)  # Resumo com preços em cache
+
+# Idempotency-Key (respostas do checkout e da criação de pedidos)
+IDEMPOTENCY_KEY_TTL_HOURS = config('IDEMPOTENCY_KEY_TTL_HOURS', default=24, cast=int)
+IDEMPOTENCY_WAIT_SECONDS = config('IDEMPOTENCY_WAIT_SECONDS', default=10, cast=float)  # Espera pela requisição concorrente
+IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS = config('IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS', default=120, cast=int)  # Chave em andamento abandonada
+
+# Outbox de eventos de domínio (publicados no Celery pelo relay)
+OUTBOX_RELAY_BATCH_SIZE = config('OUTBOX_RELAY_BATCH_SIZE', default=500, cast=int)
+OUTBOX_RELAY_MAX_BATCHES = config('OUTBOX_RELAY_MAX_BATCHES', default=20, cast=int)  # Lotes por execução do relay
+OUTBOX_DEDUP_TTL_HOURS = config('OUTBOX_DEDUP_TTL_HOURS', default=24, cast=int)  # Retenção das entregas registradas (descarte de publicações repetidas)
+OUTBOX_RETENTION_DAYS = config('OUTBOX_RETENTION_DAYS', default=7, cast=int)
+
+# Consolidados de vendas (relatórios)
+SALES_ROLLUP_SETTLE_MINUTES = config('SALES_ROLLUP_SETTLE_MINUTES', default=2, cast=int)  # Margem para pedidos ainda não confirmados
+
+# Arquivamento de pedidos encerrados (orders.archive)
+ORDER_ARCHIVE_AFTER_MONTHS = config('ORDER_ARCHIVE_AFTER_MONTHS', default=12, cast=int)  # Meses completos mantidos nas tabelas quentes
+
+# Exportações (streaming e arquivos gerados em segundo plano)
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)  # Linhas por lote lido do banco
+EXPORT_RETENTION_DAYS = config('EXPORT_RETENTION_DAYS', default=7, cast=int)
+
+# Stock ledger settings
+STOCK_LEDGER_DETAIL_DAYS = config('STOCK_LEDGER_DETAIL_DAYS', default=180, cast=int)  # Detalhe mantido antes da compactação
+STOCK_SNAPSHOT_SETTLE_MINUTES = config('STOCK_SNAPSHOT_SETTLE_MINUTES', default=5, cast=int)
+PRODUCT_DETAIL_STOCK_MOVEMENTS = config('PRODUCT_DETAIL_STOCK_MOVEMENTS', default=10, cast=int)  # Movimentações no detalhe do produto
+
+# Image variant settings
+IMAGE_VARIANT_WIDTHS = config(
+    'IMAGE_VARIANT_WIDTHS',
+    default='200,400,800,1200',
+    cast=lambda v: [int(s) for s in v.split(',') if s.strip()]
+)  # Larguras (px) das variantes responsivas
+IMAGE_VARIANT_FORMATS = ['webp', 'jpeg']
+IMAGE_VARIANT_QUALITY = config('IMAGE_VARIANT_QUALITY', default=80, cast=int)
+
+# Catalog settings
+CATALOG_PRICE_BUCKETS = config(
+    'CATALOG_PRICE_BUCKETS',
+    default='10,25,50,100,250',
+    cast=lambda v: [Decimal(s.strip()) for s in v.split(',') if s.strip()]
+)  # Limites das faixas de preço da navegação por facetas
+PRODUCT_RANKING_HALF_LIFE_DAYS = config('PRODUCT_RANKING_HALF_LIFE_DAYS', default=14, cast=int)  # Meia-vida do peso das vendas
+PRODUCT_RANKING_SETTLE_MINUTES = config('PRODUCT_RANKING_SETTLE_MINUTES', default=5, cast=int)  # Margem para pedidos ainda não confirmados
+RELATED_PRODUCTS_TOP_K = config('RELATED_PRODUCTS_TOP_K', default=10, cast=int)  # Vizinhos mantidos por produto
+RELATED_PRODUCTS_MIN_COUNT = config('RELATED_PRODUCTS_MIN_COUNT', default=2, cast=int)  # Pedidos em comum mínimos
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=3600, cast=int)  # Segundos; a invalidação é por geração
+
 # Create logs directory if it doesn't exist
 import os
 if not os.path.exists('logs'):
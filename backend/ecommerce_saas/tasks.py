@@ -3,10 +3,10 @@ from django.core.mail import send_mail, EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.utils import timezone
 import logging
 import requests
-from decimal import Decimal
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -93,27 +93,34 @@ def send_welcome_email(user_id):
         logger.error(f"Error sending welcome email: {e}")
 
 
-@shared_task
-def send_order_confirmation_email(order_id):
+@shared_task(bind=True, max_retries=3)
+def send_order_confirmation_email(self, order_id):
     """
     Enviar email de confirmação de pedido
     """
     try:
         from orders.models import Order
+        from orders.outbox import first_delivery
         
-        order = Order.objects.select_related('customer').prefetch_related('items__product').get(id=order_id)
-        
-        subject = f'Confirmação do Pedido #{order.order_number}'
-        
-        # Renderizar template HTML
-        html_message = render_to_string('emails/order_confirmation.html', {
-            'order': order,
-            'customer': order.customer,
-            'site_url': settings.FRONTEND_URL
-        })
-        
-        # Mensagem em texto simples
-        message = f"""
+        # A entrega é registrada na mesma transação: publicada de novo, a
+        # tarefa é descartada; se falhar, o registro é desfeito
+        with transaction.atomic():
+            if not first_delivery(self.request.id):
+                return
+            
+            order = Order.objects.select_related('customer').prefetch_related('items__product').get(id=order_id)
+            
+            subject = f'Confirmação do Pedido #{order.order_number}'
+            
+            # Renderizar template HTML
+            html_message = render_to_string('emails/order_confirmation.html', {
+                'order': order,
+                'customer': order.customer,
+                'site_url': settings.FRONTEND_URL
+            })
+            
+            # Mensagem em texto simples
+            message = f"""
         Olá {order.customer.full_name},
         
         Seu pedido #{order.order_number} foi confirmado!
@@ -126,43 +133,51 @@ def send_order_confirmation_email(order_id):
         Atenciosamente,
         Equipe ColheitaExpress
         """
+            
+            send_email_task.delay(
+                subject=subject,
+                message=message,
+                recipient_list=[order.customer.email],
+                html_message=html_message
+            )
+            
+            logger.info(f"Order confirmation email queued for order {order.order_number}")
         
-        send_email_task.delay(
-            subject=subject,
-            message=message,
-            recipient_list=[order.customer.email],
-            html_message=html_message
-        )
-        
-        logger.info(f"Order confirmation email queued for order {order.order_number}")
-        
-    except Exception as e:
-        logger.error(f"Error sending order confirmation email: {e}")
+    except Exception as exc:
+        logger.error(f"Error sending order confirmation email: {exc}")
+        raise self.retry(exc=exc, countdown=60 * (2 ** self.request.retries))
 
 
-@shared_task
-def send_order_status_update_email(order_id, old_status, new_status):
+@shared_task(bind=True, max_retries=3)
+def send_order_status_update_email(self, order_id, old_status, new_status):
     """
     Enviar email de atualização de status do pedido
     """
     try:
         from orders.models import Order
+        from orders.outbox import first_delivery
         
-        order = Order.objects.select_related('customer').get(id=order_id)
-        
-        subject = f'Atualização do Pedido #{order.order_number}'
-        
-        # Renderizar template HTML
-        html_message = render_to_string('emails/order_status_update.html', {
-            'order': order,
-            'customer': order.customer,
-            'old_status': old_status,
-            'new_status': new_status,
-            'site_url': settings.FRONTEND_URL
-        })
-        
-        # Mensagem em texto simples
-        message = f"""
+        # A entrega é registrada na mesma transação: publicada de novo, a
+        # tarefa é descartada; se falhar, o registro é desfeito
+        with transaction.atomic():
+            if not first_delivery(self.request.id):
+                return
+            
+            order = Order.objects.select_related('customer').get(id=order_id)
+            
+            subject = f'Atualização do Pedido #{order.order_number}'
+            
+            # Renderizar template HTML
+            html_message = render_to_string('emails/order_status_update.html', {
+                'order': order,
+                'customer': order.customer,
+                'old_status': old_status,
+                'new_status': new_status,
+                'site_url': settings.FRONTEND_URL
+            })
+            
+            # Mensagem em texto simples
+            message = f"""
         Olá {order.customer.full_name},
         
         O status do seu pedido #{order.order_number} foi atualizado.
@@ -175,18 +190,37 @@ def send_order_status_update_email(order_id, old_status, new_status):
         Atenciosamente,
         Equipe ColheitaExpress
         """
+            
+            send_email_task.delay(
+                subject=subject,
+                message=message,
+                recipient_list=[order.customer.email],
+                html_message=html_message
+            )
+            
+            logger.info(f"Order status update email queued for order {order.order_number}")
         
-        send_email_task.delay(
-            subject=subject,
-            message=message,
-            recipient_list=[order.customer.email],
-            html_message=html_message
-        )
-        
-        logger.info(f"Order status update email queued for order {order.order_number}")
-        
-    except Exception as e:
-        logger.error(f"Error sending order status update email: {e}")
+    except Exception as exc:
+        logger.error(f"Error sending order status update email: {exc}")
+        raise self.retry(exc=exc, countdown=60 * (2 ** self.request.retries))
+
+
+def _process_credit_card_payment(payment):
+    """Simular processamento de cartão de crédito"""
+    # Em produção, integrar com Stripe, PagSeguro, etc.
+    return True
+
+
+def _process_pix_payment(payment):
+    """Simular processamento PIX"""
+    # Em produção, integrar com banco ou gateway PIX
+    return True
+
+
+def _generate_bank_slip(payment):
+    """Simular geração de boleto"""
+    # Em produção, integrar com banco para gerar boleto
+    return True
 
 
 @shared_task(bind=True, max_retries=3)
@@ -195,43 +229,56 @@ def process_payment_task(self, payment_id):
     Processar pagamento de forma assíncrona
     """
     try:
+        from django.db import transaction
+        from orders.outbox import emit, event
+        from orders.state_machine import transition_orders
         from payments.models import Payment
         
-        payment = Payment.objects.select_related('order').get(id=payment_id)
+        payment = Payment.objects.select_related('order', 'payment_method').get(id=payment_id)
+        method_type = payment.payment_method.method_type
         
         # Simular processamento de pagamento
         # Em produção, aqui seria a integração com gateway de pagamento
         
-        if payment.payment_method == 'credit_card':
+        if method_type == 'credit_card':
             # Processar cartão de crédito
-            success = self._process_credit_card_payment(payment)
-        elif payment.payment_method == 'pix':
+            success = _process_credit_card_payment(payment)
+        elif method_type == 'pix':
             # Processar PIX
-            success = self._process_pix_payment(payment)
-        elif payment.payment_method == 'bank_slip':
+            success = _process_pix_payment(payment)
+        elif method_type == 'bank_slip':
             # Gerar boleto
-            success = self._generate_bank_slip(payment)
+            success = _generate_bank_slip(payment)
         else:
             success = False
         
+        old_status = payment.status
         if success:
-            payment.status = 'completed'
-            payment.processed_at = timezone.now()
-            payment.save()
-            
-            # Atualizar status do pedido
-            order = payment.order
-            order.status = 'confirmed'
-            order.save()
-            
-            # Enviar email de confirmação
-            send_order_confirmation_email.delay(order.id)
+            with transaction.atomic():
+                # 'approved' (Payment.is_successful): o post_save converte as reservas
+                # do pedido em saída de estoque (orders.services.confirm_payment)
+                payment.status = 'approved'
+                payment.processed_at = timezone.now()
+                payment.save()
+                emit(event(
+                    'payment.status_changed', 'payment', payment.id, payment_id=payment.id,
+                    order_id=payment.order_id, old_status=old_status, new_status=payment.status
+                ))
+                
+                # Atualizar status do pedido (ignorado se já tiver avançado); o email de
+                # confirmação é enviado pelo outbox após o commit
+                transition_orders([payment.order_id], 'confirmed', notes='Pagamento aprovado')
             
             logger.info(f"Payment {payment.id} processed successfully")
-            return f"Payment {payment.id} completed"
+            return f"Payment {payment.id} approved"
         else:
-            payment.status = 'failed'
-            payment.save()
+            with transaction.atomic():
+                payment.status = 'declined'
+                payment.save()
+                emit(event(
+                    'payment.status_changed', 'payment', payment.id, payment_id=payment.id,
+                    order_id=payment.order_id, old_status=old_status, new_status=payment.status
+                ))
             
             logger.error(f"Payment {payment.id} failed")
             return f"Payment {payment.id} failed"
@@ -239,21 +286,6 @@ def process_payment_task(self, payment_id):
     except Exception as exc:
         logger.error(f"Error processing payment {payment_id}: {exc}")
         raise self.retry(exc=exc, countdown=60 * (2 ** self.request.retries))
-    
-    def _process_credit_card_payment(self, payment):
-        """Simular processamento de cartão de crédito"""
-        # Em produção, integrar com Stripe, PagSeguro, etc.
-        return True
-    
-    def _process_pix_payment(self, payment):
-        """Simular processamento PIX"""
-        # Em produção, integrar com banco ou gateway PIX
-        return True
-    
-    def _generate_bank_slip(self, payment):
-        """Simular geração de boleto"""
-        # Em produção, integrar com banco para gerar boleto
-        return True
 
 
 @shared_task
@@ -287,20 +319,16 @@ def generate_sales_report_task(start_date, end_date, user_id):
     Gerar relatório de vendas de forma assíncrona
     """
     try:
-        from orders.models import Order
-        from django.db.models import Sum, Count
+        from orders.rollups import sales_report
         
         user = User.objects.get(id=user_id)
         
-        # Consultar pedidos no período
-        orders = Order.objects.filter(
-            created_at__date__range=[start_date, end_date],
-            status__in=['confirmed', 'shipped', 'delivered']
-        )
-        
-        # Calcular métricas
-        total_orders = orders.count()
-        total_revenue = orders.aggregate(Sum('total_amount'))['total_amount__sum'] or Decimal('0.00')
+        # Métricas do período lidas dos consolidados de vendas
+        totals = sales_report(
+            start_date, end_date, statuses=['confirmed', 'shipped', 'delivered']
+        )['totals']
+        total_orders = totals['orders_count']
+        total_revenue = totals['total_amount']
         
         # Gerar relatório
         report_data = {
@@ -28,6 +28,7 @@ urlpatterns = [
     path('api/products/', include('products.urls')),
     path('api/orders/', include('orders.urls')),
     path('api/deliveries/', include('deliveries.urls')),
+    path('api/exports/', include('exports.urls')),
 ]
 
 # Servir arquivos de media durante o desenvolvimento
@@ -0,0 +1,14 @@
+from django.contrib import admin
+
+from .models import ExportJob
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'dataset', 'file_format', 'user', 'status', 'rows_count', 'created_at', 'finished_at']
+    list_filter = ['dataset', 'status', 'created_at']
+    search_fields = ['user__email']
+    readonly_fields = [
+        'id', 'user', 'dataset', 'file_format', 'columns', 'params', 'status', 'file',
+        'rows_count', 'error', 'created_at', 'started_at', 'finished_at'
+    ]
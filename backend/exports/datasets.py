@@ -0,0 +1,185 @@
+"""
+Conjuntos de dados exportáveis: pedidos (com itens), entregas (com histórico de
+status) e movimentações de estoque.
+
+Cada conjunto define suas colunas (campo do values_list ou coleção filha) e como
+obter o queryset a partir da requisição. Pedidos e entregas usam a própria view
+de listagem (mesmo escopo por tipo de usuário, busca e ordenação da API).
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.utils import timezone
+
+
+class Child:
+    """Coleção filha exportada como lista em uma coluna (uma consulta por lote de linhas)"""
+    
+    def __init__(self, model_path, parent_field, fields, ordering):
+        self.model_path = model_path
+        self.parent_field = parent_field
+        self.fields = fields
+        self.ordering = ordering
+    
+    def load(self, parent_ids):
+        from django.apps import apps
+        
+        model = apps.get_model(self.model_path)
+        entries = {}
+        rows = model.objects.filter(**{f'{self.parent_field}__in': parent_ids}).order_by(
+            self.parent_field, *self.ordering
+        ).values_list(self.parent_field, *self.fields.values())
+        for parent_id, *values in rows:
+            entries.setdefault(parent_id, []).append(dict(zip(self.fields, values)))
+        return entries
+
+
+class Dataset:
+    """Colunas exportáveis e origem das linhas de um conjunto de dados"""
+    
+    def __init__(self, name, columns, default_columns, get_queryset, children=None):
+        self.name = name
+        self.columns = columns
+        self.default_columns = default_columns
+        self.get_queryset = get_queryset
+        self.children = children or {}
+    
+    @property
+    def available_columns(self):
+        return list(self.columns) + list(self.children)
+    
+    def queryset(self, request):
+        return self.get_queryset(request)
+
+
+def _list_view_queryset(view_class, request):
+    """Queryset da view de listagem com os mesmos filtros da API (busca e ordenação)"""
+    view = view_class(request=request, format_kwarg=None, args=(), kwargs={})
+    return view.filter_queryset(view.get_queryset())
+
+
+def _orders(request):
+    from orders.views import OrderListView
+    return _list_view_queryset(OrderListView, request)
+
+
+def _deliveries(request):
+    from deliveries.views import DeliveryListView
+    return _list_view_queryset(DeliveryListView, request)
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _stock_movements(request):
+    """Movimentações filtradas por produto, departamento, tipo e período (created_at)"""
+    from products.models import Stock
+    
+    params = request.query_params
+    queryset = Stock.objects.order_by('created_at', 'id')
+    if params.get('product'):
+        queryset = queryset.filter(product_id=params['product'])
+    if params.get('department'):
+        queryset = queryset.filter(product__department_id=params['department'])
+    if params.get('movement_type'):
+        queryset = queryset.filter(movement_type=params['movement_type'])
+    start_date = _parse_date(params.get('start_date'))
+    if start_date:
+        queryset = queryset.filter(created_at__gte=timezone.make_aware(datetime.combine(start_date, time.min)))
+    end_date = _parse_date(params.get('end_date'))
+    if end_date:
+        queryset = queryset.filter(
+            created_at__lt=timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+        )
+    return queryset
+
+
+ORDERS = Dataset(
+    name='orders',
+    columns={
+        'order_number': 'order_number',
+        'created_at': 'created_at',
+        'customer_name': 'customer__full_name',
+        'customer_email': 'customer__email',
+        'status': 'status',
+        'payment_status': 'payment_status',
+        'payment_method': 'payment_method',
+        'subtotal': 'subtotal',
+        'shipping_cost': 'shipping_cost',
+        'discount': 'discount',
+        'total_amount': 'total_amount',
+        'items_count': 'items_count',
+        'total_quantity': 'total_quantity',
+        'shipping_address': 'shipping_address',
+        'shipping_city': 'shipping_city',
+        'shipping_state': 'shipping_state',
+        'shipping_postal_code': 'shipping_postal_code',
+    },
+    default_columns=[
+        'order_number', 'created_at', 'customer_name', 'status', 'payment_status',
+        'payment_method', 'total_amount', 'items_count', 'shipping_city', 'shipping_state', 'items'
+    ],
+    get_queryset=_orders,
+    children={
+        'items': Child(
+            'orders.OrderItem', 'order_id',
+            {'product_id': 'product_id', 'product_name': 'product_name', 'quantity': 'quantity',
+             'unit_price': 'unit_price', 'total_price': 'total_price'},
+            ordering=['id']
+        ),
+    }
+)
+
+DELIVERIES = Dataset(
+    name='deliveries',
+    columns={
+        'tracking_code': 'tracking_code',
+        'order_number': 'order__order_number',
+        'customer_name': 'customer_name',
+        'driver_name': 'driver__full_name',
+        'status': 'status',
+        'delivery_address': 'delivery_address',
+        'delivery_city': 'delivery_city',
+        'delivery_state': 'delivery_state',
+        'estimated_delivery_date': 'estimated_delivery_date',
+        'actual_delivery_date': 'actual_delivery_date',
+        'created_at': 'created_at',
+    },
+    default_columns=[
+        'tracking_code', 'order_number', 'customer_name', 'driver_name', 'status',
+        'delivery_city', 'delivery_state', 'estimated_delivery_date', 'actual_delivery_date',
+        'created_at', 'status_history'
+    ],
+    get_queryset=_deliveries,
+    children={
+        'status_history': Child(
+            'deliveries.DeliveryStatusHistory', 'delivery_id',
+            {'status': 'status', 'notes': 'notes', 'location': 'location', 'created_at': 'created_at'},
+            ordering=['created_at', 'id']
+        ),
+    }
+)
+
+STOCK_MOVEMENTS = Dataset(
+    name='stock_movements',
+    columns={
+        'created_at': 'created_at',
+        'product_id': 'product_id',
+        'product_slug': 'product__slug',
+        'product_name': 'product__name',
+        'department': 'product__department__name',
+        'movement_type': 'movement_type',
+        'quantity': 'quantity',
+        'reason': 'reason',
+        'created_by': 'created_by__email',
+    },
+    default_columns=[
+        'created_at', 'product_id', 'product_name', 'department', 'movement_type', 'quantity', 'reason'
+    ],
+    get_queryset=_stock_movements
+)
+
+DATASETS = {dataset.name: dataset for dataset in (ORDERS, DELIVERIES, STOCK_MOVEMENTS)}
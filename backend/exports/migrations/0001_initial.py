@@ -0,0 +1,42 @@
+# Generated by Django 4.2.16 on 2026-10-17 03:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('dataset', models.CharField(max_length=50, verbose_name='Conjunto de Dados')),
+                ('file_format', models.CharField(max_length=10, verbose_name='Formato')),
+                ('columns', models.JSONField(default=list, verbose_name='Colunas')),
+                ('params', models.JSONField(default=dict, verbose_name='Filtros')),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('running', 'Em Execução'), ('completed', 'Concluída'), ('failed', 'Falhou')], default='pending', max_length=20, verbose_name='Status')),
+                ('file', models.FileField(blank=True, upload_to='exports/%Y/%m/', verbose_name='Arquivo')),
+                ('rows_count', models.PositiveBigIntegerField(default=0, verbose_name='Linhas')),
+                ('error', models.TextField(blank=True, verbose_name='Erro')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado em')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Concluído em')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Exportação',
+                'verbose_name_plural': 'Exportações',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', '-created_at'], name='exports_exp_user_id_9160cf_idx'), models.Index(fields=['finished_at'], name='exports_exp_finishe_71a6aa_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import models
+import uuid
+
+
+class ExportJob(models.Model):
+    """
+    Exportação executada em segundo plano (Celery), gravada em um arquivo
+    compactado (gzip) disponível para download.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pendente'),
+        ('running', 'Em Execução'),
+        ('completed', 'Concluída'),
+        ('failed', 'Falhou'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        'users.User',
+        on_delete=models.CASCADE,
+        related_name='export_jobs',
+        verbose_name='Usuário'
+    )
+    dataset = models.CharField(max_length=50, verbose_name='Conjunto de Dados')
+    file_format = models.CharField(max_length=10, verbose_name='Formato')
+    columns = models.JSONField(default=list, verbose_name='Colunas')
+    params = models.JSONField(default=dict, verbose_name='Filtros')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='Status')
+    file = models.FileField(upload_to='exports/%Y/%m/', blank=True, verbose_name='Arquivo')
+    rows_count = models.PositiveBigIntegerField(default=0, verbose_name='Linhas')
+    error = models.TextField(blank=True, verbose_name='Erro')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Iniciado em')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Concluído em')
+
+    class Meta:
+        verbose_name = 'Exportação'
+        verbose_name_plural = 'Exportações'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['finished_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.dataset}.{self.file_format} ({self.get_status_display()})"
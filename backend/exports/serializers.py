@@ -0,0 +1,26 @@
+from rest_framework import serializers
+from django.urls import reverse
+
+from .models import ExportJob
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer para exportações em segundo plano
+    """
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id', 'dataset', 'file_format', 'columns', 'params', 'status', 'rows_count',
+            'error', 'created_at', 'started_at', 'finished_at', 'download_url'
+        ]
+        read_only_fields = fields
+    
+    def get_download_url(self, obj):
+        if obj.status != 'completed':
+            return None
+        url = reverse('exports:download_export_job', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
@@ -0,0 +1,190 @@
+"""
+Exportação de pedidos, entregas e movimentações de estoque em CSV ou JSONL.
+
+As linhas são lidas com values_list(...).iterator(chunk_size), ou seja, com
+cursor no servidor (PostgreSQL) e sem instanciar modelos; as coleções filhas
+(itens do pedido, histórico da entrega) são carregadas com uma consulta por
+lote de linhas. A memória usada depende apenas de EXPORT_CHUNK_SIZE, não do
+tamanho da exportação. O resultado é enviado em streaming (export_response)
+ou, para exportações grandes, gravado em segundo plano em um arquivo gzip
+(run_export).
+"""
+import csv
+import gzip
+import json
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import islice
+
+from django.conf import settings
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpRequest, QueryDict, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.request import Request
+
+from .datasets import DATASETS
+
+FORMATS = ('csv', 'jsonl')
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+# Parâmetros da exportação que não são filtros da listagem
+OPTION_PARAMS = ('file_format', 'columns')
+
+
+class ExportError(Exception):
+    """Conjunto de dados, formato ou colunas inválidos"""
+
+
+def resolve_options(dataset_name, file_format=None, columns=None):
+    """
+    Valida o conjunto de dados, o formato e as colunas (separadas por vírgula).
+    Retorna (dataset, formato, colunas).
+    """
+    dataset = DATASETS.get(dataset_name)
+    if dataset is None:
+        raise ExportError(f"Conjunto de dados inválido: {dataset_name}")
+    file_format = file_format or 'csv'
+    if file_format not in FORMATS:
+        raise ExportError(f"Formato inválido: {file_format}")
+    
+    if isinstance(columns, str):
+        columns = [column.strip() for column in columns.split(',') if column.strip()]
+    columns = list(dict.fromkeys(columns or dataset.default_columns))
+    invalid = [column for column in columns if column not in dataset.available_columns]
+    if invalid:
+        raise ExportError(f"Colunas inválidas: {', '.join(invalid)}")
+    return dataset, file_format, columns
+
+
+def filter_params(query_params):
+    """Filtros da listagem informados na requisição, como {parâmetro: [valores]}"""
+    return {key: values for key, values in query_params.lists() if key not in OPTION_PARAMS}
+
+
+def build_request(user, params):
+    """Requisição equivalente à original, para aplicar os filtros fora do ciclo HTTP"""
+    http_request = HttpRequest()
+    http_request.method = 'GET'
+    http_request.GET = QueryDict(mutable=True)
+    for key, values in params.items():
+        http_request.GET.setlist(key, values)
+    request = Request(http_request)
+    request.user = user
+    return request
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def export_rows(dataset, queryset, columns, chunk_size=None):
+    """Gera um dicionário por linha com as colunas pedidas, em lotes de chunk_size"""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    fields = [column for column in columns if column in dataset.columns]
+    children = [column for column in columns if column in dataset.children]
+    rows = queryset.values_list('pk', *[dataset.columns[column] for column in fields]).iterator(
+        chunk_size=chunk_size
+    )
+    
+    for chunk in _chunks(rows, chunk_size):
+        parent_ids = [row[0] for row in chunk]
+        loaded = {name: dataset.children[name].load(parent_ids) for name in children}
+        for pk, *values in chunk:
+            row = dict(zip(fields, values))
+            for name in children:
+                row[name] = loaded[name].get(pk, [])
+            yield {column: row[column] for column in columns}
+
+
+class _Echo:
+    """Buffer que devolve o que recebe, para csv.writer em streaming"""
+    
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, list):
+        return json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return value
+
+
+def render_rows(rows, columns, file_format):
+    """
+    Serializa as linhas em pedaços de texto. No CSV, as coleções filhas vão
+    em uma célula como lista JSON.
+    """
+    if file_format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow([_cell(row[column]) for column in columns])
+    else:
+        for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def export_response(dataset, queryset, columns, file_format):
+    """Resposta em streaming com a exportação completa"""
+    response = StreamingHttpResponse(
+        render_rows(export_rows(dataset, queryset, columns), columns, file_format),
+        content_type=f'{CONTENT_TYPES[file_format]}; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{dataset.name}.{file_format}"'
+    return response
+
+
+def run_export(job, chunk_size=None):
+    """
+    Executa a exportação do ExportJob, gravando o resultado compactado (gzip)
+    em job.file. Em caso de erro o job fica como 'failed' e o erro é propagado.
+    """
+    job.status = 'running'
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+    
+    try:
+        dataset, file_format, columns = resolve_options(job.dataset, job.file_format, job.columns)
+        queryset = dataset.queryset(build_request(job.user, job.params))
+        rows_count = 0
+        
+        def counted(rows):
+            nonlocal rows_count
+            for row in rows:
+                rows_count += 1
+                yield row
+        
+        with tempfile.TemporaryFile() as output:
+            with gzip.GzipFile(fileobj=output, mode='wb') as compressed:
+                for text in render_rows(counted(export_rows(dataset, queryset, columns, chunk_size)),
+                                        columns, file_format):
+                    compressed.write(text.encode('utf-8'))
+            output.seek(0)
+            job.file.save(f'{dataset.name}-{job.pk}.{file_format}.gz', File(output), save=False)
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        raise
+    
+    job.status = 'completed'
+    job.rows_count = rows_count
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'file', 'rows_count', 'finished_at'])
+    return job
@@ -0,0 +1,51 @@
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def run_export_job(job_id):
+    """
+    Executar a exportação em segundo plano, gravando o arquivo compactado
+    """
+    try:
+        from exports.models import ExportJob
+        from exports.services import run_export
+        
+        job = ExportJob.objects.select_related('user').get(pk=job_id)
+        run_export(job)
+        
+        logger.info(f"Export {job_id} completed with {job.rows_count} rows")
+        return f"{job.rows_count} rows exported"
+    
+    except Exception as e:
+        logger.error(f"Error running export {job_id}: {e}")
+        raise
+
+
+@shared_task
+def purge_export_jobs():
+    """
+    Remover as exportações (e seus arquivos) concluídas há mais de EXPORT_RETENTION_DAYS
+    """
+    try:
+        from datetime import timedelta
+        from django.conf import settings
+        from django.utils import timezone
+        from exports.models import ExportJob
+        
+        cutoff = timezone.now() - timedelta(days=settings.EXPORT_RETENTION_DAYS)
+        purged = 0
+        for job in ExportJob.objects.filter(finished_at__lt=cutoff).iterator():
+            if job.file:
+                job.file.delete(save=False)
+            job.delete()
+            purged += 1
+        
+        logger.info(f"Purged {purged} export jobs")
+        return f"{purged} export jobs purged"
+    
+    except Exception as e:
+        logger.error(f"Error purging export jobs: {e}")
+        raise
@@ -0,0 +1,201 @@
+import csv
+import gzip
+import io
+import json
+import shutil
+import tempfile
+from unittest import mock
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from rest_framework import status
+from decimal import Decimal
+from .models import ExportJob
+from .services import run_export
+from deliveries.models import Delivery, DeliveryStatusHistory
+from orders.models import Order, OrderItem
+from products.models import Department, Product, Stock
+
+User = get_user_model()
+
+
+class ExportTest(APITestCase):
+    """Testes das exportações em streaming e em segundo plano"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email='admin@example.com',
+            password='testpass123',
+            full_name='Admin User',
+            cpf_cnpj='11111111111',
+            user_type='admin'
+        )
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass123',
+            full_name='Customer User',
+            cpf_cnpj='22222222222',
+            user_type='customer'
+        )
+        self.other_customer = User.objects.create_user(
+            email='other@example.com',
+            password='testpass123',
+            full_name='Other Customer',
+            cpf_cnpj='33333333333',
+            user_type='customer'
+        )
+        self.client.force_authenticate(user=self.admin)
+        
+        department = Department.objects.create(name='Frutas', slug='frutas')
+        self.apple = Product.objects.create(
+            name='Maçã', description='Descrição', slug='maca', department=department, price=Decimal('10.00')
+        )
+        self.pear = Product.objects.create(
+            name='Pera', description='Descrição', slug='pera', department=department, price=Decimal('8.00')
+        )
+        self.orders = [self.create_order(self.customer) for _ in range(3)]
+        self.orders.append(self.create_order(self.other_customer))
+        
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+    
+    def create_order(self, customer):
+        order = Order.objects.create(
+            customer=customer,
+            payment_method='pix',
+            subtotal=Decimal('26.00'),
+            total_amount=Decimal('26.00'),
+            items_count=2,
+            total_quantity=3,
+            shipping_address='Rua A, 1',
+            shipping_city='São Paulo',
+            shipping_state='SP',
+            shipping_postal_code='01000-000'
+        )
+        OrderItem.objects.create(order=order, product=self.apple, quantity=1, unit_price=self.apple.price)
+        OrderItem.objects.create(order=order, product=self.pear, quantity=2, unit_price=self.pear.price)
+        return order
+    
+    def stream(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content).decode('utf-8')
+    
+    def test_orders_csv_with_columns_and_filters(self):
+        """Teste do CSV com seleção de colunas e os filtros da listagem de pedidos"""
+        content = self.stream('/api/exports/orders/', {
+            'columns': 'order_number,customer_name,total_amount,items',
+            'search': 'Other',
+        })
+        rows = list(csv.reader(io.StringIO(content)))
+        
+        self.assertEqual(rows[0], ['order_number', 'customer_name', 'total_amount', 'items'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][:3], [str(self.orders[3].order_number), 'Other Customer', '26.00'])
+        items = json.loads(rows[1][3])
+        self.assertEqual([item['product_name'] for item in items], ['Maçã', 'Pera'])
+        self.assertEqual(items[1]['total_price'], '16.00')
+    
+    def test_orders_jsonl_follows_list_ordering(self):
+        """Teste do JSONL com itens, na ordenação pedida"""
+        content = self.stream('/api/exports/orders/', {
+            'file_format': 'jsonl', 'columns': 'order_number,items', 'ordering': 'created_at'
+        })
+        rows = [json.loads(line) for line in content.splitlines()]
+        
+        self.assertEqual([row['order_number'] for row in rows], [str(order.order_number) for order in self.orders])
+        self.assertEqual(len(rows[0]['items']), 2)
+        self.assertEqual(set(rows[0]), {'order_number', 'items'})
+    
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_queries_per_chunk(self):
+        """Teste de uma consulta de linhas e uma consulta de itens por lote"""
+        response = self.client.get('/api/exports/orders/', {'columns': 'order_number,items'})
+        with CaptureQueriesContext(connection) as context:
+            content = b''.join(response.streaming_content)
+        
+        # 4 pedidos em lotes de 2: pedidos + itens de cada lote
+        self.assertEqual(len(context.captured_queries), 3)
+        self.assertEqual(len(content.splitlines()), 5)
+    
+    def test_deliveries_and_stock_movements(self):
+        """Teste das exportações de entregas (com histórico) e de movimentações de estoque"""
+        delivery = Delivery.objects.create(
+            order=self.orders[0],
+            delivery_address='Rua A, 1',
+            delivery_city='São Paulo',
+            delivery_state='SP',
+            delivery_postal_code='01000-000',
+            customer_name='Customer User',
+            customer_phone='+5511999999999'
+        )
+        DeliveryStatusHistory.objects.create(delivery=delivery, status='in_transit', changed_by=self.admin)
+        content = self.stream('/api/exports/deliveries/', {'file_format': 'jsonl'})
+        row = json.loads(content)
+        self.assertEqual(row['order_number'], str(self.orders[0].order_number))
+        self.assertEqual([entry['status'] for entry in row['status_history']], ['in_transit'])
+        
+        Stock.objects.create(product=self.apple, quantity=10, movement_type='in', reason='Compra')
+        Stock.objects.create(product=self.pear, quantity=5, movement_type='in', reason='Compra')
+        content = self.stream('/api/exports/stock_movements/', {
+            'product': self.pear.pk, 'columns': 'product_name,movement_type,quantity'
+        })
+        self.assertEqual(content.splitlines(), ['product_name,movement_type,quantity', 'Pera,in,5'])
+    
+    def test_invalid_options_and_permissions(self):
+        """Teste de opções inválidas e acesso apenas de administradores"""
+        response = self.client.get('/api/exports/orders/', {'columns': 'order_number,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/exports/orders/', {'file_format': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/exports/users/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get('/api/exports/orders/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.post('/api/exports/orders/jobs/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_export_job(self):
+        """Teste da exportação em segundo plano gravada em gzip e do download"""
+        with mock.patch('exports.tasks.run_export_job.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/exports/orders/jobs/?columns=order_number,items&search=Customer')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = ExportJob.objects.get(pk=response.data['id'])
+        delay.assert_called_once_with(str(job.pk))
+        self.assertEqual(job.params, {'search': ['Customer']})
+        
+        response = self.client.get(f'/api/exports/jobs/{job.pk}/download/')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        
+        with override_settings(MEDIA_ROOT=self.media_root):
+            run_export(job, chunk_size=2)
+            job.refresh_from_db()
+            self.assertEqual(job.status, 'completed')
+            self.assertEqual(job.rows_count, 4)
+            
+            response = self.client.get(f'/api/exports/jobs/{job.pk}/')
+            self.assertEqual(response.data['status'], 'completed')
+            self.assertTrue(response.data['download_url'].endswith(f'/api/exports/jobs/{job.pk}/download/'))
+            
+            response = self.client.get(f'/api/exports/jobs/{job.pk}/download/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            content = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+            response.close()
+        
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0], ['order_number', 'items'])
+        self.assertEqual(len(rows), 5)
+    
+    def test_failed_export_job(self):
+        """Teste da exportação que falha"""
+        job = ExportJob.objects.create(user=self.admin, dataset='orders', file_format='csv', columns=['secret'])
+        with self.assertRaises(Exception):
+            run_export(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('secret', job.error)
@@ -0,0 +1,11 @@
+from django.urls import path
+from . import views
+
+app_name = 'exports'
+
+urlpatterns = [
+    path('jobs/<uuid:job_id>/', views.export_job_detail, name='export_job_detail'),
+    path('jobs/<uuid:job_id>/download/', views.download_export_job, name='download_export_job'),
+    path('<str:dataset>/', views.export_dataset, name='export_dataset'),
+    path('<str:dataset>/jobs/', views.create_export_job, name='create_export_job'),
+]
@@ -0,0 +1,90 @@
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from django.db import transaction
+from django.http import FileResponse
+from django.shortcuts import get_object_or_404
+
+from users.permissions import IsAdminUser
+from .models import ExportJob
+from .serializers import ExportJobSerializer
+from .services import ExportError, export_response, filter_params, resolve_options
+
+
+def _options(request, dataset):
+    return resolve_options(
+        dataset, request.query_params.get('file_format'), request.query_params.get('columns')
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_dataset(request, dataset):
+    """
+    Exportar pedidos, entregas ou movimentações de estoque em CSV ou JSONL, em
+    streaming, com os mesmos filtros da listagem (apenas admin)
+    """
+    try:
+        dataset, file_format, columns = _options(request, dataset)
+    except ExportError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return export_response(dataset, dataset.queryset(request), columns, file_format)
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def create_export_job(request, dataset):
+    """
+    Agendar a exportação em segundo plano, gravada em arquivo compactado (apenas admin)
+    """
+    try:
+        dataset, file_format, columns = _options(request, dataset)
+    except ExportError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    from .tasks import run_export_job
+    with transaction.atomic():
+        job = ExportJob.objects.create(
+            user=request.user,
+            dataset=dataset.name,
+            file_format=file_format,
+            columns=columns,
+            params=filter_params(request.query_params)
+        )
+        transaction.on_commit(lambda: run_export_job.delay(str(job.pk)))
+    
+    serializer = ExportJobSerializer(job, context={'request': request})
+    return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_job_detail(request, job_id):
+    """
+    Situação da exportação em segundo plano
+    """
+    job = get_object_or_404(ExportJob, pk=job_id, user=request.user)
+    serializer = ExportJobSerializer(job, context={'request': request})
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def download_export_job(request, job_id):
+    """
+    Baixar o arquivo da exportação concluída
+    """
+    job = get_object_or_404(ExportJob, pk=job_id, user=request.user)
+    if job.status != 'completed' or not job.file:
+        return Response(
+            {'error': 'A exportação ainda não está disponível.'},
+            status=status.HTTP_409_CONFLICT
+        )
+    
+    return FileResponse(
+        job.file.open('rb'),
+        as_attachment=True,
+        filename=f'{job.dataset}.{job.file_format}.gz',
+        content_type='application/gzip'
+    )
@@ -1,3 +1,108 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
-# Register your models here.
+from ecommerce_saas.pagination import EstimatedCountPaginator
+from .models import ArchivedOrder, Order, OrderItem
+from .state_machine import transition_orders
+
+
+class OrderItemInline(admin.TabularInline):
+    """
+    Itens do pedido (somente leitura): alterá-los deixaria desatualizados os
+    totais e resumos do pedido (items_count, total_quantity, total_amount).
+    """
+    model = OrderItem
+    extra = 0
+    can_delete = False
+    raw_id_fields = ('product',)
+    readonly_fields = ('total_price',)
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    """
+    Configuração do admin para o modelo Order.
+    
+    A listagem é ordenada por (created_at, id), coberta por índice composto,
+    e evita contagens completas da tabela a cada página. Status, pagamento e
+    valores são somente leitura: as mudanças de status passam pelas ações,
+    que usam a máquina de estados (histórico, eventos e estoque).
+    """
+    list_display = ('order_number', 'customer', 'status', 'payment_status', 'total_amount', 'items_count', 'created_at')
+    list_select_related = ('customer',)
+    list_filter = ('status', 'payment_status', 'payment_method')
+    search_fields = ('=order_number', 'customer__email')
+    ordering = ('-created_at', '-id')
+    raw_id_fields = ('customer',)
+    readonly_fields = (
+        'order_number', 'status', 'payment_status', 'subtotal', 'shipping_cost', 'discount', 'total_amount',
+        'items_count', 'total_quantity', 'created_at', 'updated_at'
+    )
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    inlines = [OrderItemInline]
+    
+    actions = [
+        'mark_confirmed', 'mark_processing', 'mark_shipped', 'mark_delivered', 'mark_cancelled', 'mark_returned'
+    ]
+    
+    def _transition(self, request, queryset, target):
+        changed, errors = transition_orders(
+            queryset.values_list('pk', flat=True), target, changed_by=request.user, notes='Alterado pelo admin'
+        )
+        if changed:
+            self.message_user(request, f"{len(changed)} pedido(s) atualizado(s).")
+        for message in errors.values():
+            self.message_user(request, message, level=messages.WARNING)
+    
+    def mark_confirmed(self, request, queryset):
+        self._transition(request, queryset, 'confirmed')
+    mark_confirmed.short_description = 'Marcar como confirmados'
+    
+    def mark_processing(self, request, queryset):
+        self._transition(request, queryset, 'processing')
+    mark_processing.short_description = 'Marcar como em processamento'
+    
+    def mark_shipped(self, request, queryset):
+        self._transition(request, queryset, 'shipped')
+    mark_shipped.short_description = 'Marcar como enviados'
+    
+    def mark_delivered(self, request, queryset):
+        self._transition(request, queryset, 'delivered')
+    mark_delivered.short_description = 'Marcar como entregues'
+    
+    def mark_cancelled(self, request, queryset):
+        self._transition(request, queryset, 'cancelled')
+    mark_cancelled.short_description = 'Cancelar pedidos selecionados'
+    
+    def mark_returned(self, request, queryset):
+        self._transition(request, queryset, 'returned')
+    mark_returned.short_description = 'Marcar como devolvidos'
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """
+    Configuração do admin para pedidos arquivados (somente leitura).
+    """
+    list_display = ('order_number', 'customer', 'status', 'total_amount', 'created_at', 'archived_at')
+    list_select_related = ('customer',)
+    list_filter = ('status',)
+    search_fields = ('=order_number', 'customer__email')
+    ordering = ('-created_at', '-id')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
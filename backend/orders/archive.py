@@ -0,0 +1,238 @@
+"""
+Arquivamento dos pedidos encerrados (armazenamento quente/frio).
+
+archive_orders move, em lotes, os pedidos encerrados (entregues, cancelados ou
+devolvidos) criados antes do corte (ORDER_ARCHIVE_AFTER_MONTHS meses, contados
+a partir do início do mês) para ArchivedOrder: pedido, itens, histórico e
+entrega (com histórico e avaliação), pagamentos (com reembolsos e parcelas) e
+usos de cupom viram um documento e as linhas são removidas das tabelas
+quentes. Assim as consultas dos clientes, os índices e o
+autovacuum dessas tabelas trabalham apenas com os pedidos recentes.
+
+No PostgreSQL, ArchivedOrder é particionada por mês de created_at e as
+partições de cada mês são criadas antes do lote; meses antigos podem ser
+desanexados ou removidos sem tocar no restante. No SQLite é uma tabela comum.
+
+Pedidos com pagamento ou reembolso em andamento permanecem nas tabelas quentes
+até serem concluídos. Os usos de cupom também são copiados para
+ArchivedCouponUsage, que Coupon.can_be_used_by_customer consulta para manter
+os limites de uso por cliente.
+Os pedidos arquivados continuam visíveis para os clientes (detalhe e
+rastreamento) e nos consolidados de vendas (orders.rollups).
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from coupons.models import CouponUsage
+from deliveries.models import Delivery, DeliveryFeedback, DeliveryStatusHistory
+from payments.models import Payment, PaymentInstallment, PaymentRefund
+from .models import ArchivedCouponUsage, ArchivedOrder, Order, OrderItem, OrderStatusHistory
+
+CLOSED_STATUSES = ('delivered', 'cancelled', 'returned')
+# Pagamentos e reembolsos ainda em andamento impedem o arquivamento
+OPEN_PAYMENT_STATUSES = ('pending', 'processing')
+OPEN_REFUND_STATUSES = ('pending', 'processing')
+BATCH_SIZE = 500
+
+ITEM_FIELDS = (
+    'order_id', 'id', 'product_id', 'product_name', 'product_description', 'quantity', 'unit_price', 'total_price'
+)
+STATUS_HISTORY_FIELDS = ('order_id', 'id', 'status', 'notes', 'changed_by_id', 'created_at')
+DELIVERY_HISTORY_FIELDS = (
+    'delivery_id', 'id', 'status', 'notes', 'location', 'latitude', 'longitude', 'changed_by_id', 'created_at'
+)
+REFUND_FIELDS = (
+    'payment_id', 'id', 'refund_id', 'requested_by_id', 'refund_type', 'amount', 'reason', 'status',
+    'gateway_refund_id', 'created_at', 'processed_at'
+)
+INSTALLMENT_FIELDS = ('payment_id', 'id', 'installment_number', 'amount', 'due_date', 'status', 'paid_at')
+COUPON_USAGE_FIELDS = ('order_id', 'id', 'coupon_id', 'customer_id', 'discount_amount', 'used_at')
+
+
+def add_months(month_start, months):
+    """Início do mês months meses depois (ou antes) de month_start"""
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return timezone.make_aware(datetime(index // 12, index % 12 + 1, 1))
+
+
+def month_start(value):
+    """Início do mês (horário local) de value"""
+    local = timezone.localtime(value)
+    return timezone.make_aware(datetime(local.year, local.month, 1))
+
+
+def archive_cutoff(months=None, now=None):
+    """Pedidos criados antes do início do mês de now - months são arquivados"""
+    months = settings.ORDER_ARCHIVE_AFTER_MONTHS if months is None else months
+    return add_months(month_start(now or timezone.now()), -months)
+
+
+def ensure_partitions(months):
+    """Cria (PostgreSQL) as partições mensais de ArchivedOrder dos meses informados"""
+    if connection.vendor != 'postgresql':
+        return
+    table = ArchivedOrder._meta.db_table
+    with connection.cursor() as cursor:
+        for start in sorted(set(months)):
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {table}_y{start:%Y}m{start:%m} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{add_months(start, 1).isoformat()}')"
+            )
+
+
+def archivable(before):
+    """Pedidos encerrados criados antes de before que podem ser arquivados"""
+    open_payments = Payment.objects.filter(order=OuterRef('pk')).filter(
+        Q(status__in=OPEN_PAYMENT_STATUSES) | Q(refunds__status__in=OPEN_REFUND_STATUSES)
+    )
+    return Order.objects.filter(
+        created_at__lt=before,
+        status__in=CLOSED_STATUSES
+    ).exclude(Exists(open_payments))
+
+
+def _group(rows, key):
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row.pop(key)].append(row)
+    return grouped
+
+
+def build_documents(order_ids):
+    """{order_id: documento} com pedido, itens, histórico, entrega, pagamentos e cupons"""
+    items = _group(
+        OrderItem.objects.filter(order_id__in=order_ids).order_by('id').values(
+            *ITEM_FIELDS, department_id=F('product__department_id')
+        ),
+        'order_id'
+    )
+    status_history = _group(
+        OrderStatusHistory.objects.filter(order_id__in=order_ids).order_by('created_at', 'id').values(
+            *STATUS_HISTORY_FIELDS
+        ),
+        'order_id'
+    )
+    deliveries = {row['order_id']: row for row in Delivery.objects.filter(order_id__in=order_ids).values()}
+    delivery_ids = [delivery['id'] for delivery in deliveries.values()]
+    delivery_history = _group(
+        DeliveryStatusHistory.objects.filter(delivery_id__in=delivery_ids).order_by('created_at', 'id').values(
+            *DELIVERY_HISTORY_FIELDS
+        ),
+        'delivery_id'
+    )
+    feedback = {row.pop('delivery_id'): row for row in DeliveryFeedback.objects.filter(
+        delivery_id__in=delivery_ids
+    ).values()}
+    payments = _group(
+        Payment.objects.filter(order_id__in=order_ids).order_by('created_at', 'id').values(
+            *[field.attname for field in Payment._meta.concrete_fields],
+            method_type=F('payment_method__method_type'), method_name=F('payment_method__name')
+        ),
+        'order_id'
+    )
+    payment_ids = [payment['id'] for rows in payments.values() for payment in rows]
+    refunds = _group(
+        PaymentRefund.objects.filter(payment_id__in=payment_ids).order_by('created_at', 'id').values(
+            *REFUND_FIELDS
+        ),
+        'payment_id'
+    )
+    installments = _group(
+        PaymentInstallment.objects.filter(payment_id__in=payment_ids).order_by('installment_number', 'id').values(
+            *INSTALLMENT_FIELDS
+        ),
+        'payment_id'
+    )
+    coupon_usages = _group(
+        CouponUsage.objects.filter(order_id__in=order_ids).order_by('used_at', 'id').values(
+            *COUPON_USAGE_FIELDS, coupon_code=F('coupon__code')
+        ),
+        'order_id'
+    )
+    
+    documents = {}
+    for order in Order.objects.filter(pk__in=order_ids).values():
+        delivery = deliveries.get(order['id'])
+        if delivery is not None:
+            delivery['status_history'] = delivery_history.get(delivery['id'], [])
+            delivery['feedback'] = feedback.get(delivery['id'])
+        order_payments = payments.get(order['id'], [])
+        for payment in order_payments:
+            payment['refunds'] = refunds.get(payment['id'], [])
+            payment['installments'] = installments.get(payment['id'], [])
+        documents[order['id']] = dict(
+            order,
+            items=items.get(order['id'], []),
+            status_history=status_history.get(order['id'], []),
+            delivery=delivery,
+            payments=order_payments,
+            coupon_usages=coupon_usages.get(order['id'], [])
+        )
+    return documents
+
+
+def _archive_batch(order_ids, before, now):
+    with transaction.atomic():
+        # Pedidos alterados depois da seleção deixam de ser arquivados
+        locked = list(
+            archivable(before).select_for_update(of=('self',)).filter(pk__in=order_ids).values_list('pk', flat=True)
+        )
+        documents = build_documents(locked)
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(
+                id=order_id,
+                order_number=document['order_number'],
+                customer_id=document['customer_id'],
+                status=document['status'],
+                payment_status=document['payment_status'],
+                payment_method=document['payment_method'],
+                shipping_state=document['shipping_state'],
+                shipping_city=document['shipping_city'],
+                subtotal=document['subtotal'],
+                shipping_cost=document['shipping_cost'],
+                discount=document['discount'],
+                total_amount=document['total_amount'],
+                items_count=document['items_count'],
+                total_quantity=document['total_quantity'],
+                tracking_code=document['delivery']['tracking_code'] if document['delivery'] else None,
+                document=document,
+                created_at=document['created_at'],
+                updated_at=document['updated_at'],
+                archived_at=now
+            )
+            for order_id, document in documents.items()
+        ])
+        ArchivedCouponUsage.objects.bulk_create([
+            ArchivedCouponUsage(order_id=order_id, **usage)
+            for order_id, document in documents.items()
+            for usage in document['coupon_usages']
+        ])
+        # Itens, históricos, entrega, reservas, pagamentos e usos de cupom são
+        # removidos em cascata
+        Order.objects.filter(pk__in=locked).delete()
+    return len(locked)
+
+
+def archive_orders(before=None, batch_size=BATCH_SIZE, max_batches=None, now=None):
+    """
+    Arquiva os pedidos encerrados criados antes de before (padrão:
+    archive_cutoff()), em ordem de criação. Retorna a quantidade arquivada.
+    """
+    now = now or timezone.now()
+    before = before or archive_cutoff(now=now)
+    archived = batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = list(archivable(before).order_by('created_at', 'id').values_list('pk', 'created_at')[:batch_size])
+        if not rows:
+            break
+        ensure_partitions(month_start(created_at) for _, created_at in rows)
+        archived += _archive_batch([order_id for order_id, _ in rows], before, now)
+        batches += 1
+        if len(rows) < batch_size:
+            break
+    return archived
@@ -0,0 +1,242 @@
+"""
+Armazenamento dos carrinhos de compras.
+
+O backend é escolhido por CART_STORE_BACKEND:
+
+- 'database': lê e grava diretamente em Cart/CartItem;
+- 'redis': cada carrinho é um hash (produto -> quantidade) no Redis, com
+  alterações O(1) por item e o resumo com preços em cache. Os carrinhos
+  alterados entram no conjunto de pendentes e são gravados em Cart/CartItem
+  em segundo plano (tarefa flush_carts) e sempre no checkout.
+
+Com CART_REDIS_URL = 'fakeredis://' o backend Redis usa o fakeredis (testes).
+"""
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from products.models import Product
+from .models import Cart, CartItem
+
+CART_KEY = 'cart:{user_id}'
+SUMMARY_KEY = 'cart:{user_id}:summary'
+DIRTY_KEY = 'cart:dirty'
+
+_redis_clients = {}
+
+
+def price_items(items):
+    """
+    Resumo do carrinho com preços e disponibilidade atuais, a partir de
+    {product_id: quantidade}, com uma única consulta.
+    """
+    products = Product.objects.filter(pk__in=list(items)).select_related('stock_balance').in_bulk()
+    entries = []
+    subtotal = Decimal('0.00')
+    for product_id, quantity in items.items():
+        product = products.get(product_id)
+        if product is None:
+            continue
+        unit_price = product.current_price
+        subtotal += unit_price * quantity
+        entries.append({
+            'product_id': product_id,
+            'product_name': product.name,
+            'quantity': quantity,
+            'unit_price': str(unit_price),
+            'subtotal': str(unit_price * quantity),
+            'is_available': product.is_active and product.available_quantity >= quantity,
+        })
+    return {
+        'items': entries,
+        'total_items': sum(entry['quantity'] for entry in entries),
+        'subtotal': str(subtotal),
+    }
+
+
+def persist_carts(carts):
+    """
+    Grava os carrinhos ({user_id: {product_id: quantidade}}) em Cart/CartItem
+    com um número constante de consultas: itens ausentes são removidos e os
+    demais inseridos ou atualizados.
+    """
+    if not carts:
+        return
+    product_ids = {product_id for items in carts.values() for product_id in items}
+    existing = set(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
+    
+    with transaction.atomic():
+        Cart.objects.bulk_create([Cart(customer_id=user_id) for user_id in carts], ignore_conflicts=True)
+        cart_ids = dict(Cart.objects.filter(customer_id__in=carts).values_list('customer_id', 'pk'))
+        
+        removed = Q()
+        for user_id, items in carts.items():
+            removed |= Q(cart_id=cart_ids[user_id]) & ~Q(product_id__in=list(items))
+        CartItem.objects.filter(removed).delete()
+        
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart_id=cart_ids[user_id], product_id=product_id, quantity=quantity)
+                for user_id, items in carts.items()
+                for product_id, quantity in items.items() if product_id in existing
+            ],
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity']
+        )
+        Cart.objects.filter(pk__in=cart_ids.values()).update(updated_at=timezone.now())
+
+
+class DatabaseCartStore:
+    """Carrinhos lidos e gravados diretamente no banco"""
+    
+    def _items(self, user_id):
+        return CartItem.objects.filter(cart__customer_id=user_id)
+    
+    def items(self, user_id):
+        return dict(self._items(user_id).order_by('added_at', 'pk').values_list('product_id', 'quantity'))
+    
+    def quantity(self, user_id, product_id):
+        return self._items(user_id).filter(product_id=product_id).values_list('quantity', flat=True).first()
+    
+    def add(self, user_id, product_id, quantity):
+        cart, _ = Cart.objects.get_or_create(customer_id=user_id)
+        if not CartItem.objects.filter(cart=cart, product_id=product_id).update(quantity=F('quantity') + quantity):
+            CartItem.objects.create(cart=cart, product_id=product_id, quantity=quantity)
+    
+    def set(self, user_id, product_id, quantity):
+        return bool(self._items(user_id).filter(product_id=product_id).update(quantity=quantity))
+    
+    def remove(self, user_id, product_id):
+        deleted, _ = self._items(user_id).filter(product_id=product_id).delete()
+        return bool(deleted)
+    
+    def clear(self, user_id):
+        self._items(user_id).delete()
+    
+    def summary(self, user_id):
+        return price_items(self.items(user_id))
+    
+    def flush(self, user_ids=None, batch_size=500):
+        """Nada a gravar: o banco já é o armazenamento"""
+        return 0
+
+
+class RedisCartStore:
+    """Carrinhos em hashes do Redis, gravados no banco em segundo plano"""
+    
+    def __init__(self, client):
+        self.client = client
+    
+    def _touch(self, pipe, user_id):
+        # Executado na mesma transação da alteração do item
+        pipe.expire(CART_KEY.format(user_id=user_id), timedelta(days=settings.CART_TTL_DAYS))
+        pipe.delete(SUMMARY_KEY.format(user_id=user_id))
+        pipe.sadd(DIRTY_KEY, user_id)
+    
+    def items(self, user_id):
+        return {
+            int(product_id): int(quantity)
+            for product_id, quantity in self.client.hgetall(CART_KEY.format(user_id=user_id)).items()
+        }
+    
+    def quantity(self, user_id, product_id):
+        quantity = self.client.hget(CART_KEY.format(user_id=user_id), product_id)
+        return int(quantity) if quantity is not None else None
+    
+    def add(self, user_id, product_id, quantity):
+        with self.client.pipeline() as pipe:
+            pipe.hincrby(CART_KEY.format(user_id=user_id), product_id, quantity)
+            self._touch(pipe, user_id)
+            pipe.execute()
+    
+    def set(self, user_id, product_id, quantity):
+        key = CART_KEY.format(user_id=user_id)
+        if not self.client.hexists(key, product_id):
+            return False
+        with self.client.pipeline() as pipe:
+            pipe.hset(key, product_id, quantity)
+            self._touch(pipe, user_id)
+            pipe.execute()
+        return True
+    
+    def remove(self, user_id, product_id):
+        with self.client.pipeline() as pipe:
+            pipe.hdel(CART_KEY.format(user_id=user_id), product_id)
+            self._touch(pipe, user_id)
+            removed = pipe.execute()[0]
+        return bool(removed)
+    
+    def clear(self, user_id):
+        with self.client.pipeline() as pipe:
+            pipe.delete(CART_KEY.format(user_id=user_id))
+            self._touch(pipe, user_id)
+            pipe.execute()
+    
+    def summary(self, user_id):
+        key = SUMMARY_KEY.format(user_id=user_id)
+        cached = self.client.get(key)
+        if cached is not None:
+            return json.loads(cached)
+        data = price_items(self.items(user_id))
+        self.client.set(key, json.dumps(data), ex=settings.CART_SUMMARY_TIMEOUT)
+        return data
+    
+    def _pop_dirty(self, user_ids, batch_size):
+        if user_ids is not None:
+            self.client.srem(DIRTY_KEY, *user_ids)
+            return list(user_ids)
+        return [int(user_id) for user_id in self.client.spop(DIRTY_KEY, batch_size) or []]
+    
+    def flush(self, user_ids=None, batch_size=500):
+        """
+        Grava no banco os carrinhos pendentes (ou os dos usuários informados),
+        em lotes. Retorna a quantidade de carrinhos gravados.
+        """
+        flushed = 0
+        while True:
+            batch = self._pop_dirty(user_ids, batch_size)
+            if not batch:
+                return flushed
+            # Retirados do conjunto antes da leitura: alterações concorrentes voltam a marcá-los
+            try:
+                with self.client.pipeline(transaction=False) as pipe:
+                    for user_id in batch:
+                        pipe.hgetall(CART_KEY.format(user_id=user_id))
+                    contents = pipe.execute()
+                persist_carts({
+                    int(user_id): {int(product_id): int(quantity) for product_id, quantity in items.items()}
+                    for user_id, items in zip(batch, contents)
+                })
+            except Exception:
+                # Falha na gravação: o lote volta a ficar pendente para a próxima execução
+                self.client.sadd(DIRTY_KEY, *batch)
+                raise
+            flushed += len(batch)
+            if user_ids is not None:
+                return flushed
+
+
+def get_redis_client(url=None):
+    """Cliente Redis do armazenamento de carrinhos (um por URL)"""
+    url = url or settings.CART_REDIS_URL
+    if url not in _redis_clients:
+        if url.startswith('fakeredis://'):
+            import fakeredis
+            _redis_clients[url] = fakeredis.FakeRedis(decode_responses=True)
+        else:
+            import redis
+            _redis_clients[url] = redis.Redis.from_url(url, decode_responses=True)
+    return _redis_clients[url]
+
+
+def get_cart_store():
+    """Retorna o backend de carrinho configurado em CART_STORE_BACKEND"""
+    if settings.CART_STORE_BACKEND == 'redis':
+        return RedisCartStore(get_redis_client())
+    return DatabaseCartStore()
@@ -1,26 +1,24 @@
 from rest_framework import generics, status
-from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.shortcuts import get_object_or_404
 from django.db import transaction
-from decimal import Decimal
 
-from .models import Cart, CartItem, Order, OrderItem
-from products.models import Product
-from .serializers import CartSerializer, CartItemSerializer
+from .models import Order
+from products.services import check_availability
+from .cart_store import get_cart_store
+from .idempotency import idempotent
+from .serializers import CartItemSerializer, OrderDetailSerializer
+from .services import CheckoutError, place_order
 
 
 class CartView(generics.RetrieveAPIView):
     """
     Visualizar carrinho do usuário
     """
-    serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
     
-    def get_object(self):
-        cart, created = Cart.objects.get_or_create(user=self.request.user)
-        return cart
+    def get(self, request, *args, **kwargs):
+        return Response(get_cart_store().summary(request.user.pk))
 
 
 class AddToCartView(generics.CreateAPIView):
@@ -30,59 +28,39 @@ class AddToCartView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request, *args, **kwargs):
-        product_id = request.data.get('product_id')
-        quantity = int(request.data.get('quantity', 1))
+        serializer = CartItemSerializer(data={
+            'product_id': request.data.get('product_id'),
+            'quantity': request.data.get('quantity', 1)
+        })
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        if not product_id:
-            return Response(
-                {'error': 'product_id é obrigatório'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        product_id = serializer.validated_data['product_id']
+        quantity = serializer.validated_data['quantity']
+        store = get_cart_store()
+        current_quantity = store.quantity(request.user.pk, product_id)
+        new_quantity = quantity + (current_quantity or 0)
         
-        try:
-            product = Product.objects.get(id=product_id, is_active=True)
-        except Product.DoesNotExist:
+        # Verificar produto e estoque para a quantidade final do item
+        availability = check_availability([(product_id, new_quantity)])[product_id]
+        if not availability.is_active:
             return Response(
                 {'error': 'Produto não encontrado'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
-        
-        # Verificar estoque
-        if product.stock_quantity < quantity:
+        if not availability.is_available:
+            message = 'Estoque insuficiente para a quantidade solicitada' if current_quantity else 'Estoque insuficiente'
             return Response(
-                {'error': 'Estoque insuficiente'}, 
+                {'error': message}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Obter ou criar carrinho
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        
-        # Verificar se o item já existe no carrinho
-        cart_item, item_created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            defaults={
-                'quantity': quantity,
-                'unit_price': product.current_price
-            }
-        )
-        
-        if not item_created:
-            # Item já existe, atualizar quantidade
-            new_quantity = cart_item.quantity + quantity
-            if product.stock_quantity < new_quantity:
-                return Response(
-                    {'error': 'Estoque insuficiente para a quantidade solicitada'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            cart_item.quantity = new_quantity
-            cart_item.save()
+        store.add(request.user.pk, product_id, quantity)
         
         # Retornar carrinho atualizado
-        cart_serializer = CartSerializer(cart)
         return Response({
             'message': 'Item adicionado ao carrinho com sucesso',
-            'cart': cart_serializer.data
+            'cart': store.summary(request.user.pk)
         }, status=status.HTTP_201_CREATED)
 
 
@@ -93,31 +71,22 @@ class RemoveFromCartView(generics.DestroyAPIView):
     permission_classes = [IsAuthenticated]
     
     def delete(self, request, *args, **kwargs):
-        product_id = request.data.get('product_id')
-        
-        if not product_id:
-            return Response(
-                {'error': 'product_id é obrigatório'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        serializer = CartItemSerializer(data={'product_id': request.data.get('product_id'), 'quantity': 1})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        try:
-            cart = Cart.objects.get(user=request.user)
-            cart_item = CartItem.objects.get(cart=cart, product_id=product_id)
-            cart_item.delete()
-            
-            # Retornar carrinho atualizado
-            cart_serializer = CartSerializer(cart)
-            return Response({
-                'message': 'Item removido do carrinho com sucesso',
-                'cart': cart_serializer.data
-            }, status=status.HTTP_200_OK)
-            
-        except (Cart.DoesNotExist, CartItem.DoesNotExist):
+        store = get_cart_store()
+        if not store.remove(request.user.pk, serializer.validated_data['product_id']):
             return Response(
                 {'error': 'Item não encontrado no carrinho'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        # Retornar carrinho atualizado
+        return Response({
+            'message': 'Item removido do carrinho com sucesso',
+            'cart': store.summary(request.user.pk)
+        }, status=status.HTTP_200_OK)
 
 
 class UpdateCartView(generics.UpdateAPIView):
@@ -127,48 +96,36 @@ class UpdateCartView(generics.UpdateAPIView):
     permission_classes = [IsAuthenticated]
     
     def patch(self, request, *args, **kwargs):
-        product_id = request.data.get('product_id')
-        quantity = request.data.get('quantity')
+        serializer = CartItemSerializer(data={
+            'product_id': request.data.get('product_id'),
+            'quantity': request.data.get('quantity')
+        })
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        if not product_id or quantity is None:
+        product_id = serializer.validated_data['product_id']
+        quantity = serializer.validated_data['quantity']
+        store = get_cart_store()
+        if store.quantity(request.user.pk, product_id) is None:
             return Response(
-                {'error': 'product_id e quantity são obrigatórios'}, 
-                status=status.HTTP_400_BAD_REQUEST
+                {'error': 'Item não encontrado no carrinho'}, 
+                status=status.HTTP_404_NOT_FOUND
             )
         
-        quantity = int(quantity)
-        if quantity <= 0:
+        # Verificar estoque
+        if not check_availability([(product_id, quantity)])[product_id].is_available:
             return Response(
-                {'error': 'Quantidade deve ser maior que zero'}, 
+                {'error': 'Estoque insuficiente'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        try:
-            cart = Cart.objects.get(user=request.user)
-            cart_item = CartItem.objects.get(cart=cart, product_id=product_id)
-            
-            # Verificar estoque
-            if cart_item.product.stock_quantity < quantity:
-                return Response(
-                    {'error': 'Estoque insuficiente'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            cart_item.quantity = quantity
-            cart_item.save()
-            
-            # Retornar carrinho atualizado
-            cart_serializer = CartSerializer(cart)
-            return Response({
-                'message': 'Carrinho atualizado com sucesso',
-                'cart': cart_serializer.data
-            }, status=status.HTTP_200_OK)
-            
-        except (Cart.DoesNotExist, CartItem.DoesNotExist):
-            return Response(
-                {'error': 'Item não encontrado no carrinho'}, 
-                status=status.HTTP_404_NOT_FOUND
-            )
+        store.set(request.user.pk, product_id, quantity)
+        
+        # Retornar carrinho atualizado
+        return Response({
+            'message': 'Carrinho atualizado com sucesso',
+            'cart': store.summary(request.user.pk)
+        }, status=status.HTTP_200_OK)
 
 
 class ClearCartView(generics.DestroyAPIView):
@@ -178,21 +135,12 @@ class ClearCartView(generics.DestroyAPIView):
     permission_classes = [IsAuthenticated]
     
     def delete(self, request, *args, **kwargs):
-        try:
-            cart = Cart.objects.get(user=request.user)
-            cart.items.all().delete()
-            
-            cart_serializer = CartSerializer(cart)
-            return Response({
-                'message': 'Carrinho limpo com sucesso',
-                'cart': cart_serializer.data
-            }, status=status.HTTP_200_OK)
-            
-        except Cart.DoesNotExist:
-            return Response(
-                {'message': 'Carrinho já está vazio'}, 
-                status=status.HTTP_200_OK
-            )
+        store = get_cart_store()
+        store.clear(request.user.pk)
+        return Response({
+            'message': 'Carrinho limpo com sucesso',
+            'cart': store.summary(request.user.pk)
+        }, status=status.HTTP_200_OK)
 
 
 class CheckoutView(generics.CreateAPIView):
@@ -201,72 +149,47 @@ class CheckoutView(generics.CreateAPIView):
     """
     permission_classes = [IsAuthenticated]
     
-    @transaction.atomic
+    @idempotent
     def post(self, request, *args, **kwargs):
-        try:
-            cart = Cart.objects.get(user=request.user)
-            
-            if not cart.items.exists():
+        store = get_cart_store()
+        items = list(store.items(request.user.pk).items())
+        if not items:
+            return Response(
+                {'error': 'Carrinho está vazio'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Dados do pedido (endereço do cadastro quando não informado)
+        user = request.user
+        order_data = {
+            'payment_method': request.data.get('payment_method', 'credit_card'),
+            'shipping_address': request.data.get('shipping_address', user.street_address),
+            'shipping_city': request.data.get('shipping_city', user.city),
+            'shipping_state': request.data.get('shipping_state', user.state),
+            'shipping_postal_code': request.data.get('shipping_postal_code', user.postal_code),
+            'notes': request.data.get('notes', ''),
+        }
+        
+        with transaction.atomic():
+            try:
+                order = place_order(user, items, **order_data)
+            except CheckoutError as e:
                 return Response(
-                    {'error': 'Carrinho está vazio'}, 
+                    {'error': e.errors[0], 'errors': e.errors}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Dados do pedido
-            payment_method = request.data.get('payment_method', 'credit_card')
-            shipping_address = request.data.get('shipping_address', request.user.get_full_address())
-            notes = request.data.get('notes', '')
+            # Limpar o carrinho (gravando-o no banco) só após o commit: se a
+            # transação for desfeita, o cliente mantém o carrinho
+            def clear_cart():
+                store.clear(user.pk)
+                store.flush([user.pk])
             
-            # Calcular total
-            total_amount = cart.total_amount
-            
-            # Criar pedido
-            order = Order.objects.create(
-                customer=request.user,
-                status='pending',
-                total_amount=total_amount,
-                payment_method=payment_method,
-                shipping_address=shipping_address,
-                notes=notes
-            )
-            
-            # Criar itens do pedido
-            for cart_item in cart.items.all():
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    quantity=cart_item.quantity,
-                    unit_price=cart_item.unit_price
-                )
-                
-                # Atualizar estoque (reduzir)
-                # Aqui seria criado um registro de saída no Stock
-                # Stock.objects.create(
-                #     product=cart_item.product,
-                #     quantity=-cart_item.quantity,
-                #     movement_type='out',
-                #     reason=f'Venda - Pedido {order.order_number}'
-                # )
-            
-            # Limpar carrinho
-            cart.items.all().delete()
-            
-            # Retornar dados do pedido
-            from .serializers import OrderDetailSerializer
-            order_serializer = OrderDetailSerializer(order)
-            
-            return Response({
-                'message': 'Pedido criado com sucesso',
-                'order': order_serializer.data
-            }, status=status.HTTP_201_CREATED)
-            
-        except Cart.DoesNotExist:
-            return Response(
-                {'error': 'Carrinho não encontrado'}, 
-                status=status.HTTP_404_NOT_FOUND
-            )
-        except Exception as e:
-            return Response(
-                {'error': f'Erro ao processar pedido: {str(e)}'}, 
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+            transaction.on_commit(clear_cart)
+        
+        # Retornar dados do pedido
+        order_serializer = OrderDetailSerializer(Order.objects.for_detail().get(pk=order.pk))
+        return Response({
+            'message': 'Pedido criado com sucesso',
+            'order': order_serializer.data
+        }, status=status.HTTP_201_CREATED)
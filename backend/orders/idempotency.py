@@ -0,0 +1,196 @@
+"""
+Suporte ao cabeçalho Idempotency-Key nas views que criam pedidos.
+
+A primeira requisição com uma chave registra a chave (IdempotencyKey) antes de
+executar a view e grava a resposta ao final, no banco e no cache. A view e a
+gravação da resposta rodam na mesma transação: ou o pedido e a resposta são
+gravados juntos, ou nenhum dos dois. Repetições com a mesma chave devolvem a
+resposta gravada (lida do cache sempre que possível) sem executar a view; uma
+repetição concorrente aguarda o resultado da requisição em andamento.
+Respostas 5xx e exceções desfazem a transação e liberam a chave para uma nova
+tentativa. Uma chave em andamento há mais de IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS
+(processo interrompido) é assumida pela próxima repetição.
+"""
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+CACHE_KEY = 'idempotency:{user_id}:{digest}'
+MAX_KEY_LENGTH = 255
+
+
+def _ttl():
+    return timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+
+
+def _cache_key(user_id, key):
+    # A chave vem do cliente: o digest evita caracteres inválidos no cache
+    return CACHE_KEY.format(user_id=user_id, digest=hashlib.sha256(key.encode()).hexdigest())
+
+
+def request_fingerprint(request):
+    """Hash do método, caminho e corpo da requisição"""
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method}:{request.path}:{payload}'.encode()).hexdigest()
+
+
+def _stored(entry):
+    return {
+        'request_hash': entry.request_hash,
+        'status_code': entry.status_code,
+        'body': entry.response_body,
+    }
+
+
+def _replay(stored):
+    return Response(stored['body'], status=stored['status_code'], headers={REPLAY_HEADER: 'true'})
+
+
+def _mismatch():
+    return Response(
+        {'error': 'Idempotency-Key já utilizada com outra requisição'},
+        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+    )
+
+
+def _claim(user, key, request_hash):
+    """
+    Registra a chave como em andamento. Retorna (IdempotencyKey, reivindicada);
+    uma chave vencida é descartada e registrada novamente, e uma chave em
+    andamento abandonada (mesma requisição) é assumida.
+    """
+    while True:
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                entry = IdempotencyKey.objects.create(
+                    user=user, key=key, request_hash=request_hash, claimed_at=now, expires_at=now + _ttl()
+                )
+            return entry, True
+        except IntegrityError:
+            pass
+        
+        entry = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if entry is None:
+            # A execução original falhou e liberou a chave nesse meio tempo
+            continue
+        if entry.expires_at <= now:
+            IdempotencyKey.objects.filter(pk=entry.pk, expires_at__lte=now).delete()
+            continue
+        stale = now - timedelta(seconds=settings.IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS)
+        if not entry.is_completed and entry.request_hash == request_hash and entry.claimed_at <= stale:
+            # Execução original interrompida sem liberar a chave: assume a chave
+            # (a execução antiga, se ainda terminar, não consegue gravar a resposta)
+            if _owned(entry).update(claimed_at=now):
+                entry.claimed_at = now
+                return entry, True
+            continue
+        return entry, False
+
+
+def _owned(entry):
+    """A chave enquanto ainda pertence a esta execução (em andamento, mesmo claimed_at)"""
+    return IdempotencyKey.objects.filter(pk=entry.pk, claimed_at=entry.claimed_at, status_code__isnull=True)
+
+
+def _wait(entry, cache_key):
+    """
+    Aguarda a resposta da requisição em andamento (até IDEMPOTENCY_WAIT_SECONDS).
+    Retorna None se ela não terminar a tempo ou falhar.
+    """
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.05
+    while time.monotonic() < deadline:
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+        stored = cache.get(cache_key)
+        if stored is not None:
+            return stored
+        entry = IdempotencyKey.objects.filter(pk=entry.pk).first()
+        if entry is None:
+            return None
+        if entry.is_completed:
+            return _stored(entry)
+    return None
+
+
+def idempotent(view_method):
+    """
+    Decorador para métodos POST de views DRF com suporte a Idempotency-Key
+    (opcional; sem o cabeçalho a view é executada normalmente).
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': f'{HEADER} deve ter no máximo {MAX_KEY_LENGTH} caracteres'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        request_hash = request_fingerprint(request)
+        cache_key = _cache_key(request.user.pk, key)
+        stored = cache.get(cache_key)
+        if stored is not None:
+            return _replay(stored) if stored['request_hash'] == request_hash else _mismatch()
+        
+        entry, created = _claim(request.user, key, request_hash)
+        if not created:
+            if entry.request_hash != request_hash:
+                return _mismatch()
+            stored = _stored(entry) if entry.is_completed else _wait(entry, cache_key)
+            if stored is None:
+                return Response(
+                    {'error': 'Requisição com esta Idempotency-Key ainda em processamento'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            cache.set(cache_key, stored, _ttl().total_seconds())
+            return _replay(stored)
+        
+        try:
+            with transaction.atomic():
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code >= 500:
+                    transaction.set_rollback(True)
+                else:
+                    # Guarda o corpo como o cliente o recebeu (decimais, datas e UUIDs já renderizados)
+                    body = json.loads(JSONRenderer().render(response.data))
+                    stored = _owned(entry).update(status_code=response.status_code, response_body=body)
+                    if not stored:
+                        # A chave foi assumida por outra execução: desfaz as gravações desta
+                        transaction.set_rollback(True)
+                        return Response(
+                            {'error': 'Requisição com esta Idempotency-Key processada por outra execução'},
+                            status=status.HTTP_409_CONFLICT
+                        )
+        except Exception:
+            _owned(entry).delete()
+            raise
+        if response.status_code >= 500:
+            _owned(entry).delete()
+            return response
+        
+        cache.set(cache_key, {
+            'request_hash': request_hash,
+            'status_code': response.status_code,
+            'body': body,
+        }, _ttl().total_seconds())
+        return response
+    
+    return wrapper
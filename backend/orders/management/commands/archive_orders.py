@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.archive import BATCH_SIZE, archivable, archive_cutoff, archive_orders
+
+
+class Command(BaseCommand):
+    """
+    Move os pedidos encerrados (entregues, cancelados ou devolvidos) mais
+    antigos que N meses para o armazenamento frio (ArchivedOrder).
+    """
+    help = 'Arquiva os pedidos encerrados antigos'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months',
+            type=int,
+            help='Meses completos mantidos nas tabelas quentes (padrão: ORDER_ARCHIVE_AFTER_MONTHS)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Pedidos arquivados por transação'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help='Interrompe após N lotes'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas informa quantos pedidos seriam arquivados'
+        )
+    
+    def handle(self, *args, **options):
+        if options['months'] is not None and options['months'] < 1:
+            raise CommandError('--months deve ser pelo menos 1.')
+        
+        before = archive_cutoff(options['months'])
+        if options['dry_run']:
+            count = archivable(before).count()
+            self.stdout.write(f'{count} pedidos criados antes de {before:%Y-%m-%d} seriam arquivados.')
+            return
+        
+        archived = archive_orders(before, batch_size=options['batch_size'], max_batches=options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{archived} pedidos criados antes de {before:%Y-%m-%d} arquivados.'
+        ))
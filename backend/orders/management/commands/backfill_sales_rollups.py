@@ -0,0 +1,33 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.rollups import backfill
+
+
+class Command(BaseCommand):
+    """
+    Reconstrói os consolidados de vendas (por hora e por dia) a partir dos
+    pedidos, para todo o histórico ou para um intervalo de dias.
+    """
+    help = 'Reconstrói os consolidados de vendas a partir dos pedidos'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start-date',
+            type=date.fromisoformat,
+            help='Primeiro dia reconstruído (AAAA-MM-DD)'
+        )
+        parser.add_argument(
+            '--end-date',
+            type=date.fromisoformat,
+            help='Último dia reconstruído (AAAA-MM-DD)'
+        )
+    
+    def handle(self, *args, **options):
+        start_date, end_date = options['start_date'], options['end_date']
+        if start_date and end_date and start_date > end_date:
+            raise CommandError('A data de início deve ser anterior à data de fim.')
+        
+        hours = backfill(start_date, end_date)
+        self.stdout.write(self.style.SUCCESS(f'Consolidados reconstruídos para {hours} horas com pedidos.'))
@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    """
+    Verifica (e opcionalmente corrige) o resumo dos itens gravado nos pedidos
+    (items_count e total_quantity) comparando-o com os itens do pedido.
+    """
+    help = 'Verifica o resumo dos itens gravado nos pedidos'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Corrige os resumos divergentes em vez de apenas relatá-los'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Quantidade de pedidos processados por lote'
+        )
+    
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        checked = 0
+        mismatches = 0
+        last_id = 0
+        
+        while True:
+            batch = list(
+                Order.objects.filter(pk__gt=last_id).order_by('pk').with_items_summary().values_list(
+                    'pk', 'items_count', 'total_quantity', 'actual_items_count', 'actual_total_quantity'
+                )[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            checked += len(batch)
+            
+            divergent = []
+            for order_id, items_count, total_quantity, actual_items_count, actual_total_quantity in batch:
+                if (items_count, total_quantity) != (actual_items_count, actual_total_quantity):
+                    divergent.append(order_id)
+                    self.stdout.write(
+                        f'Pedido {order_id}: itens {items_count}/{actual_items_count}, '
+                        f'quantidade {total_quantity}/{actual_total_quantity}'
+                    )
+            mismatches += len(divergent)
+            
+            if divergent and options['fix']:
+                self._rebuild(divergent)
+        
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS(f'{checked} pedidos verificados, nenhum resumo divergente.'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'{mismatches} resumos corrigidos em {checked} pedidos.'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'{mismatches} resumos divergentes em {checked} pedidos. Use --fix para corrigir.'
+            ))
+    
+    @transaction.atomic
+    def _rebuild(self, order_ids):
+        # Recalcula sob bloqueio para não sobrescrever alterações concorrentes
+        list(Order.objects.select_for_update().filter(pk__in=order_ids).values_list('pk', flat=True))
+        orders = list(Order.objects.filter(pk__in=order_ids).with_items_summary().only('id'))
+        for order in orders:
+            order.items_count = order.actual_items_count
+            order.total_quantity = order.actual_total_quantity
+        Order.objects.bulk_update(orders, ['items_count', 'total_quantity'])
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.16 on 2026-10-17 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='order',
+            options={'ordering': ['-created_at', '-id'], 'verbose_name': 'Pedido', 'verbose_name_plural': 'Pedidos'},
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-created_at', '-id'], name='orders_orde_created_f2fe3a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', '-created_at', '-id'], name='orders_orde_custome_84ca43_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-17 03:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['updated_at'], name='orders_orde_updated_94e16c_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.16 on 2026-10-17 03:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0004_order_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, verbose_name='Chave')),
+                ('request_hash', models.CharField(max_length=64, verbose_name='Hash da Requisição')),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Status da Resposta')),
+                ('response_body', models.JSONField(blank=True, null=True, verbose_name='Resposta')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('expires_at', models.DateTimeField(verbose_name='Expira em')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_keys', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Chave de Idempotência',
+                'verbose_name_plural': 'Chaves de Idempotência',
+                'indexes': [models.Index(fields=['expires_at'], name='orders_idem_expires_681ecb_idx')],
+                'unique_together': {('user', 'key')},
+            },
+        ),
+    ]
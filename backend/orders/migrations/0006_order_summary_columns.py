@@ -0,0 +1,48 @@
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_order_summaries(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    
+    last_id = 0
+    while True:
+        batch = list(
+            Order.objects.filter(pk__gt=last_id).order_by('pk').annotate(
+                actual_items_count=models.Count('items'),
+                actual_total_quantity=Coalesce(models.Sum('items__quantity'), 0)
+            ).only('id')[:1000]
+        )
+        if not batch:
+            break
+        for order in batch:
+            order.items_count = order.actual_items_count
+            order.total_quantity = order.actual_total_quantity
+        Order.objects.bulk_update(batch, ['items_count', 'total_quantity'])
+        last_id = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='order',
+            old_name='total',
+            new_name='total_amount',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Quantidade de Itens'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_quantity',
+            field=models.PositiveIntegerField(default=0, verbose_name='Quantidade Total'),
+        ),
+        migrations.RunPython(backfill_order_summaries, migrations.RunPython.noop),
+    ]
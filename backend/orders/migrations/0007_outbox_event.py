@@ -0,0 +1,31 @@
+# Generated by Django 4.2.16 on 2026-10-17 03:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_summary_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('aggregate_type', models.CharField(max_length=50, verbose_name='Tipo do Agregado')),
+                ('aggregate_id', models.PositiveBigIntegerField(verbose_name='ID do Agregado')),
+                ('event_type', models.CharField(max_length=100, verbose_name='Tipo do Evento')),
+                ('payload', models.JSONField(default=dict, verbose_name='Dados')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('published_at', models.DateTimeField(blank=True, null=True, verbose_name='Publicado em')),
+            ],
+            options={
+                'verbose_name': 'Evento do Outbox',
+                'verbose_name_plural': 'Eventos do Outbox',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['published_at', 'id'], name='orders_outb_publish_a5b4ce_idx'), models.Index(fields=['aggregate_type', 'aggregate_id'], name='orders_outb_aggrega_4dd27d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.16 on 2026-10-17 03:27
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_stock_reservations'),
+        ('orders', '0007_outbox_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hora'), ('day', 'Dia')], max_length=4, verbose_name='Período')),
+                ('period_start', models.DateTimeField(verbose_name='Início do Período')),
+                ('day', models.DateField(verbose_name='Dia')),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('confirmed', 'Confirmado'), ('processing', 'Processando'), ('shipped', 'Enviado'), ('delivered', 'Entregue'), ('cancelled', 'Cancelado'), ('returned', 'Devolvido')], max_length=20, verbose_name='Status')),
+                ('payment_method', models.CharField(max_length=20, verbose_name='Método de Pagamento')),
+                ('shipping_state', models.CharField(max_length=100, verbose_name='Estado')),
+                ('shipping_city', models.CharField(max_length=100, verbose_name='Cidade')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='Pedidos')),
+                ('items_quantity', models.PositiveIntegerField(default=0, verbose_name='Quantidade de Itens')),
+                ('subtotal', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Subtotal')),
+                ('shipping_cost', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Frete')),
+                ('discount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Desconto')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total')),
+            ],
+            options={
+                'verbose_name': 'Consolidado de Vendas',
+                'verbose_name_plural': 'Consolidados de Vendas',
+                'ordering': ['period', '-period_start'],
+                'indexes': [models.Index(fields=['period', 'day'], name='orders_sale_period_7af0dd_idx')],
+                'unique_together': {('period', 'period_start', 'status', 'payment_method', 'shipping_state', 'shipping_city')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DepartmentSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hora'), ('day', 'Dia')], max_length=4, verbose_name='Período')),
+                ('period_start', models.DateTimeField(verbose_name='Início do Período')),
+                ('day', models.DateField(verbose_name='Dia')),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('confirmed', 'Confirmado'), ('processing', 'Processando'), ('shipped', 'Enviado'), ('delivered', 'Entregue'), ('cancelled', 'Cancelado'), ('returned', 'Devolvido')], max_length=20, verbose_name='Status')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='Pedidos')),
+                ('quantity', models.PositiveIntegerField(default=0, verbose_name='Quantidade')),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Receita')),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='products.department', verbose_name='Departamento')),
+            ],
+            options={
+                'verbose_name': 'Consolidado de Vendas por Departamento',
+                'verbose_name_plural': 'Consolidados de Vendas por Departamento',
+                'ordering': ['period', '-period_start'],
+                'indexes': [models.Index(fields=['period', 'day'], name='orders_depa_period_aca1e0_idx')],
+                'unique_together': {('period', 'period_start', 'department', 'status')},
+            },
+        ),
+    ]
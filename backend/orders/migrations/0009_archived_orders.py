@@ -0,0 +1,89 @@
+# Generated by Django 4.2.16 on 2026-10-17 03:36
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Tabelas quentes: limiares fixos de autovacuum/analyze em vez de 20% da tabela,
+# para que as remoções do arquivamento sejam limpas sem esperar meses de crescimento
+HOT_TABLES = (
+    'orders_order', 'orders_orderitem', 'orders_orderstatushistory',
+    'deliveries_delivery', 'deliveries_deliverystatushistory',
+)
+AUTOVACUUM_SETTINGS = {'autovacuum_vacuum_scale_factor': 0.02, 'autovacuum_analyze_scale_factor': 0.01}
+
+
+def partition_archive(apps, schema_editor):
+    """
+    No PostgreSQL, recria a tabela de pedidos arquivados particionada por mês
+    de created_at (chave primária (id, created_at), partição padrão vazia) e
+    ajusta o autovacuum das tabelas quentes.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    model = apps.get_model('orders', 'ArchivedOrder')
+    table = model._meta.db_table
+    schema_editor.execute(
+        f"CREATE TABLE {table}_partitioned (LIKE {table} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"
+    )
+    schema_editor.execute(f"DROP TABLE {table}")
+    schema_editor.execute(f"ALTER TABLE {table}_partitioned RENAME TO {table}")
+    schema_editor.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id, created_at)")
+    schema_editor.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+    for index in model._meta.indexes:
+        schema_editor.add_index(model, index)
+    
+    options = ', '.join(f'{name} = {value}' for name, value in AUTOVACUUM_SETTINGS.items())
+    for hot_table in HOT_TABLES:
+        schema_editor.execute(f"ALTER TABLE {hot_table} SET ({options})")
+
+
+def reset_autovacuum(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for hot_table in HOT_TABLES:
+        schema_editor.execute(f"ALTER TABLE {hot_table} RESET ({', '.join(AUTOVACUUM_SETTINGS)})")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0008_sales_rollups'),
+        ('deliveries', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID do Pedido')),
+                ('order_number', models.UUIDField(verbose_name='Número do Pedido')),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('confirmed', 'Confirmado'), ('processing', 'Processando'), ('shipped', 'Enviado'), ('delivered', 'Entregue'), ('cancelled', 'Cancelado'), ('returned', 'Devolvido')], max_length=20, verbose_name='Status')),
+                ('payment_status', models.CharField(choices=[('pending', 'Pendente'), ('paid', 'Pago'), ('failed', 'Falhou'), ('refunded', 'Reembolsado')], max_length=20, verbose_name='Status do Pagamento')),
+                ('payment_method', models.CharField(max_length=20, verbose_name='Método de Pagamento')),
+                ('shipping_state', models.CharField(max_length=100, verbose_name='Estado')),
+                ('shipping_city', models.CharField(max_length=100, verbose_name='Cidade')),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Subtotal')),
+                ('shipping_cost', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Frete')),
+                ('discount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Desconto')),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Total')),
+                ('items_count', models.PositiveIntegerField(default=0, verbose_name='Quantidade de Itens')),
+                ('total_quantity', models.PositiveIntegerField(default=0, verbose_name='Quantidade Total')),
+                ('tracking_code', models.UUIDField(blank=True, null=True, verbose_name='Código de Rastreamento')),
+                ('document', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Pedido Arquivado')),
+                ('created_at', models.DateTimeField(verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(verbose_name='Atualizado em')),
+                ('archived_at', models.DateTimeField(verbose_name='Arquivado em')),
+                ('customer', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to=settings.AUTH_USER_MODEL, verbose_name='Cliente')),
+            ],
+            options={
+                'verbose_name': 'Pedido Arquivado',
+                'verbose_name_plural': 'Pedidos Arquivados',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['-created_at', '-id'], name='orders_arch_created_d41098_idx'), models.Index(fields=['customer', '-created_at', '-id'], name='orders_arch_custome_2f074a_idx'), models.Index(fields=['order_number'], name='orders_arch_order_n_14f388_idx'), models.Index(fields=['tracking_code'], name='orders_arch_trackin_7fa888_idx'), models.Index(fields=['archived_at'], name='orders_arch_archive_473b60_idx')],
+            },
+        ),
+        migrations.RunPython(partition_archive, reset_autovacuum),
+    ]
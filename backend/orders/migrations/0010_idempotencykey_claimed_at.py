@@ -0,0 +1,19 @@
+# Generated by Django 4.2.16 on 2026-10-17 04:02
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_archived_orders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='claimed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Reivindicada em'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.16 on 2026-10-17 04:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0010_idempotencykey_claimed_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedCouponUsage',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID do Uso')),
+                ('coupon_id', models.IntegerField(verbose_name='ID do Cupom')),
+                ('coupon_code', models.CharField(max_length=50, verbose_name='Código do Cupom')),
+                ('discount_amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Valor do Desconto')),
+                ('used_at', models.DateTimeField(verbose_name='Usado em')),
+                ('customer', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_coupon_usages', to=settings.AUTH_USER_MODEL, verbose_name='Cliente')),
+                ('order', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='coupon_usages', to='orders.archivedorder', verbose_name='Pedido Arquivado')),
+            ],
+            options={
+                'verbose_name': 'Uso de Cupom Arquivado',
+                'verbose_name_plural': 'Usos de Cupons Arquivados',
+                'ordering': ['-used_at'],
+                'indexes': [models.Index(fields=['coupon_id', 'customer'], name='orders_arch_coupon__769806_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.16 on 2026-10-17 04:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_archived_coupon_usages'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.CharField(max_length=100, unique=True, verbose_name='ID da Tarefa')),
+                ('delivered_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Entregue em')),
+            ],
+            options={
+                'verbose_name': 'Entrega do Outbox',
+                'verbose_name_plural': 'Entregas do Outbox',
+            },
+        ),
+    ]
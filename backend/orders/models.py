@@ -1,9 +1,40 @@
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from decimal import Decimal
 import uuid
 
 
+class OrderQuerySet(models.QuerySet):
+    """
+    QuerySet de pedidos com as anotações e pré-carregamentos lidos pelos serializers
+    """
+    
+    def for_listing(self):
+        """Cliente e entrega na mesma consulta; o resumo dos itens já está na linha (OrderListSerializer)"""
+        return self.select_related('customer', 'delivery')
+    
+    def with_items_summary(self):
+        """Anota o resumo dos itens recalculado a partir de OrderItem (verificação de consistência)"""
+        return self.annotate(
+            actual_items_count=models.Count('items'),
+            actual_total_quantity=Coalesce(models.Sum('items__quantity'), 0)
+        )
+    
+    def for_detail(self):
+        """Itens com produto, departamento e saldo pré-carregados (OrderDetailSerializer)"""
+        return self.select_related('customer__profile', 'delivery').prefetch_related(
+            models.Prefetch(
+                'items',
+                queryset=OrderItem.objects.select_related(
+                    'product__department', 'product__stock_balance'
+                )
+            )
+        )
+
+
 class Order(models.Model):
     """
     Modelo para pedidos do e-commerce.
@@ -91,13 +122,17 @@ class Order(models.Model):
         validators=[MinValueValidator(Decimal('0.00'))],
         verbose_name='Desconto'
     )
-    total = models.DecimalField(
+    total_amount = models.DecimalField(
         max_digits=10, 
         decimal_places=2,
         validators=[MinValueValidator(Decimal('0.01'))],
         verbose_name='Total'
     )
     
+    # Resumo dos itens, gravado na criação do pedido (listagens sem consultar os itens)
+    items_count = models.PositiveIntegerField(default=0, verbose_name='Quantidade de Itens')
+    total_quantity = models.PositiveIntegerField(default=0, verbose_name='Quantidade Total')
+    
     # Endereço de entrega
     shipping_address = models.TextField(verbose_name='Endereço de Entrega')
     shipping_city = models.CharField(max_length=100, verbose_name='Cidade')
@@ -115,10 +150,17 @@ class Order(models.Model):
     shipped_at = models.DateTimeField(null=True, blank=True, verbose_name='Enviado em')
     delivered_at = models.DateTimeField(null=True, blank=True, verbose_name='Entregue em')
     
+    objects = OrderQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Pedido'
         verbose_name_plural = 'Pedidos'
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['customer', '-created_at', '-id']),
+            models.Index(fields=['updated_at']),
+        ]
     
     def __str__(self):
         return f"Pedido {self.order_number} - {self.customer.full_name}"
@@ -126,14 +168,12 @@ class Order(models.Model):
     @property
     def total_items(self):
         """Retorna o número total de itens no pedido"""
-        return self.items.aggregate(
-            total=models.Sum('quantity')
-        )['total'] or 0
+        return self.total_quantity
     
     def calculate_total(self):
         """Calcula o total do pedido"""
-        self.total = self.subtotal + self.shipping_cost - self.discount
-        return self.total
+        self.total_amount = self.subtotal + self.shipping_cost - self.discount
+        return self.total_amount
     
     def get_full_shipping_address(self):
         """Retorna o endereço de entrega completo formatado"""
@@ -185,8 +225,11 @@ class OrderItem(models.Model):
         return f"{self.quantity}x {self.product_name} - Pedido {self.order.order_number}"
     
     def save(self, *args, **kwargs):
-        """Calcula o preço total automaticamente"""
+        """Calcula o preço total automaticamente e grava os dados do produto"""
         self.total_price = self.quantity * self.unit_price
+        if not self.product_name:
+            self.product_name = self.product.name
+            self.product_description = self.product.short_description or self.product.description
         super().save(*args, **kwargs)
 
 
@@ -252,11 +295,10 @@ class Cart(models.Model):
     
     @property
     def total_price(self):
-        """Calcula o preço total do carrinho"""
-        total = Decimal('0.00')
-        for item in self.items.all():
-            total += item.total_price
-        return total
+        """Calcula o preço total do carrinho (uma consulta, pelo preço efetivo)"""
+        return self.items.aggregate(
+            total=models.Sum(models.F('quantity') * models.F('product__effective_price'))
+        )['total'] or Decimal('0.00')
 
 
 class CartItem(models.Model):
@@ -297,3 +339,282 @@ class CartItem(models.Model):
     def total_price(self):
         """Calcula o preço total do item"""
         return self.quantity * self.unit_price
+
+
+class IdempotencyKey(models.Model):
+    """
+    Resposta de uma requisição POST identificada pelo cabeçalho Idempotency-Key.
+    
+    A linha é criada antes da execução (status_code nulo enquanto em andamento)
+    e recebe a resposta ao final; repetições com a mesma chave devolvem a
+    resposta gravada sem executar a view novamente. claimed_at identifica a
+    execução dona da chave (uma execução interrompida pode ser assumida).
+    """
+    user = models.ForeignKey(
+        'users.User',
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys',
+        verbose_name='Usuário'
+    )
+    key = models.CharField(max_length=255, verbose_name='Chave')
+    request_hash = models.CharField(max_length=64, verbose_name='Hash da Requisição')
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name='Status da Resposta')
+    response_body = models.JSONField(null=True, blank=True, verbose_name='Resposta')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
+    claimed_at = models.DateTimeField(default=timezone.now, verbose_name='Reivindicada em')
+    expires_at = models.DateTimeField(verbose_name='Expira em')
+    
+    class Meta:
+        verbose_name = 'Chave de Idempotência'
+        verbose_name_plural = 'Chaves de Idempotência'
+        unique_together = ['user', 'key']
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id}:{self.key}"
+    
+    @property
+    def is_completed(self):
+        return self.status_code is not None
+
+
+class OutboxEventQuerySet(models.QuerySet):
+    """
+    QuerySet de eventos do outbox
+    """
+    
+    def pending(self):
+        """Eventos ainda não publicados (índice published_at, id)"""
+        return self.filter(published_at__isnull=True)
+
+
+class OutboxEvent(models.Model):
+    """
+    Evento de domínio (pedido, pagamento, entrega) gravado na mesma transação
+    da mudança de estado que o originou.
+    
+    O relay (orders.outbox.relay) publica os eventos pendentes no Celery em
+    segundo plano; um evento só é publicado se a transação for confirmada.
+    """
+    aggregate_type = models.CharField(max_length=50, verbose_name='Tipo do Agregado')
+    aggregate_id = models.PositiveBigIntegerField(verbose_name='ID do Agregado')
+    event_type = models.CharField(max_length=100, verbose_name='Tipo do Evento')
+    payload = models.JSONField(default=dict, verbose_name='Dados')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
+    published_at = models.DateTimeField(null=True, blank=True, verbose_name='Publicado em')
+    
+    objects = OutboxEventQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = 'Evento do Outbox'
+        verbose_name_plural = 'Eventos do Outbox'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['published_at', 'id']),
+            models.Index(fields=['aggregate_type', 'aggregate_id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} {self.aggregate_type}:{self.aggregate_id}"
+
+
+class OutboxDelivery(models.Model):
+    """
+    Entrega de uma tarefa publicada pelo relay do outbox, gravada na transação
+    do consumidor (orders.outbox.first_delivery). A chave única em task_id
+    descarta a mesma tarefa publicada de novo, em qualquer worker.
+    """
+    task_id = models.CharField(max_length=100, unique=True, verbose_name='ID da Tarefa')
+    delivered_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Entregue em')
+    
+    class Meta:
+        verbose_name = 'Entrega do Outbox'
+        verbose_name_plural = 'Entregas do Outbox'
+    
+    def __str__(self):
+        return self.task_id
+
+
+class SalesRollup(models.Model):
+    """
+    Vendas consolidadas por hora e por dia (horário local de criação do
+    pedido), por status, forma de pagamento, estado e cidade de entrega.
+    
+    Mantidas incrementalmente por orders.rollups a partir dos pedidos alterados
+    desde a última execução; os relatórios de vendas são lidos daqui.
+    """
+    PERIOD_CHOICES = [
+        ('hour', 'Hora'),
+        ('day', 'Dia'),
+    ]
+    
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES, verbose_name='Período')
+    period_start = models.DateTimeField(verbose_name='Início do Período')
+    day = models.DateField(verbose_name='Dia')
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, verbose_name='Status')
+    payment_method = models.CharField(max_length=20, verbose_name='Método de Pagamento')
+    shipping_state = models.CharField(max_length=100, verbose_name='Estado')
+    shipping_city = models.CharField(max_length=100, verbose_name='Cidade')
+    orders_count = models.PositiveIntegerField(default=0, verbose_name='Pedidos')
+    items_quantity = models.PositiveIntegerField(default=0, verbose_name='Quantidade de Itens')
+    subtotal = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name='Subtotal')
+    shipping_cost = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name='Frete')
+    discount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name='Desconto')
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name='Total')
+    
+    class Meta:
+        verbose_name = 'Consolidado de Vendas'
+        verbose_name_plural = 'Consolidados de Vendas'
+        ordering = ['period', '-period_start']
+        unique_together = ['period', 'period_start', 'status', 'payment_method', 'shipping_state', 'shipping_city']
+        indexes = [
+            models.Index(fields=['period', 'day']),
+        ]
+    
+    def __str__(self):
+        return f"{self.period} {self.period_start}: {self.orders_count} pedidos"
+
+
+class DepartmentSalesRollup(models.Model):
+    """
+    Vendas dos itens consolidadas por hora e por dia, por departamento do
+    produto e status do pedido (mantidas junto com SalesRollup).
+    """
+    period = models.CharField(max_length=4, choices=SalesRollup.PERIOD_CHOICES, verbose_name='Período')
+    period_start = models.DateTimeField(verbose_name='Início do Período')
+    day = models.DateField(verbose_name='Dia')
+    department = models.ForeignKey(
+        'products.Department',
+        on_delete=models.CASCADE,
+        related_name='sales_rollups',
+        verbose_name='Departamento'
+    )
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, verbose_name='Status')
+    orders_count = models.PositiveIntegerField(default=0, verbose_name='Pedidos')
+    quantity = models.PositiveIntegerField(default=0, verbose_name='Quantidade')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name='Receita')
+    
+    class Meta:
+        verbose_name = 'Consolidado de Vendas por Departamento'
+        verbose_name_plural = 'Consolidados de Vendas por Departamento'
+        ordering = ['period', '-period_start']
+        unique_together = ['period', 'period_start', 'department', 'status']
+        indexes = [
+            models.Index(fields=['period', 'day']),
+        ]
+    
+    def __str__(self):
+        return f"{self.period} {self.period_start} {self.department_id}: {self.quantity}"
+
+
+class ArchivedOrderQuerySet(models.QuerySet):
+    """
+    QuerySet de pedidos arquivados
+    """
+    
+    def visible_to(self, user):
+        """Admin vê todos os pedidos arquivados; cliente, apenas os seus"""
+        if user.user_type == 'admin':
+            return self
+        if user.user_type == 'customer':
+            return self.filter(customer=user)
+        return self.none()
+
+
+class ArchivedOrder(models.Model):
+    """
+    Pedido encerrado movido para o armazenamento frio por orders.archive.
+    
+    O pedido, seus itens e histórico e a entrega (com histórico e avaliação)
+    ficam em document, como estavam no arquivamento; as colunas guardam apenas
+    o que é filtrado ou consolidado (consultas do cliente, rastreamento e
+    consolidados de vendas). O id é o do pedido original.
+    
+    No PostgreSQL a tabela é particionada por mês de created_at (partições
+    criadas pelo arquivamento); no SQLite é uma tabela comum.
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name='ID do Pedido')
+    order_number = models.UUIDField(verbose_name='Número do Pedido')
+    customer = models.ForeignKey(
+        'users.User',
+        on_delete=models.CASCADE,
+        related_name='archived_orders',
+        db_constraint=False,
+        db_index=False,
+        verbose_name='Cliente'
+    )
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, verbose_name='Status')
+    payment_status = models.CharField(max_length=20, choices=Order.PAYMENT_STATUS_CHOICES, verbose_name='Status do Pagamento')
+    payment_method = models.CharField(max_length=20, verbose_name='Método de Pagamento')
+    shipping_state = models.CharField(max_length=100, verbose_name='Estado')
+    shipping_city = models.CharField(max_length=100, verbose_name='Cidade')
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Subtotal')
+    shipping_cost = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Frete')
+    discount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Desconto')
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Total')
+    items_count = models.PositiveIntegerField(default=0, verbose_name='Quantidade de Itens')
+    total_quantity = models.PositiveIntegerField(default=0, verbose_name='Quantidade Total')
+    tracking_code = models.UUIDField(null=True, blank=True, verbose_name='Código de Rastreamento')
+    document = models.JSONField(encoder=DjangoJSONEncoder, verbose_name='Pedido Arquivado')
+    created_at = models.DateTimeField(verbose_name='Criado em')
+    updated_at = models.DateTimeField(verbose_name='Atualizado em')
+    archived_at = models.DateTimeField(verbose_name='Arquivado em')
+    
+    objects = ArchivedOrderQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = 'Pedido Arquivado'
+        verbose_name_plural = 'Pedidos Arquivados'
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['customer', '-created_at', '-id']),
+            models.Index(fields=['order_number']),
+            models.Index(fields=['tracking_code']),
+            models.Index(fields=['archived_at']),
+        ]
+    
+    def __str__(self):
+        return f"Pedido arquivado #{self.order_number}"
+
+
+class ArchivedCouponUsage(models.Model):
+    """
+    Uso de cupom (coupons.CouponUsage) de um pedido arquivado. Fica em uma
+    tabela própria, indexada por cupom e cliente, para que os limites de uso
+    por cliente (Coupon.can_be_used_by_customer) continuem contando os pedidos
+    arquivados. O id é o do uso original.
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name='ID do Uso')
+    order = models.ForeignKey(
+        ArchivedOrder,
+        on_delete=models.CASCADE,
+        related_name='coupon_usages',
+        db_constraint=False,
+        verbose_name='Pedido Arquivado'
+    )
+    coupon_id = models.IntegerField(verbose_name='ID do Cupom')
+    coupon_code = models.CharField(max_length=50, verbose_name='Código do Cupom')
+    customer = models.ForeignKey(
+        'users.User',
+        on_delete=models.CASCADE,
+        related_name='archived_coupon_usages',
+        db_constraint=False,
+        db_index=False,
+        verbose_name='Cliente'
+    )
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Valor do Desconto')
+    used_at = models.DateTimeField(verbose_name='Usado em')
+    
+    class Meta:
+        verbose_name = 'Uso de Cupom Arquivado'
+        verbose_name_plural = 'Usos de Cupons Arquivados'
+        ordering = ['-used_at']
+        indexes = [
+            models.Index(fields=['coupon_id', 'customer']),
+        ]
+    
+    def __str__(self):
+        return f"{self.coupon_code} (pedido arquivado {self.order_id})"
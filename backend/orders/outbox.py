@@ -0,0 +1,154 @@
+"""
+Outbox transacional dos eventos de domínio (pedidos, pagamentos e entregas).
+
+As mudanças de estado gravam seus eventos (OutboxEvent) com emit, na mesma
+transação; nenhuma tarefa é enviada ao broker durante a requisição. O relay
+reivindica lotes de eventos pendentes com SELECT ... FOR UPDATE SKIP LOCKED
+(vários relays em paralelo não publicam o mesmo evento), publica as tarefas dos
+consumidores usando uma única conexão ao broker e marca o lote como publicado.
+
+Se o relay falhar depois de publicar e antes de confirmar, o lote é publicado
+de novo com os mesmos ids de tarefa (outbox-<evento>-<n>); os consumidores
+descartam a repetição com first_delivery, que grava a entrega (OutboxDelivery,
+task_id único) na transação do próprio consumidor. Assim cada evento tem efeito
+uma única vez, qualquer que seja o worker, e uma tarefa que falha desfaz o
+registro e pode ser executada de novo.
+"""
+from datetime import timedelta
+
+from celery import current_app
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import OutboxDelivery, OutboxEvent
+
+TASK_ID_PREFIX = 'outbox-'
+METRICS_KEY = 'outbox:relay'
+
+
+def event(event_type, aggregate_type, aggregate_id, **payload):
+    """Evento ainda não gravado (ver emit)"""
+    return OutboxEvent(
+        event_type=event_type, aggregate_type=aggregate_type, aggregate_id=aggregate_id, payload=payload
+    )
+
+
+def emit(*events):
+    """Grava os eventos; deve ser chamado na transação da mudança de estado"""
+    OutboxEvent.objects.bulk_create(events)
+
+
+def _order_status_changed(payload):
+    from ecommerce_saas.tasks import send_order_confirmation_email, send_order_status_update_email
+    
+    if payload['new_status'] == 'confirmed':
+        return [send_order_confirmation_email.s(payload['order_id'])]
+    return [
+        send_order_status_update_email.s(payload['order_id'], payload['old_status'], payload['new_status'])
+    ]
+
+
+# Tarefas disparadas por tipo de evento. Os demais eventos (order.created,
+# order.paid, payment.status_changed, payment.refund_requested e
+# delivery.status_changed) ainda não têm consumidor: ficam no outbox como
+# registro e são apenas marcados como publicados
+HANDLERS = {
+    'order.status_changed': _order_status_changed,
+}
+
+
+def signatures(outbox_event):
+    """Tarefas do evento, com ids determinísticos"""
+    handler = HANDLERS.get(outbox_event.event_type)
+    tasks = handler(outbox_event.payload) if handler else []
+    for index, task in enumerate(tasks):
+        task.set(task_id=f'{TASK_ID_PREFIX}{outbox_event.pk}-{index}')
+    return tasks
+
+
+def publish(tasks):
+    """Publica as tarefas usando uma única conexão ao broker"""
+    if not tasks:
+        return
+    with current_app.producer_or_acquire() as producer:
+        for task in tasks:
+            task.apply_async(producer=producer)
+
+
+def first_delivery(task_id):
+    """
+    Registra a entrega da tarefa publicada pelo relay e retorna falso se ela já
+    foi registrada (publicação repetida do mesmo evento). Deve ser chamada
+    dentro da transação do consumidor: se ele falhar, o registro é desfeito.
+    Tarefas disparadas fora do outbox sempre passam.
+    """
+    if not task_id or not task_id.startswith(TASK_ID_PREFIX):
+        return True
+    try:
+        with transaction.atomic():
+            OutboxDelivery.objects.create(task_id=task_id)
+    except IntegrityError:
+        return False
+    return True
+
+
+def relay(batch_size=None, max_batches=None):
+    """
+    Publica os eventos pendentes em lotes, em ordem de criação. Retorna as
+    métricas da execução (também guardadas no cache, ver relay_metrics).
+    """
+    batch_size = batch_size or settings.OUTBOX_RELAY_BATCH_SIZE
+    max_batches = max_batches or settings.OUTBOX_RELAY_MAX_BATCHES
+    published = 0
+    max_lag = 0.0
+    
+    for _ in range(max_batches):
+        with transaction.atomic():
+            events = list(
+                OutboxEvent.objects.pending().select_for_update(skip_locked=True).order_by('pk')[:batch_size]
+            )
+            if not events:
+                break
+            publish([task for outbox_event in events for task in signatures(outbox_event)])
+            now = timezone.now()
+            OutboxEvent.objects.filter(pk__in=[outbox_event.pk for outbox_event in events]).update(published_at=now)
+        
+        published += len(events)
+        # Atraso entre a gravação e a publicação do evento mais antigo do lote
+        max_lag = max(max_lag, (now - events[0].created_at).total_seconds())
+        if len(events) < batch_size:
+            break
+    
+    metrics = {
+        'ran_at': timezone.now().isoformat(),
+        'published': published,
+        'max_lag_seconds': round(max_lag, 3),
+    }
+    cache.set(METRICS_KEY, metrics, None)
+    return metrics
+
+
+def relay_metrics(now=None):
+    """Eventos pendentes, idade do mais antigo e dados da última execução do relay"""
+    now = now or timezone.now()
+    pending = OutboxEvent.objects.pending()
+    oldest = pending.order_by('pk').values_list('created_at', flat=True).first()
+    return {
+        'pending': pending.count(),
+        'oldest_pending_age_seconds': round((now - oldest).total_seconds(), 3) if oldest else 0.0,
+        'last_relay': cache.get(METRICS_KEY),
+    }
+
+
+def purge_published(now=None):
+    """
+    Remove os eventos publicados há mais de OUTBOX_RETENTION_DAYS e as entregas
+    registradas há mais de OUTBOX_DEDUP_TTL_HOURS
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=settings.OUTBOX_RETENTION_DAYS)
+    deleted, _ = OutboxEvent.objects.filter(published_at__lt=cutoff).delete()
+    OutboxDelivery.objects.filter(delivered_at__lt=now - timedelta(hours=settings.OUTBOX_DEDUP_TTL_HOURS)).delete()
+    return deleted
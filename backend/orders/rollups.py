@@ -0,0 +1,368 @@
+"""
+Consolidados de vendas (SalesRollup e DepartmentSalesRollup) para relatórios.
+
+A cada execução, apenas os pedidos alterados desde a última marca d'água
+(Order.updated_at) são considerados: as horas (horário local de criação) desses
+pedidos são recalculadas a partir dos pedidos e itens, e os dias dessas horas
+a partir dos consolidados por hora. Como a hora inteira é recalculada,
+correções tardias (cancelamentos, devoluções, mudanças de pagamento em
+pedidos antigos) movem os valores entre as células sem dupla contagem.
+
+Os pedidos arquivados (orders.archive) continuam nos consolidados: as horas são
+recalculadas a partir dos pedidos e dos pedidos arquivados, e o arquivamento
+marca as horas dos pedidos movidos (archived_at) para o próximo processamento.
+
+Os relatórios de vendas leem apenas os consolidados; o filtro por cliente, que
+não é uma dimensão consolidada, usa os pedidos (e os arquivados) pelo índice
+(customer, created_at).
+"""
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate, TruncHour
+from django.utils import timezone
+
+from products.models import Department, ProcessingWatermark
+from .models import ArchivedOrder, DepartmentSalesRollup, Order, OrderItem, SalesRollup
+
+WATERMARK = 'sales_rollups'
+
+HOUR = timedelta(hours=1)
+HOURS_PER_BATCH = 24 * 31
+
+ORDER_MEASURES = ('orders_count', 'items_quantity', 'subtotal', 'shipping_cost', 'discount', 'total_amount')
+DEPARTMENT_MEASURES = ('orders_count', 'quantity', 'revenue')
+ORDER_DIMENSIONS = ('status', 'payment_method', 'shipping_state', 'shipping_city')
+
+# Agrupamentos dos relatórios -> campo do consolidado
+GROUPS = {
+    'day': 'day',
+    'hour': 'period_start',
+    'status': 'status',
+    'payment_method': 'payment_method',
+    'state': 'shipping_state',
+    'city': 'shipping_city',
+    'department': 'department',
+}
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _ranges(starts, step):
+    """Agrupa inícios de período consecutivos em intervalos [início, fim)"""
+    ranges = []
+    for start in sorted(starts):
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = start + step
+        else:
+            ranges.append([start, start + step])
+    return ranges
+
+
+def _in_ranges(field, ranges):
+    condition = Q()
+    for start, end in ranges:
+        condition |= Q(**{f'{field}__gte': start, f'{field}__lt': end})
+    return condition
+
+
+def _sum(field):
+    if field in ('orders_count', 'items_quantity', 'quantity'):
+        return Coalesce(Sum(field), 0)
+    return Coalesce(Sum(field), Value(Decimal('0.00')), output_field=DecimalField())
+
+
+def _hours(queryset):
+    return set(queryset.annotate(hour=TruncHour('created_at')).order_by().values_list('hour', flat=True).distinct())
+
+
+def affected_hours(since, until):
+    """Horas de criação dos pedidos alterados (ou arquivados) em (since, until]"""
+    orders = Order.objects.filter(updated_at__lte=until)
+    archived = ArchivedOrder.objects.filter(archived_at__lte=until)
+    if since is not None:
+        orders = orders.filter(updated_at__gt=since)
+        archived = archived.filter(archived_at__gt=since)
+    return sorted(_hours(orders) | _hours(archived))
+
+
+def _merge(rows, keys, measures):
+    """Soma as medidas das linhas com as mesmas chaves (pedidos e pedidos arquivados)"""
+    merged = {}
+    for row in rows:
+        key = tuple(row[field] for field in keys)
+        if key in merged:
+            for field in measures:
+                merged[key][field] += row[field]
+        else:
+            merged[key] = dict(row)
+    return list(merged.values())
+
+
+def _order_hour_rows(model, ranges):
+    return model.objects.filter(_in_ranges('created_at', ranges)).annotate(
+        hour=TruncHour('created_at')
+    ).values('hour', *ORDER_DIMENSIONS).annotate(
+        orders_count=Count('id'),
+        items_quantity=Sum('total_quantity'),
+        subtotal_sum=Sum('subtotal'),
+        shipping_cost_sum=Sum('shipping_cost'),
+        discount_sum=Sum('discount'),
+        total_amount_sum=Sum('total_amount')
+    ).order_by()
+
+
+def _archived_department_rows(ranges):
+    """Itens dos pedidos arquivados (lidos do documento), no formato das linhas de OrderItem"""
+    rows = {}
+    archived = ArchivedOrder.objects.filter(_in_ranges('created_at', ranges)).annotate(
+        hour=TruncHour('created_at')
+    ).values_list('pk', 'hour', 'status', 'document').iterator()
+    for order_id, hour, status, document in archived:
+        for item in document['items']:
+            row = rows.setdefault((hour, item['department_id'], status), {
+                'hour': hour,
+                'product__department_id': item['department_id'],
+                'order__status': status,
+                'order_ids': set(),
+                'total_quantity': 0,
+                'revenue': Decimal('0.00'),
+            })
+            row['order_ids'].add(order_id)
+            row['total_quantity'] += item['quantity']
+            row['revenue'] += Decimal(item['total_price'])
+    
+    # Departamentos removidos depois do arquivamento ficam fora, como nos itens dos pedidos
+    departments = set(Department.objects.filter(
+        pk__in={row['product__department_id'] for row in rows.values()}
+    ).values_list('pk', flat=True))
+    for row in rows.values():
+        row['orders_count'] = len(row.pop('order_ids'))
+    return [row for row in rows.values() if row['product__department_id'] in departments]
+
+
+def _refresh_hour_batch(hours):
+    ranges = _ranges(hours, HOUR)
+    order_rows = _merge(
+        [*_order_hour_rows(Order, ranges), *_order_hour_rows(ArchivedOrder, ranges)],
+        ('hour', *ORDER_DIMENSIONS),
+        ('orders_count', 'items_quantity', 'subtotal_sum', 'shipping_cost_sum', 'discount_sum', 'total_amount_sum')
+    )
+    department_rows = OrderItem.objects.filter(_in_ranges('order__created_at', ranges)).annotate(
+        hour=TruncHour('order__created_at')
+    ).values('hour', 'product__department_id', 'order__status').annotate(
+        orders_count=Count('order_id', distinct=True),
+        total_quantity=Sum('quantity'),
+        revenue=Sum('total_price')
+    ).order_by()
+    # Um pedido está nos pedidos ou nos arquivados, nunca nos dois: a contagem distinta pode ser somada
+    department_rows = _merge(
+        [*department_rows, *_archived_department_rows(ranges)],
+        ('hour', 'product__department_id', 'order__status'),
+        ('orders_count', 'total_quantity', 'revenue')
+    )
+    
+    with transaction.atomic():
+        SalesRollup.objects.filter(period='hour', period_start__in=hours).delete()
+        DepartmentSalesRollup.objects.filter(period='hour', period_start__in=hours).delete()
+        SalesRollup.objects.bulk_create([
+            SalesRollup(
+                period='hour',
+                period_start=row['hour'],
+                day=timezone.localdate(row['hour']),
+                status=row['status'],
+                payment_method=row['payment_method'],
+                shipping_state=row['shipping_state'],
+                shipping_city=row['shipping_city'],
+                orders_count=row['orders_count'],
+                items_quantity=row['items_quantity'] or 0,
+                subtotal=row['subtotal_sum'],
+                shipping_cost=row['shipping_cost_sum'],
+                discount=row['discount_sum'],
+                total_amount=row['total_amount_sum']
+            )
+            for row in order_rows
+        ], batch_size=1000)
+        DepartmentSalesRollup.objects.bulk_create([
+            DepartmentSalesRollup(
+                period='hour',
+                period_start=row['hour'],
+                day=timezone.localdate(row['hour']),
+                department_id=row['product__department_id'],
+                status=row['order__status'],
+                orders_count=row['orders_count'],
+                quantity=row['total_quantity'],
+                revenue=row['revenue']
+            )
+            for row in department_rows
+        ], batch_size=1000)
+
+
+def _refresh_days(days):
+    """Recalcula os consolidados diários a partir dos consolidados por hora"""
+    order_rows = SalesRollup.objects.filter(period='hour', day__in=days).values(
+        'day', *ORDER_DIMENSIONS
+    ).annotate(**{f'{field}_sum': Sum(field) for field in ORDER_MEASURES}).order_by()
+    department_rows = DepartmentSalesRollup.objects.filter(period='hour', day__in=days).values(
+        'day', 'department_id', 'status'
+    ).annotate(**{f'{field}_sum': Sum(field) for field in DEPARTMENT_MEASURES}).order_by()
+    
+    with transaction.atomic():
+        SalesRollup.objects.filter(period='day', day__in=days).delete()
+        DepartmentSalesRollup.objects.filter(period='day', day__in=days).delete()
+        SalesRollup.objects.bulk_create([
+            SalesRollup(
+                period='day',
+                period_start=_day_start(row['day']),
+                day=row['day'],
+                **{field: row[field] for field in ORDER_DIMENSIONS},
+                **{field: row[f'{field}_sum'] for field in ORDER_MEASURES}
+            )
+            for row in order_rows
+        ], batch_size=1000)
+        DepartmentSalesRollup.objects.bulk_create([
+            DepartmentSalesRollup(
+                period='day',
+                period_start=_day_start(row['day']),
+                day=row['day'],
+                department_id=row['department_id'],
+                status=row['status'],
+                **{field: row[f'{field}_sum'] for field in DEPARTMENT_MEASURES}
+            )
+            for row in department_rows
+        ], batch_size=1000)
+
+
+def refresh_hours(hours):
+    """
+    Recalcula os consolidados das horas informadas (e dos dias dessas horas),
+    em lotes de horas. Horas sem pedidos ficam sem consolidado.
+    """
+    hours = sorted(set(hours))
+    for start in range(0, len(hours), HOURS_PER_BATCH):
+        batch = hours[start:start + HOURS_PER_BATCH]
+        _refresh_hour_batch(batch)
+        _refresh_days(sorted({timezone.localdate(hour) for hour in batch}))
+
+
+def update_sales_rollups(now=None):
+    """
+    Processa os pedidos alterados desde a marca d'água. Retorna a quantidade
+    de horas recalculadas.
+    """
+    now = now or timezone.now()
+    # Margem para transações ainda não confirmadas com updated_at anterior
+    until = now - timedelta(minutes=settings.SALES_ROLLUP_SETTLE_MINUTES)
+    hours = affected_hours(ProcessingWatermark.get(WATERMARK), until)
+    refresh_hours(hours)
+    ProcessingWatermark.set(WATERMARK, until)
+    return len(hours)
+
+
+def backfill(start_date=None, end_date=None):
+    """
+    Reconstrói os consolidados dos dias informados (todos, sem datas) a partir
+    dos pedidos e dos pedidos arquivados. Retorna a quantidade de horas com pedidos.
+    """
+    orders = Order.objects.all()
+    archived = ArchivedOrder.objects.all()
+    rollups = SalesRollup.objects.all()
+    department_rollups = DepartmentSalesRollup.objects.all()
+    if start_date:
+        orders = orders.filter(created_at__gte=_day_start(start_date))
+        archived = archived.filter(created_at__gte=_day_start(start_date))
+        rollups = rollups.filter(day__gte=start_date)
+        department_rollups = department_rollups.filter(day__gte=start_date)
+    if end_date:
+        orders = orders.filter(created_at__lt=_day_start(end_date + timedelta(days=1)))
+        archived = archived.filter(created_at__lt=_day_start(end_date + timedelta(days=1)))
+        rollups = rollups.filter(day__lte=end_date)
+        department_rollups = department_rollups.filter(day__lte=end_date)
+    
+    hours = sorted(_hours(orders) | _hours(archived))
+    with transaction.atomic():
+        # Consolidados de horas que não têm mais pedidos também são removidos
+        rollups.delete()
+        department_rollups.delete()
+        refresh_hours(hours)
+    return len(hours)
+
+
+def _parse_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+
+def sales_report(start_date, end_date, statuses=None, group_by=None):
+    """
+    Totais de vendas do período (e, com group_by, por dia, hora, status, forma
+    de pagamento, estado, cidade ou departamento) lidos dos consolidados.
+    """
+    start_date, end_date = _parse_date(start_date), _parse_date(end_date)
+    if group_by == 'department':
+        model, measures = DepartmentSalesRollup, DEPARTMENT_MEASURES
+    else:
+        model, measures = SalesRollup, ORDER_MEASURES
+    period = 'hour' if group_by == 'hour' else 'day'
+    
+    rollups = model.objects.filter(period=period, day__gte=start_date, day__lte=end_date)
+    if statuses:
+        rollups = rollups.filter(status__in=statuses)
+    aggregates = {field: _sum(field) for field in measures}
+    
+    report = {
+        'start_date': start_date,
+        'end_date': end_date,
+        'as_of': ProcessingWatermark.get(WATERMARK),
+        'totals': rollups.aggregate(**aggregates),
+    }
+    if group_by:
+        field = GROUPS[group_by]
+        keys = [field, 'department__name'] if group_by == 'department' else [field]
+        report['rows'] = list(rollups.values(*keys).annotate(**aggregates).order_by(field))
+    return report
+
+
+def customer_sales_report(customer_id, start_date, end_date, statuses=None, group_by=None):
+    """
+    Versão de sales_report para um cliente, lida dos pedidos e dos pedidos
+    arquivados do cliente (sem agrupamento por departamento).
+    """
+    start_date, end_date = _parse_date(start_date), _parse_date(end_date)
+    aggregates = {
+        'orders_count': Count('id'),
+        'items_quantity': Coalesce(Sum('total_quantity'), 0),
+        **{field: _sum(field) for field in ('subtotal', 'shipping_cost', 'discount', 'total_amount')},
+    }
+    field = GROUPS[group_by] if group_by else None
+    
+    totals, rows = [], []
+    for model in (Order, ArchivedOrder):
+        orders = model.objects.filter(
+            customer_id=customer_id,
+            created_at__gte=_day_start(start_date),
+            created_at__lt=_day_start(end_date + timedelta(days=1))
+        )
+        if statuses:
+            orders = orders.filter(status__in=statuses)
+        totals.append(orders.aggregate(**aggregates))
+        if group_by == 'day':
+            orders = orders.annotate(day=TruncDate('created_at'))
+        elif group_by == 'hour':
+            orders = orders.annotate(period_start=TruncHour('created_at'))
+        if field:
+            rows.extend(orders.values(field).annotate(**aggregates).order_by(field))
+    
+    report = {
+        'start_date': start_date,
+        'end_date': end_date,
+        'as_of': timezone.now(),
+        'totals': _merge(totals, (), aggregates)[0],
+    }
+    if field:
+        report['rows'] = sorted(_merge(rows, (field,), aggregates), key=lambda row: row[field])
+    return report
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Order, OrderItem
+from .models import ArchivedOrder, Order, OrderItem
+from .state_machine import TransitionError, validate_transition
 from products.serializers import ProductListSerializer
 from users.serializers import UserSerializer
 
@@ -28,17 +29,14 @@ class OrderListSerializer(serializers.ModelSerializer):
     Serializer simplificado para listagem de pedidos
     """
     customer_name = serializers.CharField(source='customer.full_name', read_only=True)
-    items_count = serializers.SerializerMethodField()
+    estimated_delivery = serializers.DateTimeField(source='delivery.estimated_delivery_date', read_only=True)
     
     class Meta:
         model = Order
         fields = [
             'id', 'order_number', 'customer_name', 'status', 'total_amount',
-            'items_count', 'created_at', 'estimated_delivery'
+            'items_count', 'total_quantity', 'created_at', 'estimated_delivery'
         ]
-    
-    def get_items_count(self, obj):
-        return obj.items.count()
 
 
 class OrderDetailSerializer(serializers.ModelSerializer):
@@ -47,13 +45,16 @@ class OrderDetailSerializer(serializers.ModelSerializer):
     """
     customer = UserSerializer(read_only=True)
     items = OrderItemSerializer(many=True, read_only=True)
+    discount_amount = serializers.DecimalField(source='discount', max_digits=10, decimal_places=2, read_only=True)
+    estimated_delivery = serializers.DateTimeField(source='delivery.estimated_delivery_date', read_only=True)
     
     class Meta:
         model = Order
         fields = [
             'id', 'order_number', 'customer', 'status', 'items',
-            'subtotal', 'shipping_cost', 'tax_amount', 'discount_amount',
-            'total_amount', 'shipping_address', 'billing_address',
+            'subtotal', 'shipping_cost', 'discount_amount',
+            'total_amount', 'items_count', 'total_quantity', 'shipping_address', 'shipping_city',
+            'shipping_state', 'shipping_postal_code',
             'payment_method', 'payment_status', 'notes',
             'created_at', 'updated_at', 'estimated_delivery'
         ]
@@ -62,6 +63,60 @@ class OrderDetailSerializer(serializers.ModelSerializer):
         ]
 
 
+class ArchivedOrderListSerializer(serializers.ModelSerializer):
+    """
+    Serializer para listagem de pedidos arquivados
+    """
+    customer_name = serializers.CharField(source='customer.full_name', read_only=True)
+    
+    class Meta:
+        model = ArchivedOrder
+        fields = [
+            'id', 'order_number', 'customer_name', 'status', 'total_amount',
+            'items_count', 'total_quantity', 'created_at', 'archived_at'
+        ]
+
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    """
+    Serializer para detalhes do pedido arquivado, lidos do documento gravado
+    no arquivamento
+    """
+    DOCUMENT_FIELDS = [
+        'shipping_address', 'shipping_city', 'shipping_state', 'shipping_postal_code',
+        'shipping_country', 'notes', 'confirmed_at', 'shipped_at', 'delivered_at'
+    ]
+    ITEM_FIELDS = ['id', 'product_id', 'product_name', 'quantity', 'unit_price', 'total_price']
+    DELIVERY_FIELDS = [
+        'tracking_code', 'status', 'estimated_delivery_date', 'actual_delivery_date',
+        'delivered_at', 'recipient_name', 'status_history'
+    ]
+    
+    discount_amount = serializers.DecimalField(source='discount', max_digits=10, decimal_places=2, read_only=True)
+    
+    class Meta:
+        model = ArchivedOrder
+        fields = [
+            'id', 'order_number', 'customer', 'status', 'subtotal', 'shipping_cost',
+            'discount_amount', 'total_amount', 'items_count', 'total_quantity',
+            'payment_method', 'payment_status', 'created_at', 'updated_at', 'archived_at'
+        ]
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        document = instance.document
+        data.update({field: document.get(field) for field in self.DOCUMENT_FIELDS})
+        data['items'] = [
+            {field: item.get(field) for field in self.ITEM_FIELDS} for item in document['items']
+        ]
+        data['status_history'] = document['status_history']
+        delivery = document.get('delivery')
+        data['delivery'] = {field: delivery.get(field) for field in self.DELIVERY_FIELDS} if delivery else None
+        data['estimated_delivery'] = delivery.get('estimated_delivery_date') if delivery else None
+        data['archived'] = True
+        return data
+
+
 class OrderCreateSerializer(serializers.ModelSerializer):
     """
     Serializer para criação de pedidos
@@ -71,73 +126,29 @@ class OrderCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = [
-            'shipping_address', 'billing_address', 'payment_method',
-            'notes', 'items'
+            'shipping_address', 'shipping_city', 'shipping_state',
+            'shipping_postal_code', 'payment_method', 'notes', 'items'
         ]
     
     def validate_items(self, value):
         if not value:
             raise serializers.ValidationError("O pedido deve ter pelo menos um item.")
         
-        # Verificar se todos os produtos existem e estão ativos
-        from products.models import Product
-        for item_data in value:
-            try:
-                product = Product.objects.get(id=item_data['product_id'])
-                if not product.is_active:
-                    raise serializers.ValidationError(
-                        f"O produto {product.name} não está disponível."
-                    )
-                
-                # Verificar estoque
-                if product.stock_quantity < item_data['quantity']:
-                    raise serializers.ValidationError(
-                        f"Estoque insuficiente para {product.name}. "
-                        f"Disponível: {product.stock_quantity}, Solicitado: {item_data['quantity']}"
-                    )
-            except Product.DoesNotExist:
-                raise serializers.ValidationError(
-                    f"Produto com ID {item_data['product_id']} não encontrado."
-                )
-        
+        # Existência, status e estoque são verificados por place_order, sob bloqueio
         return value
     
     def create(self, validated_data):
-        items_data = validated_data.pop('items')
-        
-        # Criar o pedido
-        order = Order.objects.create(
-            customer=self.context['request'].user,
-            **validated_data
-        )
+        from .services import CheckoutError, place_order
         
-        # Criar os itens do pedido
-        from products.models import Product
-        subtotal = 0
-        
-        for item_data in items_data:
-            product = Product.objects.get(id=item_data['product_id'])
-            
-            # Usar preço atual do produto (ou preço promocional se houver)
-            unit_price = product.get_discounted_price()
-            
-            order_item = OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=item_data['quantity'],
-                unit_price=unit_price
+        items_data = validated_data.pop('items')
+        try:
+            return place_order(
+                self.context['request'].user,
+                [(item_data['product_id'], item_data['quantity']) for item_data in items_data],
+                **validated_data
             )
-            
-            subtotal += order_item.quantity * order_item.unit_price
-        
-        # Calcular valores do pedido
-        order.subtotal = subtotal
-        order.shipping_cost = order.calculate_shipping_cost()
-        order.tax_amount = order.calculate_tax()
-        order.total_amount = order.subtotal + order.shipping_cost + order.tax_amount - order.discount_amount
-        order.save()
-        
-        return order
+        except CheckoutError as e:
+            raise serializers.ValidationError({'items': e.errors})
 
 
 class OrderUpdateSerializer(serializers.ModelSerializer):
@@ -155,23 +166,10 @@ class OrderUpdateSerializer(serializers.ModelSerializer):
     def validate_status(self, value):
         instance = getattr(self, 'instance', None)
         if instance:
-            current_status = instance.status
-            
-            # Regras de transição de status
-            valid_transitions = {
-                'pending': ['confirmed', 'cancelled'],
-                'confirmed': ['processing', 'cancelled'],
-                'processing': ['shipped', 'cancelled'],
-                'shipped': ['delivered', 'returned'],
-                'delivered': ['returned'],
-                'cancelled': [],  # Status final
-                'returned': []   # Status final
-            }
-            
-            if value not in valid_transitions.get(current_status, []):
-                raise serializers.ValidationError(
-                    f"Transição de status inválida: {current_status} -> {value}"
-                )
+            try:
+                validate_transition(instance.status, value)
+            except TransitionError as e:
+                raise serializers.ValidationError(str(e))
         
         return value
 
@@ -196,27 +194,29 @@ class OrderStatusUpdateSerializer(serializers.Serializer):
     def validate_status(self, value):
         order = self.context.get('order')
         if order:
-            current_status = order.status
-            
-            # Regras de transição de status
-            valid_transitions = {
-                'pending': ['confirmed', 'cancelled'],
-                'confirmed': ['processing', 'cancelled'],
-                'processing': ['shipped', 'cancelled'],
-                'shipped': ['delivered', 'returned'],
-                'delivered': ['returned'],
-                'cancelled': [],  # Status final
-                'returned': []   # Status final
-            }
-            
-            if value not in valid_transitions.get(current_status, []):
-                raise serializers.ValidationError(
-                    f"Transição de status inválida: {current_status} -> {value}"
-                )
+            try:
+                validate_transition(order.status, value)
+            except TransitionError as e:
+                raise serializers.ValidationError(str(e))
         
         return value
 
 
+class OrderBulkStatusSerializer(serializers.Serializer):
+    """
+    Serializer para atualização de status em lote (apenas admin)
+    """
+    MAX_ORDERS = 10000
+    
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_ORDERS
+    )
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    notes = serializers.CharField(max_length=500, required=False, allow_blank=True, default='')
+
+
 class OrderSearchSerializer(serializers.Serializer):
     """
     Serializer para busca de pedidos
@@ -243,10 +243,22 @@ class OrderReportSerializer(serializers.Serializer):
     """
     Serializer para relatórios de pedidos
     """
+    GROUP_BY_CHOICES = ['day', 'hour', 'status', 'payment_method', 'state', 'city', 'department']
+    
     start_date = serializers.DateField()
     end_date = serializers.DateField()
     status = serializers.CharField(required=False)
     customer = serializers.IntegerField(required=False)
+    group_by = serializers.ChoiceField(choices=GROUP_BY_CHOICES, required=False)
+    
+    def validate_status(self, value):
+        # Lista separada por vírgulas
+        statuses = [item.strip() for item in value.split(',') if item.strip()]
+        valid = dict(Order.STATUS_CHOICES)
+        invalid = [item for item in statuses if item not in valid]
+        if invalid:
+            raise serializers.ValidationError(f"Status inválido: {', '.join(invalid)}")
+        return statuses
     
     def validate(self, attrs):
         start_date = attrs.get('start_date')
@@ -257,6 +269,11 @@ class OrderReportSerializer(serializers.Serializer):
                 "A data de início deve ser anterior à data de fim."
             )
         
+        if attrs.get('customer') and attrs.get('group_by') == 'department':
+            raise serializers.ValidationError(
+                "O agrupamento por departamento não está disponível por cliente."
+            )
+        
         return attrs
 
 
@@ -264,16 +281,11 @@ class CartItemSerializer(serializers.Serializer):
     """
     Serializer para itens do carrinho (temporário)
     """
-    product_id = serializers.IntegerField()
+    product_id = serializers.IntegerField(min_value=1)
     quantity = serializers.IntegerField(min_value=1)
     
-    def validate_product_id(self, value):
-        from products.models import Product
-        try:
-            product = Product.objects.get(id=value, is_active=True)
-        except Product.DoesNotExist:
-            raise serializers.ValidationError("Produto não encontrado ou inativo.")
-        return value
+    # Existência e status dos produtos são verificados em lote por
+    # products.services.check_availability nas views que usam este serializer
 
 
 class CartSerializer(serializers.Serializer):
@@ -0,0 +1,235 @@
+"""
+Caminho de escrita do checkout.
+
+place_order grava o pedido com um número constante de consultas, independente
+da quantidade de itens: os saldos de estoque dos produtos são bloqueados em
+ordem de product_id (evitando deadlocks entre checkouts concorrentes), todos os
+itens são validados de uma vez sob o bloqueio e itens, reservas de estoque e
+histórico de status são gravados em lote.
+
+O estoque fica reservado (StockReservation) até o pagamento: confirm_payment
+converte as reservas em movimentações de saída e release_expired_reservations
+libera as vencidas, cancelando os pedidos não pagos. Pagamentos que chegam
+depois disso não baixam o estoque de um pedido cancelado: o reembolso é
+solicitado.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from products.models import Product, StockBalance, StockReservation
+from .models import Order, OrderItem, OrderStatusHistory
+from .outbox import emit, event
+from .state_machine import transition, transition_orders
+
+FREE_SHIPPING_THRESHOLD = Decimal('100.00')
+SHIPPING_COST = Decimal('15.00')
+
+
+class CheckoutError(Exception):
+    """Itens do pedido indisponíveis; errors traz uma mensagem por produto"""
+    
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(errors[0])
+
+
+def calculate_shipping_cost(subtotal):
+    """Frete fixo, grátis a partir de FREE_SHIPPING_THRESHOLD"""
+    return Decimal('0.00') if subtotal >= FREE_SHIPPING_THRESHOLD else SHIPPING_COST
+
+
+def _requested_quantities(items):
+    requested = {}
+    for product_id, quantity in items:
+        product_id = int(product_id)
+        requested[product_id] = requested.get(product_id, 0) + int(quantity)
+    return dict(sorted(requested.items()))
+
+
+def lock_balances(product_ids):
+    """
+    Bloqueia (SELECT ... FOR UPDATE) os saldos dos produtos em ordem de
+    product_id e retorna {product_id: StockBalance} com o produto carregado.
+    """
+    # Produtos que nunca tiveram movimentação também precisam de uma linha a bloquear
+    existing = Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True)
+    StockBalance.objects.bulk_create(
+        [StockBalance(product_id=product_id) for product_id in existing],
+        ignore_conflicts=True
+    )
+    balances = StockBalance.objects.select_for_update(of=('self',)).select_related('product').filter(
+        product_id__in=product_ids
+    ).order_by('product_id')
+    return {balance.product_id: balance for balance in balances}
+
+
+def validate_items(requested, balances):
+    """Mensagens de erro dos itens indisponíveis, na ordem dos produtos"""
+    errors = []
+    for product_id, quantity in requested.items():
+        balance = balances.get(product_id)
+        if balance is None:
+            errors.append(f"Produto com ID {product_id} não encontrado.")
+        elif not balance.product.is_active:
+            errors.append(f"O produto {balance.product.name} não está disponível.")
+        elif balance.available < quantity:
+            errors.append(
+                f"Estoque insuficiente para {balance.product.name}. "
+                f"Disponível: {balance.available}, Solicitado: {quantity}"
+            )
+    return errors
+
+
+def place_order(customer, items, changed_by=None, **order_data):
+    """
+    Cria o pedido para os pares (product_id, quantity) informados, reservando o
+    estoque na mesma transação. Quantidades repetidas para o mesmo produto são
+    somadas. Levanta CheckoutError se algum item estiver indisponível.
+    """
+    requested = _requested_quantities(items)
+    if not requested:
+        raise CheckoutError(["O pedido deve ter pelo menos um item."])
+    changed_by = changed_by or customer
+    
+    with transaction.atomic():
+        balances = lock_balances(requested)
+        errors = validate_items(requested, balances)
+        if errors:
+            raise CheckoutError(errors)
+        
+        lines = [
+            (balances[product_id].product, quantity, balances[product_id].product.current_price)
+            for product_id, quantity in requested.items()
+        ]
+        subtotal = sum((quantity * unit_price for _, quantity, unit_price in lines), Decimal('0.00'))
+        shipping_cost = calculate_shipping_cost(subtotal)
+        order = Order.objects.create(
+            customer=customer,
+            status='pending',
+            subtotal=subtotal,
+            shipping_cost=shipping_cost,
+            total_amount=subtotal + shipping_cost,
+            items_count=len(lines),
+            total_quantity=sum(quantity for _, quantity, _ in lines),
+            **order_data
+        )
+        
+        # bulk_create não passa por OrderItem.save()
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=product,
+                quantity=quantity,
+                unit_price=unit_price,
+                total_price=quantity * unit_price,
+                product_name=product.name,
+                product_description=product.short_description or product.description
+            )
+            for product, quantity, unit_price in lines
+        ])
+        StockReservation.reserve(order, requested)
+        OrderStatusHistory.objects.bulk_create([
+            OrderStatusHistory(order=order, status=order.status, notes='Pedido criado', changed_by=changed_by)
+        ])
+        emit(event(
+            'order.created', 'order', order.pk,
+            order_id=order.pk, customer_id=customer.pk, total_amount=str(order.total_amount)
+        ))
+    return order
+
+
+def confirm_payment(order_id, changed_by=None):
+    """
+    Pagamento aprovado: converte as reservas ativas do pedido em movimentações
+    de saída e marca o pedido como pago. Chamadas repetidas não baixam o
+    estoque novamente. Retorna quantas reservas foram convertidas.
+    
+    Pagamento tardio (reservas já liberadas por release_expired_reservations):
+    se o pedido ainda não foi cancelado, o estoque é reservado de novo sob
+    bloqueio e convertido. Se o pedido já foi cancelado, ou não há mais estoque
+    (o pedido é cancelado), ele não é marcado como pago e o reembolso do
+    pagamento é solicitado (request_refund).
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().filter(pk=order_id).first()
+        if order is None or order.payment_status == 'paid':
+            return 0
+        if order.status == 'cancelled':
+            request_refund(order_id, 'Pagamento recebido após o cancelamento do pedido')
+            return 0
+        
+        converted = StockReservation.convert([order_id], created_by=changed_by)
+        if not converted and order.stock_reservations.exists():
+            converted = _reserve_again(order, changed_by)
+            if not converted:
+                transition(order, 'cancelled', changed_by=changed_by, notes='Estoque indisponível no pagamento')
+                request_refund(order_id, 'Estoque indisponível no pagamento do pedido')
+                return 0
+        
+        Order.objects.filter(pk=order_id).update(payment_status='paid', updated_at=timezone.now())
+        emit(event('order.paid', 'order', order_id, order_id=order_id))
+    return converted
+
+
+def _reserve_again(order, changed_by=None):
+    """Reserva e converte de novo os itens de um pedido cujas reservas foram liberadas"""
+    requested = _requested_quantities(order.items.values_list('product_id', 'quantity'))
+    balances = lock_balances(requested)
+    if validate_items(requested, balances):
+        return 0
+    StockReservation.reserve(order, requested)
+    return StockReservation.convert([order.pk], created_by=changed_by)
+
+
+def request_refund(order_id, reason):
+    """
+    Solicita o reembolso integral dos pagamentos aprovados do pedido que ainda
+    não têm reembolso em andamento (PaymentRefund pendente, a ser processado
+    no gateway).
+    """
+    from payments.models import Payment, PaymentRefund
+    
+    payments = Payment.objects.filter(order_id=order_id, status='approved').exclude(
+        refunds__status__in=('pending', 'processing', 'completed')
+    )
+    for payment in payments:
+        PaymentRefund.objects.create(payment=payment, refund_type='full', amount=payment.amount, reason=reason)
+        emit(event(
+            'payment.refund_requested', 'payment', payment.pk,
+            payment_id=payment.pk, order_id=order_id, reason=reason
+        ))
+
+
+def cancel_order(order, changed_by=None, notes=''):
+    """
+    Cancela o pedido liberando as reservas ainda ativas e devolvendo ao estoque
+    os itens que já haviam sido baixados (ver state_machine.transition_orders).
+    Levanta TransitionError se o pedido não puder ser cancelado.
+    """
+    return transition(order, 'cancelled', changed_by=changed_by, notes=notes)
+
+
+def release_expired_reservations(now=None, batch_size=1000):
+    """
+    Libera em lotes as reservas vencidas e cancela os pedidos ainda pendentes
+    de pagamento. Retorna (reservas liberadas, pedidos cancelados).
+    """
+    now = now or timezone.now()
+    released = cancelled = 0
+    while True:
+        order_ids = StockReservation.release(StockReservation.objects.expired(now), now=now, limit=batch_size)
+        if not order_ids:
+            break
+        released += len(order_ids)
+        
+        with transaction.atomic():
+            expired = list(
+                Order.objects.select_for_update().filter(
+                    pk__in=set(order_ids), status='pending', payment_status='pending'
+                ).values_list('pk', flat=True)
+            )
+            expired, _ = transition_orders(expired, 'cancelled', notes='Reserva de estoque expirada', now=now)
+        cancelled += len(expired)
+    return released, cancelled
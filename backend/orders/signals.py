@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .services import confirm_payment
+
+
+@receiver(post_save, sender='payments.Payment')
+def convert_reservations_on_payment(sender, instance, **kwargs):
+    """
+    Converter as reservas de estoque do pedido quando o pagamento é aprovado
+    """
+    if instance.is_successful:
+        confirm_payment(instance.order_id)
@@ -0,0 +1,143 @@
+"""
+Máquina de estados dos pedidos.
+
+TRANSITIONS é a única tabela de transições de status válidas. transition_orders
+aplica uma transição a muitos pedidos de uma vez: os status atuais são lidos em
+lotes, as transições são validadas em memória e aplicadas com um único UPDATE
+por lote, restrito aos status de origem válidos. O histórico e os efeitos
+colaterais (no cancelamento, liberação das reservas e devolução do estoque já
+baixado) são gravados em lote, assim como os eventos order.status_changed do
+outbox.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from products.models import Stock, StockBalance, StockReservation
+from .models import Order, OrderItem, OrderStatusHistory
+from .outbox import emit, event
+
+TRANSITIONS = {
+    'pending': ('confirmed', 'cancelled'),
+    'confirmed': ('processing', 'cancelled'),
+    'processing': ('shipped', 'cancelled'),
+    'shipped': ('delivered', 'returned'),
+    'delivered': ('returned',),
+    'cancelled': (),  # Status final
+    'returned': (),  # Status final
+}
+
+BATCH_SIZE = 500
+
+
+class TransitionError(Exception):
+    """Transição de status inválida"""
+
+
+def can_transition(current, target):
+    return target in TRANSITIONS.get(current, ())
+
+
+def sources(target):
+    """Status a partir dos quais o pedido pode passar para target"""
+    return [current for current, targets in TRANSITIONS.items() if target in targets]
+
+
+def validate_transition(current, target):
+    if not can_transition(current, target):
+        raise TransitionError(f"Transição de status inválida: {current} -> {target}")
+
+
+def _return_stock(order_ids, changed_by, now):
+    """
+    Cancelamento: libera as reservas ativas dos pedidos e devolve ao estoque os
+    itens que já haviam sido baixados (reservas convertidas ou pedidos
+    anteriores às reservas).
+    """
+    StockReservation.release(StockReservation.objects.filter(order_id__in=order_ids), now=now)
+    released = set(
+        StockReservation.objects.filter(order_id__in=order_ids, status='released').values_list(
+            'order_id', 'product_id'
+        )
+    )
+    returned = [
+        (order_number, product_id, quantity)
+        for order_id, order_number, product_id, quantity in OrderItem.objects.filter(
+            order_id__in=order_ids
+        ).values_list('order_id', 'order__order_number', 'product_id', 'quantity')
+        if (order_id, product_id) not in released
+    ]
+    
+    # bulk_create não passa por Stock.save(): o saldo é aplicado em lote
+    Stock.objects.bulk_create([
+        Stock(
+            product_id=product_id,
+            quantity=quantity,
+            movement_type='in',
+            reason=f'Cancelamento - Pedido {order_number}',
+            created_by=changed_by
+        )
+        for order_number, product_id, quantity in returned
+    ])
+    deltas = defaultdict(int)
+    for _, product_id, quantity in returned:
+        deltas[product_id] += quantity
+    StockBalance.apply_deltas(deltas)
+
+
+def transition_orders(order_ids, target, changed_by=None, notes='', now=None):
+    """
+    Passa os pedidos informados para o status target. Pedidos inexistentes ou
+    cuja transição é inválida são ignorados. Retorna (ids alterados,
+    {id: mensagem de erro}).
+    """
+    if target not in TRANSITIONS:
+        raise TransitionError(f"Status inválido: {target}")
+    now = now or timezone.now()
+    order_ids = list(dict.fromkeys(int(order_id) for order_id in order_ids))
+    allowed = sources(target)
+    changed = []
+    errors = {}
+    
+    with transaction.atomic():
+        for start in range(0, len(order_ids), BATCH_SIZE):
+            batch = order_ids[start:start + BATCH_SIZE]
+            current = dict(
+                Order.objects.select_for_update().filter(pk__in=batch).values_list('pk', 'status')
+            )
+            valid = []
+            for order_id in batch:
+                if order_id not in current:
+                    errors[order_id] = f"Pedido {order_id} não encontrado."
+                elif current[order_id] in allowed:
+                    valid.append(order_id)
+                else:
+                    errors[order_id] = f"Transição de status inválida: {current[order_id]} -> {target}"
+            if not valid:
+                continue
+            
+            Order.objects.filter(pk__in=valid, status__in=allowed).update(status=target, updated_at=now)
+            OrderStatusHistory.objects.bulk_create([
+                OrderStatusHistory(order_id=order_id, status=target, notes=notes, changed_by=changed_by)
+                for order_id in valid
+            ])
+            emit(*[
+                event('order.status_changed', 'order', order_id,
+                      order_id=order_id, old_status=current[order_id], new_status=target)
+                for order_id in valid
+            ])
+            if target == 'cancelled':
+                _return_stock(valid, changed_by, now)
+            changed.extend(valid)
+    return changed, errors
+
+
+def transition(order, target, changed_by=None, notes=''):
+    """Passa um pedido para o status target, levantando TransitionError se inválido"""
+    validate_transition(order.status, target)
+    _, errors = transition_orders([order.pk], target, changed_by=changed_by, notes=notes)
+    if errors:
+        raise TransitionError(errors[order.pk])
+    order.status = target
+    return order
@@ -0,0 +1,135 @@
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def release_expired_reservations(batch_size=1000):
+    """
+    Liberar as reservas de estoque vencidas e cancelar os pedidos não pagos
+    """
+    try:
+        from orders.services import release_expired_reservations as release
+        
+        released, cancelled = release(batch_size=batch_size)
+        
+        logger.info(f"Released {released} expired stock reservations, cancelled {cancelled} orders")
+        return f"{released} reservations released, {cancelled} orders cancelled"
+        
+    except Exception as e:
+        logger.error(f"Error releasing expired stock reservations: {e}")
+        raise
+
+
+@shared_task
+def flush_carts(batch_size=500):
+    """
+    Gravar no banco os carrinhos alterados no armazenamento de carrinhos
+    """
+    try:
+        from orders.cart_store import get_cart_store
+        
+        flushed = get_cart_store().flush(batch_size=batch_size)
+        
+        logger.info(f"Flushed {flushed} carts to the database")
+        return f"{flushed} carts flushed"
+        
+    except Exception as e:
+        logger.error(f"Error flushing carts: {e}")
+        raise
+
+
+@shared_task
+def purge_idempotency_keys():
+    """
+    Remover as chaves de idempotência vencidas
+    """
+    try:
+        from django.utils import timezone
+        from orders.models import IdempotencyKey
+        
+        deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+        
+        logger.info(f"Purged {deleted} expired idempotency keys")
+        return f"{deleted} idempotency keys purged"
+        
+    except Exception as e:
+        logger.error(f"Error purging idempotency keys: {e}")
+        raise
+
+
+
+@shared_task
+def relay_outbox_events(batch_size=None):
+    """
+    Publicar no Celery os eventos pendentes do outbox
+    """
+    try:
+        from orders.outbox import relay
+        
+        metrics = relay(batch_size=batch_size)
+        
+        logger.info(
+            f"Published {metrics['published']} outbox events (max lag {metrics['max_lag_seconds']}s)"
+        )
+        return f"{metrics['published']} outbox events published"
+        
+    except Exception as e:
+        logger.error(f"Error relaying outbox events: {e}")
+        raise
+
+
+@shared_task
+def purge_outbox_events():
+    """
+    Remover os eventos do outbox já publicados
+    """
+    try:
+        from orders.outbox import purge_published
+        
+        deleted = purge_published()
+        
+        logger.info(f"Purged {deleted} published outbox events")
+        return f"{deleted} outbox events purged"
+        
+    except Exception as e:
+        logger.error(f"Error purging outbox events: {e}")
+        raise
+
+
+@shared_task
+def update_sales_rollups():
+    """
+    Atualizar os consolidados de vendas com os pedidos alterados desde a
+    última execução
+    """
+    try:
+        from orders.rollups import update_sales_rollups as update
+        
+        hours = update()
+        
+        logger.info(f"Sales rollups updated: {hours} hours refreshed")
+        return f"{hours} sales rollup hours refreshed"
+        
+    except Exception as e:
+        logger.error(f"Error updating sales rollups: {e}")
+        raise
+
+
+@shared_task
+def archive_orders(batch_size=500):
+    """
+    Mover os pedidos encerrados antigos para o arquivo (ver orders.archive)
+    """
+    try:
+        from orders.archive import archive_orders as archive
+        
+        archived = archive(batch_size=batch_size)
+        
+        logger.info(f"Archived {archived} closed orders")
+        return f"{archived} orders archived"
+        
+    except Exception as e:
+        logger.error(f"Error archiving orders: {e}")
+        raise
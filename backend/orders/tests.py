@@ -1,13 +1,38 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock, skipUnless
+from django.test import TestCase, override_settings
+from django.conf import settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
 from rest_framework.test import APITestCase
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.utils import timezone
+from datetime import datetime, timedelta
 from decimal import Decimal
-from .models import Order, OrderItem, Cart, CartItem
-from products.models import Department, Product, Stock
-from coupons.models import Coupon
+from .models import (
+    ArchivedCouponUsage, ArchivedOrder, Order, OrderItem, Cart, CartItem, IdempotencyKey, OutboxDelivery, OutboxEvent,
+    SalesRollup, DepartmentSalesRollup
+)
+from .archive import archive_orders
+from .outbox import first_delivery, relay
+from .rollups import backfill, sales_report, update_sales_rollups
+from .cart_store import DatabaseCartStore, get_cart_store, get_redis_client, persist_carts, price_items
+from .services import CheckoutError, confirm_payment, place_order, release_expired_reservations
+from .state_machine import transition_orders
+from products.models import Department, Product, Stock, StockBalance, StockReservation
+from payments.models import Payment, PaymentMethod
+from coupons.models import Coupon, CouponUsage
+from deliveries.models import Delivery, DeliveryStatusHistory
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
 
 User = get_user_model()
 
@@ -135,3 +160,1342 @@ class OrderModelTest(TestCase):
         
         expected = f"Pedido {order.order_number} - {self.customer.full_name}"
         self.assertEqual(str(order), expected)
+
+
+class CartAPITest(APITestCase):
+    """Testes para as operações de carrinho"""
+    
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass123',
+            full_name='Customer User',
+            cpf_cnpj='12345678901'
+        )
+        self.client.force_authenticate(user=self.customer)
+        
+        self.department = Department.objects.create(
+            name='Eletrônicos',
+            slug='eletronicos'
+        )
+        
+        self.product = Product.objects.create(
+            name='Smartphone X',
+            description='Um smartphone avançado',
+            slug='smartphone-x',
+            department=self.department,
+            price=Decimal('120.00')
+        )
+        
+        Stock.objects.create(
+            product=self.product,
+            quantity=5,
+            movement_type='in',
+            reason='Estoque inicial'
+        )
+    
+    def test_add_to_cart_checks_stock(self):
+        """Teste de adição ao carrinho respeitando o estoque"""
+        response = self.client.post('/api/orders/cart/add/', {'product_id': self.product.id, 'quantity': 3}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        response = self.client.post('/api/orders/cart/add/', {'product_id': self.product.id, 'quantity': 3}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(CartItem.objects.get(cart__customer=self.customer).quantity, 3)
+    
+    def test_cart_rejects_invalid_input(self):
+        """Teste de product_id e quantity inválidos (400, sem alterar o carrinho)"""
+        self.client.post('/api/orders/cart/add/', {'product_id': self.product.id, 'quantity': 2}, format='json')
+        for data in (
+            {'product_id': 'abc', 'quantity': 1},
+            {'product_id': self.product.id, 'quantity': 'x'},
+            {'product_id': self.product.id, 'quantity': 0},
+            {'product_id': self.product.id, 'quantity': -2},
+            {'quantity': 1},
+        ):
+            response = self.client.post('/api/orders/cart/add/', data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = self.client.patch('/api/orders/cart/update/', {'product_id': 'abc', 'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.delete('/api/orders/cart/remove/', {'product_id': 'abc'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(CartItem.objects.get(cart__customer=self.customer).quantity, 2)
+    
+    def test_calculate_cart_total(self):
+        """Teste do cálculo do total do carrinho"""
+        response = self.client.post(
+            '/api/orders/cart/calculate/',
+            {'items': [{'product_id': self.product.id, 'quantity': 2}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['subtotal'], 240.0)
+        
+        response = self.client.post(
+            '/api/orders/cart/calculate/',
+            {'items': [{'product_id': self.product.id, 'quantity': 6}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class OrderQueryCountTest(APITestCase):
+    """Testes de quantidade fixa de consultas nos endpoints de pedidos"""
+    
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass123',
+            full_name='Customer User',
+            cpf_cnpj='12345678901'
+        )
+        self.client.force_authenticate(user=self.customer)
+        
+        self.department = Department.objects.create(name='Eletrônicos', slug='eletronicos')
+        self.products = [
+            Product.objects.create(
+                name=f'Produto {index}',
+                description='Descrição',
+                slug=f'produto-{index}',
+                department=self.department,
+                price=Decimal('10.00')
+            )
+            for index in range(30)
+        ]
+        for product in self.products:
+            Stock.objects.create(product=product, quantity=10, movement_type='in', reason='Compra')
+    
+    def create_order(self, items_count):
+        order = Order.objects.create(
+            customer=self.customer,
+            payment_method='pix',
+            subtotal=Decimal('10.00') * items_count,
+            total_amount=Decimal('10.00') * items_count,
+            items_count=items_count,
+            total_quantity=items_count,
+            shipping_address='Rua A, 1',
+            shipping_city='São Paulo',
+            shipping_state='SP',
+            shipping_postal_code='01000-000'
+        )
+        for product in self.products[:items_count]:
+            OrderItem.objects.create(order=order, product=product, quantity=1, unit_price=product.price)
+        return order
+    
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+    
+    def test_order_list_query_count_is_constant(self):
+        """Teste da listagem de pedidos independente da quantidade de pedidos"""
+        self.create_order(1)
+        baseline = self.count_queries('/api/orders/')
+        
+        for items_count in range(2, 7):
+            self.create_order(items_count)
+        self.assertEqual(self.count_queries('/api/orders/'), baseline)
+        self.assertLessEqual(baseline, 3)
+    
+    def test_order_list_uses_summary_columns(self):
+        """Teste da listagem de pedidos com o resumo gravado no pedido"""
+        self.create_order(3)
+        response = self.client.get('/api/orders/')
+        order = response.data['results'][0] if 'results' in response.data else response.data[0]
+        self.assertEqual(order['items_count'], 3)
+        self.assertEqual(order['total_quantity'], 3)
+        self.assertEqual(Decimal(order['total_amount']), Decimal('30.00'))
+    
+    def test_check_order_summaries_command(self):
+        """Teste do comando que verifica e corrige o resumo dos pedidos"""
+        order = self.create_order(3)
+        self.create_order(2)
+        Order.objects.filter(pk=order.pk).update(items_count=1, total_quantity=7)
+        
+        output = StringIO()
+        call_command('check_order_summaries', stdout=output)
+        self.assertIn(f'Pedido {order.pk}', output.getvalue())
+        order.refresh_from_db()
+        self.assertEqual((order.items_count, order.total_quantity), (1, 7))
+        
+        call_command('check_order_summaries', '--fix', '--batch-size', '1', stdout=StringIO())
+        order.refresh_from_db()
+        self.assertEqual((order.items_count, order.total_quantity), (3, 3))
+        
+        output = StringIO()
+        call_command('check_order_summaries', stdout=output)
+        self.assertIn('nenhum resumo divergente', output.getvalue())
+    
+    def test_order_detail_query_count_is_constant(self):
+        """Teste do detalhe do pedido independente da quantidade de itens"""
+        small = self.create_order(2)
+        large = self.create_order(30)
+        
+        baseline = self.count_queries(f'/api/orders/{small.id}/')
+        self.assertEqual(self.count_queries(f'/api/orders/{large.id}/'), baseline)
+        self.assertLessEqual(baseline, 4)
+
+
+class CheckoutTest(APITestCase):
+    """Testes do caminho de escrita do checkout"""
+    
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass123',
+            full_name='Customer User',
+            cpf_cnpj='12345678901',
+            user_type='customer'
+        )
+        self.client.force_authenticate(user=self.customer)
+        
+        self.department = Department.objects.create(name='Eletrônicos', slug='eletronicos')
+        self.products = [
+            Product.objects.create(
+                name=f'Produto {index}',
+                description='Descrição',
+                slug=f'produto-{index}',
+                department=self.department,
+                price=Decimal('10.00')
+            )
+            for index in range(20)
+        ]
+        for product in self.products:
+            Stock.objects.create(product=product, quantity=5, movement_type='in', reason='Compra')
+        self.cart = Cart.objects.create(customer=self.customer)
+        self.shipping = {
+            'payment_method': 'pix',
+            'shipping_address': 'Rua A, 1',
+            'shipping_city': 'São Paulo',
+            'shipping_state': 'SP',
+            'shipping_postal_code': '01000-000'
+        }
+    
+    def fill_cart(self, products, quantity=2):
+        self.cart.items.all().delete()
+        for product in products:
+            CartItem.objects.create(cart=self.cart, product=product, quantity=quantity)
+    
+    def checkout(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/orders/checkout/', self.shipping, format='json')
+    
+    def test_checkout_creates_order_and_reserves_stock(self):
+        """Teste do checkout gravando itens, reservas e histórico"""
+        self.fill_cart(self.products[:3])
+        response = self.checkout()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        order = Order.objects.get()
+        self.assertEqual(order.items.count(), 3)
+        self.assertEqual(order.subtotal, Decimal('60.00'))
+        self.assertEqual(order.total_amount, Decimal('75.00'))
+        self.assertEqual((order.items_count, order.total_quantity), (3, 6))
+        self.assertEqual(order.items.first().total_price, Decimal('20.00'))
+        self.assertEqual(order.status_history.get().status, 'pending')
+        self.assertEqual(order.stock_reservations.filter(status='active').count(), 3)
+        self.assertFalse(Stock.objects.filter(movement_type='out').exists())
+        balance = StockBalance.objects.get(product=self.products[0])
+        self.assertEqual((balance.quantity, balance.reserved, balance.available), (5, 2, 3))
+        self.assertFalse(self.cart.items.exists())
+    
+    def test_checkout_rejects_unavailable_items(self):
+        """Teste do checkout sem estoque suficiente"""
+        self.fill_cart(self.products[:2], quantity=6)
+        response = self.checkout()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(response.data['errors']), 2)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(StockBalance.objects.get(product=self.products[0]).quantity, 5)
+        self.assertEqual(self.cart.items.count(), 2)
+    
+    def test_place_order_query_count_is_constant(self):
+        """Teste do checkout independente da quantidade de itens"""
+        customer = self.customer
+        with CaptureQueriesContext(connection) as small:
+            place_order(customer, [(self.products[0].pk, 1)], **self.shipping)
+        with CaptureQueriesContext(connection) as large:
+            place_order(customer, [(product.pk, 1) for product in self.products[1:]], **self.shipping)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+    
+    def test_checkout_does_not_lock_departments(self):
+        """Teste da versão do catálogo avançada apenas após o commit do checkout"""
+        version = Department.catalog_version(self.department.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            with CaptureQueriesContext(connection) as context:
+                place_order(self.customer, [(self.products[0].pk, 1)], **self.shipping)
+        self.assertFalse([
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('UPDATE "products_department"')
+        ])
+        self.assertEqual(Department.catalog_version(self.department.pk), version)
+        
+        for callback in callbacks:
+            callback()
+        self.assertGreater(Department.catalog_version(self.department.pk), version)
+    
+    def test_place_order_sums_repeated_products(self):
+        """Teste de quantidades repetidas e produto inexistente"""
+        product = self.products[0]
+        order = place_order(self.customer, [(product.pk, 2), (product.pk, 3)], **self.shipping)
+        self.assertEqual(order.items.get().quantity, 5)
+        self.assertEqual(StockBalance.objects.get(product=product).available, 0)
+        
+        with self.assertRaises(CheckoutError) as context:
+            place_order(self.customer, [(product.pk, 1), (999999, 1)], **self.shipping)
+        self.assertEqual(len(context.exception.errors), 2)
+    
+    def test_order_create_endpoint_uses_checkout_service(self):
+        """Teste da criação de pedido pela API baixando o estoque uma única vez"""
+        response = self.client.post('/api/orders/create/', {
+            **self.shipping,
+            'items': [{'product_id': self.products[0].pk, 'quantity': 2}]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(StockBalance.objects.get(product=self.products[0]).available, 3)
+        
+        response = self.client.post('/api/orders/create/', {
+            **self.shipping,
+            'items': [{'product_id': self.products[0].pk, 'quantity': 4}]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('items', response.data)
+
+
+class StockReservationTest(APITestCase):
+    """Testes das reservas de estoque de pedidos aguardando pagamento"""
+    
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass123',
+            full_name='Customer User',
+            cpf_cnpj='12345678901',
+            user_type='customer'
+        )
+        self.client.force_authenticate(user=self.customer)
+        
+        department = Department.objects.create(name='Eletrônicos', slug='eletronicos')
+        self.product = Product.objects.create(
+            name='Produto', description='Descrição', slug='produto', department=department, price=Decimal('10.00')
+        )
+        Stock.objects.create(product=self.product, quantity=5, movement_type='in', reason='Compra')
+        self.order = place_order(
+            self.customer, [(self.product.pk, 4)], payment_method='pix', shipping_address='Rua A, 1',
+            shipping_city='São Paulo', shipping_state='SP', shipping_postal_code='01000-000'
+        )
+    
+    def balance(self):
+        balance = StockBalance.objects.get(product=self.product)
+        return balance.quantity, balance.reserved
+    
+    def test_reservation_reduces_availability(self):
+        """Teste da disponibilidade descontando as reservas ativas"""
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.available_quantity, 1)
+        self.assertEqual(self.product.facet.in_stock, True)
+        
+        response = self.client.post('/api/orders/cart/add/', {'product_id': self.product.id, 'quantity': 2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.assertRaises(CheckoutError):
+            place_order(self.customer, [(self.product.pk, 2)], payment_method='pix')
+    
+    def test_payment_converts_reservations(self):
+        """Teste da conversão das reservas em saída com o pagamento aprovado"""
+        method = PaymentMethod.objects.create(name='PIX', method_type='pix')
+        Payment.objects.create(
+            order=self.order, payment_method=method, amount=self.order.total_amount, status='approved'
+        )
+        
+        self.assertEqual(self.balance(), (1, 0))
+        self.assertEqual(StockReservation.objects.get().status, 'converted')
+        self.assertEqual(Stock.ledger_balances([self.product.pk]), {self.product.pk: 1})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_status, 'paid')
+        
+        # Confirmações repetidas não baixam o estoque novamente
+        self.assertEqual(confirm_payment(self.order.pk), 0)
+        self.assertEqual(self.balance(), (1, 0))
+    
+    def test_payment_task_converts_reservations(self):
+        """Teste do processamento do pagamento de ponta a ponta baixando o estoque"""
+        from ecommerce_saas.tasks import process_payment_task
+        method = PaymentMethod.objects.create(name='PIX', method_type='pix')
+        payment = Payment.objects.create(order=self.order, payment_method=method, amount=self.order.total_amount)
+        self.assertEqual(self.balance(), (5, 4))
+        
+        process_payment_task.apply(args=(payment.pk,)).get()
+        
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'approved')
+        self.assertEqual(self.balance(), (1, 0))
+        self.assertEqual(StockReservation.objects.get().status, 'converted')
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.payment_status), ('confirmed', 'paid'))
+    
+    def test_late_payment_after_cancellation_requests_refund(self):
+        """Teste do pagamento (PIX) recebido depois do cancelamento por expiração"""
+        later = timezone.now() + timedelta(minutes=31)
+        self.assertEqual(release_expired_reservations(later), (1, 1))
+        
+        method = PaymentMethod.objects.create(name='PIX', method_type='pix')
+        payment = Payment.objects.create(
+            order=self.order, payment_method=method, amount=self.order.total_amount, status='approved'
+        )
+        self.assertEqual(self.balance(), (5, 0))
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.payment_status), ('cancelled', 'pending'))
+        refund = payment.refunds.get()
+        self.assertEqual((refund.status, refund.amount), ('pending', payment.amount))
+        self.assertTrue(OutboxEvent.objects.filter(event_type='payment.refund_requested').exists())
+        
+        # Novas confirmações não duplicam o reembolso
+        payment.save()
+        self.assertEqual(payment.refunds.count(), 1)
+    
+    def test_late_payment_before_cancellation_reserves_again(self):
+        """Teste do pagamento entre a liberação das reservas e o cancelamento do pedido"""
+        StockReservation.release(StockReservation.objects.filter(order=self.order))
+        self.assertEqual(self.balance(), (5, 0))
+        
+        self.assertEqual(confirm_payment(self.order.pk), 1)
+        self.assertEqual(self.balance(), (1, 0))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_status, 'paid')
+        # O pedido pago não é cancelado pela varredura
+        self.assertEqual(release_expired_reservations(timezone.now() + timedelta(minutes=31)), (0, 0))
+        
+        # Sem estoque para reservar de novo: pedido cancelado e reembolso solicitado
+        other = place_order(self.customer, [(self.product.pk, 1)], payment_method='pix')
+        StockReservation.release(StockReservation.objects.filter(order=other))
+        Stock.objects.create(product=self.product, quantity=1, movement_type='out', reason='Perda')
+        method = PaymentMethod.objects.create(name='PIX', method_type='pix')
+        payment = Payment.objects.create(order=other, payment_method=method, amount=other.total_amount, status='approved')
+        other.refresh_from_db()
+        self.assertEqual((other.status, other.payment_status), ('cancelled', 'pending'))
+        self.assertEqual(payment.refunds.count(), 1)
+        self.assertEqual(self.balance(), (0, 0))
+    
+    def test_expired_reservations_are_released(self):
+        """Teste da liberação das reservas vencidas e cancelamento do pedido"""
+        self.assertEqual(release_expired_reservations(timezone.now()), (0, 0))
+        
+        later = timezone.now() + timedelta(minutes=31)
+        self.assertEqual(release_expired_reservations(later), (1, 1))
+        self.assertEqual(self.balance(), (5, 0))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'cancelled')
+        self.assertEqual(self.order.status_history.first().status, 'cancelled')
+        self.assertEqual(release_expired_reservations(later), (0, 0))
+        
+        # Pagamento após a expiração não baixa o estoque
+        self.assertEqual(confirm_payment(self.order.pk), 0)
+        self.assertEqual(self.balance(), (5, 0))
+    
+    def test_cancel_order_releases_or_returns_stock(self):
+        """Teste do cancelamento liberando reservas ou devolvendo o estoque baixado"""
+        response = self.client.post(f'/api/orders/{self.order.id}/cancel/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.balance(), (5, 0))
+        self.assertFalse(Stock.objects.filter(movement_type='in', reason__startswith='Cancelamento').exists())
+        
+        paid = place_order(self.customer, [(self.product.pk, 3)], payment_method='pix')
+        confirm_payment(paid.pk)
+        self.assertEqual(self.balance(), (2, 0))
+        response = self.client.post(f'/api/orders/{paid.id}/cancel/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.balance(), (5, 0))
+        self.assertEqual(Stock.ledger_balances([self.product.pk]), {self.product.pk: 5})
+
+
+class OrderStateMachineTest(APITestCase):
+    """Testes da máquina de estados e da atualização de status em lote"""
+    
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass123',
+            full_name='Customer User',
+            cpf_cnpj='12345678901',
+            user_type='customer'
+        )
+        self.admin = User.objects.create_user(
+            email='admin@example.com',
+            password='testpass123',
+            full_name='Admin User',
+            cpf_cnpj='12345678902',
+            user_type='admin'
+        )
+        self.client.force_authenticate(user=self.admin)
+        
+        department = Department.objects.create(name='Eletrônicos', slug='eletronicos')
+        self.product = Product.objects.create(
+            name='Produto', description='Descrição', slug='produto', department=department, price=Decimal('10.00')
+        )
+        Stock.objects.create(product=self.product, quantity=100, movement_type='in', reason='Compra')
+    
+    def create_orders(self, count):
+        return [
+            place_order(self.customer, [(self.product.pk, 2)], payment_method='pix')
+            for _ in range(count)
+        ]
+    
+    def bulk_status(self, order_ids, new_status):
+        return self.client.post(
+            '/api/orders/bulk-status/', {'order_ids': order_ids, 'status': new_status}, format='json'
+        )
+    
+    def balance(self):
+        balance = StockBalance.objects.get(product=self.product)
+        return balance.quantity, balance.reserved
+    
+    def test_bulk_status_applies_valid_transitions(self):
+        """Teste da transição em lote com pedidos inválidos ou inexistentes"""
+        orders = self.create_orders(3)
+        Order.objects.filter(pk=orders[2].pk).update(status='cancelled')
+        
+        response = self.bulk_status([order.pk for order in orders] + [9999], 'confirmed')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(set(response.data['errors']), {orders[2].pk, 9999})
+        self.assertEqual(
+            list(Order.objects.order_by('pk').values_list('status', flat=True)),
+            ['confirmed', 'confirmed', 'cancelled']
+        )
+        self.assertEqual(orders[0].status_history.filter(status='confirmed').get().changed_by, self.admin)
+        
+        response = self.bulk_status([orders[0].pk], 'delivered')
+        self.assertEqual(response.data['updated'], 0)
+        self.assertIn('confirmed -> delivered', response.data['errors'][orders[0].pk])
+    
+    def test_bulk_cancel_returns_stock(self):
+        """Teste do cancelamento em lote liberando reservas e devolvendo o estoque baixado"""
+        pending, paid = self.create_orders(2)
+        confirm_payment(paid.pk)
+        self.assertEqual(self.balance(), (98, 2))
+        
+        response = self.bulk_status([pending.pk, paid.pk], 'cancelled')
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(self.balance(), (100, 0))
+        self.assertEqual(Stock.ledger_balances([self.product.pk]), {self.product.pk: 100})
+        self.assertEqual(StockReservation.objects.filter(status='active').count(), 0)
+    
+    def test_bulk_status_query_count_is_constant(self):
+        """Teste da transição em lote independente da quantidade de pedidos"""
+        def count_queries(order_ids):
+            with CaptureQueriesContext(connection) as context:
+                response = self.bulk_status(order_ids, 'cancelled')
+            self.assertEqual(response.data['updated'], len(order_ids))
+            return len(context.captured_queries)
+        
+        baseline = count_queries([order.pk for order in self.create_orders(2)])
+        self.assertEqual(count_queries([order.pk for order in self.create_orders(10)]), baseline)
+    
+    def test_bulk_status_requires_admin(self):
+        """Teste da atualização em lote restrita a administradores"""
+        order, = self.create_orders(1)
+        self.client.force_authenticate(user=self.customer)
+        response = self.bulk_status([order.pk], 'confirmed')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_admin_status_actions_use_state_machine(self):
+        """Teste das ações de status do admin com status, valores e itens somente leitura"""
+        pending, delivered = self.create_orders(2)
+        Order.objects.filter(pk=delivered.pk).update(status='delivered')
+        superuser = User.objects.create_superuser(
+            email='root@example.com', password='testpass123', full_name='Root', cpf_cnpj='12345678903'
+        )
+        self.client.force_login(superuser)
+        
+        response = self.client.get(f'/admin/orders/order/{pending.pk}/change/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        form = response.context['adminform'].form
+        self.assertFalse({'status', 'payment_status', 'total_amount', 'subtotal'} & set(form.fields))
+        formset = response.context['inline_admin_formsets'][0]
+        self.assertFalse(formset.has_add_permission or formset.has_change_permission or formset.has_delete_permission)
+        
+        response = self.client.post('/admin/orders/order/', {
+            'action': 'mark_cancelled', '_selected_action': [pending.pk, delivered.pk]
+        })
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(
+            dict(Order.objects.values_list('pk', 'status')), {pending.pk: 'cancelled', delivered.pk: 'delivered'}
+        )
+        self.assertEqual(pending.status_history.filter(status='cancelled').get().changed_by, superuser)
+        self.assertEqual(self.balance(), (100, 2))
+    
+    def test_shipped_order_cannot_be_cancelled(self):
+        """Teste do cancelamento seguindo a tabela de transições"""
+        order, = self.create_orders(1)
+        Order.objects.filter(pk=order.pk).update(status='shipped')
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.post(f'/api/orders/{order.id}/cancel/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CartStoreTest(APITestCase):
+    """Testes dos armazenamentos de carrinho"""
+    
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass123',
+            full_name='Customer User',
+            cpf_cnpj='12345678901',
+            user_type='customer'
+        )
+        self.client.force_authenticate(user=self.customer)
+        
+        department = Department.objects.create(name='Eletrônicos', slug='eletronicos')
+        self.products = [
+            Product.objects.create(
+                name=f'Produto {index}', description='Descrição', slug=f'produto-{index}',
+                department=department, price=Decimal('10.00')
+            )
+            for index in range(10)
+        ]
+        for product in self.products:
+            Stock.objects.create(product=product, quantity=5, movement_type='in', reason='Compra')
+    
+    def cart_items(self):
+        return dict(CartItem.objects.filter(cart__customer=self.customer).values_list('product_id', 'quantity'))
+    
+    def test_database_store_summary(self):
+        """Teste do resumo com preços em uma única consulta"""
+        store = DatabaseCartStore()
+        store.add(self.customer.pk, self.products[0].pk, 2)
+        store.add(self.customer.pk, self.products[0].pk, 1)
+        self.assertTrue(store.set(self.customer.pk, self.products[0].pk, 4))
+        self.assertFalse(store.set(self.customer.pk, self.products[1].pk, 1))
+        for product in self.products[1:]:
+            store.add(self.customer.pk, product.pk, 1)
+        
+        items = store.items(self.customer.pk)
+        with self.assertNumQueries(1):
+            summary = price_items(items)
+        self.assertEqual(summary['total_items'], 13)
+        self.assertEqual(summary['subtotal'], '130.00')
+        self.assertEqual(Cart.objects.get(customer=self.customer).total_price, Decimal('130.00'))
+        
+        self.assertTrue(store.remove(self.customer.pk, self.products[0].pk))
+        store.clear(self.customer.pk)
+        self.assertEqual(self.cart_items(), {})
+    
+    def test_persist_carts(self):
+        """Teste da gravação em lote dos carrinhos no banco"""
+        first, second = self.products[0].pk, self.products[1].pk
+        persist_carts({self.customer.pk: {first: 2, 999999: 1}})
+        self.assertEqual(self.cart_items(), {first: 2})
+        
+        persist_carts({self.customer.pk: {first: 3, second: 1}})
+        self.assertEqual(self.cart_items(), {first: 3, second: 1})
+        
+        persist_carts({self.customer.pk: {}})
+        self.assertEqual(self.cart_items(), {})
+        self.assertEqual(Cart.objects.count(), 1)
+
+
+@skipUnless(fakeredis, 'fakeredis não instalado')
+@override_settings(CART_STORE_BACKEND='redis', CART_REDIS_URL='fakeredis://')
+class RedisCartStoreTest(APITestCase):
+    """Testes do armazenamento de carrinhos no Redis (fakeredis)"""
+    
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass123',
+            full_name='Customer User',
+            cpf_cnpj='12345678901',
+            user_type='customer'
+        )
+        self.client.force_authenticate(user=self.customer)
+        
+        department = Department.objects.create(name='Eletrônicos', slug='eletronicos')
+        self.products = [
+            Product.objects.create(
+                name=f'Produto {index}', description='Descrição', slug=f'produto-{index}',
+                department=department, price=Decimal('10.00')
+            )
+            for index in range(10)
+        ]
+        for product in self.products:
+            Stock.objects.create(product=product, quantity=5, movement_type='in', reason='Compra')
+        get_redis_client().flushall()
+    
+    def cart_items(self):
+        return dict(CartItem.objects.filter(cart__customer=self.customer).values_list('product_id', 'quantity'))
+    
+    def test_cart_mutations_are_written_behind(self):
+        """Teste das alterações no Redis gravadas no banco em segundo plano"""
+        first, second = self.products[0].pk, self.products[1].pk
+        response = self.client.post('/api/orders/cart/add/', {'product_id': first, 'quantity': 2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.client.post('/api/orders/cart/add/', {'product_id': second, 'quantity': 1}, format='json')
+        response = self.client.patch('/api/orders/cart/update/', {'product_id': first, 'quantity': 3}, format='json')
+        self.assertEqual(response.data['cart']['total_items'], 4)
+        self.assertEqual(self.cart_items(), {})
+        
+        store = get_cart_store()
+        self.assertEqual(store.flush(), 1)
+        self.assertEqual(self.cart_items(), {first: 3, second: 1})
+        self.assertEqual(store.flush(), 0)
+        
+        self.client.delete('/api/orders/cart/remove/', {'product_id': second}, format='json')
+        store.flush()
+        self.assertEqual(self.cart_items(), {first: 3})
+    
+    def test_summary_is_cached(self):
+        """Teste do resumo com preços servido do cache até a próxima alteração"""
+        store = get_cart_store()
+        store.add(self.customer.pk, self.products[0].pk, 2)
+        self.assertEqual(store.summary(self.customer.pk)['subtotal'], '20.00')
+        with self.assertNumQueries(0):
+            store.summary(self.customer.pk)
+        
+        store.add(self.customer.pk, self.products[0].pk, 1)
+        self.assertEqual(store.summary(self.customer.pk)['subtotal'], '30.00')
+    
+    def test_checkout_flushes_cart(self):
+        """Teste do checkout lendo o carrinho do Redis e gravando-o no banco"""
+        self.client.post('/api/orders/cart/add/', {'product_id': self.products[0].pk, 'quantity': 2}, format='json')
+        get_cart_store().flush()
+        
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/orders/checkout/', {
+                'payment_method': 'pix', 'shipping_address': 'Rua A, 1', 'shipping_city': 'São Paulo',
+                'shipping_state': 'SP', 'shipping_postal_code': '01000-000'
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.get().items.get().quantity, 2)
+        # O carrinho só é limpo depois do commit
+        self.assertEqual(get_cart_store().items(self.customer.pk), {self.products[0].pk: 2})
+        
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_cart_store().items(self.customer.pk), {})
+        self.assertEqual(self.cart_items(), {})
+    
+    def test_failed_flush_keeps_carts_dirty(self):
+        """Teste do lote devolvido ao conjunto de pendentes quando a gravação falha"""
+        store = get_cart_store()
+        store.add(self.customer.pk, self.products[0].pk, 2)
+        
+        with mock.patch('orders.cart_store.persist_carts', side_effect=RuntimeError('banco indisponível')):
+            with self.assertRaises(RuntimeError):
+                store.flush()
+        self.assertEqual(self.cart_items(), {})
+        
+        self.assertEqual(store.flush(), 1)
+        self.assertEqual(self.cart_items(), {self.products[0].pk: 2})
+
+
+class IdempotencyKeyTest(APITestCase):
+    """Testes do cabeçalho Idempotency-Key no checkout e na criação de pedidos"""
+    
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass123',
+            full_name='Customer User',
+            cpf_cnpj='12345678901',
+            user_type='customer'
+        )
+        self.client.force_authenticate(user=self.customer)
+        
+        department = Department.objects.create(name='Eletrônicos', slug='eletronicos')
+        self.product = Product.objects.create(
+            name='Produto', description='Descrição', slug='produto', department=department, price=Decimal('10.00')
+        )
+        Stock.objects.create(product=self.product, quantity=5, movement_type='in', reason='Compra')
+        self.payload = {
+            'payment_method': 'pix',
+            'shipping_address': 'Rua A, 1',
+            'shipping_city': 'São Paulo',
+            'shipping_state': 'SP',
+            'shipping_postal_code': '01000-000',
+            'items': [{'product_id': self.product.pk, 'quantity': 2}]
+        }
+    
+    def create_order(self, key, payload=None):
+        return self.client.post(
+            '/api/orders/create/', payload or self.payload, format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+    
+    def test_replay_returns_stored_response(self):
+        """Teste da repetição devolvendo a resposta gravada sem criar outro pedido"""
+        first = self.create_order('chave-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        
+        with self.assertNumQueries(0):
+            replay = self.create_order('chave-1')
+        self.assertEqual(replay.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(StockBalance.objects.get(product=self.product).available, 3)
+        
+        # Sem o cache, a resposta é lida do banco
+        cache.clear()
+        self.assertEqual(self.create_order('chave-1').json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+        
+        # Outra chave cria outro pedido
+        self.assertEqual(self.create_order('chave-2').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 2)
+    
+    def test_key_reused_with_other_request(self):
+        """Teste da mesma chave com outro corpo de requisição"""
+        self.create_order('chave-1')
+        response = self.create_order('chave-1', {**self.payload, 'notes': 'outra'})
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Order.objects.count(), 1)
+    
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0.2)
+    def test_in_flight_duplicate_conflicts(self):
+        """Teste da repetição concorrente sem resultado dentro da espera"""
+        self.create_order('chave-1')
+        entry = IdempotencyKey.objects.get()
+        IdempotencyKey.objects.filter(pk=entry.pk).update(status_code=None, response_body=None)
+        cache.clear()
+        
+        response = self.create_order('chave-1')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Order.objects.count(), 1)
+    
+    def test_response_stored_in_view_transaction(self):
+        """Teste do pedido desfeito quando a resposta não pode ser gravada"""
+        with mock.patch('orders.idempotency.JSONRenderer.render', side_effect=RuntimeError('falha')):
+            with self.assertRaises(RuntimeError):
+                self.create_order('chave-1')
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(StockBalance.objects.get(product=self.product).available, 5)
+        
+        self.assertEqual(self.create_order('chave-1').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 1)
+    
+    def test_stale_claim_is_taken_over(self):
+        """Teste da chave abandonada em andamento assumida pela repetição"""
+        self.create_order('chave-1')
+        Order.objects.all().delete()
+        stale = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS + 1)
+        IdempotencyKey.objects.update(status_code=None, response_body=None, claimed_at=stale)
+        cache.clear()
+        
+        response = self.create_order('chave-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 1)
+        entry = IdempotencyKey.objects.get()
+        self.assertEqual(entry.status_code, status.HTTP_201_CREATED)
+        self.assertGreater(entry.claimed_at, stale)
+    
+    def test_taken_over_execution_does_not_commit(self):
+        """Teste da execução antiga que termina depois de a chave ser assumida"""
+        from rest_framework.renderers import JSONRenderer
+        render = JSONRenderer.render
+        
+        def taken_over(renderer, data, *args, **kwargs):
+            IdempotencyKey.objects.update(claimed_at=timezone.now() + timedelta(seconds=1))
+            return render(renderer, data, *args, **kwargs)
+        
+        with mock.patch('orders.idempotency.JSONRenderer.render', autospec=True, side_effect=taken_over):
+            response = self.create_order('chave-1')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Order.objects.exists())
+        self.assertIsNone(IdempotencyKey.objects.get().status_code)
+    
+    def test_failed_request_releases_key(self):
+        """Teste da chave liberada quando a requisição falha"""
+        response = self.create_order('chave-1', {**self.payload, 'items': [{'product_id': self.product.pk, 'quantity': 9}]})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        
+        self.assertEqual(self.create_order('chave-1').status_code, status.HTTP_201_CREATED)
+    
+    def test_checkout_is_idempotent(self):
+        """Teste do checkout repetido com a mesma chave"""
+        CartItem.objects.create(cart=Cart.objects.create(customer=self.customer), product=self.product, quantity=1)
+        headers = {'HTTP_IDEMPOTENCY_KEY': 'checkout-1'}
+        first = self.client.post('/api/orders/checkout/', self.payload, format='json', **headers)
+        replay = self.client.post('/api/orders/checkout/', self.payload, format='json', **headers)
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(replay.data['order']['id'], first.data['order']['id'])
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class OutboxTest(APITestCase):
+    """Testes do outbox de eventos de domínio e do relay"""
+    
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass123',
+            full_name='Customer User',
+            cpf_cnpj='12345678901',
+            user_type='customer'
+        )
+        department = Department.objects.create(name='Eletrônicos', slug='eletronicos')
+        self.product = Product.objects.create(
+            name='Produto', description='Descrição', slug='produto', department=department, price=Decimal('10.00')
+        )
+        Stock.objects.create(product=self.product, quantity=100, movement_type='in', reason='Compra')
+    
+    def create_order(self):
+        return place_order(self.customer, [(self.product.pk, 1)], payment_method='pix')
+    
+    def test_state_changes_write_events(self):
+        """Teste dos eventos gravados na transação da mudança de estado"""
+        order = self.create_order()
+        transition_orders([order.pk], 'confirmed')
+        confirm_payment(order.pk)
+        self.assertEqual(
+            list(OutboxEvent.objects.values_list('event_type', flat=True)),
+            ['order.created', 'order.status_changed', 'order.paid']
+        )
+        self.assertEqual(
+            OutboxEvent.objects.get(event_type='order.status_changed').payload,
+            {'order_id': order.pk, 'old_status': 'pending', 'new_status': 'confirmed'}
+        )
+        
+        # Transação desfeita não deixa eventos
+        with self.assertRaises(CheckoutError):
+            place_order(self.customer, [(self.product.pk, 1000)], payment_method='pix')
+        self.assertEqual(OutboxEvent.objects.count(), 3)
+    
+    def test_relay_publishes_pending_events(self):
+        """Teste do relay publicando os eventos pendentes em lotes"""
+        orders = [self.create_order() for _ in range(3)]
+        transition_orders([order.pk for order in orders], 'confirmed')
+        
+        with mock.patch('orders.outbox.publish') as publish:
+            metrics = relay(batch_size=2)
+        self.assertEqual(metrics['published'], 6)
+        self.assertFalse(OutboxEvent.objects.pending().exists())
+        
+        # Apenas order.status_changed tem consumidor, com ids de tarefa determinísticos
+        tasks = [task for call in publish.call_args_list for task in call.args[0]]
+        self.assertEqual([task.task for task in tasks], ['ecommerce_saas.tasks.send_order_confirmation_email'] * 3)
+        event_ids = OutboxEvent.objects.filter(event_type='order.status_changed').values_list('pk', flat=True)
+        self.assertEqual([task.id for task in tasks], [f'outbox-{pk}-0' for pk in event_ids])
+        
+        with mock.patch('orders.outbox.publish') as publish:
+            self.assertEqual(relay()['published'], 0)
+        publish.assert_not_called()
+    
+    def test_failed_publish_keeps_events_pending(self):
+        """Teste do lote mantido pendente quando a publicação falha"""
+        self.create_order()
+        with mock.patch('orders.outbox.publish', side_effect=ConnectionError):
+            with self.assertRaises(ConnectionError):
+                relay()
+        self.assertEqual(OutboxEvent.objects.pending().count(), 1)
+    
+    def test_repeated_delivery_is_discarded(self):
+        """Teste do descarte de tarefas publicadas novamente"""
+        self.assertTrue(first_delivery('outbox-1-0'))
+        self.assertFalse(first_delivery('outbox-1-0'))
+        # Registro no banco, compartilhado por todos os workers
+        cache.clear()
+        self.assertFalse(first_delivery('outbox-1-0'))
+        self.assertTrue(first_delivery('outbox-2-0'))
+        self.assertTrue(first_delivery('4b6f1a1e-task'))
+        self.assertTrue(first_delivery('4b6f1a1e-task'))
+    
+    def test_failed_consumer_releases_delivery(self):
+        """Teste da entrega desfeita quando o consumidor falha"""
+        from ecommerce_saas.tasks import send_order_status_update_email
+        
+        order = self.create_order()
+        args = (order.pk, 'confirmed', 'processing')
+        render = mock.patch('ecommerce_saas.tasks.render_to_string', return_value='<p>Pedido</p>')
+        render.start()
+        self.addCleanup(render.stop)
+        with mock.patch('ecommerce_saas.tasks.send_email_task.delay', side_effect=ConnectionError) as delay:
+            result = send_order_status_update_email.apply(args=args, task_id='outbox-9-0')
+        self.assertTrue(result.failed())
+        self.assertEqual(delay.call_count, 4)
+        self.assertFalse(OutboxDelivery.objects.exists())
+        
+        with mock.patch('ecommerce_saas.tasks.send_email_task.delay') as delay:
+            send_order_status_update_email.apply(args=args, task_id='outbox-9-0')
+            send_order_status_update_email.apply(args=args, task_id='outbox-9-0')
+        delay.assert_called_once()
+        self.assertEqual(OutboxDelivery.objects.get().task_id, 'outbox-9-0')
+    
+    def test_outbox_metrics(self):
+        """Teste das métricas de atraso do outbox"""
+        admin = User.objects.create_user(
+            email='admin@example.com',
+            password='testpass123',
+            full_name='Admin User',
+            cpf_cnpj='12345678902',
+            user_type='admin'
+        )
+        self.create_order()
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/orders/outbox/metrics/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['pending'], 1)
+        self.assertIsNone(response.data['last_relay'])
+        
+        with mock.patch('orders.outbox.publish'):
+            relay()
+        response = self.client.get('/api/orders/outbox/metrics/')
+        self.assertEqual(response.data['pending'], 0)
+        self.assertEqual(response.data['last_relay']['published'], 1)
+
+
+class SalesRollupTest(APITestCase):
+    """Testes dos consolidados de vendas e do relatório de vendas"""
+    
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass123',
+            full_name='Customer User',
+            cpf_cnpj='12345678901',
+            user_type='customer'
+        )
+        self.admin = User.objects.create_user(
+            email='admin@example.com',
+            password='testpass123',
+            full_name='Admin User',
+            cpf_cnpj='12345678902',
+            user_type='admin'
+        )
+        self.client.force_authenticate(user=self.admin)
+        
+        self.fruits = Department.objects.create(name='Frutas', slug='frutas')
+        self.vegetables = Department.objects.create(name='Legumes', slug='legumes')
+        self.apple = Product.objects.create(
+            name='Maçã', description='Descrição', slug='maca', department=self.fruits, price=Decimal('10.00')
+        )
+        self.carrot = Product.objects.create(
+            name='Cenoura', description='Descrição', slug='cenoura', department=self.vegetables, price=Decimal('5.00')
+        )
+        for product in (self.apple, self.carrot):
+            Stock.objects.create(product=product, quantity=1000, movement_type='in', reason='Compra')
+        self.day = timezone.localdate() - timedelta(days=3)
+    
+    def create_order(self, hour, items, city='São Paulo', payment_method='pix'):
+        order = place_order(
+            self.customer, items, payment_method=payment_method, shipping_address='Rua A, 1',
+            shipping_city=city, shipping_state='SP', shipping_postal_code='01000-000'
+        )
+        created_at = timezone.make_aware(datetime.combine(self.day, datetime.min.time())) + timedelta(hours=hour)
+        Order.objects.filter(pk=order.pk).update(created_at=created_at)
+        return order
+    
+    def update(self, hours=1):
+        return update_sales_rollups(timezone.now() + timedelta(hours=hours))
+    
+    def report(self, **params):
+        params = {'start_date': self.day, 'end_date': self.day, **params}
+        response = self.client.get('/api/orders/reports/sales/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+    
+    def test_rollups_by_hour_and_day(self):
+        """Teste dos consolidados por hora, por dia e por departamento"""
+        self.create_order(9, [(self.apple.pk, 2), (self.carrot.pk, 1)])
+        self.create_order(9, [(self.apple.pk, 1)], city='Campinas')
+        self.create_order(15, [(self.carrot.pk, 4)], payment_method='credit_card')
+        self.assertEqual(self.update(), 2)
+        
+        self.assertEqual(SalesRollup.objects.filter(period='hour').count(), 3)
+        daily = SalesRollup.objects.filter(period='day', day=self.day)
+        self.assertEqual(sum(row.orders_count for row in daily), 3)
+        self.assertEqual(sum(row.items_quantity for row in daily), 8)
+        self.assertEqual(sum(row.subtotal for row in daily), Decimal('55.00'))
+        
+        fruits = DepartmentSalesRollup.objects.get(period='day', department=self.fruits)
+        self.assertEqual((fruits.orders_count, fruits.quantity, fruits.revenue), (2, 3, Decimal('30.00')))
+        vegetables = DepartmentSalesRollup.objects.get(period='day', department=self.vegetables)
+        self.assertEqual((vegetables.orders_count, vegetables.quantity, vegetables.revenue), (2, 5, Decimal('25.00')))
+        
+        # Sem pedidos alterados nada é recalculado
+        self.assertEqual(self.update(), 0)
+    
+    def test_late_corrections_move_totals(self):
+        """Teste de cancelamentos tardios refletidos nos consolidados"""
+        order = self.create_order(10, [(self.apple.pk, 2)])
+        self.create_order(10, [(self.apple.pk, 1)])
+        self.update()
+        self.assertEqual(self.report(status='pending')['totals']['orders_count'], 2)
+        
+        transition_orders([order.pk], 'cancelled', now=timezone.now() + timedelta(hours=2))
+        self.assertEqual(self.update(hours=3), 1)
+        self.assertEqual(self.report(status='pending')['totals']['orders_count'], 1)
+        self.assertEqual(self.report(status='cancelled')['totals']['orders_count'], 1)
+        self.assertEqual(self.report()['totals']['orders_count'], 2)
+    
+    def test_sales_report_from_rollups(self):
+        """Teste do relatório de vendas agrupado, lido dos consolidados"""
+        self.create_order(9, [(self.apple.pk, 2), (self.carrot.pk, 1)])
+        self.create_order(15, [(self.carrot.pk, 4)], city='Campinas')
+        self.update()
+        
+        with CaptureQueriesContext(connection) as context:
+            report = self.report(group_by='city')
+        self.assertLessEqual(len(context.captured_queries), 3)
+        self.assertEqual(report['totals']['orders_count'], 2)
+        self.assertEqual(
+            [(row['shipping_city'], row['orders_count']) for row in report['rows']],
+            [('Campinas', 1), ('São Paulo', 1)]
+        )
+        
+        report = self.report(group_by='department')
+        self.assertEqual(
+            [(row['department__name'], row['quantity']) for row in report['rows']],
+            [('Frutas', 2), ('Legumes', 5)]
+        )
+        self.assertEqual(len(self.report(group_by='hour')['rows']), 2)
+        
+        # Filtro por cliente lido dos pedidos
+        report = self.report(customer=self.customer.pk, group_by='day')
+        self.assertEqual(report['rows'][0]['orders_count'], 2)
+        
+        response = self.client.get('/api/orders/reports/sales/', {
+            'start_date': self.day, 'end_date': self.day, 'status': 'unknown'
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_backfill_command_matches_incremental(self):
+        """Teste da reconstrução dos consolidados pelo comando"""
+        self.create_order(9, [(self.apple.pk, 2)])
+        self.create_order(20, [(self.carrot.pk, 3)])
+        self.update()
+        expected = list(SalesRollup.objects.order_by('period', 'period_start').values_list(
+            'period', 'period_start', 'orders_count', 'total_amount'
+        ))
+        
+        SalesRollup.objects.all().delete()
+        call_command('backfill_sales_rollups', stdout=StringIO())
+        self.assertEqual(list(SalesRollup.objects.order_by('period', 'period_start').values_list(
+            'period', 'period_start', 'orders_count', 'total_amount'
+        )), expected)
+        
+        call_command(
+            'backfill_sales_rollups', '--start-date', str(self.day), '--end-date', str(self.day), stdout=StringIO()
+        )
+        self.assertEqual(SalesRollup.objects.filter(period='day').count(), 1)
+
+
+class OrderArchiveTest(APITestCase):
+    """Testes do arquivamento de pedidos encerrados e da leitura dos arquivados"""
+    
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com',
+            password='testpass123',
+            full_name='Customer User',
+            cpf_cnpj='12345678901',
+            user_type='customer'
+        )
+        self.other_customer = User.objects.create_user(
+            email='other@example.com',
+            password='testpass123',
+            full_name='Other Customer',
+            cpf_cnpj='12345678902',
+            user_type='customer'
+        )
+        self.department = Department.objects.create(name='Frutas', slug='frutas')
+        self.apple = Product.objects.create(
+            name='Maçã', description='Descrição', slug='maca', department=self.department, price=Decimal('10.00')
+        )
+        Stock.objects.create(product=self.apple, quantity=1000, movement_type='in', reason='Compra')
+        self.now = timezone.now()
+        self.old = self.now - timedelta(days=400)
+    
+    def create_order(self, status='delivered', created_at=None, quantity=1):
+        order = place_order(
+            self.customer, [(self.apple.pk, quantity)], payment_method='pix', shipping_address='Rua A, 1',
+            shipping_city='São Paulo', shipping_state='SP', shipping_postal_code='01000-000'
+        )
+        if status == 'delivered':
+            confirm_payment(order.pk)
+            for target in ('confirmed', 'processing', 'shipped', 'delivered'):
+                transition_orders([order.pk], target)
+        elif status == 'cancelled':
+            transition_orders([order.pk], 'cancelled')
+        Order.objects.filter(pk=order.pk).update(created_at=created_at or self.old)
+        return order
+    
+    def create_delivery(self, order):
+        delivery = Delivery.objects.create(
+            order=order,
+            delivery_address='Rua A, 1',
+            delivery_city='São Paulo',
+            delivery_state='SP',
+            delivery_postal_code='01000-000',
+            customer_name='Customer User',
+            customer_phone='+5511999999999',
+            status='delivered'
+        )
+        DeliveryStatusHistory.objects.create(delivery=delivery, status='in_transit', location='Centro')
+        DeliveryStatusHistory.objects.create(delivery=delivery, status='delivered')
+        return delivery
+    
+    def test_archive_moves_closed_old_orders(self):
+        """Teste do arquivamento apenas de pedidos encerrados, antigos e sem pagamento em andamento"""
+        delivered = self.create_order('delivered')
+        delivery = self.create_delivery(delivered)
+        cancelled = self.create_order('cancelled')
+        pending = self.create_order('pending')
+        recent = self.create_order('delivered', created_at=self.now)
+        with_coupon = self.create_order('delivered')
+        coupon = Coupon.objects.create(
+            code='PROMO10', name='Promo', discount_type='percentage', discount_value=Decimal('10.00'),
+            valid_from=self.old - timedelta(days=1), valid_until=self.now
+        )
+        usage = CouponUsage.objects.create(
+            coupon=coupon, customer=self.customer, order=with_coupon, discount_amount=Decimal('1.00')
+        )
+        method = PaymentMethod.objects.create(name='PIX', method_type='pix')
+        payment = Payment.objects.create(
+            order=delivered, payment_method=method, amount=delivered.total_amount, status='approved'
+        )
+        payment.refunds.create(refund_type='partial', amount=Decimal('1.00'), reason='Avaria', status='completed')
+        open_payment = self.create_order('cancelled')
+        Payment.objects.create(order=open_payment, payment_method=method, amount=open_payment.total_amount)
+        
+        self.assertEqual(archive_orders(now=self.now, batch_size=1), 3)
+        self.assertEqual(
+            set(ArchivedOrder.objects.values_list('pk', flat=True)), {delivered.pk, cancelled.pk, with_coupon.pk}
+        )
+        self.assertEqual(
+            set(Order.objects.values_list('pk', flat=True)), {pending.pk, recent.pk, open_payment.pk}
+        )
+        self.assertFalse(Payment.objects.filter(pk=payment.pk).exists())
+        self.assertFalse(CouponUsage.objects.filter(pk=usage.pk).exists())
+        self.assertFalse(OrderItem.objects.filter(order_id__in=[delivered.pk, cancelled.pk]).exists())
+        self.assertFalse(Delivery.objects.filter(pk=delivery.pk).exists())
+        self.assertFalse(DeliveryStatusHistory.objects.filter(delivery_id=delivery.pk).exists())
+        
+        archived = ArchivedOrder.objects.get(pk=delivered.pk)
+        self.assertEqual(archived.order_number, delivered.order_number)
+        self.assertEqual(archived.tracking_code, delivery.tracking_code)
+        self.assertEqual(archived.total_amount, delivered.total_amount)
+        document = archived.document
+        self.assertEqual([item['product_name'] for item in document['items']], ['Maçã'])
+        self.assertEqual(document['items'][0]['department_id'], self.department.pk)
+        self.assertEqual(
+            [entry['status'] for entry in document['status_history']],
+            ['pending', 'confirmed', 'processing', 'shipped', 'delivered']
+        )
+        self.assertEqual([entry['status'] for entry in document['delivery']['status_history']], ['in_transit', 'delivered'])
+        self.assertEqual(
+            [(entry['status'], entry['method_type']) for entry in document['payments']], [('approved', 'pix')]
+        )
+        self.assertEqual([refund['amount'] for refund in document['payments'][0]['refunds']], ['1.00'])
+        self.assertEqual(
+            [entry['coupon_code'] for entry in ArchivedOrder.objects.get(pk=with_coupon.pk).document['coupon_usages']],
+            ['PROMO10']
+        )
+        
+        # Reservas já convertidas ou liberadas: o saldo não muda com o arquivamento
+        self.assertEqual(StockBalance.objects.get(product=self.apple).reserved, 1)
+        self.assertEqual(archive_orders(now=self.now), 0)
+    
+    def test_coupon_limits_count_archived_usages(self):
+        """Teste dos limites de uso por cliente e de primeiro pedido com os pedidos arquivados"""
+        coupon = Coupon.objects.create(
+            code='PROMO10', name='Promo', discount_type='percentage', discount_value=Decimal('10.00'),
+            valid_from=self.old - timedelta(days=1), valid_until=self.now + timedelta(days=1),
+            usage_limit_per_customer=1
+        )
+        first_order = Coupon.objects.create(
+            code='PRIMEIRA', name='Primeira compra', discount_type='percentage', discount_value=Decimal('10.00'),
+            valid_from=self.old - timedelta(days=1), valid_until=self.now + timedelta(days=1),
+            first_order_only=True
+        )
+        order = self.create_order('delivered')
+        CouponUsage.objects.create(coupon=coupon, customer=self.customer, order=order, discount_amount=Decimal('1.00'))
+        
+        self.assertEqual(archive_orders(now=self.now), 1)
+        usage = ArchivedCouponUsage.objects.get()
+        self.assertEqual((usage.order_id, usage.coupon_id, usage.coupon_code), (order.pk, coupon.pk, 'PROMO10'))
+        self.assertFalse(self.customer.orders.exists())
+        self.assertFalse(coupon.can_be_used_by_customer(self.customer))
+        self.assertFalse(first_order.can_be_used_by_customer(self.customer))
+        self.assertTrue(coupon.can_be_used_by_customer(self.other_customer))
+        self.assertTrue(first_order.can_be_used_by_customer(self.other_customer))
+    
+    def test_read_through(self):
+        """Teste do detalhe, da listagem e do rastreamento de pedidos arquivados"""
+        order = self.create_order('delivered')
+        delivery = self.create_delivery(order)
+        hot = self.create_order('pending', created_at=self.now)
+        archive_orders(now=self.now)
+        
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get(f'/api/orders/{order.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['archived'])
+        self.assertEqual(response.data['order_number'], str(order.order_number))
+        self.assertEqual(response.data['items'][0]['quantity'], 1)
+        self.assertEqual(response.data['delivery']['status'], 'delivered')
+        
+        response = self.client.get(f'/api/orders/{hot.pk}/')
+        self.assertNotIn('archived', response.data)
+        
+        response = self.client.get('/api/orders/archived/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in response.data['results']], [order.pk])
+        
+        response = self.client.get(f'/api/deliveries/track/{delivery.tracking_code}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([entry['status'] for entry in response.data['status_history']], ['in_transit', 'delivered'])
+        
+        self.client.force_authenticate(user=self.other_customer)
+        response = self.client.get(f'/api/orders/{order.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get('/api/orders/archived/')
+        self.assertEqual(response.data['results'], [])
+    
+    def test_sales_rollups_keep_archived_orders(self):
+        """Teste dos consolidados de vendas antes e depois do arquivamento"""
+        self.create_order('delivered', quantity=2)
+        self.create_order('pending', quantity=3)
+        self.create_order('cancelled', quantity=1)
+        day = timezone.localdate(self.old)
+        update_sales_rollups(self.now + timedelta(hours=1))
+        expected = sales_report(day, day, group_by='status')
+        expected_departments = sales_report(day, day, group_by='department')
+        
+        self.assertEqual(archive_orders(now=self.now + timedelta(hours=1)), 2)
+        # As horas dos pedidos arquivados são recalculadas, agora a partir do arquivo
+        self.assertEqual(update_sales_rollups(self.now + timedelta(hours=2)), 1)
+        self.assertEqual(sales_report(day, day, group_by='status')['rows'], expected['rows'])
+        self.assertEqual(sales_report(day, day, group_by='department')['rows'], expected_departments['rows'])
+        self.assertEqual(expected['totals']['orders_count'], 3)
+        
+        backfill()
+        self.assertEqual(sales_report(day, day, group_by='status')['rows'], expected['rows'])
+        
+        self.client.force_authenticate(user=User.objects.create_user(
+            email='admin@example.com', password='testpass123', full_name='Admin User',
+            cpf_cnpj='12345678903', user_type='admin'
+        ))
+        response = self.client.get('/api/orders/reports/sales/', {
+            'start_date': day, 'end_date': day, 'customer': self.customer.pk
+        })
+        self.assertEqual(response.data['totals']['orders_count'], 3)
+        self.assertEqual(response.data['totals']['items_quantity'], 6)
+    
+    def test_archive_command(self):
+        """Teste do comando de arquivamento"""
+        self.create_order('delivered')
+        self.create_order('delivered', created_at=self.now - timedelta(days=70))
+        
+        out = StringIO()
+        call_command('archive_orders', '--dry-run', stdout=out)
+        self.assertIn('1 pedidos', out.getvalue())
+        self.assertFalse(ArchivedOrder.objects.exists())
+        
+        call_command('archive_orders', '--months', '1', stdout=StringIO())
+        self.assertEqual(ArchivedOrder.objects.count(), 2)
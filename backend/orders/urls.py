@@ -8,8 +8,12 @@ urlpatterns = [
     # Pedidos
     path('', views.OrderListView.as_view(), name='order_list'),
     path('<int:pk>/', views.OrderDetailView.as_view(), name='order_detail'),
+    path('archived/', views.ArchivedOrderListView.as_view(), name='archived_order_list'),
     path('create/', views.OrderCreateView.as_view(), name='order_create'),
     path('<int:order_id>/cancel/', views.cancel_order, name='cancel_order'),
+    path('bulk-status/', views.bulk_update_status, name='bulk_update_status'),
+    path('outbox/metrics/', views.outbox_metrics, name='outbox_metrics'),
+    path('reports/sales/', views.sales_report, name='sales_report'),
     
     # Carrinho
     path('cart/', CartView.as_view(), name='cart'),
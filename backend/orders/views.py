@@ -3,17 +3,26 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.db.models import Q, Sum, Count
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from datetime import datetime, timedelta
+from decimal import Decimal
 
-from .models import Order, OrderItem
+from ecommerce_saas.pagination import OptionalKeysetPagination
+from users.permissions import CanViewReports, IsAdminUser
+from .idempotency import idempotent
+from .models import ArchivedOrder, Order, OrderItem
+from .state_machine import TransitionError, can_transition, transition_orders
 from .serializers import (
+    ArchivedOrderListSerializer,
+    ArchivedOrderSerializer,
     OrderListSerializer,
     OrderDetailSerializer,
     OrderCreateSerializer,
     OrderUpdateSerializer,
     OrderStatusUpdateSerializer,
+    OrderBulkStatusSerializer,
     OrderSearchSerializer,
     OrderReportSerializer,
     CartSerializer
@@ -30,10 +39,11 @@ class OrderListView(generics.ListAPIView):
     search_fields = ['order_number', 'customer__full_name']
     ordering_fields = ['created_at', 'total_amount', 'status']
     ordering = ['-created_at']
+    pagination_class = OptionalKeysetPagination
     
     def get_queryset(self):
         user = self.request.user
-        queryset = Order.objects.select_related('customer')
+        queryset = Order.objects.for_listing()
         
         # Filtrar baseado no tipo de usuário
         if user.user_type == 'admin':
@@ -58,7 +68,7 @@ class OrderDetailView(generics.RetrieveAPIView):
     
     def get_queryset(self):
         user = self.request.user
-        queryset = Order.objects.select_related('customer').prefetch_related('items__product')
+        queryset = Order.objects.for_detail()
         
         # Filtrar baseado no tipo de usuário
         if user.user_type == 'admin':
@@ -67,6 +77,28 @@ class OrderDetailView(generics.RetrieveAPIView):
             return queryset.filter(customer=user)
         else:
             return queryset.none()
+    
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            # Pedidos encerrados antigos são lidos do arquivo (orders.archive)
+            archived = get_object_or_404(ArchivedOrder.objects.visible_to(request.user), pk=kwargs['pk'])
+            return Response(ArchivedOrderSerializer(archived).data)
+
+
+class ArchivedOrderListView(generics.ListAPIView):
+    """
+    Listar pedidos arquivados (pedidos encerrados antigos)
+    """
+    serializer_class = ArchivedOrderListSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [filters.SearchFilter]
+    search_fields = ['order_number', 'customer__full_name']
+    pagination_class = OptionalKeysetPagination
+    
+    def get_queryset(self):
+        return ArchivedOrder.objects.visible_to(self.request.user).select_related('customer').defer('document')
 
 
 class OrderCreateView(generics.CreateAPIView):
@@ -77,22 +109,16 @@ class OrderCreateView(generics.CreateAPIView):
     serializer_class = OrderCreateSerializer
     permission_classes = [IsAuthenticated]
     
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+    
     def perform_create(self, serializer):
         if self.request.user.user_type != 'customer':
             raise permissions.PermissionDenied("Apenas clientes podem criar pedidos.")
         
-        order = serializer.save()
-        
-        # Reduzir estoque dos produtos
-        from products.models import Stock
-        for item in order.items.all():
-            Stock.objects.create(
-                product=item.product,
-                quantity=item.quantity,
-                movement_type='out',
-                reason=f'Venda - Pedido {order.order_number}',
-                created_by=self.request.user
-            )
+        # place_order baixa o estoque na mesma transação do pedido
+        serializer.save()
 
 
 @api_view(['POST'])
@@ -111,25 +137,18 @@ def cancel_order(request, order_id):
         raise permissions.PermissionDenied("Apenas clientes e administradores podem cancelar pedidos.")
     
     # Verificar se o pedido pode ser cancelado
-    if order.status in ['delivered', 'cancelled', 'returned']:
+    if not can_transition(order.status, 'cancelled'):
         return Response({
             'error': f'Pedido não pode ser cancelado. Status atual: {order.get_status_display()}'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    # Cancelar pedido
-    order.status = 'cancelled'
-    order.save()
-    
-    # Devolver estoque
-    from products.models import Stock
-    for item in order.items.all():
-        Stock.objects.create(
-            product=item.product,
-            quantity=item.quantity,
-            movement_type='in',
-            reason=f'Cancelamento - Pedido {order.order_number}',
-            created_by=user
-        )
+    # Cancelar pedido liberando as reservas e devolvendo o estoque já baixado
+    from .services import cancel_order as cancel
+    try:
+        cancel(order, changed_by=user)
+    except TransitionError as e:
+        # Status alterado concorrentemente
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     return Response({
         'message': 'Pedido cancelado com sucesso',
@@ -137,6 +156,62 @@ def cancel_order(request, order_id):
     }, status=status.HTTP_200_OK)
 
 
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def bulk_update_status(request):
+    """
+    Atualizar o status de vários pedidos de uma vez (apenas admin)
+    """
+    serializer = OrderBulkStatusSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    
+    changed, errors = transition_orders(
+        serializer.validated_data['order_ids'],
+        serializer.validated_data['status'],
+        changed_by=request.user,
+        notes=serializer.validated_data['notes']
+    )
+    return Response({
+        'updated': len(changed),
+        'order_ids': changed,
+        'errors': errors
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([CanViewReports])
+def sales_report(request):
+    """
+    Relatório de vendas do período, lido dos consolidados de vendas (apenas admin)
+    """
+    serializer = OrderReportSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    params = serializer.validated_data
+    
+    from .rollups import customer_sales_report, sales_report as build_report
+    if params.get('customer'):
+        report = customer_sales_report(
+            params['customer'], params['start_date'], params['end_date'],
+            statuses=params.get('status'), group_by=params.get('group_by')
+        )
+    else:
+        report = build_report(
+            params['start_date'], params['end_date'],
+            statuses=params.get('status'), group_by=params.get('group_by')
+        )
+    return Response(report, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def outbox_metrics(request):
+    """
+    Métricas do outbox de eventos: pendentes, atraso e última execução do relay (apenas admin)
+    """
+    from .outbox import relay_metrics
+    return Response(relay_metrics(), status=status.HTTP_200_OK)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def calculate_cart_total(request):
@@ -150,42 +225,36 @@ def calculate_cart_total(request):
     if serializer.is_valid():
         items = serializer.validated_data['items']
         
-        from products.models import Product
-        cart_total = 0
+        from products.services import check_availability
+        availability = check_availability(
+            (item_data['product_id'], item_data['quantity']) for item_data in items
+        )
+        
+        cart_total = Decimal('0.00')
         cart_items = []
         
-        for item_data in items:
-            try:
-                product = Product.objects.get(id=item_data['product_id'], is_active=True)
-                quantity = item_data['quantity']
-                
-                # Verificar estoque
-                if product.stock_quantity < quantity:
-                    return Response({
-                        'error': f'Estoque insuficiente para {product.name}. '
-                                f'Disponível: {product.stock_quantity}, Solicitado: {quantity}'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-                
-                unit_price = product.get_discounted_price()
-                subtotal = unit_price * quantity
-                cart_total += subtotal
-                
-                cart_items.append({
-                    'product_id': product.id,
-                    'product_name': product.name,
-                    'quantity': quantity,
-                    'unit_price': float(unit_price),
-                    'subtotal': float(subtotal)
-                })
-                
-            except Product.DoesNotExist:
+        for entry in availability.values():
+            if entry.error:
                 return Response({
-                    'error': f'Produto com ID {item_data["product_id"]} não encontrado.'
+                    'error': entry.error
                 }, status=status.HTTP_400_BAD_REQUEST)
+            
+            unit_price = entry.current_price
+            subtotal = unit_price * entry.requested_quantity
+            cart_total += subtotal
+            
+            cart_items.append({
+                'product_id': entry.product_id,
+                'product_name': entry.product.name,
+                'quantity': entry.requested_quantity,
+                'unit_price': float(unit_price),
+                'subtotal': float(subtotal)
+            })
         
         # Calcular custos adicionais (simulado)
-        shipping_cost = 15.00 if cart_total < 100 else 0  # Frete grátis acima de R$ 100
-        tax_amount = cart_total * 0.05  # 5% de impostos
+        from .services import calculate_shipping_cost
+        shipping_cost = calculate_shipping_cost(cart_total)  # Frete grátis acima de R$ 100
+        tax_amount = cart_total * Decimal('0.05')  # 5% de impostos
         total_amount = cart_total + shipping_cost + tax_amount
         
         return Response({
@@ -1,6 +1,11 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Department, Product, ProductImage, Stock, ProductReview
+from datetime import timedelta
+from .models import (
+    Department, PriceSchedule, Product, ProductImage, ProductRanking, Stock, StockMonthlySummary,
+    StockReservation, ProductReview
+)
 
 
 class ProductImageInline(admin.TabularInline):
@@ -14,12 +19,32 @@ class ProductImageInline(admin.TabularInline):
 
 class StockInline(admin.TabularInline):
     """
-    Inline para movimentações de estoque.
+    Inline para movimentações de estoque recentes.
+    O histórico completo fica disponível na listagem de Estoques.
     """
     model = Stock
     extra = 0
     fields = ('movement_type', 'quantity', 'reason', 'created_by', 'created_at')
     readonly_fields = ('created_at',)
+    recent_days = 30
+    
+    def get_queryset(self, request):
+        since = timezone.now() - timedelta(days=self.recent_days)
+        return super().get_queryset(request).filter(created_at__gte=since)
+
+
+class StockMonthlySummaryInline(admin.TabularInline):
+    """
+    Inline somente leitura para os resumos mensais de estoque compactados.
+    """
+    model = StockMonthlySummary
+    extra = 0
+    fields = ('month', 'quantity_in', 'quantity_out', 'quantity_adjustment', 'movements_count')
+    readonly_fields = fields
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Department)
@@ -44,17 +69,18 @@ class ProductAdmin(admin.ModelAdmin):
     Configuração do admin para o modelo Product.
     """
     list_display = ('name', 'department', 'current_price_display', 'stock_quantity', 'is_active', 'is_featured', 'created_at')
+    list_select_related = ('department', 'stock_balance')
     list_filter = ('department', 'is_active', 'is_featured', 'is_on_promotion', 'created_at')
     search_fields = ('name', 'description', 'short_description')
     prepopulated_fields = {'slug': ('name',)}
-    readonly_fields = ('created_at', 'updated_at', 'stock_quantity')
+    readonly_fields = ('created_at', 'updated_at', 'stock_quantity', 'effective_price', 'rating_avg', 'rating_count')
     
     fieldsets = (
         ('Informações Básicas', {
             'fields': ('name', 'slug', 'department', 'short_description', 'description')
         }),
         ('Preços', {
-            'fields': ('price', 'promotional_price', 'is_on_promotion')
+            'fields': ('price', 'promotional_price', 'is_on_promotion', 'effective_price')
         }),
         ('Imagens', {
             'fields': ('main_image',)
@@ -71,25 +97,55 @@ class ProductAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Informações do Sistema', {
-            'fields': ('created_at', 'updated_at', 'stock_quantity'),
+            'fields': ('created_at', 'updated_at', 'stock_quantity', 'rating_avg', 'rating_count'),
             'classes': ('collapse',)
         }),
     )
     
-    inlines = [ProductImageInline, StockInline]
+    inlines = [ProductImageInline, StockInline, StockMonthlySummaryInline]
     
     def current_price_display(self, obj):
-        if obj.is_on_promotion and obj.promotional_price:
+        if obj.current_price < obj.price:
             return format_html(
                 '<span style="text-decoration: line-through;">R$ {}</span><br>'
                 '<strong style="color: red;">R$ {}</strong>',
-                obj.price, obj.promotional_price
+                obj.price, obj.current_price
             )
         return f'R$ {obj.price}'
     current_price_display.short_description = 'Preço Atual'
     current_price_display.allow_tags = True
 
 
+@admin.register(PriceSchedule)
+class PriceScheduleAdmin(admin.ModelAdmin):
+    """
+    Configuração do admin para o modelo PriceSchedule.
+    """
+    list_display = ('name', 'product', 'department', 'kind', 'value', 'starts_at', 'ends_at', 'is_active')
+    list_select_related = ('product', 'department')
+    list_filter = ('kind', 'is_active', 'department', 'starts_at')
+    search_fields = ('name', 'product__name')
+    raw_id_fields = ('product',)
+    readonly_fields = ('created_at', 'updated_at')
+    date_hierarchy = 'starts_at'
+
+
+@admin.register(ProductRanking)
+class ProductRankingAdmin(admin.ModelAdmin):
+    """
+    Configuração do admin para o modelo ProductRanking (somente leitura).
+    """
+    list_display = ('rank', 'product', 'score', 'quantity_7d', 'quantity_30d', 'quantity_90d', 'revenue_30d', 'computed_at')
+    list_select_related = ('product',)
+    search_fields = ('product__name',)
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(ProductImage)
 class ProductImageAdmin(admin.ModelAdmin):
     """
@@ -124,6 +180,28 @@ class StockAdmin(admin.ModelAdmin):
         if not obj.created_by:
             obj.created_by = request.user
         super().save_model(request, obj, form, change)
+    
+    def delete_queryset(self, request, queryset):
+        # Exclusão individual para estornar cada movimentação no saldo
+        for obj in queryset:
+            obj.delete()
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    """
+    Configuração do admin para o modelo StockReservation (somente leitura).
+    """
+    list_display = ('product', 'order', 'quantity', 'status', 'expires_at', 'resolved_at')
+    list_filter = ('status', 'expires_at')
+    list_select_related = ('product', 'order')
+    search_fields = ('product__name', 'order__order_number')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(ProductReview)
@@ -139,9 +217,9 @@ class ProductReviewAdmin(admin.ModelAdmin):
     actions = ['approve_reviews', 'disapprove_reviews']
     
     def approve_reviews(self, request, queryset):
-        queryset.update(is_approved=True)
+        queryset.set_approved(True)
     approve_reviews.short_description = 'Aprovar avaliações selecionadas'
     
     def disapprove_reviews(self, request, queryset):
-        queryset.update(is_approved=False)
+        queryset.set_approved(False)
     disapprove_reviews.short_description = 'Desaprovar avaliações selecionadas'
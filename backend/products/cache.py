@@ -0,0 +1,209 @@
+"""
+Cache das listagens públicas do catálogo (destaques e produtos por departamento).
+
+O payload já serializado é guardado no cache compartilhado, por departamento e
+por página. Cada listagem tem um contador de geração que entra na chave das
+entradas: invalidar é apenas avançar o contador, e as entradas antigas expiram
+sozinhas. Os contadores são avançados por Department.touch_catalog (produto,
+preço, estoque e imagens) e pelo salvamento do departamento, apenas para os
+departamentos afetados; os destaques só são invalidados quando a mudança envolve
+um produto em destaque.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.paginator import EmptyPage, Paginator
+from django.db import transaction
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+
+FEATURED_LIMIT = 8
+
+GENERATION_KEY = 'catalog:gen:{scope}'
+FEATURED_KEY = 'catalog:featured:{generation}'
+FEATURED_MEMBERS_KEY = 'catalog:featured:members'
+DEPARTMENT_PAGE_KEY = 'catalog:department:{department_id}:{generation}:{page}:{page_size}'
+RELATED_KEY = 'catalog:related:{slug}:{generation}'
+RELATED_SCOPE = 'related'
+
+
+def get_cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def _scope(department_id=None):
+    return 'featured' if department_id is None else f'department:{department_id}'
+
+
+def generation(department_id=None, scope=None):
+    """Geração atual da listagem (dos destaques, sem departamento)"""
+    cache = get_cache()
+    key = GENERATION_KEY.format(scope=scope or _scope(department_id))
+    value = cache.get(key)
+    if value is None:
+        # Valor inicial único: um contador despejado não reaproveita entradas antigas
+        cache.add(key, time.time_ns(), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def _bump(scopes):
+    cache = get_cache()
+    for scope in scopes:
+        key = GENERATION_KEY.format(scope=scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def bump(department_ids=(), featured=False):
+    """
+    Avança as gerações agora e novamente após o commit, descartando o que
+    outra requisição tenha guardado a partir do estado ainda não confirmado.
+    """
+    scopes = [_scope(pk) for pk in set(department_ids) if pk]
+    if featured:
+        scopes.append(_scope())
+    if not scopes:
+        return
+    _bump(scopes)
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def invalidate(department_ids=None, product_ids=None):
+    """
+    Invalida as listagens afetadas por uma mudança no catálogo, com os mesmos
+    argumentos de Department.touch_catalog (sem argumentos, todas).
+    """
+    from .models import Department, Product
+    
+    members = get_cache().get(FEATURED_MEMBERS_KEY) or {'products': [], 'departments': []}
+    department_ids = {pk for pk in (department_ids or ()) if pk}
+    
+    if product_ids is not None:
+        product_ids = set(product_ids)
+        rows = list(
+            Product.objects.filter(pk__in=product_ids).values_list('department_id', 'is_featured')
+        )
+        department_ids.update(department_id for department_id, _ in rows)
+        featured = (
+            any(is_featured for _, is_featured in rows)
+            or bool(product_ids.intersection(members['products']))
+        )
+    elif department_ids:
+        featured = (
+            bool(department_ids.intersection(members['departments']))
+            or Product.objects.filter(department_id__in=department_ids, is_featured=True).exists()
+        )
+    else:
+        department_ids = set(Department.objects.values_list('pk', flat=True))
+        featured = True
+    
+    bump(department_ids, featured=featured)
+
+
+def _build_featured():
+    from .models import Product
+    from .serializers import ProductListSerializer
+    
+    products = list(Product.objects.filter(
+        is_active=True, is_featured=True
+    ).for_listing()[:FEATURED_LIMIT])
+    return (
+        ProductListSerializer(products, many=True).data,
+        [product.pk for product in products],
+        {product.department_id for product in products}
+    )
+
+
+def featured_products():
+    """Payload dos destaques, montado apenas na falta do cache"""
+    cache = get_cache()
+    key = FEATURED_KEY.format(generation=generation())
+    data = cache.get(key)
+    if data is None:
+        data, product_ids, department_ids = _build_featured()
+        cache.set(key, data, settings.CATALOG_CACHE_TIMEOUT)
+        cache.set(FEATURED_MEMBERS_KEY, {
+            'products': product_ids, 'departments': list(department_ids)
+        }, timeout=None)
+    return data
+
+
+def _build_department_page(department_id, page_number, page_size):
+    from .models import Department, Product
+    from .serializers import DepartmentSerializer, ProductListSerializer
+    
+    department = get_object_or_404(
+        Department.objects.with_products_count(), id=department_id, is_active=True
+    )
+    paginator = Paginator(
+        Product.objects.filter(department=department, is_active=True).for_listing().order_by(
+            '-created_at', '-id'
+        ),
+        page_size
+    )
+    try:
+        page = paginator.page(page_number)
+    except EmptyPage:
+        raise Http404('Página inválida.')
+    return {
+        'department': DepartmentSerializer(department).data,
+        'count': paginator.count,
+        'num_pages': paginator.num_pages,
+        'products': ProductListSerializer(page.object_list, many=True).data
+    }
+
+
+def department_page(department_id, page_number, page_size):
+    """
+    Payload de uma página da listagem do departamento, montado apenas na falta
+    do cache. Departamento inativo ou página inexistente levantam Http404.
+    """
+    cache = get_cache()
+    key = DEPARTMENT_PAGE_KEY.format(
+        department_id=department_id, generation=generation(department_id),
+        page=page_number, page_size=page_size
+    )
+    data = cache.get(key)
+    if data is None:
+        data = _build_department_page(department_id, page_number, page_size)
+        cache.set(key, data, settings.CATALOG_CACHE_TIMEOUT)
+    return data
+
+
+def warm(page_size):
+    """Pré-computa os destaques e a primeira página de cada departamento ativo"""
+    from .models import Department
+    
+    featured_products()
+    department_ids = list(Department.objects.filter(is_active=True).values_list('pk', flat=True))
+    for department_id in department_ids:
+        department_page(department_id, 1, page_size)
+    return len(department_ids)
+
+
+def bump_related():
+    """Invalida as listas de produtos relacionados (após o job de recomendações)"""
+    _bump([RELATED_SCOPE])
+
+
+def related_product_ids(slug):
+    """
+    Ids dos produtos relacionados, em ordem, montados apenas na falta do cache.
+    Produto inexistente ou inativo levanta Http404.
+    """
+    from .models import Product, RelatedProduct
+    
+    cache = get_cache()
+    key = RELATED_KEY.format(slug=slug, generation=generation(scope=RELATED_SCOPE))
+    product_ids = cache.get(key)
+    if product_ids is None:
+        product = get_object_or_404(Product.objects.only('id'), slug=slug, is_active=True)
+        product_ids = list(
+            RelatedProduct.objects.filter(product=product).order_by('rank').values_list('related_id', flat=True)
+        )
+        cache.set(key, product_ids, settings.CATALOG_CACHE_TIMEOUT)
+    return product_ids
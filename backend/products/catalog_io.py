@@ -0,0 +1,413 @@
+"""
+Importação e exportação do catálogo em lote (CSV ou JSONL).
+
+A importação processa o arquivo em lotes: departamentos, produtos, imagens e
+estoque inicial são gravados com bulk_create/bulk_update, e os índices
+derivados (saldo, facetas, busca e versão do catálogo) são atualizados uma vez
+por lote. Linhas inválidas são reportadas individualmente sem interromper o
+lote. A exportação percorre o banco com iterator() (cursor no servidor em
+PostgreSQL), mantendo o uso de memória constante.
+"""
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import groupby
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import (
+    Department, PriceSchedule, Product, ProductFacet, ProductImage, Stock, StockBalance
+)
+from .search import get_search_backend
+
+FORMATS = ('csv', 'jsonl')
+
+COLUMNS = [
+    'slug', 'name', 'department', 'department_slug', 'short_description', 'description',
+    'price', 'promotional_price', 'is_on_promotion', 'is_active', 'is_featured',
+    'weight', 'dimensions', 'main_image', 'images', 'stock'
+]
+
+# Campos do produto atualizados quando o slug já existe
+UPDATE_FIELDS = [
+    'name', 'department', 'short_description', 'description', 'price',
+    'promotional_price', 'is_on_promotion', 'is_active', 'is_featured',
+    'weight', 'dimensions', 'main_image'
+]
+
+IMAGE_SEPARATOR = '|'
+TRUE_VALUES = {'1', 'true', 'sim', 'yes', 's', 'y'}
+
+
+class RowError(Exception):
+    pass
+
+
+def detect_format(filename, default='csv'):
+    """Formato pelo nome do arquivo (.csv / .jsonl / .ndjson)"""
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(stream, fmt):
+    """
+    Lê o arquivo linha a linha e gera (número_da_linha, dicionário). `stream`
+    pode ser binário ou texto.
+    """
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as e:
+                yield line_number, RowError(f'JSON inválido: {e}')
+
+
+def _text(row, key, default=''):
+    value = row.get(key)
+    if value is None:
+        return default
+    return str(value).strip()
+
+
+def _decimal(row, key, required=False):
+    value = _text(row, key)
+    if not value:
+        if required:
+            raise RowError(f'{key} é obrigatório')
+        return None
+    try:
+        number = Decimal(value.replace(',', '.'))
+    except InvalidOperation:
+        raise RowError(f'{key} inválido: {value}')
+    if not number.is_finite():
+        raise RowError(f'{key} inválido: {value}')
+    # Limites de dígitos e valor mínimo do campo do modelo
+    try:
+        return Product._meta.get_field(key).clean(number, None)
+    except ValidationError as e:
+        raise RowError(f'{key} inválido: {value} ({" ".join(e.messages)})')
+
+
+def _bool(row, key, default):
+    value = row.get(key)
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def parse_row(row):
+    """Valida e normaliza uma linha do arquivo"""
+    if isinstance(row, RowError):
+        raise row
+    if not isinstance(row, dict):
+        raise RowError('linha deve ser um objeto')
+    
+    name = _text(row, 'name')
+    if not name:
+        raise RowError('name é obrigatório')
+    department = _text(row, 'department')
+    if not department:
+        raise RowError('department é obrigatório')
+    
+    # Valores não positivos são rejeitados pelo validador do campo
+    price = _decimal(row, 'price', required=True)
+    promotional_price = _decimal(row, 'promotional_price')
+    
+    images = row.get('images') or []
+    if isinstance(images, str):
+        images = [path.strip() for path in images.split(IMAGE_SEPARATOR) if path.strip()]
+    
+    stock = _text(row, 'stock') or '0'
+    try:
+        stock = int(stock)
+    except ValueError:
+        raise RowError(f'stock inválido: {stock}')
+    if stock < 0:
+        raise RowError('stock não pode ser negativo')
+    
+    return {
+        'slug': _text(row, 'slug') or slugify(name),
+        'name': name,
+        'department': department,
+        'department_slug': _text(row, 'department_slug') or slugify(department),
+        'short_description': _text(row, 'short_description'),
+        'description': _text(row, 'description'),
+        'price': price,
+        'promotional_price': promotional_price,
+        'is_on_promotion': _bool(row, 'is_on_promotion', bool(promotional_price)),
+        'is_active': _bool(row, 'is_active', True),
+        'is_featured': _bool(row, 'is_featured', False),
+        'weight': _decimal(row, 'weight'),
+        'dimensions': _text(row, 'dimensions'),
+        'main_image': _text(row, 'main_image'),
+        'images': images,
+        'stock': stock,
+    }
+
+
+class ImportResult:
+    """
+    Resumo da importação
+    """
+    
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+    
+    def add_error(self, line, message):
+        self.errors.append({'line': line, 'error': str(message)})
+    
+    def to_dict(self, max_errors=None):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'errors_count': len(self.errors),
+            'errors': self.errors[:max_errors] if max_errors else self.errors,
+        }
+
+
+class CatalogImporter:
+    """
+    Importa linhas do catálogo em lotes de `batch_size`.
+    
+    O estoque inicial (`stock`) é lançado apenas para produtos novos, como uma
+    movimentação de entrada; reimportar o arquivo não duplica estoque. As
+    variantes das imagens importadas são geradas depois pelo comando
+    generate_image_variants.
+    """
+    
+    def __init__(self, batch_size=500, user=None):
+        self.batch_size = batch_size
+        self.user = user
+        self.result = ImportResult()
+        self._departments = {}
+    
+    def run(self, rows):
+        batch = []
+        for line, row in rows:
+            try:
+                batch.append((line, parse_row(row)))
+            except RowError as e:
+                self.result.add_error(line, e)
+                continue
+            if len(batch) >= self.batch_size:
+                self._import_batch(batch)
+                batch = []
+        if batch:
+            self._import_batch(batch)
+        return self.result
+    
+    def _import_batch(self, batch):
+        # A última ocorrência de um slug no lote prevalece
+        by_slug = {}
+        for line, data in batch:
+            by_slug[data['slug']] = (line, data)
+        batch = list(by_slug.values())
+        
+        with transaction.atomic():
+            self._ensure_departments(data for _, data in batch)
+            existing = {
+                product.slug: product
+                for product in Product.objects.filter(slug__in=by_slug)
+            }
+            
+            to_create, to_update = [], []
+            for line, data in batch:
+                if data['department_slug'] not in self._departments:
+                    self.result.add_error(line, f"departamento inválido: {data['department']}")
+                    continue
+                product = existing.get(data['slug']) or Product(slug=data['slug'])
+                for field in UPDATE_FIELDS:
+                    if field == 'department':
+                        product.department = self._departments[data['department_slug']]
+                    else:
+                        setattr(product, field, data[field])
+                # Preço base; os agendamentos vigentes são aplicados em _refresh_indexes
+                product.effective_price = product.base_price
+                (to_update if product.pk else to_create).append((line, data, product))
+            
+            created = self._create_products(to_create)
+            if to_update:
+                # bulk_update não aplica auto_now: a versão do produto (ETag) é avançada aqui
+                now = timezone.now()
+                for _, _, product in to_update:
+                    product.updated_at = now
+                Product.objects.bulk_update(
+                    [product for _, _, product in to_update],
+                    UPDATE_FIELDS + ['effective_price', 'updated_at']
+                )
+            
+            self._create_images(created + to_update)
+            self._create_initial_stock(created)
+            self._refresh_indexes([product.pk for _, _, product in created + to_update])
+        
+        self.result.created += len(created)
+        self.result.updated += len(to_update)
+    
+    def _ensure_departments(self, rows):
+        missing = {}
+        for data in rows:
+            if data['department_slug'] not in self._departments:
+                missing.setdefault(data['department_slug'], data['department'])
+        if not missing:
+            return
+        
+        Department.objects.bulk_create(
+            [Department(name=name, slug=slug) for slug, name in missing.items()],
+            ignore_conflicts=True
+        )
+        for department in Department.objects.filter(slug__in=missing):
+            self._departments[department.slug] = department
+        # Departamento com mesmo nome e slug diferente (nome é único)
+        for slug, name in missing.items():
+            if slug not in self._departments:
+                department = Department.objects.filter(name=name).first()
+                if department is not None:
+                    self._departments[slug] = department
+    
+    def _create_products(self, entries):
+        if not entries:
+            return []
+        try:
+            with transaction.atomic():
+                Product.objects.bulk_create([product for _, _, product in entries])
+            return entries
+        except IntegrityError:
+            pass
+        
+        # Isola as linhas com problema sem perder o restante do lote
+        created = []
+        for line, data, product in entries:
+            product.pk = None
+            try:
+                with transaction.atomic():
+                    product.save(force_insert=True)
+                created.append((line, data, product))
+            except IntegrityError as e:
+                self.result.add_error(line, e)
+        return created
+    
+    def _create_images(self, entries):
+        product_ids = [product.pk for _, data, product in entries if data['images']]
+        if not product_ids:
+            return
+        ProductImage.objects.filter(product_id__in=product_ids).delete()
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=path, order=position)
+            for _, data, product in entries
+            for position, path in enumerate(data['images'])
+        ])
+    
+    def _create_initial_stock(self, entries):
+        movements = [
+            Stock(
+                product=product,
+                quantity=data['stock'],
+                movement_type='in',
+                reason='Estoque inicial (importação)',
+                created_by=self.user
+            )
+            for _, data, product in entries if data['stock']
+        ]
+        if not movements:
+            return
+        # bulk_create não passa por Stock.save(): aplica o saldo em lote
+        Stock.objects.bulk_create(movements)
+        StockBalance.apply_deltas({movement.product_id: movement.quantity for movement in movements})
+    
+    def _refresh_indexes(self, product_ids):
+        if not product_ids:
+            return
+        PriceSchedule.refresh_prices(product_ids)
+        ProductFacet.refresh_products(product_ids)
+        get_search_backend().index_products(product_ids)
+        Department.touch_catalog(product_ids=product_ids)
+
+
+def export_rows(queryset=None, chunk_size=2000):
+    """
+    Gera um dicionário por produto (mesmas colunas da importação) sem carregar
+    o catálogo em memória: produtos e imagens são lidos em paralelo, ambos
+    ordenados por produto.
+    """
+    queryset = (queryset if queryset is not None else Product.objects.all()).order_by('id')
+    products = queryset.values_list(
+        'id', 'slug', 'name', 'department__name', 'department__slug', 'short_description',
+        'description', 'price', 'promotional_price', 'is_on_promotion', 'is_active',
+        'is_featured', 'weight', 'dimensions', 'main_image', 'stock_balance__quantity'
+    ).iterator(chunk_size=chunk_size)
+    images = groupby(
+        ProductImage.objects.filter(product__in=queryset.values('pk')).order_by(
+            'product_id', 'order', 'id'
+        ).values_list('product_id', 'image').iterator(chunk_size=chunk_size),
+        key=lambda image: image[0]
+    )
+    
+    pending = next(images, None)
+    for (product_id, slug, name, department, department_slug, short_description, description,
+         price, promotional_price, is_on_promotion, is_active, is_featured, weight,
+         dimensions, main_image, stock) in products:
+        product_images = []
+        while pending is not None and pending[0] <= product_id:
+            if pending[0] == product_id:
+                product_images = [path for _, path in pending[1]]
+            pending = next(images, None)
+        
+        yield {
+            'slug': slug,
+            'name': name,
+            'department': department,
+            'department_slug': department_slug,
+            'short_description': short_description,
+            'description': description,
+            'price': str(price),
+            'promotional_price': str(promotional_price) if promotional_price is not None else '',
+            'is_on_promotion': is_on_promotion,
+            'is_active': is_active,
+            'is_featured': is_featured,
+            'weight': str(weight) if weight is not None else '',
+            'dimensions': dimensions,
+            'main_image': main_image,
+            'images': product_images,
+            'stock': stock or 0,
+        }
+
+
+class _Echo:
+    """Buffer que devolve o que recebe, para csv.writer em streaming"""
+    
+    def write(self, value):
+        return value
+
+
+def render_rows(rows, fmt):
+    """Serializa as linhas exportadas em pedaços de texto (CSV ou JSONL)"""
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(COLUMNS)
+        for row in rows:
+            row = dict(row, images=IMAGE_SEPARATOR.join(row['images']))
+            yield writer.writerow([row[column] for column in COLUMNS])
+    else:
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + '\n'
@@ -0,0 +1,69 @@
+"""
+Validadores para GET condicional (ETag / Last-Modified) do catálogo.
+
+As funções seguem a assinatura de django.views.decorators.http.condition e
+consultam apenas os carimbos de versão (Product.updated_at, saldo de estoque e
+Department.catalog_updated_at), de modo que um 304 é respondido sem montar
+nem serializar o queryset.
+"""
+import hashlib
+
+from django.db.models import Max
+
+from .models import Department, Product
+
+
+def make_etag(version, request):
+    """ETag fraco derivado da versão e da URL completa (filtros e página)"""
+    if version is None:
+        return None
+    digest = hashlib.sha1(
+        f'{version.isoformat()}|{request.get_full_path()}'.encode()
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _memoize(request, key, compute):
+    """condition() chama etag e last_modified em separado; consulta uma só vez"""
+    cache = request.__dict__.setdefault('_catalog_versions', {})
+    if key not in cache:
+        cache[key] = compute()
+    return cache[key]
+
+
+def _department_from_request(request, department_id=None):
+    department_id = department_id or request.GET.get('department')
+    try:
+        return int(department_id) if department_id else None
+    except (TypeError, ValueError):
+        return None
+
+
+def catalog_last_modified(request, department_id=None, **kwargs):
+    """Versão do catálogo (de um departamento, quando filtrado)"""
+    department_id = _department_from_request(request, department_id)
+    return _memoize(
+        request, ('catalog', department_id),
+        lambda: Department.catalog_version(department_id)
+    )
+
+
+def catalog_etag(request, department_id=None, **kwargs):
+    return make_etag(catalog_last_modified(request, department_id), request)
+
+
+def product_last_modified(request, slug=None, **kwargs):
+    """Versão do produto: dados, saldo de estoque e departamento"""
+    def compute():
+        versions = Product.objects.filter(slug=slug, is_active=True).aggregate(
+            product=Max('updated_at'),
+            stock=Max('stock_balance__updated_at'),
+            department=Max('department__catalog_updated_at')
+        )
+        stamps = [stamp for stamp in versions.values() if stamp is not None]
+        return max(stamps) if stamps else None
+    return _memoize(request, ('product', slug), compute)
+
+
+def product_etag(request, slug=None, **kwargs):
+    return make_etag(product_last_modified(request, slug), request)
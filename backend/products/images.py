@@ -0,0 +1,126 @@
+"""
+Variantes responsivas das imagens do catálogo.
+
+Para cada imagem enviada são geradas cópias redimensionadas em larguras fixas
+(IMAGE_VARIANT_WIDTHS) nos formatos de IMAGE_VARIANT_FORMATS, gravadas ao lado
+do original (`foto.jpg` -> `foto__w400.webp`). O mapa de variantes fica em um
+JSONField do próprio modelo, de modo que os serializers montam o `srcset` sem
+acessar o storage.
+"""
+import os
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow é opcional fora do worker de imagens
+    Image = ImageOps = None
+
+# (modelo, campo da imagem, campo do mapa de variantes)
+IMAGE_FIELDS = (
+    ('products.Product', 'main_image', 'main_image_variants'),
+    ('products.ProductImage', 'image', 'image_variants'),
+    ('products.Department', 'image', 'image_variants'),
+)
+
+PIL_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+
+def variant_name(name, width, fmt):
+    """Nome da variante ao lado do original"""
+    root, _ = os.path.splitext(name)
+    return f'{root}__w{width}.{EXTENSIONS[fmt]}'
+
+
+def build_variants(name, storage=None):
+    """
+    Gera as variantes da imagem `name` e retorna o mapa
+    {'source': name, 'width': largura_original, 'webp': {largura: nome}, ...}.
+    Larguras maiores que o original não são geradas (sem ampliação).
+    """
+    if Image is None:
+        raise RuntimeError('Pillow não está instalado.')
+    storage = storage or default_storage
+    
+    with storage.open(name, 'rb') as source:
+        original = ImageOps.exif_transpose(Image.open(source))
+        original.load()
+    
+    variants = {'source': name, 'width': original.width}
+    for fmt in settings.IMAGE_VARIANT_FORMATS:
+        variants[fmt] = {}
+        for width in settings.IMAGE_VARIANT_WIDTHS:
+            if width >= original.width:
+                continue
+            height = max(1, round(original.height * width / original.width))
+            resized = original.resize((width, height), Image.LANCZOS)
+            if fmt == 'jpeg' and resized.mode not in ('RGB', 'L'):
+                resized = resized.convert('RGB')
+            
+            buffer = BytesIO()
+            resized.save(buffer, PIL_FORMATS[fmt], quality=settings.IMAGE_VARIANT_QUALITY, optimize=True)
+            
+            target = variant_name(name, width, fmt)
+            if storage.exists(target):
+                storage.delete(target)
+            variants[fmt][str(width)] = storage.save(target, ContentFile(buffer.getvalue()))
+    return variants
+
+
+def needs_variants(field_file, variants):
+    """Indica se a imagem mudou desde a última geração de variantes"""
+    return bool(field_file) and (variants or {}).get('source') != field_file.name
+
+
+def srcset(field_file, variants):
+    """
+    Mapa estilo srcset por formato: {'webp': 'url 200w, url 400w', ...}.
+    Sem variantes geradas, retorna None.
+    """
+    if not field_file or needs_variants(field_file, variants):
+        return None
+    
+    result = {}
+    for fmt in settings.IMAGE_VARIANT_FORMATS:
+        entries = sorted((int(width), name) for width, name in variants.get(fmt, {}).items())
+        if not entries:
+            continue
+        result[fmt] = ', '.join(f'{field_file.storage.url(name)} {width}w' for width, name in entries)
+    return result or None
+
+
+def touch_catalog(model_label, pk):
+    """As variantes entram no srcset das listagens: avança a versão do catálogo"""
+    Department = apps.get_model('products.Department')
+    if model_label == 'products.Department':
+        Department.touch_catalog([pk])
+    elif model_label == 'products.Product':
+        Department.touch_catalog(product_ids=[pk])
+    else:
+        model = apps.get_model(model_label)
+        Department.touch_catalog(product_ids=model.objects.filter(pk=pk).values_list('product_id', flat=True))
+
+
+def process_image(model_label, pk, field_name, variants_field):
+    """
+    Gera e grava as variantes de um objeto. Atualiza apenas o campo do mapa
+    (queryset.update), sem disparar os sinais de gravação do modelo.
+    """
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).only(field_name, variants_field).first()
+    if instance is None:
+        return None
+    field_file = getattr(instance, field_name)
+    if not needs_variants(field_file, getattr(instance, variants_field)):
+        return None
+    
+    variants = build_variants(field_file.name, field_file.storage)
+    # Só grava se a imagem não foi trocada durante o processamento
+    if model.objects.filter(pk=pk, **{field_name: field_file.name}).update(**{variants_field: variants}):
+        touch_catalog(model_label, pk)
+    return variants
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from products import catalog_io
+from products.models import Product
+
+
+class Command(BaseCommand):
+    """
+    Exporta o catálogo em CSV ou JSONL, lendo o banco em streaming.
+    """
+    help = 'Exporta produtos para CSV ou JSONL'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Arquivo de saída (padrão: saída padrão)')
+        parser.add_argument(
+            '--format',
+            choices=catalog_io.FORMATS,
+            dest='file_format',
+            help='Formato do arquivo (padrão: pela extensão, ou csv)'
+        )
+        parser.add_argument(
+            '--department',
+            type=int,
+            action='append',
+            dest='departments',
+            help='Limitar a exportação a um departamento (pode ser repetido)'
+        )
+    
+    def handle(self, *args, **options):
+        fmt = options['file_format'] or catalog_io.detect_format(options['path'])
+        
+        queryset = Product.objects.all()
+        if options['departments']:
+            queryset = queryset.filter(department_id__in=options['departments'])
+        
+        chunks = catalog_io.render_rows(catalog_io.export_rows(queryset), fmt)
+        if options['path']:
+            with open(options['path'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+            self.stderr.write(self.style.SUCCESS(f"Catálogo exportado para {options['path']}."))
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
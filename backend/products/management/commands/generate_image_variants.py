@@ -0,0 +1,78 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from products.images import IMAGE_FIELDS, build_variants, touch_catalog
+
+
+def _build(job):
+    """Executado nos processos do pool: apenas Pillow e storage, sem banco"""
+    model_label, pk, field_name, variants_field, name = job
+    try:
+        return job, build_variants(name), None
+    except Exception as e:
+        return job, None, str(e)
+
+
+class Command(BaseCommand):
+    """
+    Gera as variantes responsivas das imagens já existentes no catálogo
+    (backfill), distribuindo o processamento das imagens em um pool de processos.
+    """
+    help = 'Gera as variantes WebP/JPEG das imagens de produtos e departamentos'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Quantidade de processos (padrão: número de CPUs)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenera também as imagens que já possuem variantes'
+        )
+    
+    def handle(self, *args, **options):
+        jobs = list(self._pending_jobs(options['force']))
+        if not jobs:
+            self.stdout.write(self.style.SUCCESS('Nenhuma imagem pendente.'))
+            return
+        
+        self.stdout.write(f'{len(jobs)} imagens para processar.')
+        
+        # Conexões abertas não podem ser herdadas pelos processos filhos
+        connections.close_all()
+        
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [executor.submit(_build, job) for job in jobs]
+            for future in as_completed(futures):
+                (model_label, pk, field_name, variants_field, name), variants, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{model_label} {pk} ({name}): {error}')
+                    continue
+                
+                # Só grava se a imagem não foi trocada durante o processamento
+                if apps.get_model(model_label).objects.filter(
+                    pk=pk, **{field_name: name}
+                ).update(**{variants_field: variants}):
+                    touch_catalog(model_label, pk)
+                done += 1
+        
+        message = f'{done} imagens processadas, {failed} com erro.'
+        self.stdout.write(self.style.SUCCESS(message) if not failed else self.style.WARNING(message))
+    
+    def _pending_jobs(self, force):
+        for model_label, field_name, variants_field in IMAGE_FIELDS:
+            model = apps.get_model(model_label)
+            rows = model.objects.exclude(**{field_name: ''}).exclude(
+                **{f'{field_name}__isnull': True}
+            ).values_list('pk', field_name, variants_field).iterator()
+            for pk, name, variants in rows:
+                if force or (variants or {}).get('source') != name:
+                    yield model_label, pk, field_name, variants_field, name
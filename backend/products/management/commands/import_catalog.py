@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products import catalog_io
+
+
+class Command(BaseCommand):
+    """
+    Importa o catálogo (departamentos, produtos, imagens e estoque inicial) de
+    um arquivo CSV ou JSONL, em lotes.
+    """
+    help = 'Importa produtos de um arquivo CSV ou JSONL'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Arquivo a importar')
+        parser.add_argument(
+            '--format',
+            choices=catalog_io.FORMATS,
+            dest='file_format',
+            help='Formato do arquivo (padrão: pela extensão)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Quantidade de linhas gravadas por lote'
+        )
+    
+    def handle(self, *args, **options):
+        fmt = options['file_format'] or catalog_io.detect_format(options['path'])
+        importer = catalog_io.CatalogImporter(batch_size=options['batch_size'])
+        
+        try:
+            with open(options['path'], 'rb') as stream:
+                result = importer.run(catalog_io.read_rows(stream, fmt))
+        except OSError as e:
+            raise CommandError(f'Não foi possível ler o arquivo: {e}')
+        
+        for error in result.errors:
+            self.stderr.write(f"Linha {error['line']}: {error['error']}")
+        
+        message = (
+            f'{result.created} produtos criados, {result.updated} atualizados, '
+            f'{len(result.errors)} linhas com erro.'
+        )
+        self.stdout.write(self.style.WARNING(message) if result.errors else self.style.SUCCESS(message))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+
+
+class Command(BaseCommand):
+    """
+    Recalcula a média, a quantidade e o histograma de avaliações dos produtos a
+    partir das avaliações aprovadas. Necessário após alterações em massa que não
+    passam por ProductReview.save() (queryset.update).
+    """
+    help = 'Recalcula os agregados de avaliações dos produtos'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Produtos por lote de atualização'
+        )
+    
+    def handle(self, *args, **options):
+        changed = Product.rebuild_rating_aggregates(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Agregados de avaliações recalculados: {changed} produtos alterados.'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.search import get_search_backend
+
+
+class Command(BaseCommand):
+    """
+    Reconstrói o índice de busca textual a partir da tabela de produtos.
+    Necessário após atualizações em massa que não disparam sinais (queryset.update).
+    """
+    help = 'Reconstrói o índice de busca textual de produtos'
+    
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        with transaction.atomic():
+            backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Índice de busca reconstruído ({backend.__class__.__name__}).'
+        ))
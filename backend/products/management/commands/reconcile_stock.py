@@ -0,0 +1,100 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.models import Product, ProductFacet, Stock, StockBalance
+
+
+class Command(BaseCommand):
+    """
+    Verifica (e opcionalmente reconstrói) os saldos materializados de estoque
+    comparando-os com o livro de movimentações.
+    """
+    help = 'Verifica e reconstrói os saldos de estoque a partir das movimentações'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Corrige os saldos divergentes em vez de apenas relatá-los'
+        )
+        parser.add_argument(
+            '--product',
+            type=int,
+            action='append',
+            dest='products',
+            help='Limitar a verificação a um produto (pode ser repetido)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Quantidade de produtos processados por lote'
+        )
+    
+    def handle(self, *args, **options):
+        product_ids = Product.objects.order_by('id').values_list('id', flat=True)
+        if options['products']:
+            product_ids = product_ids.filter(id__in=options['products'])
+        product_ids = list(product_ids)
+        
+        batch_size = options['batch_size']
+        checked = 0
+        mismatches = 0
+        
+        for start in range(0, len(product_ids), batch_size):
+            batch = product_ids[start:start + batch_size]
+            expected = Stock.ledger_balances(batch)
+            current = dict(
+                StockBalance.objects.filter(product_id__in=batch).values_list('product_id', 'quantity')
+            )
+            
+            divergent = {}
+            for product_id in batch:
+                ledger_quantity = expected.get(product_id, 0)
+                balance_quantity = current.get(product_id)
+                if balance_quantity is None and ledger_quantity == 0:
+                    continue
+                if balance_quantity != ledger_quantity:
+                    divergent[product_id] = ledger_quantity
+                    self.stdout.write(
+                        f'Produto {product_id}: saldo {balance_quantity} / livro {ledger_quantity}'
+                    )
+            
+            checked += len(batch)
+            mismatches += len(divergent)
+            
+            if divergent and options['fix']:
+                self._rebuild(list(divergent))
+        
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS(f'{checked} produtos verificados, nenhum saldo divergente.'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'{mismatches} saldos corrigidos em {checked} produtos.'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'{mismatches} saldos divergentes em {checked} produtos. Use --fix para corrigir.'
+            ))
+    
+    @transaction.atomic
+    def _rebuild(self, product_ids):
+        # Bloqueia os saldos e recalcula dentro da transação para não perder
+        # movimentações concorrentes registradas durante a verificação
+        current = set(
+            StockBalance.objects.select_for_update().filter(
+                product_id__in=product_ids
+            ).values_list('product_id', flat=True)
+        )
+        expected = Stock.ledger_balances(product_ids)
+        divergent = {product_id: expected.get(product_id, 0) for product_id in product_ids}
+        
+        to_update = [
+            StockBalance(product_id=product_id, quantity=quantity)
+            for product_id, quantity in divergent.items() if product_id in current
+        ]
+        to_create = [
+            StockBalance(product_id=product_id, quantity=quantity)
+            for product_id, quantity in divergent.items() if product_id not in current
+        ]
+        StockBalance.objects.bulk_update(to_update, ['quantity'])
+        StockBalance.objects.bulk_create(to_create)
+        ProductFacet.refresh_stock(divergent)
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.16 on 2026-10-17 02:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_stock_balances(apps, schema_editor):
+    Stock = apps.get_model('products', 'Stock')
+    StockBalance = apps.get_model('products', 'StockBalance')
+    
+    signed_quantity = models.Case(
+        models.When(movement_type='out', then=-models.F('quantity')),
+        default=models.F('quantity'),
+        output_field=models.IntegerField()
+    )
+    rows = Stock.objects.order_by().values('product_id').annotate(total=models.Sum(signed_quantity))
+    StockBalance.objects.bulk_create(
+        [StockBalance(product_id=row['product_id'], quantity=row['total'] or 0) for row in rows],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockBalance',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock_balance', serialize=False, to='products.product', verbose_name='Produto')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Quantidade')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Saldo de Estoque',
+                'verbose_name_plural': 'Saldos de Estoque',
+            },
+        ),
+        migrations.RunPython(backfill_stock_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.16 on 2026-10-17 02:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_stockbalance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Mês')),
+                ('quantity_in', models.IntegerField(default=0, verbose_name='Entradas')),
+                ('quantity_out', models.IntegerField(default=0, verbose_name='Saídas')),
+                ('quantity_adjustment', models.IntegerField(default=0, verbose_name='Ajustes')),
+                ('movements_count', models.PositiveIntegerField(default=0, verbose_name='Movimentações')),
+            ],
+            options={
+                'verbose_name': 'Resumo Mensal de Estoque',
+                'verbose_name_plural': 'Resumos Mensais de Estoque',
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(verbose_name='Quantidade')),
+                ('taken_at', models.DateTimeField(verbose_name='Saldo em')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Estoque',
+                'verbose_name_plural': 'Snapshots de Estoque',
+                'ordering': ['-taken_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['product', 'created_at'], name='products_st_product_de2b66_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['created_at'], name='products_st_created_8822c1_idx'),
+        ),
+        migrations.AddField(
+            model_name='stocksnapshot',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='products.product', verbose_name='Produto'),
+        ),
+        migrations.AddField(
+            model_name='stockmonthlysummary',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_summaries', to='products.product', verbose_name='Produto'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='stocksnapshot',
+            unique_together={('product', 'taken_at')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='stockmonthlysummary',
+            unique_together={('product', 'month')},
+        ),
+    ]
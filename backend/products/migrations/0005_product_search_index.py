@@ -0,0 +1,64 @@
+from django.db import migrations
+
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('portuguese_unaccent', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('portuguese_unaccent', coalesce(short_description, '')), 'B') || "
+    "setweight(to_tsvector('portuguese_unaccent', coalesce(description, '')), 'C')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Cria o índice textual de produtos conforme o banco:
+    tsvector + GIN no PostgreSQL, tabela virtual FTS5 no SQLite.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+        schema_editor.execute(
+            "DO $$ BEGIN "
+            "CREATE TEXT SEARCH CONFIGURATION portuguese_unaccent (COPY = portuguese); "
+            "EXCEPTION WHEN duplicate_object THEN NULL; "
+            "END $$"
+        )
+        schema_editor.execute(
+            "ALTER TEXT SEARCH CONFIGURATION portuguese_unaccent "
+            "ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem"
+        )
+        schema_editor.execute("ALTER TABLE products_product ADD COLUMN IF NOT EXISTS search_vector tsvector")
+        schema_editor.execute(f"UPDATE products_product SET search_vector = {POSTGRES_VECTOR}")
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS products_product_search_idx "
+            "ON products_product USING GIN (search_vector)"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS products_product_fts USING fts5("
+            "name, short_description, description, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO products_product_fts (rowid, name, short_description, description) "
+            "SELECT id, name, short_description, description FROM products_product"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS products_product_search_idx")
+        schema_editor.execute("ALTER TABLE products_product DROP COLUMN IF EXISTS search_vector")
+        schema_editor.execute("DROP TEXT SEARCH CONFIGURATION IF EXISTS portuguese_unaccent")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS products_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_stock_snapshots_and_summaries'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
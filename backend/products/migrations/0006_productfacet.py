@@ -0,0 +1,51 @@
+# Generated by Django 4.2.16 on 2026-10-17 02:43
+
+from bisect import bisect_right
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_product_facets(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductFacet = apps.get_model('products', 'ProductFacet')
+    
+    rows = Product.objects.values_list('id', 'department_id', 'price', 'stock_balance__quantity').iterator()
+    ProductFacet.objects.bulk_create(
+        (
+            ProductFacet(
+                product_id=product_id,
+                department_id=department_id,
+                price_bucket=bisect_right(settings.CATALOG_PRICE_BUCKETS, price),
+                in_stock=(quantity or 0) > 0
+            )
+            for product_id, department_id, price, quantity in rows
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacet',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='facet', serialize=False, to='products.product', verbose_name='Produto')),
+                ('price_bucket', models.PositiveSmallIntegerField(default=0, verbose_name='Faixa de Preço')),
+                ('in_stock', models.BooleanField(default=False, verbose_name='Em Estoque')),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.department', verbose_name='Departamento')),
+            ],
+            options={
+                'verbose_name': 'Faceta de Produto',
+                'verbose_name_plural': 'Facetas de Produtos',
+                'indexes': [models.Index(fields=['department', 'price_bucket', 'in_stock'], name='products_pr_departm_a604c6_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_product_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-17 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_productfacet'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', '-created_at', '-id'], name='products_pr_is_acti_079805_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.16 on 2026-10-17 02:49
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='department',
+            name='catalog_updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Versão do catálogo do departamento (produtos, preços e estoque)', verbose_name='Catálogo Atualizado em'),
+        ),
+    ]
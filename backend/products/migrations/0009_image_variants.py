@@ -0,0 +1,28 @@
+# Generated by Django 4.2.16 on 2026-10-17 02:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_department_catalog_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='department',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variantes da Imagem'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='main_image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variantes da Imagem Principal'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variantes da Imagem'),
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 4.2.16 on 2026-10-17 02:58
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_effective_price(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    
+    # Sem agendamentos ainda: o preço efetivo é o preço base
+    Product.objects.update(effective_price=models.Case(
+        models.When(
+            is_on_promotion=True, promotional_price__isnull=False,
+            then=models.F('promotional_price')
+        ),
+        default=models.F('price')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Nome')),
+                ('kind', models.CharField(choices=[('price', 'Preço fixo'), ('percentage', 'Percentual de desconto')], default='price', max_length=20, verbose_name='Tipo')),
+                ('value', models.DecimalField(decimal_places=2, help_text='Preço (tipo preço fixo) ou percentual de desconto', max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))], verbose_name='Valor')),
+                ('starts_at', models.DateTimeField(verbose_name='Início')),
+                ('ends_at', models.DateTimeField(blank=True, null=True, verbose_name='Fim')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Ativo')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Preço Agendado',
+                'verbose_name_plural': 'Preços Agendados',
+                'ordering': ['-starts_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, editable=False, help_text='Preço vigente materializado (promoção manual e preços agendados)', max_digits=10, null=True, verbose_name='Preço Efetivo'),
+        ),
+        migrations.RunPython(backfill_effective_price, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, editable=False, help_text='Preço vigente materializado (promoção manual e preços agendados)', max_digits=10, verbose_name='Preço Efetivo'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'effective_price'], name='products_pr_is_acti_6f57d5_idx'),
+        ),
+        migrations.AddField(
+            model_name='priceschedule',
+            name='department',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='price_schedules', to='products.department', verbose_name='Departamento'),
+        ),
+        migrations.AddField(
+            model_name='priceschedule',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='price_schedules', to='products.product', verbose_name='Produto'),
+        ),
+        migrations.AddIndex(
+            model_name='priceschedule',
+            index=models.Index(fields=['is_active', 'starts_at'], name='products_pr_is_acti_e40711_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='priceschedule',
+            index=models.Index(fields=['is_active', 'ends_at'], name='products_pr_is_acti_d6b5b8_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='priceschedule',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('department__isnull', True), ('product__isnull', False)), models.Q(('department__isnull', False), ('product__isnull', True)), _connector='OR'), name='price_schedule_single_target'),
+        ),
+        migrations.AddConstraint(
+            model_name='priceschedule',
+            constraint=models.CheckConstraint(check=models.Q(('kind', 'percentage'), ('value__gt', 100), _negated=True), name='price_schedule_percentage_range'),
+        ),
+        migrations.AddConstraint(
+            model_name='priceschedule',
+            constraint=models.CheckConstraint(check=models.Q(('ends_at__isnull', True), ('ends_at__gt', models.F('starts_at')), _connector='OR'), name='price_schedule_valid_period'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.16 on 2026-10-17 03:00
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_price_schedules'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Nome')),
+                ('value', models.DateTimeField(blank=True, null=True, verbose_name='Processado até')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': "Marca d'Água de Processamento",
+                'verbose_name_plural': "Marcas d'Água de Processamento",
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductRanking',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='products.product', verbose_name='Produto')),
+                ('score', models.FloatField(default=0, verbose_name='Pontuação')),
+                ('rank', models.PositiveIntegerField(verbose_name='Posição')),
+                ('quantity_7d', models.PositiveIntegerField(default=0, verbose_name='Quantidade (7 dias)')),
+                ('quantity_30d', models.PositiveIntegerField(default=0, verbose_name='Quantidade (30 dias)')),
+                ('quantity_90d', models.PositiveIntegerField(default=0, verbose_name='Quantidade (90 dias)')),
+                ('revenue_7d', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Receita (7 dias)')),
+                ('revenue_30d', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Receita (30 dias)')),
+                ('revenue_90d', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Receita (90 dias)')),
+                ('computed_at', models.DateTimeField(verbose_name='Calculado em')),
+            ],
+            options={
+                'verbose_name': 'Ranking de Produto',
+                'verbose_name_plural': 'Ranking de Produtos',
+                'ordering': ['rank'],
+                'indexes': [models.Index(fields=['-score'], name='products_pr_score_b40936_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Dia')),
+                ('quantity', models.PositiveIntegerField(default=0, verbose_name='Quantidade')),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Receita')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='Pedidos')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_daily', to='products.product', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Venda Diária',
+                'verbose_name_plural': 'Vendas Diárias',
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['day', 'product'], name='products_pr_day_f3c9d3_idx')],
+                'unique_together': {('product', 'day')},
+            },
+        ),
+    ]
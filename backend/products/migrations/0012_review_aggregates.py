@@ -0,0 +1,59 @@
+# Generated by Django 4.2.16 on 2026-10-17 03:02
+
+from decimal import Decimal
+from django.db import migrations, models
+import products.models
+
+
+def backfill_review_aggregates(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductReview = apps.get_model('products', 'ProductReview')
+    
+    histograms = {}
+    rows = ProductReview.objects.filter(is_approved=True).values('product_id', 'rating').annotate(
+        total=models.Count('id')
+    ).order_by()
+    for row in rows:
+        histograms.setdefault(row['product_id'], products.models.empty_rating_histogram())
+        histograms[row['product_id']][str(row['rating'])] = row['total']
+    
+    changed = []
+    for product in Product.objects.filter(pk__in=histograms).only('id'):
+        histogram = histograms[product.pk]
+        count = sum(histogram.values())
+        total = sum(int(rating) * quantity for rating, quantity in histogram.items())
+        product.rating_histogram = histogram
+        product.rating_count = count
+        product.rating_avg = (Decimal(total) / count).quantize(Decimal('0.01'))
+        changed.append(product)
+    Product.objects.bulk_update(changed, ['rating_histogram', 'rating_count', 'rating_avg'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_rankings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=3, verbose_name='Avaliação Média'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Quantidade de Avaliações'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_histogram',
+            field=models.JSONField(default=products.models.empty_rating_histogram, editable=False, verbose_name='Avaliações por Estrela'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'rating_avg'], name='products_pr_is_acti_2dfd9c_idx'),
+        ),
+        migrations.RunPython(backfill_review_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.16 on 2026-10-17 03:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_review_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Similaridade')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Posição')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_products', to='products.product', verbose_name='Produto')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product', verbose_name='Produto Relacionado')),
+            ],
+            options={
+                'verbose_name': 'Produto Relacionado',
+                'verbose_name_plural': 'Produtos Relacionados',
+                'ordering': ['product', 'rank'],
+                'indexes': [models.Index(fields=['product', 'rank'], name='products_re_product_5f5c5b_idx')],
+                'unique_together': {('product', 'related')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductCooccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Pedidos em Comum')),
+                ('product_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product', verbose_name='Produto A')),
+                ('product_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product', verbose_name='Produto B')),
+            ],
+            options={
+                'verbose_name': 'Coocorrência de Produtos',
+                'verbose_name_plural': 'Coocorrências de Produtos',
+                'indexes': [models.Index(fields=['product_b'], name='products_pr_product_39ac99_idx')],
+                'unique_together': {('product_a', 'product_b')},
+            },
+        ),
+    ]
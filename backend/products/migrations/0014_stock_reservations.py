@@ -0,0 +1,39 @@
+# Generated by Django 4.2.16 on 2026-10-17 03:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_updated_at_index'),
+        ('products', '0013_related_products'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockbalance',
+            name='reserved',
+            field=models.IntegerField(default=0, verbose_name='Reservado'),
+        ),
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Quantidade')),
+                ('status', models.CharField(choices=[('active', 'Ativa'), ('converted', 'Convertida'), ('released', 'Liberada')], default='active', max_length=10, verbose_name='Status')),
+                ('expires_at', models.DateTimeField(verbose_name='Expira em')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('resolved_at', models.DateTimeField(blank=True, null=True, verbose_name='Resolvida em')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='orders.order', verbose_name='Pedido')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='products.product', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Reserva de Estoque',
+                'verbose_name_plural': 'Reservas de Estoque',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='products_st_status_657db7_idx'), models.Index(fields=['order', 'status'], name='products_st_order_i_c65a4c_idx')],
+            },
+        ),
+    ]
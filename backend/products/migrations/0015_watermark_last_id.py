@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-17 03:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingwatermark',
+            name='last_id',
+            field=models.BigIntegerField(blank=True, help_text='Desempate por id no instante value (processamento em lotes interrompido)', null=True, verbose_name='Último ID'),
+        ),
+    ]
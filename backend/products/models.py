@@ -1,7 +1,57 @@
-from django.db import models
+from bisect import bisect_right
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import (
+    Case, Count, Exists, F, IntegerField, OuterRef, Prefetch, Q, Subquery, Sum, Value, When
+)
+from django.db.models.functions import TruncMonth
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
+from django.utils import timezone
+from datetime import timedelta
 from decimal import Decimal
 
+from . import cache as catalog_cache
+
+
+class DepartmentQuerySet(models.QuerySet):
+    """
+    QuerySet de departamentos com anotações usadas pelos serializers
+    """
+    
+    def with_products_count(self):
+        """Anota a quantidade de produtos ativos (lida por DepartmentSerializer)"""
+        return self.annotate(
+            active_products_count=Count('products', filter=Q(products__is_active=True))
+        )
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    QuerySet de produtos com os relacionamentos lidos pelos serializers
+    """
+    
+    def for_listing(self):
+        """Departamento e saldo de estoque na mesma consulta (ProductListSerializer)"""
+        return self.select_related('department', 'stock_balance')
+    
+    def for_detail(self):
+        """
+        Listagem mais imagens e as últimas PRODUCT_DETAIL_STOCK_MOVEMENTS
+        movimentações pré-carregadas em recent_stock (ProductDetailSerializer);
+        o saldo vem de stock_balance, sem ler o histórico inteiro
+        """
+        return self.for_listing().prefetch_related(
+            'images',
+            Prefetch(
+                'stock',
+                queryset=Stock.objects.order_by('-created_at', '-id')[:settings.PRODUCT_DETAIL_STOCK_MOVEMENTS],
+                to_attr='recent_stock'
+            )
+        )
+
 
 class Department(models.Model):
     """
@@ -11,9 +61,17 @@ class Department(models.Model):
     description = models.TextField(blank=True, verbose_name='Descrição')
     slug = models.SlugField(max_length=100, unique=True, verbose_name='Slug')
     image = models.ImageField(upload_to='departments/', blank=True, null=True, verbose_name='Imagem')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Variantes da Imagem')
     is_active = models.BooleanField(default=True, verbose_name='Ativo')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
+    catalog_updated_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Catálogo Atualizado em',
+        help_text='Versão do catálogo do departamento (produtos, preços e estoque)'
+    )
+    
+    objects = DepartmentQuerySet.as_manager()
     
     class Meta:
         verbose_name = 'Departamento'
@@ -22,6 +80,46 @@ class Department(models.Model):
     
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        self.catalog_updated_at = timezone.now()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'catalog_updated_at'}
+        super().save(*args, **kwargs)
+        catalog_cache.invalidate(department_ids=[self.pk])
+    
+    @classmethod
+    def touch_catalog(cls, department_ids=None, product_ids=None):
+        """
+        Avança a versão do catálogo dos departamentos informados (ou dos
+        departamentos dos produtos informados) em uma única consulta.
+        """
+        queryset = cls.objects.all()
+        if department_ids is not None:
+            queryset = queryset.filter(pk__in=[pk for pk in department_ids if pk])
+        if product_ids is not None:
+            queryset = queryset.filter(pk__in=Product.objects.filter(
+                pk__in=list(product_ids)
+            ).values('department_id'))
+        queryset.update(catalog_updated_at=timezone.now())
+        catalog_cache.invalidate(department_ids, product_ids)
+    
+    @classmethod
+    def catalog_version(cls, department_id=None):
+        """Versão do catálogo de um departamento, ou de todo o catálogo"""
+        queryset = cls.objects.all()
+        if department_id is not None:
+            queryset = queryset.filter(pk=department_id)
+        return queryset.aggregate(version=models.Max('catalog_updated_at'))['version']
+
+
+def empty_rating_histogram():
+    return {str(rating): 0 for rating in range(1, 6)}
+
+
+# Campos que alteram o preço efetivo do produto
+PRICE_FIELDS = {'price', 'promotional_price', 'is_on_promotion', 'department', 'department_id'}
 
 
 class Product(models.Model):
@@ -56,9 +154,19 @@ class Product(models.Model):
         validators=[MinValueValidator(Decimal('0.01'))],
         verbose_name='Preço Promocional'
     )
+    effective_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        editable=False,
+        verbose_name='Preço Efetivo',
+        help_text='Preço vigente materializado (promoção manual e preços agendados)'
+    )
     
     # Imagens
     main_image = models.ImageField(upload_to='products/', verbose_name='Imagem Principal')
+    main_image_variants = models.JSONField(
+        default=dict, blank=True, editable=False, verbose_name='Variantes da Imagem Principal'
+    )
     
     # Especificações técnicas
     weight = models.DecimalField(
@@ -75,6 +183,21 @@ class Product(models.Model):
     is_featured = models.BooleanField(default=False, verbose_name='Produto em Destaque')
     is_on_promotion = models.BooleanField(default=False, verbose_name='Em Promoção')
     
+    # Avaliações (agregados das avaliações aprovadas)
+    rating_avg = models.DecimalField(
+        max_digits=3,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False,
+        verbose_name='Avaliação Média'
+    )
+    rating_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Quantidade de Avaliações')
+    rating_histogram = models.JSONField(
+        default=empty_rating_histogram,
+        editable=False,
+        verbose_name='Avaliações por Estrela'
+    )
+    
     # SEO
     meta_title = models.CharField(max_length=60, blank=True, verbose_name='Meta Título')
     meta_description = models.CharField(max_length=160, blank=True, verbose_name='Meta Descrição')
@@ -83,40 +206,145 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
     
+    objects = ProductQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Produto'
         verbose_name_plural = 'Produtos'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', '-created_at', '-id']),
+            models.Index(fields=['is_active', 'effective_price']),
+            models.Index(fields=['is_active', 'rating_avg']),
+        ]
     
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or PRICE_FIELDS.intersection(update_fields):
+            self.effective_price = PriceSchedule.effective_price_for(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'effective_price'}
+        super().save(*args, **kwargs)
+    
     @property
-    def current_price(self):
-        """Retorna o preço atual (promocional se disponível, senão o preço normal)"""
+    def base_price(self):
+        """Preço sem agendamentos (promocional manual, se ativo, senão o preço normal)"""
         if self.is_on_promotion and self.promotional_price:
             return self.promotional_price
         return self.price
     
+    @staticmethod
+    def base_price_expression():
+        """Expressão SQL equivalente a base_price"""
+        return Case(
+            When(is_on_promotion=True, promotional_price__isnull=False, then=F('promotional_price')),
+            default=F('price')
+        )
+    
+    @property
+    def current_price(self):
+        """Retorna o preço atual (preço efetivo materializado)"""
+        if self.effective_price is None:
+            return self.base_price
+        return self.effective_price
+    
     @property
     def discount_percentage(self):
-        """Calcula a porcentagem de desconto se houver promoção"""
-        if self.is_on_promotion and self.promotional_price:
-            discount = ((self.price - self.promotional_price) / self.price) * 100
+        """Calcula a porcentagem de desconto sobre o preço normal"""
+        if self.current_price < self.price:
+            discount = ((self.price - self.current_price) / self.price) * 100
             return round(discount, 2)
         return 0
     
     @property
     def stock_quantity(self):
-        """Retorna a quantidade total em estoque"""
-        return self.stock.aggregate(
-            total=models.Sum('quantity')
-        )['total'] or 0
+        """Retorna a quantidade total em estoque (saldo materializado)"""
+        try:
+            return self.stock_balance.quantity
+        except StockBalance.DoesNotExist:
+            return 0
+    
+    @property
+    def available_quantity(self):
+        """Quantidade disponível para venda: saldo menos as reservas ativas"""
+        try:
+            return self.stock_balance.available
+        except StockBalance.DoesNotExist:
+            return 0
     
     @property
     def is_in_stock(self):
         """Verifica se o produto está em estoque"""
-        return self.stock_quantity > 0
+        return self.available_quantity > 0
+    
+    def set_rating_histogram(self, histogram):
+        """Atualiza o histograma e os agregados derivados (quantidade e média)"""
+        self.rating_histogram = {**empty_rating_histogram(), **histogram}
+        self.rating_count = sum(self.rating_histogram.values())
+        if self.rating_count:
+            total = sum(int(rating) * count for rating, count in self.rating_histogram.items())
+            self.rating_avg = (Decimal(total) / self.rating_count).quantize(Decimal('0.01'))
+        else:
+            self.rating_avg = Decimal('0.00')
+    
+    @classmethod
+    def apply_rating_deltas(cls, deltas):
+        """
+        Aplica variações do histograma de avaliações ({product_id: {estrela:
+        delta}}) com as linhas dos produtos bloqueadas, em consultas constantes.
+        """
+        deltas = {
+            product_id: {rating: delta for rating, delta in stars.items() if delta}
+            for product_id, stars in deltas.items()
+        }
+        deltas = {product_id: stars for product_id, stars in deltas.items() if stars}
+        if not deltas:
+            return
+        
+        with transaction.atomic():
+            products = list(
+                cls.objects.select_for_update().filter(pk__in=deltas).order_by('pk').only(
+                    'id', 'rating_histogram'
+                )
+            )
+            for product in products:
+                histogram = {**empty_rating_histogram(), **product.rating_histogram}
+                for rating, delta in deltas[product.pk].items():
+                    histogram[str(rating)] = max(0, histogram[str(rating)] + delta)
+                product.set_rating_histogram(histogram)
+            cls.objects.bulk_update(products, ['rating_histogram', 'rating_count', 'rating_avg'])
+        Department.touch_catalog(product_ids=deltas)
+    
+    @classmethod
+    def rebuild_rating_aggregates(cls, batch_size=1000):
+        """
+        Recalcula os agregados de avaliações de todos os produtos a partir das
+        avaliações aprovadas e retorna quantos produtos mudaram
+        """
+        histograms = defaultdict(dict)
+        rows = ProductReview.objects.filter(is_approved=True).values('product_id', 'rating').annotate(
+            total=Count('id')
+        ).order_by()
+        for row in rows:
+            histograms[row['product_id']][str(row['rating'])] = row['total']
+        
+        changed = []
+        products = cls.objects.only('id', 'rating_histogram', 'rating_count', 'rating_avg').order_by('pk')
+        for product in products.iterator(chunk_size=batch_size):
+            previous = (product.rating_histogram, product.rating_count, product.rating_avg)
+            product.set_rating_histogram(histograms.get(product.pk, {}))
+            if (product.rating_histogram, product.rating_count, product.rating_avg) != previous:
+                changed.append(product)
+        
+        if changed:
+            cls.objects.bulk_update(
+                changed, ['rating_histogram', 'rating_count', 'rating_avg'], batch_size=batch_size
+            )
+            Department.touch_catalog(product_ids=[product.pk for product in changed])
+        return len(changed)
 
 
 class ProductImage(models.Model):
@@ -130,6 +358,7 @@ class ProductImage(models.Model):
         verbose_name='Produto'
     )
     image = models.ImageField(upload_to='products/gallery/', verbose_name='Imagem')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Variantes da Imagem')
     alt_text = models.CharField(max_length=255, blank=True, verbose_name='Texto Alternativo')
     order = models.PositiveIntegerField(default=0, verbose_name='Ordem')
     
@@ -179,9 +408,985 @@ class Stock(models.Model):
         verbose_name = 'Estoque'
         verbose_name_plural = 'Estoques'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['product', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
     
     def __str__(self):
         return f"{self.product.name} - {self.get_movement_type_display()}: {self.quantity}"
+    
+    @property
+    def signed_quantity(self):
+        """Quantidade com sinal: saídas subtraem, entradas e ajustes somam"""
+        if self.movement_type == 'out':
+            return -self.quantity
+        return self.quantity
+    
+    @staticmethod
+    def signed_quantity_expression():
+        """Expressão SQL equivalente a signed_quantity, para agregações no banco"""
+        return Case(
+            When(movement_type='out', then=-F('quantity')),
+            default=F('quantity'),
+            output_field=IntegerField()
+        )
+    
+    @classmethod
+    def ledger_balances(cls, product_ids=None, as_of=None):
+        """
+        Recalcula os saldos a partir do livro ({product_id: saldo}): último
+        snapshot de cada produto somado às movimentações posteriores a ele.
+        """
+        as_of = as_of or timezone.now()
+        snapshots = StockSnapshot.latest_before(as_of)
+        
+        balances_queryset = StockSnapshot.objects.filter(
+            taken_at__lte=as_of,
+            taken_at=Subquery(snapshots.filter(product=OuterRef('product')).values('taken_at')[:1])
+        )
+        movements = cls.objects.filter(created_at__lte=as_of).annotate(
+            since=Subquery(snapshots.filter(product=OuterRef('product')).values('taken_at')[:1])
+        ).filter(Q(since__isnull=True) | Q(created_at__gt=F('since')))
+        
+        if product_ids is not None:
+            balances_queryset = balances_queryset.filter(product_id__in=product_ids)
+            movements = movements.filter(product_id__in=product_ids)
+        
+        balances = dict(balances_queryset.values_list('product_id', 'quantity'))
+        rows = movements.order_by().values('product_id').annotate(
+            total=Sum(cls.signed_quantity_expression())
+        )
+        for row in rows:
+            balances[row['product_id']] = balances.get(row['product_id'], 0) + (row['total'] or 0)
+        return balances
+    
+    def save(self, *args, **kwargs):
+        """Grava a movimentação e atualiza o saldo do produto na mesma transação"""
+        with transaction.atomic():
+            deltas = {}
+            if self.pk:
+                previous = Stock.objects.filter(pk=self.pk).values(
+                    'product_id', 'movement_type', 'quantity'
+                ).first()
+                if previous:
+                    sign = -1 if previous['movement_type'] == 'out' else 1
+                    deltas[previous['product_id']] = -sign * previous['quantity']
+            super().save(*args, **kwargs)
+            deltas[self.product_id] = deltas.get(self.product_id, 0) + self.signed_quantity
+            StockBalance.apply_deltas(deltas)
+        self._forget_cached_balance()
+    
+    def delete(self, *args, **kwargs):
+        """Remove a movimentação estornando seu efeito no saldo"""
+        with transaction.atomic():
+            StockBalance.apply_deltas({self.product_id: -self.signed_quantity})
+            result = super().delete(*args, **kwargs)
+        self._forget_cached_balance()
+        return result
+    
+    def _forget_cached_balance(self):
+        # Evita que a instância do produto já carregada exiba o saldo antigo
+        if Stock.product.is_cached(self):
+            relation = Product.stock_balance.related
+            if relation.is_cached(self.product):
+                relation.delete_cached_value(self.product)
+
+
+class StockSnapshot(models.Model):
+    """
+    Saldo de um produto em um instante (taken_at). O saldo em qualquer data é
+    o último snapshot anterior somado às movimentações posteriores a ele.
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_snapshots',
+        verbose_name='Produto'
+    )
+    quantity = models.IntegerField(verbose_name='Quantidade')
+    taken_at = models.DateTimeField(verbose_name='Saldo em')
+    
+    class Meta:
+        verbose_name = 'Snapshot de Estoque'
+        verbose_name_plural = 'Snapshots de Estoque'
+        ordering = ['-taken_at']
+        unique_together = ['product', 'taken_at']
+    
+    def __str__(self):
+        return f"{self.product.name} em {self.taken_at}: {self.quantity}"
+    
+    @classmethod
+    def latest_before(cls, as_of):
+        """Snapshots até as_of, do mais recente para o mais antigo"""
+        return cls.objects.filter(taken_at__lte=as_of).order_by('-taken_at')
+    
+    @classmethod
+    def take(cls, as_of=None, product_ids=None):
+        """
+        Registra snapshots em as_of para os produtos que tiveram movimentações
+        desde o seu último snapshot. Retorna a quantidade de snapshots criados.
+        """
+        as_of = as_of or timezone.now()
+        changed = Stock.objects.filter(created_at__lte=as_of).annotate(
+            since=Subquery(cls.latest_before(as_of).filter(product=OuterRef('product')).values('taken_at')[:1])
+        ).filter(Q(since__isnull=True) | Q(created_at__gt=F('since')))
+        if product_ids is not None:
+            changed = changed.filter(product_id__in=product_ids)
+        changed = list(changed.order_by().values_list('product_id', flat=True).distinct())
+        if not changed:
+            return 0
+        
+        balances = Stock.ledger_balances(changed, as_of=as_of)
+        cls.objects.bulk_create(
+            [cls(product_id=product_id, quantity=balances.get(product_id, 0), taken_at=as_of) for product_id in changed],
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+        return len(changed)
+
+
+class StockMonthlySummary(models.Model):
+    """
+    Resumo mensal das movimentações compactadas de um produto. O detalhe é
+    mantido apenas dentro da janela configurada em STOCK_LEDGER_DETAIL_DAYS.
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_summaries',
+        verbose_name='Produto'
+    )
+    month = models.DateField(verbose_name='Mês')
+    quantity_in = models.IntegerField(default=0, verbose_name='Entradas')
+    quantity_out = models.IntegerField(default=0, verbose_name='Saídas')
+    quantity_adjustment = models.IntegerField(default=0, verbose_name='Ajustes')
+    movements_count = models.PositiveIntegerField(default=0, verbose_name='Movimentações')
+    
+    class Meta:
+        verbose_name = 'Resumo Mensal de Estoque'
+        verbose_name_plural = 'Resumos Mensais de Estoque'
+        ordering = ['-month']
+        unique_together = ['product', 'month']
+    
+    def __str__(self):
+        return f"{self.product.name} - {self.month:%m/%Y}: {self.net_quantity}"
+    
+    @property
+    def net_quantity(self):
+        """Variação líquida do saldo no mês"""
+        return self.quantity_in - self.quantity_out + self.quantity_adjustment
+    
+    @classmethod
+    def compact(cls, product_ids, cutoff):
+        """
+        Consolida em resumos mensais as movimentações anteriores a cutoff dos
+        produtos informados e remove o detalhe. Um snapshot em cutoff é
+        registrado antes, para que os saldos continuem calculáveis.
+        """
+        with transaction.atomic():
+            StockSnapshot.take(as_of=cutoff, product_ids=product_ids)
+            
+            old_movements = Stock.objects.filter(product_id__in=product_ids, created_at__lt=cutoff)
+            rows = old_movements.annotate(month=TruncMonth('created_at')).order_by().values(
+                'product_id', 'month'
+            ).annotate(
+                quantity_in=Sum(Case(When(movement_type='in', then=F('quantity')), default=Value(0))),
+                quantity_out=Sum(Case(When(movement_type='out', then=F('quantity')), default=Value(0))),
+                quantity_adjustment=Sum(Case(When(movement_type='adjustment', then=F('quantity')), default=Value(0))),
+                movements_count=models.Count('id')
+            )
+            
+            totals = {}
+            for row in rows:
+                month = timezone.localtime(row['month']).date() if timezone.is_aware(row['month']) else row['month'].date()
+                key = (row['product_id'], month.replace(day=1))
+                summary = totals.setdefault(key, cls(product_id=key[0], month=key[1]))
+                summary.quantity_in += row['quantity_in']
+                summary.quantity_out += row['quantity_out']
+                summary.quantity_adjustment += row['quantity_adjustment']
+                summary.movements_count += row['movements_count']
+            
+            if not totals:
+                return 0
+            
+            existing = cls.objects.select_for_update().filter(
+                product_id__in={product_id for product_id, _ in totals},
+                month__in={month for _, month in totals}
+            )
+            to_update = []
+            for summary in existing:
+                key = (summary.product_id, summary.month)
+                if key in totals:
+                    new = totals.pop(key)
+                    summary.quantity_in += new.quantity_in
+                    summary.quantity_out += new.quantity_out
+                    summary.quantity_adjustment += new.quantity_adjustment
+                    summary.movements_count += new.movements_count
+                    to_update.append(summary)
+            
+            cls.objects.bulk_update(
+                to_update,
+                ['quantity_in', 'quantity_out', 'quantity_adjustment', 'movements_count'],
+                batch_size=1000
+            )
+            cls.objects.bulk_create(totals.values(), batch_size=1000)
+            
+            # O saldo materializado não muda: apenas o detalhe antigo é removido
+            deleted, _ = old_movements.delete()
+            
+            # Snapshots anteriores ao último snapshot até cutoff não são mais necessários
+            StockSnapshot.objects.filter(
+                product_id__in=product_ids,
+                taken_at__lt=Subquery(
+                    StockSnapshot.latest_before(cutoff).filter(product=OuterRef('product')).values('taken_at')[:1]
+                )
+            ).delete()
+            return deleted
+
+
+class StockBalance(models.Model):
+    """
+    Saldo de estoque materializado por produto.
+    
+    Mantido incrementalmente a cada movimentação registrada em Stock, evitando
+    somar todo o livro de movimentações em cada leitura. O comando
+    `reconcile_stock` verifica e reconstrói os saldos a partir do livro.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stock_balance',
+        verbose_name='Produto'
+    )
+    quantity = models.IntegerField(default=0, verbose_name='Quantidade')
+    # Soma das reservas ativas (StockReservation), mantida junto com o saldo
+    reserved = models.IntegerField(default=0, verbose_name='Reservado')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
+    
+    class Meta:
+        verbose_name = 'Saldo de Estoque'
+        verbose_name_plural = 'Saldos de Estoque'
+    
+    def __str__(self):
+        return f"{self.product.name}: {self.quantity}"
+    
+    @property
+    def available(self):
+        """Saldo disponível para venda (saldo menos reservas ativas)"""
+        return self.quantity - self.reserved
+    
+    @staticmethod
+    def _delta_expression(deltas):
+        return Case(
+            *[When(product_id=product_id, then=Value(delta)) for product_id, delta in deltas.items()],
+            default=Value(0),
+            output_field=IntegerField()
+        )
+    
+    @classmethod
+    def apply_deltas(cls, deltas, reserved_deltas=None):
+        """
+        Aplica variações de saldo ({product_id: delta}) e, opcionalmente, da
+        quantidade reservada com um número constante de consultas, independente
+        da quantidade de produtos.
+        """
+        deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+        reserved_deltas = {
+            product_id: delta for product_id, delta in (reserved_deltas or {}).items() if delta
+        }
+        product_ids = set(deltas) | set(reserved_deltas)
+        if not product_ids:
+            return
+        
+        # Garante a existência das linhas de saldo (concorrência segura)
+        cls.objects.bulk_create(
+            [cls(product_id=product_id) for product_id in product_ids],
+            ignore_conflicts=True
+        )
+        changes = {'updated_at': timezone.now()}
+        if deltas:
+            changes['quantity'] = F('quantity') + cls._delta_expression(deltas)
+        if reserved_deltas:
+            changes['reserved'] = F('reserved') + cls._delta_expression(reserved_deltas)
+        cls.objects.filter(product_id__in=product_ids).update(**changes)
+        ProductFacet.refresh_stock(product_ids)
+        # A versão do catálogo avança após o commit, fora da seção com os saldos
+        # bloqueados: checkouts do mesmo departamento não disputam a sua linha
+        transaction.on_commit(lambda: Department.touch_catalog(product_ids=product_ids))
+
+
+class StockReservationQuerySet(models.QuerySet):
+    """
+    QuerySet de reservas de estoque
+    """
+    
+    def active(self):
+        return self.filter(status='active')
+    
+    def expired(self, now=None):
+        """Reservas ativas vencidas (índice status, expires_at)"""
+        return self.active().filter(expires_at__lte=now or timezone.now())
+
+
+class StockReservation(models.Model):
+    """
+    Reserva de estoque de um pedido aguardando pagamento, com validade.
+    
+    Enquanto ativa, a quantidade é somada em StockBalance.reserved e deixa de
+    estar disponível. Com o pagamento aprovado a reserva é convertida em uma
+    movimentação de saída (Stock); vencida ou cancelada, é liberada.
+    """
+    STATUS_CHOICES = [
+        ('active', 'Ativa'),
+        ('converted', 'Convertida'),
+        ('released', 'Liberada'),
+    ]
+    
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='reservations',
+        verbose_name='Produto'
+    )
+    order = models.ForeignKey(
+        'orders.Order',
+        on_delete=models.CASCADE,
+        related_name='stock_reservations',
+        verbose_name='Pedido'
+    )
+    quantity = models.PositiveIntegerField(verbose_name='Quantidade')
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='active',
+        verbose_name='Status'
+    )
+    expires_at = models.DateTimeField(verbose_name='Expira em')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
+    resolved_at = models.DateTimeField(null=True, blank=True, verbose_name='Resolvida em')
+    
+    objects = StockReservationQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = 'Reserva de Estoque'
+        verbose_name_plural = 'Reservas de Estoque'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+            models.Index(fields=['order', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.name}: {self.quantity} ({self.get_status_display()})"
+    
+    @staticmethod
+    def _quantities(rows):
+        quantities = defaultdict(int)
+        for _, product_id, quantity, *_ in rows:
+            quantities[product_id] += quantity
+        return quantities
+    
+    @classmethod
+    def reserve(cls, order, quantities, expires_at=None):
+        """
+        Reserva as quantidades ({product_id: quantidade}) para o pedido até
+        expires_at (padrão: PAYMENT_TIMEOUT_MINUTES a partir de agora). O
+        chamador deve ter bloqueado e validado os saldos.
+        """
+        expires_at = expires_at or timezone.now() + timedelta(minutes=settings.PAYMENT_TIMEOUT_MINUTES)
+        reservations = cls.objects.bulk_create([
+            cls(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in quantities.items()
+        ])
+        StockBalance.apply_deltas({}, reserved_deltas=quantities)
+        return reservations
+    
+    @classmethod
+    def convert(cls, order_ids, created_by=None, now=None):
+        """
+        Converte as reservas ativas dos pedidos em movimentações de saída,
+        baixando o saldo e a quantidade reservada. Retorna quantas converteu.
+        """
+        now = now or timezone.now()
+        with transaction.atomic():
+            rows = list(
+                cls.objects.active().filter(order_id__in=list(order_ids)).select_for_update(of=('self',)).values_list(
+                    'pk', 'product_id', 'quantity', 'order__order_number'
+                )
+            )
+            if not rows:
+                return 0
+            cls.objects.filter(pk__in=[row[0] for row in rows]).update(status='converted', resolved_at=now)
+            # bulk_create não passa por Stock.save(): o saldo é aplicado abaixo
+            Stock.objects.bulk_create([
+                Stock(
+                    product_id=product_id,
+                    quantity=quantity,
+                    movement_type='out',
+                    reason=f'Venda - Pedido {order_number}',
+                    created_by=created_by
+                )
+                for _, product_id, quantity, order_number in rows
+            ])
+            quantities = cls._quantities(rows)
+            StockBalance.apply_deltas(
+                {product_id: -quantity for product_id, quantity in quantities.items()},
+                reserved_deltas={product_id: -quantity for product_id, quantity in quantities.items()}
+            )
+        return len(rows)
+    
+    @classmethod
+    def release(cls, reservations, now=None, limit=None):
+        """
+        Libera as reservas ativas do queryset (até limit), devolvendo a
+        quantidade ao disponível. Reservas bloqueadas por outra transação (sendo
+        convertidas) são ignoradas. Retorna o id do pedido de cada reserva liberada.
+        """
+        now = now or timezone.now()
+        with transaction.atomic():
+            rows = reservations.active().select_for_update(of=('self',), skip_locked=True).order_by(
+                'expires_at', 'pk'
+            ).values_list('pk', 'product_id', 'quantity', 'order_id')
+            rows = list(rows[:limit] if limit else rows)
+            if not rows:
+                return []
+            cls.objects.filter(pk__in=[row[0] for row in rows]).update(status='released', resolved_at=now)
+            StockBalance.apply_deltas({}, reserved_deltas={
+                product_id: -quantity for product_id, quantity in cls._quantities(rows).items()
+            })
+        return [row[3] for row in rows]
+
+
+class ProductFacet(models.Model):
+    """
+    Índice de facetas do catálogo (uma linha por produto).
+    
+    Guarda departamento, faixa de preço e disponibilidade já calculados e é
+    atualizado incrementalmente nas alterações de produto, preço e estoque,
+    de forma que todas as contagens de facetas saiam de uma única consulta
+    agrupada.
+    """
+    FACETS = ('department', 'price', 'in_stock')
+    
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='facet',
+        verbose_name='Produto'
+    )
+    department = models.ForeignKey(
+        Department,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Departamento'
+    )
+    price_bucket = models.PositiveSmallIntegerField(default=0, verbose_name='Faixa de Preço')
+    in_stock = models.BooleanField(default=False, verbose_name='Em Estoque')
+    
+    class Meta:
+        verbose_name = 'Faceta de Produto'
+        verbose_name_plural = 'Facetas de Produtos'
+        indexes = [
+            models.Index(fields=['department', 'price_bucket', 'in_stock']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id}: {self.department_id}/{self.price_bucket}/{self.in_stock}"
+    
+    @staticmethod
+    def price_bucket_for(price):
+        """Índice da faixa de preço segundo CATALOG_PRICE_BUCKETS"""
+        return bisect_right(settings.CATALOG_PRICE_BUCKETS, price)
+    
+    @staticmethod
+    def price_bucket_ranges():
+        """Lista de (mínimo, máximo) de cada faixa; o máximo da última é None"""
+        bounds = list(settings.CATALOG_PRICE_BUCKETS)
+        return list(zip([Decimal('0')] + bounds, bounds + [None]))
+    
+    @classmethod
+    def refresh_products(cls, product_ids):
+        """
+        Recalcula as linhas de facetas dos produtos informados (duas consultas)
+        """
+        rows = Product.objects.filter(id__in=list(product_ids)).values_list(
+            'id', 'department_id', 'effective_price', 'stock_balance__quantity', 'stock_balance__reserved'
+        )
+        cls.objects.bulk_create(
+            [
+                cls(
+                    product_id=product_id,
+                    department_id=department_id,
+                    price_bucket=cls.price_bucket_for(price),
+                    in_stock=(quantity or 0) - (reserved or 0) > 0
+                )
+                for product_id, department_id, price, quantity, reserved in rows
+            ],
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['department', 'price_bucket', 'in_stock']
+        )
+    
+    @classmethod
+    def refresh_stock(cls, product_ids):
+        """
+        Atualiza a disponibilidade a partir dos saldos materializados (uma consulta)
+        """
+        cls.objects.filter(product_id__in=list(product_ids)).update(
+            in_stock=Exists(
+                StockBalance.objects.filter(product_id=OuterRef('product_id'), quantity__gt=F('reserved'))
+            )
+        )
+    
+    @classmethod
+    def counts(cls, products, facets=FACETS):
+        """
+        Contagens de facetas para o conjunto de produtos filtrado, calculadas
+        com um único GROUP BY sobre o índice de facetas.
+        """
+        rows = cls.objects.filter(
+            product_id__in=products.order_by().values('pk')
+        ).values(
+            'department_id', 'department__name', 'price_bucket', 'in_stock'
+        ).annotate(count=Count('pk')).order_by()
+        
+        departments = {}
+        price_buckets = [0] * len(settings.CATALOG_PRICE_BUCKETS) + [0]
+        in_stock = {True: 0, False: 0}
+        for row in rows:
+            department = departments.setdefault(row['department_id'], {
+                'id': row['department_id'],
+                'name': row['department__name'],
+                'count': 0
+            })
+            department['count'] += row['count']
+            price_buckets[min(row['price_bucket'], len(price_buckets) - 1)] += row['count']
+            in_stock[row['in_stock']] += row['count']
+        
+        result = {}
+        if 'department' in facets:
+            result['department'] = sorted(
+                departments.values(), key=lambda item: (-item['count'], item['name'])
+            )
+        if 'price' in facets:
+            result['price'] = [
+                {'bucket': index, 'min': minimum, 'max': maximum, 'count': price_buckets[index]}
+                for index, (minimum, maximum) in enumerate(cls.price_bucket_ranges())
+            ]
+        if 'in_stock' in facets:
+            result['in_stock'] = {'true': in_stock[True], 'false': in_stock[False]}
+        return result
+
+
+class PriceScheduleQuerySet(models.QuerySet):
+    """
+    QuerySet de preços agendados
+    """
+    
+    def active_at(self, when=None):
+        """Agendamentos vigentes no instante informado (padrão: agora)"""
+        when = when or timezone.now()
+        return self.filter(is_active=True, starts_at__lte=when).filter(
+            Q(ends_at__isnull=True) | Q(ends_at__gt=when)
+        )
+
+
+class PriceSchedule(models.Model):
+    """
+    Preço agendado para um produto ou para todo um departamento: preço fixo ou
+    percentual de desconto sobre o preço normal, válido entre início e fim.
+    
+    O preço vigente de cada produto fica materializado em Product.effective_price
+    (o menor entre o preço base e os agendamentos vigentes), atualizado pela
+    tarefa periódica apply_price_schedules nas viradas de início e fim
+    (apply_transitions).
+    """
+    KIND_CHOICES = [
+        ('price', 'Preço fixo'),
+        ('percentage', 'Percentual de desconto'),
+    ]
+    
+    name = models.CharField(max_length=100, verbose_name='Nome')
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='price_schedules',
+        verbose_name='Produto'
+    )
+    department = models.ForeignKey(
+        Department,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='price_schedules',
+        verbose_name='Departamento'
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='price', verbose_name='Tipo')
+    value = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        validators=[MinValueValidator(Decimal('0.01'))],
+        verbose_name='Valor',
+        help_text='Preço (tipo preço fixo) ou percentual de desconto'
+    )
+    starts_at = models.DateTimeField(verbose_name='Início')
+    ends_at = models.DateTimeField(null=True, blank=True, verbose_name='Fim')
+    is_active = models.BooleanField(default=True, verbose_name='Ativo')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
+    
+    objects = PriceScheduleQuerySet.as_manager()
+    
+    # Marca d'água das viradas já aplicadas por apply_transitions
+    WATERMARK = 'price_schedule_transitions'
+    
+    class Meta:
+        verbose_name = 'Preço Agendado'
+        verbose_name_plural = 'Preços Agendados'
+        ordering = ['-starts_at']
+        indexes = [
+            models.Index(fields=['is_active', 'starts_at']),
+            models.Index(fields=['is_active', 'ends_at']),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=(
+                    Q(product__isnull=False, department__isnull=True)
+                    | Q(product__isnull=True, department__isnull=False)
+                ),
+                name='price_schedule_single_target'
+            ),
+            models.CheckConstraint(
+                check=~Q(kind='percentage', value__gt=100),
+                name='price_schedule_percentage_range'
+            ),
+            models.CheckConstraint(
+                check=Q(ends_at__isnull=True) | Q(ends_at__gt=F('starts_at')),
+                name='price_schedule_valid_period'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.product or self.department})"
+    
+    def clean(self):
+        if bool(self.product_id) == bool(self.department_id):
+            raise ValidationError('Informe um produto ou um departamento.')
+        if self.kind == 'percentage' and self.value is not None and self.value > 100:
+            raise ValidationError({'value': 'O percentual deve ser no máximo 100.'})
+        if self.ends_at and self.starts_at and self.ends_at <= self.starts_at:
+            raise ValidationError({'ends_at': 'O fim deve ser posterior ao início.'})
+    
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = self._target_product_ids() if self.pk else []
+            super().save(*args, **kwargs)
+            PriceSchedule.refresh_prices(set(previous) | set(self._target_product_ids()))
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            product_ids = self._target_product_ids()
+            result = super().delete(*args, **kwargs)
+            PriceSchedule.refresh_prices(product_ids)
+            return result
+    
+    def _target_product_ids(self):
+        """Produtos afetados pelo agendamento conforme gravado no banco"""
+        target = PriceSchedule.objects.filter(pk=self.pk).values('product_id', 'department_id').first()
+        if target is None:
+            return []
+        if target['product_id']:
+            return [target['product_id']]
+        return list(Product.objects.filter(department_id=target['department_id']).values_list('pk', flat=True))
+    
+    def price_for(self, price):
+        """Preço resultante do agendamento sobre o preço normal"""
+        if self.kind == 'percentage':
+            return (price * (100 - self.value) / 100).quantize(Decimal('0.01'))
+        return self.value
+    
+    @staticmethod
+    def resolve(product, schedules):
+        """Menor preço entre o preço base e os agendamentos (mínimo de R$ 0,01)"""
+        prices = [product.base_price] + [schedule.price_for(product.price) for schedule in schedules]
+        return max(min(prices), Decimal('0.01'))
+    
+    @classmethod
+    def effective_price_for(cls, product, when=None):
+        """Preço efetivo de um produto (usado ao salvar o produto)"""
+        targets = Q(department_id=product.department_id)
+        if product.pk:
+            targets |= Q(product_id=product.pk)
+        return cls.resolve(product, cls.objects.active_at(when).filter(targets))
+    
+    @classmethod
+    def refresh_prices(cls, product_ids=None, when=None, batch_size=1000):
+        """
+        Materializa Product.effective_price e retorna quantos produtos mudaram.
+        
+        Sem product_ids, considera apenas os produtos com agendamento vigente e
+        os que ainda carregam um preço efetivo diferente do base (agendamento
+        encerrado). As alterações são gravadas com bulk_update, e as facetas,
+        a versão do catálogo e o cache das listagens são atualizados uma vez.
+        """
+        when = when or timezone.now()
+        by_product, by_department = defaultdict(list), defaultdict(list)
+        for schedule in cls.objects.active_at(when):
+            if schedule.product_id:
+                by_product[schedule.product_id].append(schedule)
+            else:
+                by_department[schedule.department_id].append(schedule)
+        
+        products = Product.objects.all()
+        if product_ids is not None:
+            products = products.filter(pk__in=list(product_ids))
+        else:
+            products = products.alias(base=Product.base_price_expression()).filter(
+                Q(pk__in=list(by_product))
+                | Q(department_id__in=list(by_department))
+                | ~Q(effective_price=F('base'))
+            )
+        
+        changed = []
+        products = products.only(
+            'id', 'department_id', 'price', 'promotional_price', 'is_on_promotion', 'effective_price'
+        ).order_by('pk')
+        for product in products.iterator(chunk_size=batch_size):
+            price = cls.resolve(product, by_product[product.pk] + by_department[product.department_id])
+            if price != product.effective_price:
+                product.effective_price = price
+                product.updated_at = when
+                changed.append(product)
+        
+        if changed:
+            Product.objects.bulk_update(changed, ['effective_price', 'updated_at'], batch_size=batch_size)
+            product_ids = [product.pk for product in changed]
+            ProductFacet.refresh_products(product_ids)
+            Department.touch_catalog(product_ids=product_ids)
+        return len(changed)
+    
+    @classmethod
+    def apply_transitions(cls, when=None):
+        """
+        Atualiza o preço efetivo apenas dos produtos cujos agendamentos
+        começaram ou terminaram desde a última execução (índices de starts_at e
+        ends_at), em vez de percorrer o catálogo. Na primeira execução, sem
+        marca d'água, faz a atualização completa. Retorna quantos produtos mudaram.
+        """
+        when = when or timezone.now()
+        since = ProcessingWatermark.get(cls.WATERMARK)
+        with transaction.atomic():
+            if since is None:
+                changed = cls.refresh_prices(when=when)
+            else:
+                crossed = cls.objects.filter(is_active=True).filter(
+                    Q(starts_at__gt=since, starts_at__lte=when) | Q(ends_at__gt=since, ends_at__lte=when)
+                )
+                product_ids = set()
+                department_ids = set()
+                for product_id, department_id in crossed.values_list('product_id', 'department_id'):
+                    if product_id:
+                        product_ids.add(product_id)
+                    else:
+                        department_ids.add(department_id)
+                if department_ids:
+                    product_ids.update(
+                        Product.objects.filter(department_id__in=department_ids).values_list('pk', flat=True)
+                    )
+                changed = cls.refresh_prices(product_ids, when=when) if product_ids else 0
+            ProcessingWatermark.set(cls.WATERMARK, when)
+        return changed
+
+
+class ProcessingWatermark(models.Model):
+    """
+    Marca d'água de processamentos incrementais: até onde os dados de origem já
+    foram consumidos por cada rotina (identificada por `name`).
+    """
+    name = models.CharField(max_length=100, unique=True, verbose_name='Nome')
+    value = models.DateTimeField(null=True, blank=True, verbose_name='Processado até')
+    last_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Último ID',
+        help_text='Desempate por id no instante value (processamento em lotes interrompido)'
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
+    
+    class Meta:
+        verbose_name = "Marca d'Água de Processamento"
+        verbose_name_plural = "Marcas d'Água de Processamento"
+    
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+    
+    @classmethod
+    def get(cls, name):
+        return cls.objects.filter(name=name).values_list('value', flat=True).first()
+    
+    @classmethod
+    def get_position(cls, name):
+        """(value, last_id) da marca d'água, ou (None, None)"""
+        return cls.objects.filter(name=name).values_list('value', 'last_id').first() or (None, None)
+    
+    @classmethod
+    def set(cls, name, value, last_id=None):
+        cls.objects.update_or_create(name=name, defaults={'value': value, 'last_id': last_id})
+
+
+class ProductSalesDaily(models.Model):
+    """
+    Vendas diárias consolidadas por produto (dia local do pedido), mantidas
+    incrementalmente a partir dos pedidos alterados desde a última execução.
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='sales_daily',
+        verbose_name='Produto'
+    )
+    day = models.DateField(verbose_name='Dia')
+    quantity = models.PositiveIntegerField(default=0, verbose_name='Quantidade')
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), verbose_name='Receita')
+    orders_count = models.PositiveIntegerField(default=0, verbose_name='Pedidos')
+    
+    class Meta:
+        verbose_name = 'Venda Diária'
+        verbose_name_plural = 'Vendas Diárias'
+        ordering = ['-day']
+        unique_together = ['product', 'day']
+        indexes = [
+            models.Index(fields=['day', 'product']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} em {self.day}: {self.quantity}"
+
+
+class ProductRanking(models.Model):
+    """
+    Ranking de mais vendidos: quantidades e receita nas janelas de 7, 30 e 90
+    dias e uma pontuação com decaimento exponencial pela idade da venda.
+    """
+    WINDOWS = (7, 30, 90)
+    
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ranking',
+        verbose_name='Produto'
+    )
+    score = models.FloatField(default=0, verbose_name='Pontuação')
+    rank = models.PositiveIntegerField(verbose_name='Posição')
+    quantity_7d = models.PositiveIntegerField(default=0, verbose_name='Quantidade (7 dias)')
+    quantity_30d = models.PositiveIntegerField(default=0, verbose_name='Quantidade (30 dias)')
+    quantity_90d = models.PositiveIntegerField(default=0, verbose_name='Quantidade (90 dias)')
+    revenue_7d = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), verbose_name='Receita (7 dias)')
+    revenue_30d = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), verbose_name='Receita (30 dias)')
+    revenue_90d = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), verbose_name='Receita (90 dias)')
+    computed_at = models.DateTimeField(verbose_name='Calculado em')
+    
+    class Meta:
+        verbose_name = 'Ranking de Produto'
+        verbose_name_plural = 'Ranking de Produtos'
+        ordering = ['rank']
+        indexes = [
+            models.Index(fields=['-score']),
+        ]
+    
+    def __str__(self):
+        return f"#{self.rank} {self.product_id} ({self.score:.2f})"
+
+
+class ProductCooccurrence(models.Model):
+    """
+    Matriz esparsa de coocorrência de produtos nos pedidos, guardada como
+    triângulo superior (product_a <= product_b). A diagonal (product_a ==
+    product_b) é a quantidade de pedidos com o produto.
+    """
+    product_a = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Produto A'
+    )
+    product_b = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Produto B'
+    )
+    count = models.PositiveIntegerField(default=0, verbose_name='Pedidos em Comum')
+    
+    class Meta:
+        verbose_name = 'Coocorrência de Produtos'
+        verbose_name_plural = 'Coocorrências de Produtos'
+        unique_together = ['product_a', 'product_b']
+        indexes = [
+            models.Index(fields=['product_b']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_a_id} x {self.product_b_id}: {self.count}"
+
+
+class RelatedProduct(models.Model):
+    """
+    Vizinhos mais próximos de cada produto ("comprados juntos"), com a
+    similaridade de Jaccard calculada a partir da matriz de coocorrência.
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='related_products',
+        verbose_name='Produto'
+    )
+    related = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Produto Relacionado'
+    )
+    score = models.FloatField(verbose_name='Similaridade')
+    rank = models.PositiveSmallIntegerField(verbose_name='Posição')
+    
+    class Meta:
+        verbose_name = 'Produto Relacionado'
+        verbose_name_plural = 'Produtos Relacionados'
+        ordering = ['product', 'rank']
+        unique_together = ['product', 'related']
+        indexes = [
+            models.Index(fields=['product', 'rank']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.score:.3f})"
+
+
+class ProductReviewQuerySet(models.QuerySet):
+    """
+    QuerySet de avaliações que mantém os agregados dos produtos
+    """
+    
+    def set_approved(self, approved):
+        """
+        Aprova ou desaprova as avaliações em lote, atualizando apenas os
+        agregados dos produtos das avaliações que mudaram de estado
+        """
+        with transaction.atomic():
+            rows = list(
+                self.exclude(is_approved=approved).select_for_update().values_list('pk', 'product_id', 'rating')
+            )
+            ProductReview.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(is_approved=approved)
+            sign = 1 if approved else -1
+            ProductReview.apply_to_products((product_id, rating, sign) for _, product_id, rating in rows)
+        return len(rows)
 
 
 class ProductReview(models.Model):
@@ -208,6 +1413,8 @@ class ProductReview(models.Model):
     is_approved = models.BooleanField(default=False, verbose_name='Aprovado')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Criado em')
     
+    objects = ProductReviewQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Avaliação'
         verbose_name_plural = 'Avaliações'
@@ -216,3 +1423,28 @@ class ProductReview(models.Model):
     
     def __str__(self):
         return f"{self.product.name} - {self.rating} estrelas por {self.customer.full_name}"
+    
+    def save(self, *args, **kwargs):
+        """Grava a avaliação e ajusta os agregados do produto na mesma transação"""
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = ProductReview.objects.filter(pk=self.pk).values(
+                    'product_id', 'rating', 'is_approved'
+                ).first()
+            super().save(*args, **kwargs)
+            
+            entries = []
+            if previous and previous['is_approved']:
+                entries.append((previous['product_id'], previous['rating'], -1))
+            if self.is_approved:
+                entries.append((self.product_id, self.rating, 1))
+            ProductReview.apply_to_products(entries)
+    
+    @staticmethod
+    def apply_to_products(entries):
+        """Aplica entradas (product_id, estrela, +1/-1) aos agregados dos produtos"""
+        deltas = defaultdict(lambda: defaultdict(int))
+        for product_id, rating, sign in entries:
+            deltas[product_id][rating] += sign
+        Product.apply_rating_deltas(deltas)
@@ -0,0 +1,164 @@
+"""
+Ranking incremental de mais vendidos.
+
+A cada execução, apenas os pedidos alterados desde a última marca d'água
+(Order.updated_at) são considerados: os dias (data local de criação) desses
+pedidos têm suas vendas diárias recalculadas em ProductSalesDaily, o que
+também reflete cancelamentos e devoluções. O ranking é então recalculado a
+partir das vendas diárias dos últimos 90 dias, sem percorrer o histórico de
+pedidos.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Department, ProcessingWatermark, ProductRanking, ProductSalesDaily
+
+WATERMARK = 'product_sales_daily'
+
+# Pedidos que não contam como venda
+EXCLUDED_STATUSES = ('cancelled', 'returned')
+
+DAYS_PER_BATCH = 31
+
+
+def _day_range(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def affected_days(since, until, first_day):
+    """Dias (a partir de first_day) com pedidos alterados em (since, until]"""
+    Order = apps.get_model('orders', 'Order')
+    orders = Order.objects.filter(
+        updated_at__lte=until, created_at__gte=_day_range(first_day)[0]
+    )
+    if since is not None:
+        orders = orders.filter(updated_at__gt=since)
+    return sorted(
+        orders.annotate(day=TruncDate('created_at')).order_by().values_list('day', flat=True).distinct()
+    )
+
+
+def refresh_sales_days(days):
+    """Recalcula as vendas diárias dos dias informados, em lotes de dias"""
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    
+    for start in range(0, len(days), DAYS_PER_BATCH):
+        batch = days[start:start + DAYS_PER_BATCH]
+        periods = Q()
+        for day in batch:
+            day_start, day_end = _day_range(day)
+            periods |= Q(order__created_at__gte=day_start, order__created_at__lt=day_end)
+        
+        rows = OrderItem.objects.filter(periods).exclude(
+            order__status__in=EXCLUDED_STATUSES
+        ).annotate(day=TruncDate('order__created_at')).values('product_id', 'day').annotate(
+            total_quantity=Sum('quantity'),
+            total_revenue=Sum('total_price'),
+            total_orders=Count('order_id', distinct=True)
+        ).order_by()
+        
+        with transaction.atomic():
+            ProductSalesDaily.objects.filter(day__in=batch).delete()
+            ProductSalesDaily.objects.bulk_create([
+                ProductSalesDaily(
+                    product_id=row['product_id'],
+                    day=row['day'],
+                    quantity=row['total_quantity'],
+                    revenue=row['total_revenue'],
+                    orders_count=row['total_orders']
+                )
+                for row in rows
+            ], batch_size=1000)
+
+
+def compute_rankings(today, computed_at):
+    """
+    Recalcula o ProductRanking a partir das vendas diárias das janelas. A
+    pontuação soma as quantidades com peso 0,5 ** (idade / meia-vida).
+    Retorna (produtos no ranking, produtos que entraram, saíram ou mudaram de
+    posição).
+    """
+    horizon = max(ProductRanking.WINDOWS)
+    half_life = settings.PRODUCT_RANKING_HALF_LIFE_DAYS
+    decay = Case(
+        *[
+            When(day=today - timedelta(days=age), then=Value(0.5 ** (age / half_life)))
+            for age in range(horizon)
+        ],
+        default=Value(0.0),
+        output_field=FloatField()
+    )
+    
+    windows = {}
+    for days in ProductRanking.WINDOWS:
+        in_window = Q(day__gt=today - timedelta(days=days))
+        windows[f'quantity_{days}d'] = Coalesce(Sum('quantity', filter=in_window), 0)
+        windows[f'revenue_{days}d'] = Coalesce(
+            Sum('revenue', filter=in_window), Value(Decimal('0.00')), output_field=DecimalField()
+        )
+    
+    rows = ProductSalesDaily.objects.filter(
+        day__gt=today - timedelta(days=horizon), day__lte=today
+    ).values('product_id').annotate(
+        score=Sum(F('quantity') * decay, output_field=FloatField()),
+        **windows
+    ).order_by('-score', 'product_id')
+    
+    rankings = [
+        ProductRanking(rank=position, computed_at=computed_at, **row)
+        for position, row in enumerate(rows, start=1)
+    ]
+    fields = ['score', 'rank', 'computed_at'] + list(windows)
+    
+    with transaction.atomic():
+        previous = dict(ProductRanking.objects.values_list('product_id', 'rank'))
+        ProductRanking.objects.bulk_create(
+            rankings,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=fields,
+            batch_size=1000
+        )
+        # Produtos sem vendas nas janelas saem do ranking
+        ProductRanking.objects.filter(computed_at__lt=computed_at).delete()
+    
+    current = {ranking.product_id: ranking.rank for ranking in rankings}
+    changed = {
+        product_id for product_id in previous.keys() | current.keys()
+        if previous.get(product_id) != current.get(product_id)
+    }
+    return len(rankings), changed
+
+
+def update_rankings(now=None):
+    """
+    Processa os pedidos alterados desde a marca d'água e recalcula o ranking.
+    Retorna (dias recalculados, produtos no ranking).
+    """
+    now = now or timezone.now()
+    # Margem para transações ainda não confirmadas com updated_at anterior
+    until = now - timedelta(minutes=settings.PRODUCT_RANKING_SETTLE_MINUTES)
+    today = timezone.localdate(now)
+    first_day = today - timedelta(days=max(ProductRanking.WINDOWS) - 1)
+    
+    days = affected_days(ProcessingWatermark.get(WATERMARK), until, first_day)
+    refresh_sales_days(days)
+    ProcessingWatermark.set(WATERMARK, until)
+    
+    # Vendas fora da maior janela não participam mais do ranking
+    ProductSalesDaily.objects.filter(day__lt=first_day).delete()
+    
+    ranked, changed = compute_rankings(today, now)
+    # ?ordering=popularity depende do ranking: avança a versão do catálogo
+    # apenas dos departamentos com produtos que mudaram de posição
+    if changed:
+        Department.touch_catalog(product_ids=changed)
+    return len(days), ranked
@@ -0,0 +1,194 @@
+"""
+Recomendações "comprados juntos" a partir da coocorrência de produtos nos pedidos.
+
+Os pedidos criados desde a última marca d'água são lidos em lotes; os pares de
+produtos de cada lote são contados de forma vetorizada (NumPy, quando
+disponível) e somados à matriz esparsa ProductCooccurrence. Em seguida, apenas
+os produtos presentes nos novos pedidos têm seus K vizinhos recalculados
+(similaridade de Jaccard: pedidos em comum / pedidos com qualquer um dos dois)
+em RelatedProduct; a lista de um produto ausente do lote é atualizada quando
+ele volta a ser vendido. Cancelamentos posteriores ao processamento não são
+descontados.
+"""
+import heapq
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import combinations
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import cache as catalog_cache
+from .models import ProcessingWatermark, ProductCooccurrence, RelatedProduct
+
+try:
+    import numpy as np
+except ImportError:  # NumPy é opcional: a contagem cai para itertools
+    np = None
+
+WATERMARK = 'product_cooccurrence'
+
+# Pedidos que não contam como compra
+EXCLUDED_STATUSES = ('cancelled', 'returned')
+
+ORDERS_PER_BATCH = 5000
+PRODUCTS_PER_BATCH = 500
+
+
+def _chunks(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def count_pairs(rows):
+    """
+    Conta, para linhas (pedido, produto), os pares de produtos comprados juntos:
+    {(produto_a, produto_b): pedidos}, com produto_a <= produto_b e a diagonal
+    (produto, produto) contando os pedidos de cada produto.
+    """
+    if not rows:
+        return {}
+    if np is None:
+        baskets = defaultdict(set)
+        for order_id, product_id in rows:
+            baskets[order_id].add(product_id)
+        counts = Counter()
+        for products in baskets.values():
+            products = sorted(products)
+            counts.update((product_id, product_id) for product_id in products)
+            counts.update(combinations(products, 2))
+        return dict(counts)
+    
+    data = np.unique(np.asarray(rows, dtype=np.int64), axis=0)  # ordenado por pedido e produto
+    orders, products = data[:, 0], data[:, 1]
+    starts = np.flatnonzero(np.r_[True, orders[1:] != orders[:-1]])
+    lengths = np.diff(np.r_[starts, len(orders)])
+    # Quantos itens seguem cada linha dentro do mesmo pedido
+    remaining = np.repeat(starts + lengths, lengths) - np.arange(len(orders)) - 1
+    
+    firsts, seconds = [products], [products]
+    for offset in range(1, int(lengths.max())):
+        index = np.flatnonzero(remaining >= offset)
+        firsts.append(products[index])
+        seconds.append(products[index + offset])
+    pairs, counts = np.unique(
+        np.stack([np.concatenate(firsts), np.concatenate(seconds)], axis=1),
+        axis=0,
+        return_counts=True
+    )
+    return {(int(a), int(b)): int(count) for (a, b), count in zip(pairs, counts)}
+
+
+def add_counts(counts):
+    """Soma as contagens à matriz de coocorrência (upsert em lote)"""
+    if not counts:
+        return
+    with transaction.atomic():
+        existing = ProductCooccurrence.objects.select_for_update().filter(
+            product_a_id__in={a for a, _ in counts},
+            product_b_id__in={b for _, b in counts}
+        ).values_list('product_a_id', 'product_b_id', 'count')
+        totals = dict(counts)
+        for a, b, count in existing:
+            if (a, b) in totals:
+                totals[(a, b)] += count
+        ProductCooccurrence.objects.bulk_create(
+            [
+                ProductCooccurrence(product_a_id=a, product_b_id=b, count=count)
+                for (a, b), count in totals.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['product_a', 'product_b'],
+            update_fields=['count'],
+            batch_size=1000
+        )
+
+
+def rebuild_neighbors(product_ids, top_k=None, min_count=None):
+    """Recalcula os K vizinhos dos produtos informados"""
+    top_k = top_k or settings.RELATED_PRODUCTS_TOP_K
+    min_count = min_count or settings.RELATED_PRODUCTS_MIN_COUNT
+    product_ids = sorted(product_ids)
+    
+    for start in range(0, len(product_ids), PRODUCTS_PER_BATCH):
+        batch = set(product_ids[start:start + PRODUCTS_PER_BATCH])
+        pairs = list(
+            ProductCooccurrence.objects.filter(
+                Q(product_a_id__in=batch) | Q(product_b_id__in=batch), count__gte=min_count
+            ).exclude(product_a=F('product_b')).values_list('product_a_id', 'product_b_id', 'count')
+        )
+        involved = {a for a, _, _ in pairs} | {b for _, b, _ in pairs}
+        orders = dict(
+            ProductCooccurrence.objects.filter(
+                product_a_id__in=involved, product_a=F('product_b')
+            ).values_list('product_a_id', 'count')
+        )
+        
+        candidates = defaultdict(list)
+        for a, b, together in pairs:
+            score = together / (orders[a] + orders[b] - together)
+            if a in batch:
+                candidates[a].append((score, together, -b))
+            if b in batch:
+                candidates[b].append((score, together, -a))
+        
+        with transaction.atomic():
+            RelatedProduct.objects.filter(product_id__in=batch).delete()
+            RelatedProduct.objects.bulk_create([
+                RelatedProduct(product_id=product_id, related_id=-negative_id, score=score, rank=rank)
+                for product_id, neighbors in candidates.items()
+                for rank, (score, _, negative_id) in enumerate(heapq.nlargest(top_k, neighbors), start=1)
+            ], batch_size=1000)
+
+
+def update_related_products(now=None):
+    """
+    Processa os pedidos criados desde a marca d'água e atualiza os vizinhos dos
+    produtos afetados. Retorna (pedidos processados, produtos atualizados).
+    """
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    
+    now = now or timezone.now()
+    # Margem para transações ainda não confirmadas com created_at anterior
+    until = now - timedelta(minutes=settings.PRODUCT_RANKING_SETTLE_MINUTES)
+    since, since_id = ProcessingWatermark.get_position(WATERMARK)
+    
+    orders = Order.objects.filter(created_at__lte=until).exclude(status__in=EXCLUDED_STATUSES)
+    if since is not None:
+        after = Q(created_at__gt=since)
+        if since_id is not None:
+            after |= Q(created_at=since, id__gt=since_id)
+        orders = orders.filter(after)
+    processed = 0
+    affected = set()
+    positions = orders.order_by('created_at', 'id').values_list('id', 'created_at').iterator(
+        chunk_size=ORDERS_PER_BATCH
+    )
+    for batch in _chunks(positions, ORDERS_PER_BATCH):
+        order_ids = [order_id for order_id, _ in batch]
+        rows = list(OrderItem.objects.filter(order_id__in=order_ids).values_list('order_id', 'product_id'))
+        counts = count_pairs(rows)
+        # Contagens e posição (created_at, id) do lote na mesma transação: uma
+        # execução interrompida recomeça do lote seguinte, sem contar em dobro
+        last_id, last_created_at = batch[-1]
+        with transaction.atomic():
+            add_counts(counts)
+            ProcessingWatermark.set(WATERMARK, last_created_at, last_id=last_id)
+        affected.update(product_id for pair in counts for product_id in pair)
+        processed += len(batch)
+    
+    ProcessingWatermark.set(WATERMARK, until)
+    if affected:
+        rebuild_neighbors(affected)
+        catalog_cache.bump_related()
+    return processed, len(affected)
@@ -0,0 +1,168 @@
+"""
+Busca textual do catálogo com ranking de relevância.
+
+Em PostgreSQL a busca usa a coluna products_product.search_vector (tsvector
+com índice GIN e a configuração portuguese_unaccent: stemming em português
+sem acentos). Em SQLite (desenvolvimento) usa a tabela virtual FTS5
+products_product_fts. Nos demais bancos recorre a icontains.
+
+O índice é atualizado a cada gravação de produto (ver products.signals) e
+pode ser reconstruído com get_search_backend().rebuild().
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, TextField, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+SEARCH_CONFIG = 'portuguese_unaccent'
+FTS_TABLE = 'products_product_fts'
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_STOP = '</mark>'
+
+
+class SimpleSearchBackend:
+    """
+    Fallback sem índice textual: filtra com icontains e não ordena por relevância.
+    """
+    def search(self, queryset, query):
+        return queryset.filter(
+            Q(name__icontains=query) | Q(description__icontains=query)
+        ).annotate(
+            search_rank=Value(0.0, output_field=FloatField()),
+            search_highlight=Value(None, output_field=TextField())
+        )
+    
+    def index_products(self, product_ids):
+        pass
+    
+    def remove_products(self, product_ids):
+        pass
+    
+    def rebuild(self):
+        pass
+
+
+class PostgresSearchBackend(SimpleSearchBackend):
+    """
+    Busca com tsvector/GIN, websearch_to_tsquery e ts_rank_cd.
+    """
+    table = Product._meta.db_table
+    vector_sql = (
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(short_description, '')), 'B') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'C')"
+    )
+    tsquery_sql = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+    
+    def search(self, queryset, query):
+        column = f'"{self.table}"."search_vector"'
+        return queryset.filter(
+            RawSQL(f"{column} @@ {self.tsquery_sql}", [query], output_field=BooleanField())
+        ).annotate(
+            search_rank=RawSQL(
+                f"ts_rank_cd({column}, {self.tsquery_sql})", [query], output_field=FloatField()
+            ),
+            search_highlight=RawSQL(
+                f"ts_headline('{SEARCH_CONFIG}', \"{self.table}\".\"description\", {self.tsquery_sql}, "
+                f"'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxWords=30, MinWords=10')",
+                [query],
+                output_field=TextField()
+            )
+        )
+    
+    def index_products(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE "{self.table}" SET search_vector = {self.vector_sql} WHERE id = ANY(%s)',
+                [list(product_ids)]
+            )
+    
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE "{self.table}" SET search_vector = {self.vector_sql}')
+
+
+class SQLiteSearchBackend(SimpleSearchBackend):
+    """
+    Busca com FTS5 (tokenizer unicode61 sem diacríticos) e ranking bm25.
+    Não há stemming em português no SQLite; termos são buscados por prefixo.
+    """
+    table = Product._meta.db_table
+    
+    def _match_expression(self, query):
+        terms = re.findall(r'\w+', query)
+        return ' '.join(f'"{term}"*' for term in terms)
+    
+    def search(self, queryset, query):
+        match = self._match_expression(query)
+        if not match:
+            return queryset.none()
+        
+        correlated = f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = "{self.table}"."id"'
+        return queryset.filter(
+            RawSQL(
+                f'"{self.table}"."id" IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)',
+                [match],
+                output_field=BooleanField()
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f'(SELECT -bm25({FTS_TABLE}, 10.0, 5.0, 1.0) {correlated})', [match], output_field=FloatField()
+            ),
+            search_highlight=RawSQL(
+                f"(SELECT snippet({FTS_TABLE}, -1, '{HIGHLIGHT_START}', '{HIGHLIGHT_STOP}', '…', 24) {correlated})",
+                [match],
+                output_field=TextField()
+            )
+        )
+    
+    def index_products(self, product_ids):
+        product_ids = list(product_ids)
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', product_ids)
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, short_description, description) '
+                f'SELECT id, name, short_description, description FROM "{self.table}" WHERE id IN ({placeholders})',
+                product_ids
+            )
+    
+    def remove_products(self, product_ids):
+        product_ids = list(product_ids)
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', product_ids)
+    
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, short_description, description) '
+                f'SELECT id, name, short_description, description FROM "{self.table}"'
+            )
+
+
+# Bancos (alias, nome) em que a tabela FTS já foi encontrada. A ausência não é
+# guardada: a migração que cria a tabela pode rodar depois da primeira consulta.
+_fts_databases = set()
+
+
+def _sqlite_fts_available():
+    database = (connection.alias, str(connection.settings_dict['NAME']))
+    if database not in _fts_databases:
+        if FTS_TABLE not in connection.introspection.table_names():
+            return False
+        _fts_databases.add(database)
+    return True
+
+
+def get_search_backend():
+    """Retorna o backend de busca adequado ao banco de dados em uso"""
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    if connection.vendor == 'sqlite' and _sqlite_fts_available():
+        return SQLiteSearchBackend()
+    return SimpleSearchBackend()
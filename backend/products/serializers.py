@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from .images import srcset
 from .models import Department, Product, ProductImage, Stock
 
 
@@ -7,13 +8,20 @@ class DepartmentSerializer(serializers.ModelSerializer):
     Serializer para departamentos
     """
     products_count = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Department
-        fields = ['id', 'name', 'description', 'is_active', 'created_at', 'products_count']
+        fields = ['id', 'name', 'description', 'is_active', 'created_at', 'products_count', 'image_srcset']
         read_only_fields = ['id', 'created_at']
     
+    def get_image_srcset(self, obj):
+        return srcset(obj.image, obj.image_variants)
+    
     def get_products_count(self, obj):
+        # Usa a anotação de DepartmentQuerySet.with_products_count() quando presente
+        if hasattr(obj, 'active_products_count'):
+            return obj.active_products_count
         return obj.products.filter(is_active=True).count()
 
 
@@ -21,10 +29,15 @@ class ProductImageSerializer(serializers.ModelSerializer):
     """
     Serializer para imagens de produtos
     """
+    srcset = serializers.SerializerMethodField()
+    
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'alt_text', 'is_primary', 'order']
+        fields = ['id', 'image', 'alt_text', 'order', 'srcset']
         read_only_fields = ['id']
+    
+    def get_srcset(self, obj):
+        return srcset(obj.image, obj.image_variants)
 
 
 class StockSerializer(serializers.ModelSerializer):
@@ -53,6 +66,7 @@ class ProductListSerializer(serializers.ModelSerializer):
     """
     department_name = serializers.CharField(source='department.name', read_only=True)
     primary_image = serializers.SerializerMethodField()
+    primary_image_srcset = serializers.SerializerMethodField()
     current_price = serializers.SerializerMethodField()
     stock_quantity = serializers.SerializerMethodField()
     is_in_stock = serializers.SerializerMethodField()
@@ -61,8 +75,8 @@ class ProductListSerializer(serializers.ModelSerializer):
         model = Product
         fields = [
             'id', 'name', 'slug', 'price', 'current_price', 'department_name',
-            'primary_image', 'stock_quantity', 'is_in_stock', 'is_active',
-            'created_at'
+            'primary_image', 'primary_image_srcset', 'stock_quantity', 'is_in_stock', 'is_active',
+            'rating_avg', 'rating_count', 'created_at'
         ]
     
     def get_primary_image(self, obj):
@@ -70,16 +84,31 @@ class ProductListSerializer(serializers.ModelSerializer):
             return obj.main_image.url
         return None
     
+    def get_primary_image_srcset(self, obj):
+        return srcset(obj.main_image, obj.main_image_variants)
+    
     def get_current_price(self, obj):
-        return obj.price
+        return obj.current_price
     
     def get_stock_quantity(self, obj):
-        return obj.stock_quantity
+        # Quantidade disponível para venda (descontadas as reservas ativas)
+        return obj.available_quantity
     
     def get_is_in_stock(self, obj):
         return obj.is_in_stock
 
 
+class ProductSearchResultSerializer(ProductListSerializer):
+    """
+    Serializer para resultados da busca textual, com relevância e trecho destacado
+    """
+    rank = serializers.FloatField(source='search_rank', read_only=True)
+    highlight = serializers.CharField(source='search_highlight', read_only=True, allow_null=True)
+    
+    class Meta(ProductListSerializer.Meta):
+        fields = ProductListSerializer.Meta.fields + ['rank', 'highlight']
+
+
 class ProductDetailSerializer(serializers.ModelSerializer):
     """
     Serializer completo para detalhes do produto
@@ -87,40 +116,56 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     department = DepartmentSerializer(read_only=True)
     department_id = serializers.IntegerField(write_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
-    stock = StockSerializer(many=True, read_only=True)
+    # Últimas movimentações (ProductQuerySet.for_detail); o saldo está em stock_quantity
+    stock = StockSerializer(source='recent_stock', many=True, read_only=True)
 
     current_price = serializers.SerializerMethodField()
     discount_percentage = serializers.SerializerMethodField()
+    main_image_srcset = serializers.SerializerMethodField()
+    stock_quantity = serializers.SerializerMethodField()
+    is_in_stock = serializers.SerializerMethodField()
     
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'slug', 'description', 'price', 'current_price',
-            'discount_percentage', 'department', 'department_id',
+            'discount_percentage', 'main_image', 'main_image_srcset', 'department', 'department_id',
             'weight', 'dimensions', 'is_active', 'is_featured',
+            'rating_avg', 'rating_count', 'rating_histogram',
             'meta_title', 'meta_description', 'created_at', 'updated_at',
-            'images', 'stock'
+            'stock_quantity', 'is_in_stock', 'images', 'stock'
         ]
         read_only_fields = ['id', 'slug', 'created_at', 'updated_at']
     
     def get_current_price(self, obj):
-        return obj.price
+        return obj.current_price
+    
+    def get_main_image_srcset(self, obj):
+        return srcset(obj.main_image, obj.main_image_variants)
     
     def get_discount_percentage(self, obj):
-        # Por enquanto sem promoções
-        return 0
+        return obj.discount_percentage
+    
+    def get_stock_quantity(self, obj):
+        # Quantidade disponível para venda (descontadas as reservas ativas)
+        return obj.available_quantity
+    
+    def get_is_in_stock(self, obj):
+        return obj.is_in_stock
 
 
 class ProductCreateUpdateSerializer(serializers.ModelSerializer):
     """
     Serializer para criação e atualização de produtos
     """
+    initial_stock = serializers.IntegerField(min_value=0, required=False, default=0, write_only=True)
+    
     class Meta:
         model = Product
         fields = [
             'name', 'description', 'price', 'department',
             'weight', 'dimensions', 'is_active', 'is_featured',
-            'meta_title', 'meta_description'
+            'meta_title', 'meta_description', 'initial_stock'
         ]
     
     def validate_price(self, value):
@@ -162,13 +207,42 @@ class ProductSearchSerializer(serializers.Serializer):
     department = serializers.IntegerField(required=False)
     min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
     max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    min_rating = serializers.DecimalField(
+        max_digits=3, decimal_places=2, min_value=0, max_value=5, required=False
+    )
     in_stock = serializers.BooleanField(required=False)
     is_featured = serializers.BooleanField(required=False)
     ordering = serializers.ChoiceField(
         choices=[
-            'name', '-name', 'price', '-price', 'created_at', '-created_at',
+            'relevance', 'name', '-name', 'price', '-price', 'created_at', '-created_at',
             'rating', '-rating'
         ],
         required=False,
-        default='-created_at'
+        default='relevance'
     )
+
+
+class AvailabilityItemSerializer(serializers.Serializer):
+    """
+    Serializer para um item da verificação de disponibilidade
+    """
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class AvailabilityCheckSerializer(serializers.Serializer):
+    """
+    Serializer para verificação de disponibilidade de vários produtos
+    """
+    MAX_ITEMS = 500
+    
+    items = AvailabilityItemSerializer(many=True)
+    
+    def validate_items(self, value):
+        if not value:
+            raise serializers.ValidationError("Informe pelo menos um item.")
+        if len(value) > self.MAX_ITEMS:
+            raise serializers.ValidationError(
+                f"Máximo de {self.MAX_ITEMS} itens por verificação."
+            )
+        return value
@@ -0,0 +1,86 @@
+from .models import Product
+
+
+class ProductAvailability:
+    """
+    Resultado da verificação de disponibilidade de um produto.
+    """
+    def __init__(self, product_id, requested_quantity, product=None):
+        self.product_id = product_id
+        self.requested_quantity = requested_quantity
+        self.product = product
+    
+    @property
+    def exists(self):
+        return self.product is not None
+    
+    @property
+    def is_active(self):
+        return self.exists and self.product.is_active
+    
+    @property
+    def available_quantity(self):
+        return self.product.available_quantity if self.exists else 0
+    
+    @property
+    def current_price(self):
+        return self.product.current_price if self.exists else None
+    
+    @property
+    def is_available(self):
+        return self.is_active and self.available_quantity >= self.requested_quantity
+    
+    @property
+    def error(self):
+        """Mensagem de erro para o cliente, ou None se o item estiver disponível"""
+        if not self.exists:
+            return f"Produto com ID {self.product_id} não encontrado."
+        if not self.is_active:
+            return f"O produto {self.product.name} não está disponível."
+        if not self.is_available:
+            return (
+                f"Estoque insuficiente para {self.product.name}. "
+                f"Disponível: {self.available_quantity}, Solicitado: {self.requested_quantity}"
+            )
+        return None
+    
+    def to_dict(self):
+        return {
+            'product_id': self.product_id,
+            'name': self.product.name if self.exists else None,
+            'is_active': self.is_active,
+            'requested_quantity': self.requested_quantity,
+            'available_quantity': self.available_quantity,
+            'current_price': self.current_price,
+            'is_available': self.is_available,
+        }
+
+
+def check_availability(items):
+    """
+    Verifica a disponibilidade de vários produtos com uma única consulta.
+    
+    Recebe pares (product_id, quantity) e retorna um dicionário
+    {product_id: ProductAvailability}, na ordem em que os produtos foram
+    informados. Quantidades repetidas para o mesmo produto são somadas.
+    """
+    requested = {}
+    for product_id, quantity in items:
+        product_id = int(product_id)
+        requested[product_id] = requested.get(product_id, 0) + int(quantity)
+    
+    if not requested:
+        return {}
+    
+    products = Product.objects.filter(id__in=requested).select_related('stock_balance')
+    found = {product.id: product for product in products}
+    
+    return {
+        product_id: ProductAvailability(product_id, quantity, found.get(product_id))
+        for product_id, quantity in requested.items()
+    }
+
+
+def availability_errors(availability):
+    """Lista as mensagens de erro de um resultado de check_availability"""
+    return [entry.error for entry in availability.values() if entry.error]
@@ -0,0 +1,120 @@
+import logging
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .images import IMAGE_FIELDS, needs_variants
+
+from .models import Department, Product, ProductFacet, ProductImage, ProductReview
+from .search import get_search_backend
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FIELDS = {'name', 'short_description', 'description'}
+FACET_FIELDS = {'department', 'department_id', 'effective_price'}
+
+
+@receiver(post_save, sender=Product)
+def index_product_for_search(sender, instance, update_fields=None, **kwargs):
+    """
+    Atualizar o índice de busca quando os textos do produto mudam
+    """
+    if update_fields is not None and not SEARCH_FIELDS.intersection(update_fields):
+        return
+    get_search_backend().index_products([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_facets(sender, instance, update_fields=None, **kwargs):
+    """
+    Atualizar o índice de facetas quando departamento ou preço mudam
+    """
+    if update_fields is not None and not FACET_FIELDS.intersection(update_fields):
+        return
+    ProductFacet.refresh_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_search(sender, instance, **kwargs):
+    """
+    Remover o produto do índice de busca
+    """
+    get_search_backend().remove_products([instance.pk])
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_department(sender, instance, **kwargs):
+    """
+    Guardar o departamento anterior para invalidar também o catálogo de origem
+    """
+    instance._previous_department_id = None
+    if instance.pk:
+        instance._previous_department_id = Product.objects.filter(
+            pk=instance.pk
+        ).values_list('department_id', flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def touch_department_catalog(sender, instance, **kwargs):
+    """
+    Avançar a versão do catálogo dos departamentos afetados
+    """
+    Department.touch_catalog([
+        instance.department_id, getattr(instance, '_previous_department_id', None)
+    ])
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_product_on_image_change(sender, instance, **kwargs):
+    """
+    Imagens fazem parte da representação do produto: avançar sua versão
+    """
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+    Department.touch_catalog(product_ids=[instance.product_id])
+
+
+@receiver(post_delete, sender=ProductReview)
+def remove_review_from_aggregates(sender, instance, **kwargs):
+    """
+    Remover a avaliação aprovada dos agregados do produto (inclusive exclusões em lote)
+    """
+    if instance.is_approved:
+        ProductReview.apply_to_products([(instance.product_id, instance.rating, -1)])
+
+
+def schedule_image_variants(sender, instance, **kwargs):
+    """
+    Enfileirar a geração de variantes quando uma imagem é enviada ou trocada
+    """
+    from .tasks import generate_image_variants
+    
+    for model_label, field_name, variants_field in IMAGE_FIELDS:
+        if apps.get_model(model_label) is not sender:
+            continue
+        if not needs_variants(getattr(instance, field_name), getattr(instance, variants_field)):
+            continue
+        
+        args = (model_label, instance.pk, field_name, variants_field)
+        
+        def enqueue(args=args):
+            try:
+                generate_image_variants.delay(*args)
+            except Exception as e:
+                # Sem broker disponível: a imagem original continua servida e o
+                # comando generate_image_variants recupera depois
+                logger.error(f"Could not enqueue image variants for {args[0]} {args[1]}: {e}")
+        
+        transaction.on_commit(enqueue)
+
+
+for _model_label, _field_name, _variants_field in IMAGE_FIELDS:
+    post_save.connect(
+        schedule_image_variants,
+        sender=_model_label,
+        dispatch_uid=f'image_variants_{_model_label}'
+    )
@@ -0,0 +1,158 @@
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def snapshot_stock_balances():
+    """
+    Registrar snapshots de saldo para os produtos movimentados desde o último
+    snapshot
+    """
+    try:
+        from products.models import StockSnapshot
+        
+        # Margem para transações ainda não confirmadas no instante do snapshot
+        as_of = timezone.now() - timedelta(minutes=settings.STOCK_SNAPSHOT_SETTLE_MINUTES)
+        created = StockSnapshot.take(as_of=as_of)
+        
+        logger.info(f"Stock snapshots taken for {created} products as of {as_of}")
+        return f"{created} stock snapshots taken"
+        
+    except Exception as e:
+        logger.error(f"Error taking stock snapshots: {e}")
+        raise
+
+
+@shared_task
+def compact_stock_ledger(detail_days=None, batch_size=500):
+    """
+    Consolidar em resumos mensais as movimentações de estoque fora da janela de
+    detalhe
+    """
+    try:
+        from products.models import Stock, StockMonthlySummary
+        
+        detail_days = detail_days or settings.STOCK_LEDGER_DETAIL_DAYS
+        
+        # Compactar apenas meses completos anteriores à janela de detalhe
+        cutoff = timezone.localtime(timezone.now() - timedelta(days=detail_days)).replace(
+            day=1, hour=0, minute=0, second=0, microsecond=0
+        )
+        
+        product_ids = list(
+            Stock.objects.filter(created_at__lt=cutoff).order_by('product_id').values_list(
+                'product_id', flat=True
+            ).distinct()
+        )
+        
+        compacted = 0
+        for start in range(0, len(product_ids), batch_size):
+            compacted += StockMonthlySummary.compact(product_ids[start:start + batch_size], cutoff)
+        
+        logger.info(f"Compacted {compacted} stock movements older than {cutoff}")
+        return f"{compacted} stock movements compacted"
+        
+    except Exception as e:
+        logger.error(f"Error compacting stock ledger: {e}")
+        raise
+
+
+@shared_task
+def generate_image_variants(model_label, pk, field_name, variants_field):
+    """
+    Gerar as variantes responsivas (WebP/JPEG) de uma imagem do catálogo
+    """
+    try:
+        from products.images import process_image
+        
+        variants = process_image(model_label, pk, field_name, variants_field)
+        if variants is None:
+            return f"No variants needed for {model_label} {pk}"
+        
+        logger.info(f"Image variants generated for {model_label} {pk}.{field_name}")
+        return f"Variants generated for {model_label} {pk}"
+        
+    except Exception as e:
+        logger.error(f"Error generating image variants for {model_label} {pk}: {e}")
+        raise
+
+
+@shared_task
+def update_product_rankings():
+    """
+    Atualizar o ranking de mais vendidos com os pedidos alterados desde a
+    última execução
+    """
+    try:
+        from products.rankings import update_rankings
+        
+        days, ranked = update_rankings()
+        
+        logger.info(f"Product rankings updated: {days} sales days refreshed, {ranked} products ranked")
+        return f"{ranked} products ranked ({days} sales days refreshed)"
+        
+    except Exception as e:
+        logger.error(f"Error updating product rankings: {e}")
+        raise
+
+
+@shared_task
+def update_related_products():
+    """
+    Atualizar a matriz de coocorrência e os produtos relacionados com os
+    pedidos criados desde a última execução
+    """
+    try:
+        from products.recommendations import update_related_products as update
+        
+        orders, products = update()
+        
+        logger.info(f"Related products updated from {orders} orders ({products} products affected)")
+        return f"{products} products updated from {orders} orders"
+        
+    except Exception as e:
+        logger.error(f"Error updating related products: {e}")
+        raise
+
+
+@shared_task
+def apply_price_schedules():
+    """
+    Materializar o preço efetivo dos produtos cujos agendamentos começaram ou
+    terminaram desde a última execução
+    """
+    try:
+        from products.models import PriceSchedule
+        
+        changed = PriceSchedule.apply_transitions()
+        
+        logger.info(f"Effective prices updated for {changed} products")
+        return f"{changed} effective prices updated"
+        
+    except Exception as e:
+        logger.error(f"Error applying price schedules: {e}")
+        raise
+
+
+@shared_task
+def warm_catalog_cache():
+    """
+    Pré-computar no cache os destaques e a primeira página de cada departamento
+    """
+    try:
+        from rest_framework.pagination import PageNumberPagination
+        from products import cache as catalog_cache
+        
+        departments = catalog_cache.warm(PageNumberPagination.page_size)
+        
+        logger.info(f"Catalog cache warmed for {departments} departments")
+        return f"Catalog cache warmed for {departments} departments"
+        
+    except Exception as e:
+        logger.error(f"Error warming catalog cache: {e}")
+        raise
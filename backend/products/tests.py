@@ -1,4 +1,16 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from django.test import TestCase, override_settings
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.core.management import call_command
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError
@@ -6,7 +18,16 @@ from rest_framework.test import APITestCase
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 from decimal import Decimal
-from .models import Department, Product, ProductImage, Stock, ProductReview
+from datetime import timedelta
+from django.utils import timezone
+from . import cache as catalog_cache, recommendations, search
+from .models import (
+    Department, PriceSchedule, ProcessingWatermark, Product, ProductCooccurrence, ProductFacet, ProductImage,
+    ProductRanking, RelatedProduct, Stock, StockBalance, StockSnapshot, StockMonthlySummary, ProductReview
+)
+from .rankings import update_rankings
+from .recommendations import count_pairs, update_related_products
+from orders.models import Order, OrderItem
 
 User = get_user_model()
 
@@ -242,6 +263,997 @@ class StockModelTest(TestCase):
         self.assertEqual(total_stock, 75)  # 100 - 30 + 5
 
 
+class StockBalanceTest(TestCase):
+    """Testes para o saldo de estoque materializado"""
+    
+    def setUp(self):
+        self.department = Department.objects.create(
+            name='Eletrônicos',
+            slug='eletronicos'
+        )
+        
+        self.product = Product.objects.create(
+            name='Smartphone X',
+            description='Um smartphone avançado',
+            slug='smartphone-x',
+            department=self.department,
+            price=Decimal('1200.00')
+        )
+    
+    def test_balance_follows_movements(self):
+        """Teste de atualização do saldo a cada movimentação"""
+        Stock.objects.create(product=self.product, quantity=100, movement_type='in', reason='Compra')
+        Stock.objects.create(product=self.product, quantity=30, movement_type='out', reason='Venda')
+        
+        balance = StockBalance.objects.get(product=self.product)
+        self.assertEqual(balance.quantity, 70)
+    
+    def test_stock_quantity_does_not_aggregate_ledger(self):
+        """Teste de leitura do saldo sem somar o livro de movimentações"""
+        Stock.objects.create(product=self.product, quantity=10, movement_type='in', reason='Compra')
+        product = Product.objects.select_related('stock_balance').get(pk=self.product.pk)
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(product.stock_quantity, 10)
+    
+    def test_update_and_delete_movement(self):
+        """Teste de estorno do saldo ao alterar ou excluir movimentações"""
+        movement = Stock.objects.create(product=self.product, quantity=10, movement_type='in', reason='Compra')
+        movement.movement_type = 'out'
+        movement.save()
+        self.assertEqual(StockBalance.objects.get(product=self.product).quantity, -10)
+        
+        movement.delete()
+        self.assertEqual(StockBalance.objects.get(product=self.product).quantity, 0)
+    
+    def test_reconcile_stock_fixes_divergence(self):
+        """Teste do comando reconcile_stock"""
+        Stock.objects.create(product=self.product, quantity=40, movement_type='in', reason='Compra')
+        StockBalance.objects.filter(product=self.product).update(quantity=999)
+        
+        out = StringIO()
+        call_command('reconcile_stock', stdout=out)
+        self.assertIn('1 saldos divergentes', out.getvalue())
+        self.assertEqual(StockBalance.objects.get(product=self.product).quantity, 999)
+        
+        call_command('reconcile_stock', '--fix', stdout=StringIO())
+        self.assertEqual(StockBalance.objects.get(product=self.product).quantity, 40)
+
+
+class StockLedgerCompactionTest(TestCase):
+    """Testes para snapshots e compactação do livro de estoque"""
+    
+    def setUp(self):
+        self.department = Department.objects.create(
+            name='Eletrônicos',
+            slug='eletronicos'
+        )
+        
+        self.product = Product.objects.create(
+            name='Smartphone X',
+            description='Um smartphone avançado',
+            slug='smartphone-x',
+            department=self.department,
+            price=Decimal('1200.00')
+        )
+    
+    def _movement(self, quantity, movement_type, days_ago):
+        movement = Stock.objects.create(
+            product=self.product,
+            quantity=quantity,
+            movement_type=movement_type,
+            reason='Teste'
+        )
+        Stock.objects.filter(pk=movement.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+    
+    def test_snapshot_plus_deltas(self):
+        """Teste do saldo calculado a partir do último snapshot"""
+        self._movement(100, 'in', days_ago=10)
+        self.assertEqual(StockSnapshot.take(), 1)
+        self.assertEqual(StockSnapshot.take(), 0)
+        
+        self._movement(20, 'out', days_ago=0)
+        self.assertEqual(Stock.ledger_balances([self.product.pk]), {self.product.pk: 80})
+    
+    def test_compaction_keeps_balance(self):
+        """Teste da compactação em resumos mensais"""
+        self._movement(100, 'in', days_ago=400)
+        self._movement(30, 'out', days_ago=400)
+        self._movement(5, 'in', days_ago=1)
+        
+        cutoff = timezone.now() - timedelta(days=200)
+        deleted = StockMonthlySummary.compact([self.product.pk], cutoff)
+        
+        self.assertEqual(deleted, 2)
+        self.assertEqual(Stock.objects.filter(product=self.product).count(), 1)
+        summary = StockMonthlySummary.objects.get(product=self.product)
+        self.assertEqual(summary.net_quantity, 70)
+        self.assertEqual(summary.movements_count, 2)
+        self.assertEqual(Stock.ledger_balances([self.product.pk]), {self.product.pk: 75})
+        self.assertEqual(self.product.stock_quantity, 75)
+        
+        out = StringIO()
+        call_command('reconcile_stock', stdout=out)
+        self.assertIn('nenhum saldo divergente', out.getvalue())
+
+
+class ProductAvailabilityAPITest(APITestCase):
+    """Testes para a verificação de disponibilidade em lote"""
+    
+    def setUp(self):
+        self.department = Department.objects.create(
+            name='Eletrônicos',
+            slug='eletronicos'
+        )
+        self.products = []
+        for index in range(5):
+            product = Product.objects.create(
+                name=f'Produto {index}',
+                description='Descrição',
+                slug=f'produto-{index}',
+                department=self.department,
+                price=Decimal('10.00')
+            )
+            Stock.objects.create(product=product, quantity=10, movement_type='in', reason='Compra')
+            self.products.append(product)
+        
+        self.inactive = self.products[-1]
+        self.inactive.is_active = False
+        self.inactive.save()
+    
+    def test_availability_uses_single_query(self):
+        """Teste de consulta única independente da quantidade de itens"""
+        items = [{'product_id': product.id, 'quantity': 2} for product in self.products[:4]]
+        
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/products/availability/', {'items': items}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['all_available'])
+        self.assertEqual(len(response.data['items']), 4)
+        self.assertEqual(response.data['items'][0]['available_quantity'], 10)
+    
+    def test_availability_reports_problems(self):
+        """Teste de produtos inativos, inexistentes ou sem estoque"""
+        items = [
+            {'product_id': self.products[0].id, 'quantity': 11},
+            {'product_id': self.inactive.id, 'quantity': 1},
+            {'product_id': 999999, 'quantity': 1},
+        ]
+        response = self.client.post('/api/products/availability/', {'items': items}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['all_available'])
+        self.assertEqual([item['is_available'] for item in response.data['items']], [False, False, False])
+        self.assertFalse(response.data['items'][1]['is_active'])
+        self.assertIsNone(response.data['items'][2]['name'])
+    
+    def test_availability_rejects_invalid_input(self):
+        """Teste de product_id e quantity inválidos (400)"""
+        for item in ({'product_id': 'abc', 'quantity': 1}, {'product_id': self.products[0].id, 'quantity': 0}):
+            response = self.client.post('/api/products/availability/', {'items': [item]}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductSearchAPITest(APITestCase):
+    """Testes para a busca textual de produtos"""
+    
+    def setUp(self):
+        self.department = Department.objects.create(name='Hortifruti', slug='hortifruti')
+        self.other_department = Department.objects.create(name='Mercearia', slug='mercearia')
+        self.apple = Product.objects.create(
+            name='Maçã Fuji',
+            description='Maçã doce e crocante colhida na serra.',
+            slug='maca-fuji',
+            department=self.department,
+            price=Decimal('8.00')
+        )
+        self.juice = Product.objects.create(
+            name='Suco natural',
+            description='Suco de maçã sem açúcar.',
+            slug='suco-natural',
+            department=self.other_department,
+            price=Decimal('12.00')
+        )
+        self.rice = Product.objects.create(
+            name='Arroz integral',
+            description='Arroz tipo 1.',
+            slug='arroz-integral',
+            department=self.other_department,
+            price=Decimal('20.00')
+        )
+    
+    def test_search_ranks_name_matches_first(self):
+        """Teste de relevância, acentuação e destaque"""
+        response = self.client.get('/api/products/search/', {'q': 'maca'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [item['id'] for item in response.data['results']]
+        self.assertEqual(ids, [self.apple.id, self.juice.id])
+        self.assertIn('<mark>', response.data['results'][0]['highlight'])
+    
+    @skipUnless(connection.vendor == 'sqlite', 'Detecção da tabela FTS5 do SQLite')
+    def test_fts_detection_is_not_pinned_to_fallback(self):
+        """Teste da tabela FTS criada depois da primeira detecção"""
+        search._fts_databases.clear()
+        with mock.patch.object(connection.introspection, 'table_names', return_value=[]):
+            self.assertIsInstance(search.get_search_backend(), search.SimpleSearchBackend)
+        self.assertIsInstance(search.get_search_backend(), search.SQLiteSearchBackend)
+    
+    def test_search_applies_catalog_filters(self):
+        """Teste dos filtros de departamento e preço na busca"""
+        response = self.client.get('/api/products/search/', {
+            'q': 'maçã', 'department': self.other_department.id, 'max_price': '15.00'
+        })
+        
+        self.assertEqual([item['id'] for item in response.data['results']], [self.juice.id])
+    
+    def test_search_index_follows_product_changes(self):
+        """Teste de atualização do índice ao salvar e excluir produtos"""
+        self.rice.name = 'Arroz parboilizado'
+        self.rice.save()
+        
+        response = self.client.get('/api/products/', {'search': 'parboilizado'})
+        self.assertEqual([item['id'] for item in response.data['results']], [self.rice.id])
+        
+        self.rice.delete()
+        response = self.client.get('/api/products/search/', {'q': 'arroz'})
+        self.assertEqual(response.data['results'], [])
+    
+    def test_search_requires_query(self):
+        """Teste de termo de busca obrigatório"""
+        response = self.client.get('/api/products/search/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductFacetTest(APITestCase):
+    """Testes para a navegação por facetas do catálogo"""
+    
+    def setUp(self):
+        self.fruits = Department.objects.create(name='Frutas', slug='frutas')
+        self.grains = Department.objects.create(name='Grãos', slug='graos')
+        self.apple = Product.objects.create(
+            name='Maçã', description='Fruta', slug='maca',
+            department=self.fruits, price=Decimal('8.00')
+        )
+        self.pear = Product.objects.create(
+            name='Pera', description='Fruta', slug='pera',
+            department=self.fruits, price=Decimal('30.00')
+        )
+        self.rice = Product.objects.create(
+            name='Arroz', description='Grão', slug='arroz',
+            department=self.grains, price=Decimal('30.00')
+        )
+        Stock.objects.create(product=self.apple, quantity=5, movement_type='in', reason='Compra')
+    
+    def test_facet_index_follows_changes(self):
+        """Teste de atualização incremental do índice de facetas"""
+        facet = ProductFacet.objects.get(product=self.apple)
+        self.assertEqual(facet.department_id, self.fruits.id)
+        self.assertEqual(facet.price_bucket, 0)
+        self.assertTrue(facet.in_stock)
+        
+        Stock.objects.create(product=self.apple, quantity=5, movement_type='out', reason='Venda')
+        self.apple.price = Decimal('60.00')
+        self.apple.department = self.grains
+        self.apple.save()
+        
+        facet.refresh_from_db()
+        self.assertFalse(facet.in_stock)
+        self.assertEqual(facet.price_bucket, 3)
+        self.assertEqual(facet.department_id, self.grains.id)
+    
+    def test_list_returns_facets_for_current_filters(self):
+        """Teste do modo facetas com filtros aplicados"""
+        response = self.client.get('/api/products/', {
+            'facets': 'department,price,in_stock', 'min_price': '20'
+        })
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        facets = response.data['facets']
+        self.assertEqual(
+            [(item['name'], item['count']) for item in facets['department']],
+            [('Frutas', 1), ('Grãos', 1)]
+        )
+        self.assertEqual(facets['price'][2]['count'], 2)
+        self.assertEqual(facets['in_stock'], {'true': 0, 'false': 2})
+    
+    def test_facet_counts_use_single_query(self):
+        """Teste de consulta única para todas as facetas"""
+        with self.assertNumQueries(1):
+            ProductFacet.counts(Product.objects.filter(is_active=True))
+    
+    def test_invalid_facet(self):
+        """Teste de faceta inexistente"""
+        response = self.client.get('/api/products/', {'facets': 'color'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PriceScheduleTest(APITestCase):
+    """Testes para os preços agendados e o preço efetivo materializado"""
+    
+    def setUp(self):
+        cache.clear()
+        self.department = Department.objects.create(name='Frutas', slug='frutas')
+        self.apple = Product.objects.create(
+            name='Maçã', description='Fruta', slug='maca',
+            department=self.department, price=Decimal('10.00')
+        )
+        self.pear = Product.objects.create(
+            name='Pera', description='Fruta', slug='pera',
+            department=self.department, price=Decimal('8.00'),
+            promotional_price=Decimal('7.00'), is_on_promotion=True
+        )
+        self.now = timezone.now()
+    
+    def test_effective_price_on_save(self):
+        """Teste do preço efetivo ao salvar produto e agendamento"""
+        self.assertEqual(self.pear.effective_price, Decimal('7.00'))
+        
+        PriceSchedule.objects.create(
+            name='Oferta', product=self.apple, kind='price', value=Decimal('6.50'),
+            starts_at=self.now - timedelta(hours=1)
+        )
+        self.apple.refresh_from_db()
+        self.assertEqual(self.apple.current_price, Decimal('6.50'))
+        self.assertEqual(self.apple.discount_percentage, Decimal('35.00'))
+        
+        # Alterar o preço normal mantém o agendamento aplicado
+        self.apple.price = Decimal('12.00')
+        self.apple.save()
+        self.assertEqual(self.apple.effective_price, Decimal('6.50'))
+    
+    def test_department_schedule_window(self):
+        """Teste de agendamento por departamento nas viradas de início e fim"""
+        starts_at = self.now + timedelta(hours=1)
+        PriceSchedule.objects.create(
+            name='Virada', department=self.department, kind='percentage', value=Decimal('50'),
+            starts_at=starts_at, ends_at=starts_at + timedelta(hours=1)
+        )
+        self.apple.refresh_from_db()
+        self.assertEqual(self.apple.effective_price, Decimal('10.00'))
+        
+        self.assertEqual(PriceSchedule.refresh_prices(when=starts_at), 2)
+        self.assertEqual(
+            dict(Product.objects.values_list('slug', 'effective_price')),
+            {'maca': Decimal('5.00'), 'pera': Decimal('4.00')}
+        )
+        self.assertEqual(ProductFacet.objects.get(product=self.apple).price_bucket, 0)
+        
+        self.assertEqual(PriceSchedule.refresh_prices(when=starts_at + timedelta(hours=2)), 2)
+        self.assertEqual(
+            dict(Product.objects.values_list('slug', 'effective_price')),
+            {'maca': Decimal('10.00'), 'pera': Decimal('7.00')}
+        )
+        self.assertEqual(PriceSchedule.refresh_prices(when=starts_at + timedelta(hours=2)), 0)
+    
+    def test_transitions_only_touch_crossed_schedules(self):
+        """Teste da tarefa periódica guiada pelas viradas desde a última execução"""
+        from .tasks import apply_price_schedules
+        starts_at = self.now + timedelta(hours=1)
+        PriceSchedule.objects.create(
+            name='Virada', product=self.apple, kind='price', value=Decimal('6.00'),
+            starts_at=starts_at, ends_at=starts_at + timedelta(hours=1)
+        )
+        apply_price_schedules()
+        self.assertIsNotNone(ProcessingWatermark.get(PriceSchedule.WATERMARK))
+        
+        # Produto com preço efetivo divergente fora de qualquer virada não é relido
+        Product.objects.filter(pk=self.pear.pk).update(effective_price=Decimal('1.00'))
+        self.assertEqual(PriceSchedule.apply_transitions(when=self.now + timedelta(minutes=30)), 0)
+        
+        self.assertEqual(PriceSchedule.apply_transitions(when=starts_at), 1)
+        self.apple.refresh_from_db()
+        self.assertEqual(self.apple.effective_price, Decimal('6.00'))
+        
+        self.assertEqual(PriceSchedule.apply_transitions(when=starts_at + timedelta(hours=2)), 1)
+        self.apple.refresh_from_db()
+        self.assertEqual(self.apple.effective_price, Decimal('10.00'))
+        self.assertEqual(Product.objects.get(pk=self.pear.pk).effective_price, Decimal('1.00'))
+    
+    def test_filter_and_ordering_use_effective_price(self):
+        """Teste de filtro e ordenação pelo preço efetivo"""
+        PriceSchedule.objects.create(
+            name='Oferta', product=self.apple, kind='price', value=Decimal('5.00'),
+            starts_at=self.now - timedelta(hours=1)
+        )
+        
+        response = self.client.get('/api/products/', {'ordering': 'price'})
+        self.assertEqual([item['slug'] for item in response.data['results']], ['maca', 'pera'])
+        self.assertEqual(response.data['results'][0]['current_price'], Decimal('5.00'))
+        
+        response = self.client.get('/api/products/', {'max_price': '6.00'})
+        self.assertEqual([item['slug'] for item in response.data['results']], ['maca'])
+    
+    def test_schedule_requires_single_target(self):
+        """Teste de validação do alvo do agendamento"""
+        schedule = PriceSchedule(
+            name='Inválido', product=self.apple, department=self.department,
+            value=Decimal('5.00'), starts_at=self.now
+        )
+        with self.assertRaises(ValidationError):
+            schedule.full_clean()
+
+
+class ProductRankingTest(APITestCase):
+    """Testes para o ranking incremental de mais vendidos"""
+    
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='cliente@example.com', password='testpass123', full_name='Cliente',
+            cpf_cnpj='22222222222', user_type='customer'
+        )
+        department = Department.objects.create(name='Frutas', slug='frutas')
+        self.products = {
+            slug: Product.objects.create(
+                name=slug, description='Fruta', slug=slug, department=department, price=Decimal('10.00')
+            )
+            for slug in ('maca', 'pera', 'uva')
+        }
+        self.now = timezone.now()
+        self.orders = [
+            self.create_order('maca', 5, days_ago=1),
+            self.create_order('pera', 20, days_ago=40),
+            self.create_order('uva', 2, days_ago=2),
+        ]
+    
+    def create_order(self, slug, quantity, days_ago):
+        order = Order.objects.create(
+            customer=self.customer,
+            payment_method='pix',
+            subtotal=Decimal('10.00') * quantity,
+            total_amount=Decimal('10.00') * quantity,
+            shipping_address='Rua A, 1',
+            shipping_city='São Paulo',
+            shipping_state='SP',
+            shipping_postal_code='01000-000'
+        )
+        OrderItem.objects.create(
+            order=order, product=self.products[slug], quantity=quantity, unit_price=Decimal('10.00')
+        )
+        created_at = self.now - timedelta(days=days_ago)
+        Order.objects.filter(pk=order.pk).update(created_at=created_at, updated_at=created_at)
+        order.refresh_from_db()
+        return order
+    
+    def ranking(self):
+        return list(ProductRanking.objects.order_by('rank').values_list('product__slug', flat=True))
+    
+    def test_rankings_with_decay_and_windows(self):
+        """Teste das janelas e do decaimento"""
+        self.assertEqual(update_rankings(self.now), (3, 3))
+        self.assertEqual(self.ranking(), ['maca', 'pera', 'uva'])
+        
+        pear = ProductRanking.objects.get(product=self.products['pera'])
+        self.assertEqual((pear.quantity_7d, pear.quantity_30d, pear.quantity_90d), (0, 0, 20))
+        self.assertEqual(pear.revenue_90d, Decimal('200.00'))
+        self.assertLess(pear.score, 20)
+    
+    def test_incremental_update_after_cancellation(self):
+        """Teste de processamento apenas dos pedidos alterados"""
+        update_rankings(self.now)
+        
+        order = self.orders[0]
+        order.status = 'cancelled'
+        order.save()
+        
+        days, ranked = update_rankings(self.now + timedelta(minutes=10))
+        self.assertEqual((days, ranked), (1, 2))
+        self.assertEqual(self.ranking(), ['pera', 'uva'])
+        
+        # Sem novas alterações, nenhum dia é recalculado
+        self.assertEqual(update_rankings(self.now + timedelta(minutes=20)), (0, 2))
+    
+    def test_catalog_touched_only_for_rank_changes(self):
+        """Teste de nova versão do catálogo apenas para os produtos que mudaram de posição"""
+        update_rankings(self.now)
+        
+        # maca sai do ranking: pera e uva sobem uma posição
+        order = self.orders[0]
+        order.status = 'cancelled'
+        order.save()
+        with mock.patch.object(Department, 'touch_catalog') as touch_catalog:
+            update_rankings(self.now + timedelta(minutes=10))
+        touch_catalog.assert_called_once_with(product_ids={
+            self.products['maca'].pk, self.products['pera'].pk, self.products['uva'].pk
+        })
+        
+        # Sem mudança de posição, o catálogo não é tocado
+        with mock.patch.object(Department, 'touch_catalog') as touch_catalog:
+            update_rankings(self.now + timedelta(minutes=20))
+        touch_catalog.assert_not_called()
+        
+        # uva (última posição) sai do ranking: pera mantém a posição
+        Order.objects.filter(pk=self.orders[2].pk).update(
+            status='cancelled', updated_at=self.now + timedelta(minutes=20)
+        )
+        with mock.patch.object(Department, 'touch_catalog') as touch_catalog:
+            update_rankings(self.now + timedelta(minutes=40))
+        touch_catalog.assert_called_once_with(product_ids={self.products['uva'].pk})
+    
+    def test_ordering_by_popularity(self):
+        """Teste de ?ordering=popularity na listagem"""
+        order = self.orders[0]
+        order.status = 'cancelled'
+        order.save()
+        update_rankings(self.now + timedelta(minutes=10))
+        
+        response = self.client.get('/api/products/', {'ordering': 'popularity'})
+        self.assertEqual([item['slug'] for item in response.data['results']], ['pera', 'uva', 'maca'])
+        
+        response = self.client.get('/api/products/', {'ordering': '-popularity'})
+        self.assertEqual([item['slug'] for item in response.data['results']], ['uva', 'pera', 'maca'])
+
+
+class KeysetPaginationTest(APITestCase):
+    """Testes para a paginação por cursor do catálogo"""
+    
+    def setUp(self):
+        department = Department.objects.create(name='Frutas', slug='frutas')
+        created_at = timezone.now()
+        self.products = [
+            Product.objects.create(
+                name=f'Produto {index}', description='Fruta', slug=f'produto-{index}',
+                department=department, price=Decimal('5.00')
+            )
+            for index in range(5)
+        ]
+        # Mesmo created_at para exercitar o desempate por id
+        Product.objects.update(created_at=created_at)
+    
+    def test_cursor_pages_are_stable(self):
+        """Teste de páginas sem sobreposição, com has_more e sem contagem"""
+        seen = []
+        response = self.client.get('/api/products/', {'pagination': 'cursor', 'page_size': 2})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            seen.extend(item['id'] for item in response.data['results'])
+            if not response.data['has_more']:
+                self.assertIsNone(response.data['next'])
+                break
+            response = self.client.get(response.data['next'])
+        
+        self.assertEqual(seen, sorted((product.id for product in self.products), reverse=True))
+    
+    def test_page_number_is_default(self):
+        """Teste de compatibilidade com a paginação por página"""
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.data['count'], 5)
+    
+    def test_invalid_cursor(self):
+        """Teste de cursor inválido"""
+        response = self.client.get('/api/products/', {'cursor': 'invalido'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_cursor_rejects_custom_ordering(self):
+        """Teste de cursor combinado com outra ordenação"""
+        response = self.client.get('/api/products/', {'pagination': 'cursor', 'ordering': 'price'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ordering', response.data)
+        
+        response = self.client.get('/api/products/', {'pagination': 'cursor', 'ordering': '-created_at'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class CatalogQueryCountTest(APITestCase):
+    """Testes de quantidade fixa de consultas nos endpoints do catálogo"""
+    
+    def setUp(self):
+        self.departments = [
+            Department.objects.create(name=f'Departamento {index}', slug=f'departamento-{index}')
+            for index in range(2)
+        ]
+        self.create_products(2)
+    
+    def create_products(self, count):
+        start = Product.objects.count()
+        for index in range(start, start + count):
+            product = Product.objects.create(
+                name=f'Produto {index}',
+                description='Descrição',
+                slug=f'produto-{index}',
+                department=self.departments[index % 2],
+                price=Decimal('10.00')
+            )
+            Stock.objects.create(product=product, quantity=5, movement_type='in', reason='Compra')
+            ProductImage.objects.create(product=product, image='products/foto.jpg', alt_text='Foto')
+    
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+    
+    def assertConstantQueries(self, url):
+        baseline = self.count_queries(url)
+        self.create_products(6)
+        Department.objects.create(name='Departamento extra', slug='departamento-extra')
+        self.assertEqual(self.count_queries(url), baseline)
+    
+    def test_department_list(self):
+        """Teste da listagem de departamentos"""
+        self.assertConstantQueries('/api/products/departments/')
+    
+    def test_product_list(self):
+        """Teste da listagem de produtos"""
+        self.assertConstantQueries('/api/products/')
+    
+    def test_products_by_department(self):
+        """Teste da listagem por departamento"""
+        self.assertConstantQueries(f'/api/products/departments/{self.departments[0].id}/products/')
+    
+    def test_product_detail(self):
+        """Teste do detalhe do produto"""
+        product = Product.objects.first()
+        baseline = self.count_queries(f'/api/products/{product.slug}/')
+        for _ in range(5):
+            Stock.objects.create(product=product, quantity=1, movement_type='in', reason='Compra')
+            ProductImage.objects.create(product=product, image='products/foto.jpg')
+        self.assertEqual(self.count_queries(f'/api/products/{product.slug}/'), baseline)
+    
+    def test_product_detail_recent_stock_movements(self):
+        """Teste do detalhe com as últimas movimentações e o saldo materializado"""
+        product = Product.objects.first()
+        limit = settings.PRODUCT_DETAIL_STOCK_MOVEMENTS
+        for _ in range(limit):
+            Stock.objects.create(product=product, quantity=1, movement_type='in', reason='Compra')
+        
+        response = self.client.get(f'/api/products/{product.slug}/')
+        latest = list(product.stock.order_by('-created_at', '-id').values_list('id', flat=True)[:limit])
+        self.assertEqual([movement['id'] for movement in response.data['stock']], latest)
+        self.assertEqual(response.data['stock_quantity'], 5 + limit)
+        self.assertTrue(response.data['is_in_stock'])
+
+
+class ConditionalGetTest(APITestCase):
+    """Testes de ETag / Last-Modified no catálogo"""
+    
+    def setUp(self):
+        self.department = Department.objects.create(name='Frutas', slug='frutas')
+        self.other_department = Department.objects.create(name='Grãos', slug='graos')
+        self.product = Product.objects.create(
+            name='Maçã', description='Fruta', slug='maca',
+            department=self.department, price=Decimal('8.00')
+        )
+    
+    def test_product_detail_not_modified(self):
+        """Teste de 304 sem serialização e invalidação por estoque"""
+        url = f'/api/products/{self.product.slug}/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        
+        Stock.objects.create(product=self.product, quantity=3, movement_type='in', reason='Compra')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], self.product.id)
+    
+    def test_department_catalog_version(self):
+        """Teste da versão por departamento nas listagens"""
+        url = f'/api/products/departments/{self.other_department.id}/products/'
+        etag = self.client.get(url)['ETag']
+        list_etag = self.client.get('/api/products/')['ETag']
+        
+        # Alteração em outro departamento não invalida esta listagem
+        self.product.price = Decimal('9.00')
+        self.product.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=list_etag).status_code, status.HTTP_200_OK)
+        
+        # Mudar o produto de departamento invalida as duas listagens
+        self.product.department = self.other_department
+        self.product.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+
+class CatalogCacheTest(APITestCase):
+    """Testes do cache das listagens de destaques e por departamento"""
+    
+    def setUp(self):
+        cache.clear()
+        self.department = Department.objects.create(name='Frutas', slug='frutas')
+        self.other_department = Department.objects.create(name='Grãos', slug='graos')
+        self.featured = Product.objects.create(
+            name='Maçã', description='Fruta', slug='maca', is_featured=True,
+            department=self.department, price=Decimal('8.00')
+        )
+        self.products = [
+            Product.objects.create(
+                name=f'Arroz {index}', description='Grão', slug=f'arroz-{index}',
+                department=self.other_department, price=Decimal('20.00')
+            )
+            for index in range(3)
+        ]
+        self.department_url = f'/api/products/departments/{self.other_department.id}/products/'
+    
+    def test_featured_served_from_cache(self):
+        """Teste de destaques sem consultas além da versão do catálogo"""
+        response = self.client.get('/api/products/featured/')
+        self.assertEqual([item['id'] for item in response.data], [self.featured.id])
+        
+        with self.assertNumQueries(1):
+            self.client.get('/api/products/featured/')
+    
+    def test_featured_invalidated_by_stock_and_price(self):
+        """Teste de invalidação dos destaques por estoque e preço"""
+        self.client.get('/api/products/featured/')
+        
+        # Estoque invalida o cache após o commit
+        with self.captureOnCommitCallbacks(execute=True):
+            Stock.objects.create(product=self.featured, quantity=4, movement_type='in', reason='Compra')
+        self.assertEqual(self.client.get('/api/products/featured/').data[0]['stock_quantity'], 4)
+        
+        self.featured.price = Decimal('7.50')
+        self.featured.save()
+        self.assertEqual(self.client.get('/api/products/featured/').data[0]['price'], '7.50')
+        
+        self.featured.is_featured = False
+        self.featured.save()
+        self.assertEqual(self.client.get('/api/products/featured/').data, [])
+    
+    def test_changes_elsewhere_keep_entries(self):
+        """Teste de invalidação restrita aos departamentos afetados"""
+        featured_generation = catalog_cache.generation()
+        department_generation = catalog_cache.generation(self.department.id)
+        other_generation = catalog_cache.generation(self.other_department.id)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Stock.objects.create(product=self.products[0], quantity=2, movement_type='in', reason='Compra')
+        
+        self.assertEqual(catalog_cache.generation(), featured_generation)
+        self.assertEqual(catalog_cache.generation(self.department.id), department_generation)
+        self.assertNotEqual(catalog_cache.generation(self.other_department.id), other_generation)
+    
+    def test_products_by_department_paginated(self):
+        """Teste da paginação e do cache por página"""
+        response = self.client.get(self.department_url, {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['products']), 2)
+        self.assertIsNotNone(response.data['next'])
+        self.assertIsNone(response.data['previous'])
+        
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['products']), 1)
+        self.assertIsNone(response.data['next'])
+        
+        with self.assertNumQueries(1):
+            self.client.get(self.department_url, {'page_size': 2})
+        
+        response = self.client.get(self.department_url, {'page': 3, 'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(self.department_url, {'page': 'x'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_department_changes_invalidate_pages(self):
+        """Teste de invalidação por produto e pelo próprio departamento"""
+        self.client.get(self.department_url)
+        
+        self.products[0].is_active = False
+        self.products[0].save()
+        self.assertEqual(self.client.get(self.department_url).data['count'], 2)
+        
+        self.other_department.name = 'Cereais'
+        self.other_department.save()
+        self.assertEqual(self.client.get(self.department_url).data['department']['name'], 'Cereais')
+        
+        self.other_department.is_active = False
+        self.other_department.save()
+        self.assertEqual(self.client.get(self.department_url).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ImageVariantsTest(APITestCase):
+    """Testes para as variantes responsivas das imagens"""
+    
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        
+        self.department = Department.objects.create(name='Frutas', slug='frutas')
+        self.product = Product.objects.create(
+            name='Maçã', description='Fruta', slug='maca',
+            department=self.department, price=Decimal('8.00'),
+            main_image=self.make_image('maca.png', 1000, 500)
+        )
+    
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def make_image(self, name, width, height):
+        from PIL import Image
+        buffer = BytesIO()
+        Image.new('RGBA', (width, height), (200, 30, 30, 255)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+    
+    def test_variants_generated_and_exposed(self):
+        """Teste de geração sem ampliação e do srcset no serializer"""
+        from .tasks import generate_image_variants
+        generate_image_variants('products.Product', self.product.id, 'main_image', 'main_image_variants')
+        
+        self.product.refresh_from_db()
+        variants = self.product.main_image_variants
+        self.assertEqual(variants['source'], self.product.main_image.name)
+        self.assertEqual(sorted(variants['webp']), ['200', '400', '800'])
+        self.assertTrue(variants['jpeg']['400'].endswith('__w400.jpg'))
+        
+        response = self.client.get('/api/products/')
+        srcset = response.data['results'][0]['primary_image_srcset']
+        self.assertIn('__w200.webp 200w', srcset['webp'])
+        self.assertIn('__w800.jpg 800w', srcset['jpeg'])
+    
+    def test_srcset_empty_until_generated(self):
+        """Teste de fallback para a imagem original"""
+        response = self.client.get('/api/products/')
+        self.assertIsNone(response.data['results'][0]['primary_image_srcset'])
+    
+    def test_backfill_command(self):
+        """Teste do comando de backfill em pool de processos"""
+        ProductImage.objects.create(product=self.product, image=self.make_image('detalhe.png', 300, 300))
+        out = StringIO()
+        call_command('generate_image_variants', workers=1, stdout=out)
+        
+        self.assertIn('2 imagens processadas', out.getvalue())
+        image = ProductImage.objects.get(product=self.product)
+        self.assertEqual(list(image.image_variants['webp']), ['200'])
+        
+        out = StringIO()
+        call_command('generate_image_variants', workers=1, stdout=out)
+        self.assertIn('Nenhuma imagem pendente', out.getvalue())
+    
+    def test_variants_touch_catalog(self):
+        """Teste de nova versão do catálogo (ETag) ao gravar as variantes"""
+        from .images import process_image
+        
+        def catalog_version():
+            return Department.objects.values_list('catalog_updated_at', flat=True).get(pk=self.department.pk)
+        
+        response = self.client.get('/api/products/')
+        etag = response['ETag']
+        before = catalog_version()
+        process_image('products.Product', self.product.id, 'main_image', 'main_image_variants')
+        self.assertGreater(catalog_version(), before)
+        self.assertNotEqual(self.client.get('/api/products/')['ETag'], etag)
+        
+        image = ProductImage.objects.create(product=self.product, image=self.make_image('detalhe.png', 300, 300))
+        before = catalog_version()
+        process_image('products.ProductImage', image.id, 'image', 'image_variants')
+        self.assertGreater(catalog_version(), before)
+        
+        # Nada gravado (variantes já geradas): a versão não muda
+        before = catalog_version()
+        process_image('products.ProductImage', image.id, 'image', 'image_variants')
+        self.assertEqual(catalog_version(), before)
+
+
+class CatalogImportExportTest(APITestCase):
+    """Testes para importação e exportação do catálogo em lote"""
+    
+    CSV = (
+        'slug,name,department,price,promotional_price,images,stock\n'
+        'maca,Maçã Fuji,Frutas,8.00,,products/gallery/maca.jpg|products/gallery/maca2.jpg,10\n'
+        ',Pera,Frutas,abc,,,5\n'
+        'arroz,Arroz integral,Grãos,20.00,18.00,,0\n'
+    )
+    
+    def import_csv(self, content):
+        path = os.path.join(self.tmpdir, 'catalogo.csv')
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write(content)
+        out, err = StringIO(), StringIO()
+        call_command('import_catalog', path, batch_size=2, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+    
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+    
+    def test_import_creates_catalog_and_reports_errors(self):
+        """Teste de importação em lote com erro por linha"""
+        out, err = self.import_csv(self.CSV)
+        
+        self.assertIn('2 produtos criados, 0 atualizados, 1 linhas com erro', out)
+        self.assertIn('Linha 3: price inválido', err)
+        
+        apple = Product.objects.get(slug='maca')
+        self.assertEqual(apple.department.name, 'Frutas')
+        self.assertEqual(apple.stock_quantity, 10)
+        self.assertEqual(apple.images.count(), 2)
+        self.assertTrue(ProductFacet.objects.get(product=apple).in_stock)
+        self.assertTrue(Product.objects.get(slug='arroz').is_on_promotion)
+        
+        response = self.client.get('/api/products/search/', {'q': 'fuji'})
+        self.assertEqual([item['id'] for item in response.data['results']], [apple.id])
+    
+    def test_invalid_numbers_are_row_errors(self):
+        """Teste de preços não finitos ou fora dos limites do campo reportados por linha"""
+        out, err = self.import_csv(
+            'slug,name,department,price,weight\n'
+            'maca,Maçã,Frutas,8.00,0.2\n'
+            'pera,Pera,Frutas,NaN,\n'
+            'uva,Uva,Frutas,1e12,\n'
+            'kiwi,Kiwi,Frutas,Infinity,\n'
+            'caju,Caju,Frutas,0,\n'
+            'manga,Manga,Frutas,5.00,123456.1\n'
+        )
+        
+        self.assertIn('1 produtos criados, 0 atualizados, 5 linhas com erro', out)
+        for line in range(3, 8):
+            self.assertIn(f'Linha {line}: ', err)
+        self.assertIn('price inválido: NaN', err)
+        self.assertIn('weight inválido: 123456.1', err)
+        self.assertEqual(list(Product.objects.values_list('slug', flat=True)), ['maca'])
+    
+    def test_reimport_updates_without_duplicating_stock(self):
+        """Teste de reimportação idempotente"""
+        self.import_csv(self.CSV)
+        out, _ = self.import_csv(self.CSV.replace('8.00', '9.50'))
+        
+        self.assertIn('0 produtos criados, 2 atualizados', out)
+        apple = Product.objects.get(slug='maca')
+        self.assertEqual(apple.price, Decimal('9.50'))
+        self.assertEqual(apple.stock_quantity, 10)
+        self.assertEqual(Stock.objects.filter(product=apple).count(), 1)
+    
+    def test_export_round_trip(self):
+        """Teste de exportação compatível com a importação"""
+        self.import_csv(self.CSV)
+        out = StringIO()
+        call_command('export_catalog', '--format', 'jsonl', stdout=out)
+        
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row['slug'] for row in rows], ['maca', 'arroz'])
+        self.assertEqual(rows[0]['images'], ['products/gallery/maca.jpg', 'products/gallery/maca2.jpg'])
+        self.assertEqual(rows[0]['stock'], 10)
+    
+    def test_admin_endpoints(self):
+        """Teste dos endpoints de importação e exportação (apenas admin)"""
+        admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', full_name='Admin',
+            cpf_cnpj='11111111111', user_type='admin'
+        )
+        upload = SimpleUploadedFile('catalogo.csv', self.CSV.encode('utf-8'), content_type='text/csv')
+        
+        response = self.client.post('/api/products/catalog/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        
+        self.client.force_authenticate(user=admin)
+        upload.seek(0)
+        response = self.client.post('/api/products/catalog/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['errors'][0]['line'], 3)
+        
+        response = self.client.get('/api/products/catalog/export/')
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('slug,name,department'))
+        self.assertIn('maca,Maçã Fuji,Frutas', content)
+    
+    def test_create_product_without_default_stock(self):
+        """Teste de criação sem o estoque fixo de 50 unidades"""
+        admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', full_name='Admin',
+            cpf_cnpj='11111111111', user_type='admin'
+        )
+        department = Department.objects.create(name='Frutas', slug='frutas')
+        self.client.force_authenticate(user=admin)
+        response = self.client.post('/api/products/create/', {
+            'name': 'Uva', 'description': 'Fruta', 'price': '12.00', 'department': department.id
+        }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Stock.objects.exists())
+
+
 class ProductImageTest(TestCase):
     """Testes para o modelo ProductImage"""
     
@@ -352,3 +1364,226 @@ class ProductReviewTest(TestCase):
                 title='Segunda avaliação',
                 comment='Segunda avaliação'
             )
+
+
+class ReviewAggregatesTest(APITestCase):
+    """Testes para os agregados de avaliações armazenados no produto"""
+    
+    def setUp(self):
+        self.department = Department.objects.create(name='Frutas', slug='frutas')
+        self.apple = Product.objects.create(
+            name='Maçã', description='Fruta', slug='maca', department=self.department, price=Decimal('8.00')
+        )
+        self.pear = Product.objects.create(
+            name='Pera', description='Fruta', slug='pera', department=self.department, price=Decimal('9.00')
+        )
+        self.customers = [
+            User.objects.create_user(
+                email=f'cliente{index}@example.com', password='testpass123',
+                full_name=f'Cliente {index}', cpf_cnpj=f'0000000000{index}'
+            )
+            for index in range(3)
+        ]
+    
+    def review(self, product, customer, rating, is_approved=False):
+        return ProductReview.objects.create(
+            product=product, customer=customer, rating=rating,
+            title='Avaliação', comment='Comentário', is_approved=is_approved
+        )
+    
+    def test_incremental_updates(self):
+        """Teste de criação, aprovação, alteração e exclusão de avaliações"""
+        pending = self.review(self.apple, self.customers[0], 5)
+        self.review(self.apple, self.customers[1], 2, is_approved=True)
+        self.apple.refresh_from_db()
+        self.assertEqual((self.apple.rating_count, self.apple.rating_avg), (1, Decimal('2.00')))
+        
+        pending.is_approved = True
+        pending.save()
+        self.apple.refresh_from_db()
+        self.assertEqual((self.apple.rating_count, self.apple.rating_avg), (2, Decimal('3.50')))
+        self.assertEqual(self.apple.rating_histogram, {'1': 0, '2': 1, '3': 0, '4': 0, '5': 1})
+        
+        pending.rating = 4
+        pending.save()
+        pending.delete()
+        self.apple.refresh_from_db()
+        self.assertEqual((self.apple.rating_count, self.apple.rating_avg), (1, Decimal('2.00')))
+        self.assertEqual(self.apple.rating_histogram['5'], 0)
+    
+    def test_bulk_admin_actions(self):
+        """Teste das ações de aprovar/desaprovar em lote"""
+        self.review(self.apple, self.customers[0], 5)
+        self.review(self.apple, self.customers[1], 4, is_approved=True)
+        self.review(self.pear, self.customers[2], 1)
+        
+        self.assertEqual(ProductReview.objects.all().set_approved(True), 2)
+        self.apple.refresh_from_db()
+        self.pear.refresh_from_db()
+        self.assertEqual((self.apple.rating_count, self.apple.rating_avg), (2, Decimal('4.50')))
+        self.assertEqual((self.pear.rating_count, self.pear.rating_avg), (1, Decimal('1.00')))
+        
+        ProductReview.objects.filter(product=self.apple).set_approved(False)
+        self.apple.refresh_from_db()
+        self.assertEqual((self.apple.rating_count, self.apple.rating_avg), (0, Decimal('0.00')))
+    
+    def test_rebuild_command(self):
+        """Teste do comando de reconstrução após update em massa"""
+        self.review(self.apple, self.customers[0], 3)
+        ProductReview.objects.update(is_approved=True)
+        
+        out = StringIO()
+        call_command('rebuild_review_aggregates', stdout=out)
+        self.assertIn('1 produtos alterados', out.getvalue())
+        self.apple.refresh_from_db()
+        self.assertEqual((self.apple.rating_count, self.apple.rating_avg), (1, Decimal('3.00')))
+    
+    def test_listing_rating_filter_and_ordering(self):
+        """Teste de ?ordering=rating e min_rating na listagem"""
+        self.review(self.apple, self.customers[0], 5, is_approved=True)
+        self.review(self.pear, self.customers[1], 3, is_approved=True)
+        
+        response = self.client.get('/api/products/', {'ordering': '-rating'})
+        self.assertEqual([item['slug'] for item in response.data['results']], ['maca', 'pera'])
+        self.assertEqual(response.data['results'][0]['rating_avg'], '5.00')
+        
+        response = self.client.get('/api/products/', {'min_rating': '4'})
+        self.assertEqual([item['slug'] for item in response.data['results']], ['maca'])
+        
+        for invalid in ('abc', '6', 'NaN'):
+            response = self.client.get('/api/products/', {'min_rating': invalid})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('min_rating', response.data)
+        response = self.client.get('/api/products/', {'min_price': 'barato'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RelatedProductsTest(APITestCase):
+    """Testes para as recomendações "comprados juntos\""""
+    
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user(
+            email='cliente@example.com', password='testpass123', full_name='Cliente',
+            cpf_cnpj='22222222222', user_type='customer'
+        )
+        department = Department.objects.create(name='Frutas', slug='frutas')
+        self.products = {
+            slug: Product.objects.create(
+                name=slug, description='Fruta', slug=slug, department=department, price=Decimal('10.00')
+            )
+            for slug in ('a', 'b', 'c')
+        }
+        self.now = timezone.now()
+        for basket in (['a', 'b'], ['a', 'b'], ['a', 'b', 'c'], ['a', 'c'], ['c']):
+            self.create_order(basket)
+    
+    def create_order(self, basket, created_at=None):
+        order = Order.objects.create(
+            customer=self.customer,
+            payment_method='pix',
+            subtotal=Decimal('10.00') * len(basket),
+            total_amount=Decimal('10.00') * len(basket),
+            shipping_address='Rua A, 1',
+            shipping_city='São Paulo',
+            shipping_state='SP',
+            shipping_postal_code='01000-000'
+        )
+        for slug in basket:
+            OrderItem.objects.create(
+                order=order, product=self.products[slug], quantity=1, unit_price=Decimal('10.00')
+            )
+        Order.objects.filter(pk=order.pk).update(
+            created_at=created_at or self.now - timedelta(hours=1)
+        )
+        return order
+    
+    def related(self, slug):
+        return list(
+            RelatedProduct.objects.filter(product=self.products[slug]).order_by('rank').values_list(
+                'related__slug', flat=True
+            )
+        )
+    
+    def test_count_pairs(self):
+        """Teste da contagem de pares com diagonal"""
+        self.assertEqual(
+            count_pairs([(1, 2), (1, 1), (2, 1), (2, 1)]),
+            {(1, 1): 2, (2, 2): 1, (1, 2): 1}
+        )
+    
+    @skipUnless(recommendations.np is not None, 'NumPy não instalado')
+    def test_count_pairs_numpy_matches_fallback(self):
+        """Teste da contagem vetorizada (NumPy) contra a contagem com itertools"""
+        import random
+        generator = random.Random(42)
+        rows = [
+            (order_id, generator.randint(1, 30))
+            for order_id in range(1, 300)
+            for _ in range(generator.randint(1, 8))
+        ]
+        vectorized = count_pairs(rows)
+        with mock.patch.object(recommendations, 'np', None):
+            fallback = count_pairs(rows)
+        self.assertEqual(vectorized, fallback)
+        self.assertTrue(all(isinstance(count, int) for count in vectorized.values()))
+    
+    def test_interrupted_run_resumes_after_last_batch(self):
+        """Teste da marca d'água (created_at, id) gravada com as contagens de cada lote"""
+        created_at = self.now - timedelta(hours=2)
+        for _ in range(3):
+            self.create_order(['a', 'b'], created_at=created_at)
+        
+        calls = []
+        original = recommendations.add_counts
+        
+        def failing_add_counts(counts):
+            calls.append(counts)
+            if len(calls) == 2:
+                raise RuntimeError('falha no meio da execução')
+            original(counts)
+        
+        with mock.patch.object(recommendations, 'ORDERS_PER_BATCH', 2), \
+                mock.patch.object(recommendations, 'add_counts', failing_add_counts):
+            with self.assertRaises(RuntimeError):
+                update_related_products(self.now)
+        
+        # O primeiro lote (dois pedidos com o mesmo created_at) foi gravado com a posição
+        watermark = ProcessingWatermark.get_position(recommendations.WATERMARK)
+        self.assertEqual(watermark[0], created_at)
+        self.assertIsNotNone(watermark[1])
+        
+        with mock.patch.object(recommendations, 'ORDERS_PER_BATCH', 2):
+            self.assertEqual(update_related_products(self.now), (6, 3))
+        pair = ProductCooccurrence.objects.get(product_a=self.products['a'], product_b=self.products['b'])
+        self.assertEqual(pair.count, 6)
+    
+    def test_top_neighbors_and_incremental_update(self):
+        """Teste dos vizinhos por Jaccard e da atualização incremental"""
+        self.assertEqual(update_related_products(self.now), (5, 3))
+        self.assertEqual(self.related('a'), ['b', 'c'])
+        self.assertEqual(self.related('b'), ['a'])
+        score = RelatedProduct.objects.get(product=self.products['a'], related=self.products['b']).score
+        self.assertAlmostEqual(score, 0.75)
+        
+        later = self.now + timedelta(hours=1)
+        self.create_order(['b', 'c'], created_at=later)
+        self.create_order(['b', 'c'], created_at=later)
+        self.assertEqual(update_related_products(later + timedelta(hours=1)), (2, 2))
+        self.assertEqual(self.related('b'), ['a', 'c'])
+        self.assertEqual(self.related('c'), ['b', 'a'])
+        self.assertEqual(update_related_products(later + timedelta(hours=1)), (0, 0))
+    
+    def test_related_endpoint(self):
+        """Teste do endpoint de relacionados servido do cache"""
+        update_related_products(self.now)
+        
+        response = self.client.get('/api/products/a/related/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['slug'] for item in response.data], ['b', 'c'])
+        
+        with self.assertNumQueries(1):
+            self.client.get('/api/products/a/related/')
+        
+        response = self.client.get('/api/products/inexistente/related/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
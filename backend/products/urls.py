@@ -11,10 +11,15 @@ urlpatterns = [
     
     # Produtos
     path('', views.ProductListView.as_view(), name='product_list'),
+    path('search/', views.ProductSearchView.as_view(), name='product_search'),
     path('featured/', views.featured_products, name='featured_products'),
 
     path('create/', views.ProductCreateView.as_view(), name='product_create'),
+    path('catalog/import/', views.import_catalog, name='import_catalog'),
+    path('catalog/export/', views.export_catalog, name='export_catalog'),
+    path('availability/', views.product_availability, name='product_availability'),
     path('<slug:slug>/', views.ProductDetailView.as_view(), name='product_detail'),
+    path('<slug:slug>/related/', views.related_products, name='related_products'),
     
     # Estoque
     path('inventory/movement/', views.inventory_movement, name='inventory_movement'),
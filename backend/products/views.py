@@ -1,30 +1,46 @@
 from rest_framework import status, generics, permissions, filters
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.parsers import MultiPartParser
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from django.db.models import Q, F
+from rest_framework.utils.urls import replace_query_param
+from django.db.models import F
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .models import Department, Product, ProductImage, Stock
+from ecommerce_saas.pagination import OptionalKeysetPagination
+from users.permissions import IsAdminUser
+from . import cache as catalog_cache, catalog_io
+from .models import Department, Product, ProductFacet, ProductImage, Stock
 from .serializers import (
     DepartmentSerializer,
     ProductListSerializer,
+    ProductSearchResultSerializer,
     ProductDetailSerializer,
     ProductCreateUpdateSerializer,
     ProductImageSerializer,
     StockSerializer,
     StockMovementSerializer,
-
+    AvailabilityCheckSerializer,
     ProductSearchSerializer
 )
+from .conditional import catalog_etag, catalog_last_modified, product_etag, product_last_modified
+from .search import get_search_backend
+from .services import check_availability
+
+DEPARTMENT_MAX_PAGE_SIZE = 100
 
 
 class DepartmentListCreateView(generics.ListCreateAPIView):
     """
     Listar e criar departamentos
     """
-    queryset = Department.objects.filter(is_active=True)
+    queryset = Department.objects.filter(is_active=True).with_products_count()
     serializer_class = DepartmentSerializer
     permission_classes = [AllowAny]  # Clientes podem ver departamentos
     
@@ -38,7 +54,7 @@ class DepartmentDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
     Visualizar, atualizar e deletar departamento
     """
-    queryset = Department.objects.all()
+    queryset = Department.objects.with_products_count()
     serializer_class = DepartmentSerializer
     permission_classes = [IsAuthenticated]
     
@@ -48,58 +64,203 @@ class DepartmentDetailView(generics.RetrieveUpdateDestroyAPIView):
         instance.save()
 
 
+# Filtros de catálogo aceitos na listagem e na busca (validados por ProductSearchSerializer)
+CATALOG_FILTER_PARAMS = ('department', 'min_price', 'max_price', 'min_rating', 'in_stock', 'is_featured')
+
+
+def filter_catalog(queryset, department=None, min_price=None, max_price=None,
+                   in_stock=False, is_featured=False, min_rating=None):
+    """
+    Aplicar os filtros de catálogo (departamento, preço, estoque, destaque e avaliação)
+    """
+    if department:
+        queryset = queryset.filter(department_id=department)
+    
+    # Faixa de preço sobre o preço efetivo (promoções e agendamentos)
+    if min_price is not None:
+        queryset = queryset.filter(effective_price__gte=min_price)
+    
+    if max_price is not None:
+        queryset = queryset.filter(effective_price__lte=max_price)
+    
+    if in_stock:
+        # Filtrar produtos com estoque disponível (descontadas as reservas)
+        queryset = queryset.filter(stock_balance__quantity__gt=F('stock_balance__reserved'))
+    
+    if is_featured:
+        queryset = queryset.filter(is_featured=True)
+    
+    if min_rating is not None:
+        queryset = queryset.filter(rating_count__gt=0, rating_avg__gte=min_rating)
+    
+    return queryset
+
+
+class CatalogOrderingFilter(filters.OrderingFilter):
+    """
+    OrderingFilter com nomes públicos mapeados para colunas internas:
+    ?ordering=price ordena pelo preço efetivo indexado, ?ordering=rating pela
+    média de avaliações armazenada e ?ordering=popularity pelo ranking de mais
+    vendidos (produtos sem vendas por último)
+    """
+    ordering_aliases = {
+        'price': 'effective_price',
+        'popularity': '-ranking__score',
+        'rating': 'rating_avg',
+    }
+    
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        valid = super().remove_invalid_fields(queryset, fields, view, request)
+        return [self.resolve_alias(term) for term in valid]
+    
+    def resolve_alias(self, term):
+        descending = term.startswith('-')
+        field = self.ordering_aliases.get(term.lstrip('-'), term.lstrip('-'))
+        if field.startswith('-'):
+            descending, field = not descending, field[1:]
+        return F(field).desc(nulls_last=True) if descending else F(field).asc(nulls_last=True)
+
+
+@method_decorator(condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified), name='get')
 class ProductListView(generics.ListAPIView):
     """
     Listar produtos com filtros e busca
     """
     serializer_class = ProductListSerializer
     permission_classes = [AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['name', 'description']
-    ordering_fields = ['name', 'price', 'created_at']
+    filter_backends = [DjangoFilterBackend, CatalogOrderingFilter]
+    ordering_fields = ['name', 'price', 'created_at', 'popularity', 'rating']
     ordering = ['-created_at']
+    pagination_class = OptionalKeysetPagination
     
     def get_queryset(self):
-        queryset = Product.objects.filter(is_active=True).select_related('department')
+        queryset = Product.objects.filter(is_active=True).for_listing()
+        params = self.request.query_params
         
-        # Filtros personalizados
-        department = self.request.query_params.get('department')
-        if department:
-            queryset = queryset.filter(department_id=department)
+        # Mesma validação dos filtros da busca: valores inválidos retornam 400
+        filters_serializer = ProductSearchSerializer(data={
+            key: value for key, value in params.items()
+            if key in CATALOG_FILTER_PARAMS and value != ''
+        })
+        filters_serializer.is_valid(raise_exception=True)
+        data = filters_serializer.validated_data
         
-        min_price = self.request.query_params.get('min_price')
-        if min_price:
-            queryset = queryset.filter(price__gte=min_price)
+        # Busca textual pelo índice (substitui o SearchFilter com icontains)
+        search = params.get('search', '').strip()
+        if search:
+            queryset = get_search_backend().search(queryset, search)
         
-        max_price = self.request.query_params.get('max_price')
-        if max_price:
-            queryset = queryset.filter(price__lte=max_price)
+        return filter_catalog(
+            queryset,
+            department=data.get('department'),
+            min_price=data.get('min_price'),
+            max_price=data.get('max_price'),
+            in_stock=data.get('in_stock', False),
+            is_featured=data.get('is_featured', False),
+            min_rating=data.get('min_rating')
+        )
+    
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        
+        # Modo facetas: ?facets=department,price,in_stock
+        facets = request.query_params.get('facets')
+        if facets:
+            requested = [name.strip() for name in facets.split(',') if name.strip()]
+            invalid = [name for name in requested if name not in ProductFacet.FACETS]
+            if invalid:
+                raise ValidationError({
+                    'facets': f"Facetas inválidas: {', '.join(invalid)}. "
+                              f"Opções: {', '.join(ProductFacet.FACETS)}."
+                })
+            response.data['facets'] = ProductFacet.counts(
+                self.filter_queryset(self.get_queryset()), requested
+            )
+        
+        return response
+
+
+@method_decorator(condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified), name='get')
+class ProductSearchView(generics.ListAPIView):
+    """
+    Busca textual de produtos ordenada por relevância, com trechos destacados
+    """
+    serializer_class = ProductSearchResultSerializer
+    permission_classes = [AllowAny]
+    
+    ordering_map = {
+        'relevance': ['-search_rank', '-created_at'],
+        'name': ['name'],
+        '-name': ['-name'],
+        'price': ['effective_price'],
+        '-price': ['-effective_price'],
+        'created_at': ['created_at'],
+        '-created_at': ['-created_at'],
+        'rating': ['rating_avg'],
+        '-rating': ['-rating_avg'],
+    }
+    
+    def get_queryset(self):
+        params = ProductSearchSerializer(data={
+            'query': self.request.query_params.get('q', ''),
+            **{
+                key: value for key, value in self.request.query_params.items()
+                if key in CATALOG_FILTER_PARAMS + ('ordering',)
+            }
+        })
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
         
-        in_stock = self.request.query_params.get('in_stock')
-        if in_stock and in_stock.lower() == 'true':
-            # Filtrar produtos que têm estoque
-            from django.db.models import Sum
-            queryset = queryset.annotate(
-                total_stock=Sum('stock__quantity')
-            ).filter(total_stock__gt=0)
+        query = data.get('query', '').strip()
+        if not query:
+            raise ValidationError({'q': 'Informe o termo de busca.'})
         
-        is_featured = self.request.query_params.get('is_featured')
-        if is_featured and is_featured.lower() == 'true':
-            queryset = queryset.filter(is_featured=True)
+        queryset = Product.objects.filter(is_active=True).for_listing()
+        queryset = get_search_backend().search(queryset, query)
+        queryset = filter_catalog(
+            queryset,
+            department=data.get('department'),
+            min_price=data.get('min_price'),
+            max_price=data.get('max_price'),
+            in_stock=data.get('in_stock', False),
+            is_featured=data.get('is_featured', False),
+            min_rating=data.get('min_rating')
+        )
         
-        return queryset
+        ordering = data.get('ordering', 'relevance')
+        return queryset.order_by(*self.ordering_map[ordering], 'id')
 
 
+@method_decorator(condition(etag_func=product_etag, last_modified_func=product_last_modified), name='get')
 class ProductDetailView(generics.RetrieveAPIView):
     """
     Visualizar detalhes do produto
     """
-    queryset = Product.objects.filter(is_active=True)
+    queryset = Product.objects.filter(is_active=True).for_detail()
     serializer_class = ProductDetailSerializer
     permission_classes = [AllowAny]
     lookup_field = 'slug'
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def related_products(request, slug):
+    """
+    Listar produtos comprados junto com o produto (pré-calculados pelo job de
+    recomendações; a lista de ids vem do cache)
+    """
+    product_ids = catalog_cache.related_product_ids(slug)
+    if not product_ids:
+        return Response([])
+    
+    products = {
+        product.pk: product
+        for product in Product.objects.filter(pk__in=product_ids, is_active=True).for_listing()
+    }
+    related = [products[pk] for pk in product_ids if pk in products]
+    return Response(ProductListSerializer(related, many=True).data)
+
+
 class ProductCreateView(generics.CreateAPIView):
     """
     Criar novo produto (apenas admin)
@@ -113,43 +274,139 @@ class ProductCreateView(generics.CreateAPIView):
         if self.request.user.user_type != 'admin':
             raise permissions.PermissionDenied("Apenas administradores podem criar produtos.")
         
+        initial_stock = serializer.validated_data.pop('initial_stock', 0)
         product = serializer.save()
         
-        # Criar registro de estoque inicial
-        Stock.objects.create(
-            product=product,
-            quantity=50,
-            movement_type='in',
-            reason='Estoque inicial'
-        )
+        # Estoque inicial apenas quando informado
+        if initial_stock:
+            Stock.objects.create(
+                product=product,
+                quantity=initial_stock,
+                movement_type='in',
+                reason='Estoque inicial',
+                created_by=self.request.user
+            )
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
 def featured_products(request):
     """
     Listar produtos em destaque
     """
-    products = Product.objects.filter(is_active=True, is_featured=True)[:8]
-    serializer = ProductListSerializer(products, many=True)
-    return Response(serializer.data)
+    return Response(catalog_cache.featured_products())
+
+
+def _page_param(request, name, default, maximum=None):
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise NotFound('Página inválida.')
+    if value < 1:
+        raise NotFound('Página inválida.')
+    return min(value, maximum) if maximum else value
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
 def products_by_department(request, department_id):
     """
-    Listar produtos por departamento
+    Listar produtos por departamento (paginado: ?page=N&page_size=M)
     """
-    department = get_object_or_404(Department, id=department_id, is_active=True)
-    products = Product.objects.filter(department=department, is_active=True)
-    serializer = ProductListSerializer(products, many=True)
+    page_number = _page_param(request, 'page', 1)
+    page_size = _page_param(
+        request, 'page_size', PageNumberPagination.page_size, DEPARTMENT_MAX_PAGE_SIZE
+    )
+    
+    data = catalog_cache.department_page(department_id, page_number, page_size)
+    
+    # Links montados por requisição: a entrada do cache não depende do host
+    url = request.build_absolute_uri()
+    next_link = previous_link = None
+    if page_number < data['num_pages']:
+        next_link = replace_query_param(url, 'page', page_number + 1)
+    if page_number > 1:
+        previous_link = replace_query_param(url, 'page', page_number - 1)
+    
     return Response({
-        'department': DepartmentSerializer(department).data,
-        'products': serializer.data
+        'department': data['department'],
+        'count': data['count'],
+        'next': next_link,
+        'previous': previous_link,
+        'products': data['products']
     })
 
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def product_availability(request):
+    """
+    Verificar disponibilidade, estoque e preço atual de vários produtos
+    """
+    serializer = AvailabilityCheckSerializer(data=request.data)
+    if serializer.is_valid():
+        availability = check_availability(
+            (item['product_id'], item['quantity'])
+            for item in serializer.validated_data['items']
+        )
+        items = [entry.to_dict() for entry in availability.values()]
+        return Response({
+            'items': items,
+            'all_available': all(item['is_available'] for item in items)
+        })
+    
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+@parser_classes([MultiPartParser])
+def import_catalog(request):
+    """
+    Importar catálogo a partir de um arquivo CSV ou JSONL (apenas admin)
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'error': 'Envie o arquivo no campo "file".'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    fmt = request.data.get('file_format') or catalog_io.detect_format(upload.name)
+    if fmt not in catalog_io.FORMATS:
+        return Response({'error': f'Formato inválido: {fmt}'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    importer = catalog_io.CatalogImporter(user=request.user)
+    result = importer.run(catalog_io.read_rows(upload, fmt))
+    return Response(result.to_dict(max_errors=500), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_catalog(request):
+    """
+    Exportar catálogo em CSV ou JSONL, em streaming (apenas admin)
+    """
+    fmt = request.query_params.get('file_format', 'csv')
+    if fmt not in catalog_io.FORMATS:
+        return Response({'error': f'Formato inválido: {fmt}'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    queryset = Product.objects.all()
+    department = request.query_params.get('department')
+    if department:
+        queryset = queryset.filter(department_id=department)
+    
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(
+        catalog_io.render_rows(catalog_io.export_rows(queryset), fmt),
+        content_type=f'{content_type}; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'attachment; filename="catalogo.{fmt}"'
+    return response
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def inventory_movement(request):